@@ -4,7 +4,7 @@ Admin configuration para el módulo de automation.
 
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import EmailProcessingLog, EmailAutoProcessingConfig
+from .models import EmailProcessingLog, EmailAutoProcessingConfig, MailboxFolderCheckpoint
 
 
 @admin.register(EmailProcessingLog)
@@ -178,6 +178,9 @@ class EmailAutoProcessingConfigAdmin(admin.ModelAdmin):
         ('Processing Options', {
             'fields': (
                 'auto_parse_enabled',
+                'max_concurrent_downloads',
+                'memory_budget_mb',
+                'max_messages_per_minute',
             )
         }),
         ('Last Run Info', {
@@ -230,3 +233,28 @@ class EmailAutoProcessingConfigAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """No permitir eliminar la configuración"""
         return False
+
+
+@admin.register(MailboxFolderCheckpoint)
+class MailboxFolderCheckpointAdmin(admin.ModelAdmin):
+    """Admin para MailboxFolderCheckpoint (borrar un checkpoint reprocesa la ventana completa)"""
+    
+    list_display = [
+        'folder_path',
+        'last_received_at',
+        'messages_processed',
+        'updated_at',
+    ]
+    
+    readonly_fields = [
+        'folder_path',
+        'last_received_at',
+        'last_message_id',
+        'messages_processed',
+        'created_at',
+        'updated_at',
+    ]
+    
+    def has_add_permission(self, request):
+        """Los checkpoints los crea el motor de procesamiento"""
+        return False
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailboxFolderCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('folder_path', models.CharField(help_text='Carpeta del buzón (ej: Inbox, Inbox/DTEs)', max_length=500, unique=True)),
+                ('last_received_at', models.DateTimeField(blank=True, help_text='receivedDateTime del último email procesado sin huecos', null=True)),
+                ('last_message_id', models.CharField(blank=True, help_text='Message-ID del último email procesado', max_length=500)),
+                ('messages_processed', models.IntegerField(default=0, help_text='Total acumulado de emails procesados en esta carpeta')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Carpeta',
+                'verbose_name_plural': 'Checkpoints de Carpetas',
+                'db_table': 'automation_mailbox_checkpoint',
+            },
+        ),
+        migrations.AddField(
+            model_name='emailautoprocessingconfig',
+            name='max_concurrent_downloads',
+            field=models.PositiveSmallIntegerField(default=2, help_text='Cantidad de workers que descargan adjuntos en paralelo'),
+        ),
+        migrations.AddField(
+            model_name='emailautoprocessingconfig',
+            name='max_messages_per_minute',
+            field=models.PositiveIntegerField(default=0, help_text='Límite de emails despachados por minuto (0 = sin límite)'),
+        ),
+        migrations.AddField(
+            model_name='emailautoprocessingconfig',
+            name='memory_budget_mb',
+            field=models.PositiveIntegerField(default=64, help_text='Máximo de MB de adjuntos descargados pendientes de procesar al mismo tiempo'),
+        ),
+    ]
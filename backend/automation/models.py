@@ -160,6 +160,22 @@ class EmailAutoProcessingConfig(TimeStampedModel):
         help_text="Máximo de emails a procesar en cada ejecución"
     )
     
+    # Límites del motor de procesamiento (ver services/mailbox_engine.py)
+    max_concurrent_downloads = models.PositiveSmallIntegerField(
+        default=2,
+        help_text="Cantidad de workers que descargan adjuntos en paralelo"
+    )
+    
+    memory_budget_mb = models.PositiveIntegerField(
+        default=64,
+        help_text="Máximo de MB de adjuntos descargados pendientes de procesar al mismo tiempo"
+    )
+    
+    max_messages_per_minute = models.PositiveIntegerField(
+        default=0,
+        help_text="Límite de emails despachados por minuto (0 = sin límite)"
+    )
+    
     last_run_at = models.DateTimeField(
         null=True,
         blank=True,
@@ -180,3 +196,44 @@ class EmailAutoProcessingConfig(TimeStampedModel):
     def __str__(self):
         status = "Activo" if self.is_active else "Inactivo"
         return f"Email Auto-Processing Config ({status})"
+
+
+class MailboxFolderCheckpoint(TimeStampedModel):
+    """
+    Checkpoint de procesamiento por carpeta del buzón.
+    
+    Guarda la fecha de recepción del último email procesado (en orden
+    cronológico) para que una ejecución interrumpida continúe desde ahí
+    en lugar de volver a listar toda la ventana de días.
+    """
+    
+    folder_path = models.CharField(
+        max_length=500,
+        unique=True,
+        help_text="Carpeta del buzón (ej: Inbox, Inbox/DTEs)"
+    )
+    
+    last_received_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="receivedDateTime del último email procesado sin huecos"
+    )
+    
+    last_message_id = models.CharField(
+        max_length=500,
+        blank=True,
+        help_text="Message-ID del último email procesado"
+    )
+    
+    messages_processed = models.IntegerField(
+        default=0,
+        help_text="Total acumulado de emails procesados en esta carpeta"
+    )
+    
+    class Meta:
+        db_table = 'automation_mailbox_checkpoint'
+        verbose_name = "Checkpoint de Carpeta"
+        verbose_name_plural = "Checkpoints de Carpetas"
+    
+    def __str__(self):
+        return f"{self.folder_path} @ {self.last_received_at or '-'}"
@@ -89,6 +89,9 @@ class EmailAutoProcessingConfigSerializer(serializers.ModelSerializer):
             'sender_whitelist',
             'auto_parse_enabled',
             'max_emails_per_run',
+            'max_concurrent_downloads',
+            'memory_budget_mb',
+            'max_messages_per_minute',
             'last_run_at',
             'last_run_status',
             'last_run_ago',
@@ -8,14 +8,17 @@ import base64
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime
 from decimal import Decimal
+import mimetypes
 import tempfile
 import os
 
 from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile as DjangoUploadedFile
 from django.db import transaction
 from django.utils import timezone
 
 from automation.models import EmailProcessingLog, EmailAutoProcessingConfig
+from automation.services.mailbox_engine import MailboxProcessingEngine
 from automation.services.microsoft_graph import MicrosoftGraphClient
 from invoices.models import Invoice, UploadedFile
 from invoices.serializers import InvoiceCreateSerializer
@@ -72,49 +75,11 @@ class EmailProcessor:
                 'failed': 0,
             }
         
-        start_time = datetime.now()
-        stats = {
-            'processed': 0,
-            'success': 0,
-            'failed': 0,
-            'skipped': 0,
-            'invoices_created': 0,
-        }
-        
+        engine = MailboxProcessingEngine(self)
         try:
-            # Iterar sobre carpetas configuradas
-            for folder in self.config.target_folders:
-                logger.info(f"Processing folder: {folder}")
-                
-                # Buscar emails con keywords en subject
-                messages = self.graph_client.search_messages_by_subject(
-                    keywords=self.config.subject_filters,
-                    folder=folder,
-                    days_back=7,
-                    max_results=self.config.max_emails_per_run
-                )
-                
-                logger.info(f"Found {len(messages)} messages in {folder}")
-                
-                # Procesar cada mensaje
-                for message in messages:
-                    stats['processed'] += 1
-                    
-                    result = self._process_single_message(message, folder)
-                    
-                    if result['status'] == 'success':
-                        stats['success'] += 1
-                        stats['invoices_created'] += result.get('invoices_count', 0)
-                    elif result['status'] == 'failed':
-                        stats['failed'] += 1
-                    elif result['status'] == 'skipped':
-                        stats['skipped'] += 1
-                    
-                    # Limitar cantidad por run
-                    if stats['processed'] >= self.config.max_emails_per_run:
-                        logger.info(f"Reached max emails per run: {self.config.max_emails_per_run}")
-                        break
-            
+            # Carpetas, dedup en lote, descargas concurrentes y checkpoints
+            stats = engine.run()
+
             # Actualizar config con last run info
             self.config.last_run_at = timezone.now()
             self.config.last_run_status = (
@@ -123,24 +88,27 @@ class EmailProcessor:
                 f"Failed: {stats['failed']}, "
                 f"Invoices: {stats['invoices_created']}"
             )
-            self.config.save()
-            
-            elapsed = (datetime.now() - start_time).total_seconds()
-            logger.info(f"Mailbox processing completed in {elapsed:.2f}s: {stats}")
-            
+            self.config.save(update_fields=['last_run_at', 'last_run_status', 'updated_at'])
+
+            logger.info(f"Mailbox processing completed in {stats['elapsed_seconds']:.2f}s: {stats}")
+
             return {
                 'status': 'completed',
-                'elapsed_seconds': elapsed,
                 **stats
             }
-            
+
         except Exception as e:
             logger.error(f"Mailbox processing failed: {e}", exc_info=True)
-            
+
+            # Lo procesado antes del error ya quedó registrado (logs y checkpoint)
+            stats = engine.stats
             self.config.last_run_at = timezone.now()
-            self.config.last_run_status = f"Error: {str(e)}"
-            self.config.save()
-            
+            self.config.last_run_status = (
+                f"Error: {str(e)} "
+                f"(Processed: {stats['processed']}, Success: {stats['success']}, Failed: {stats['failed']})"
+            )
+            self.config.save(update_fields=['last_run_at', 'last_run_status', 'updated_at'])
+
             return {
                 'status': 'error',
                 'error': str(e),
@@ -335,42 +303,66 @@ class EmailProcessor:
         # MEMORY OPTIMIZATION: Decode and save to tempfile to avoid loading in RAM
         content_bytes_base64 = attachment.get('contentBytes', '')
 
-        # Use tempfile to avoid keeping large files in memory
-        import tempfile
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
-            # Decode in chunks if possible, or decode and write immediately
-            content_bytes = base64.b64decode(content_bytes_base64)
-            tmp.write(content_bytes)
-            tmp.flush()
+            tmp.write(base64.b64decode(content_bytes_base64))
             tmp_path = tmp.name
 
         try:
-            # Create UploadedFile from tempfile (without loading full content in memory)
-            uploaded_file = self._create_uploaded_file_from_path(filename, tmp_path, content_type)
+            return self._create_invoice_from_path(filename, tmp_path, content_type)
         finally:
-            # Clean up tempfile
             try:
                 os.unlink(tmp_path)
-            except:
+            except OSError:
                 pass
-        
-        # Crear Invoice usando serializer con auto_parse
-        invoice_data = {
-            'file': uploaded_file.id,
-            'auto_parse': self.config.auto_parse_enabled,
-            'source': 'email',
-        }
-        
-        # Crear usando serializer (esto triggerea el auto-parsing)
-        serializer = InvoiceCreateSerializer(data=invoice_data)
-        
-        if serializer.is_valid():
-            invoice = serializer.save()
-            logger.info(f"Created invoice: {invoice.numero_factura} from {filename}")
-            return invoice
-        else:
-            logger.error(f"Failed to create invoice from {filename}: {serializer.errors}")
-            raise ValueError(f"Validation error: {serializer.errors}")
+
+    def _create_invoice_from_path(
+        self,
+        filename: str,
+        file_path: str,
+        content_type: str
+    ) -> Invoice:
+        """
+        Crea una factura (con auto-parse) desde un archivo ya descargado a disco.
+
+        El archivo se entrega al InvoiceCreateSerializer como un archivo
+        subido, igual que en la carga manual: el serializer se encarga de
+        deduplicar por hash, guardarlo en storage y parsearlo.
+
+        Args:
+            filename: Nombre original del adjunto
+            file_path: Path al archivo temporal
+            content_type: MIME type reportado por MS Graph
+
+        Returns:
+            Invoice creada
+
+        Raises:
+            ValueError: Si el serializer rechaza el archivo
+        """
+        if not content_type or content_type == 'application/octet-stream':
+            content_type = mimetypes.guess_type(filename)[0] or content_type
+
+        with open(file_path, 'rb') as fh:
+            upload = DjangoUploadedFile(
+                file=fh,
+                name=filename,
+                content_type=content_type,
+                size=os.path.getsize(file_path),
+            )
+
+            # Crear usando serializer (esto triggerea el auto-parsing)
+            serializer = InvoiceCreateSerializer(data={
+                'file': upload,
+                'auto_parse': self.config.auto_parse_enabled,
+            })
+
+            if serializer.is_valid():
+                invoice = serializer.save()
+                logger.info(f"Created invoice: {invoice.numero_factura} from {filename}")
+                return invoice
+
+        logger.error(f"Failed to create invoice from {filename}: {serializer.errors}")
+        raise ValueError(f"Validation error: {serializer.errors}")
     
     def _create_uploaded_file_from_path(
         self,
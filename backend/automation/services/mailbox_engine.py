@@ -0,0 +1,455 @@
+"""
+Mailbox Processing Engine.
+Procesa el buzón de DTEs con concurrencia acotada, presupuesto de memoria y
+checkpoints por carpeta.
+
+Flujo por carpeta:
+1. Listar mensajes desde el checkpoint (más antiguos primero).
+2. Deduplicar TODOS los message ids contra EmailProcessingLog en una sola query.
+3. Un pool pequeño de workers lista y descarga los adjuntos directo a disco
+   (streaming, sin base64 en memoria). Antes de descargar, cada worker reserva
+   en UNA sola llamada al MemoryBudget el tamaño de todos los adjuntos
+   soportados del mensaje; si el presupuesto está lleno espera (sin tener
+   nada reservado) a que el hilo principal libere mensajes ya procesados.
+4. El hilo principal persiste cada mensaje (UploadedFile, Invoice con
+   auto-parse, EmailProcessingLog) y avanza el checkpoint cuando todos los
+   mensajes anteriores ya terminaron, de modo que una ejecución interrumpida
+   retoma sin huecos.
+
+Los workers NO tocan la base de datos: solo red y disco. Todo el trabajo con
+el ORM ocurre en el hilo que invocó run().
+"""
+
+import base64
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.utils import timezone
+
+from automation.models import EmailProcessingLog, MailboxFolderCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+ATTACHMENT_METADATA_FIELDS = ['id', 'name', 'contentType', 'size']
+DEFAULT_ATTACHMENT_SIZE = 1024 * 1024  # Reserva cuando Graph no informa el tamaño
+BASE64_CHUNK = 64 * 1024  # Múltiplo de 4: cada chunk decodifica de forma independiente
+
+
+class MemoryBudget:
+    """
+    Semáforo por bytes para los adjuntos en vuelo.
+
+    Un adjunto más grande que el presupuesto completo se deja pasar solo
+    (espera a que no haya nada más reservado) para no bloquear la ejecución.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = max(int(limit_bytes), 1)
+        self.in_use = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes: int) -> int:
+        nbytes = min(max(int(nbytes), 1), self.limit_bytes)
+        with self._condition:
+            while self.in_use and self.in_use + nbytes > self.limit_bytes:
+                self._condition.wait()
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        return nbytes
+
+    def release(self, nbytes: int) -> None:
+        with self._condition:
+            self.in_use = max(self.in_use - nbytes, 0)
+            self._condition.notify_all()
+
+
+class MailboxProcessingEngine:
+    """
+    Motor de procesamiento concurrente y reanudable del buzón.
+
+    Usa los límites de EmailAutoProcessingConfig:
+    - max_concurrent_downloads: tamaño del pool de workers
+    - memory_budget_mb: bytes de adjuntos descargados pendientes de procesar
+    - max_messages_per_minute: ritmo máximo de despacho (0 = sin límite)
+    - max_emails_per_run: tope de mensajes por ejecución (todas las carpetas)
+    """
+
+    def __init__(self, processor):
+        """
+        Args:
+            processor: EmailProcessor que aporta graph_client, config y la
+                lógica de creación de facturas/logs.
+        """
+        self.processor = processor
+        self.graph_client = processor.graph_client
+        self.config = processor.config
+
+        self.concurrency = max(self.config.max_concurrent_downloads or 1, 1)
+        self.budget = MemoryBudget((self.config.memory_budget_mb or 1) * 1024 * 1024)
+        per_minute = self.config.max_messages_per_minute or 0
+        self.min_dispatch_interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._last_dispatch = 0.0
+        # Acumulado de la ejecución; si run() falla conserva lo procesado hasta ese punto
+        self.stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {'processed': 0, 'success': 0, 'failed': 0, 'skipped': 0, 'invoices_created': 0}
+
+    # ------------------------------------------------------------------ #
+    # Ejecución
+    # ------------------------------------------------------------------ #
+
+    def run(self) -> Dict[str, any]:
+        """
+        Procesa todas las carpetas configuradas.
+
+        Returns:
+            Dict con estadísticas (mismas claves que EmailProcessor.process_mailbox
+            más peak_inflight_bytes y messages_per_second)
+        """
+        start = time.monotonic()
+        stats = self.stats = self._empty_stats()
+
+        remaining = self.config.max_emails_per_run
+        for folder in self.config.target_folders:
+            if remaining <= 0:
+                logger.info(f"Reached max emails per run: {self.config.max_emails_per_run}")
+                break
+            folder_stats = self.process_folder(folder, remaining)
+            remaining -= folder_stats['processed']
+
+        elapsed = time.monotonic() - start
+        stats['elapsed_seconds'] = elapsed
+        stats['peak_inflight_bytes'] = self.budget.peak
+        stats['messages_per_second'] = round(stats['processed'] / elapsed, 2) if elapsed > 0 else 0.0
+        return stats
+
+    def process_folder(self, folder: str, limit: int) -> Dict[str, int]:
+        """Procesa una carpeta desde su checkpoint (también suma en self.stats)."""
+        stats = self._empty_stats()
+
+        checkpoint, _ = MailboxFolderCheckpoint.objects.get_or_create(folder_path=folder)
+
+        messages = self.graph_client.search_messages_by_subject(
+            keywords=self.config.subject_filters,
+            folder=folder,
+            days_back=7,
+            max_results=limit,
+            received_after=checkpoint.last_received_at,
+            oldest_first=True,
+        )
+        # El filtro de Graph es inclusivo (ge): descartar el último ya confirmado
+        messages = sorted(
+            (m for m in messages
+             if not checkpoint.last_message_id or self._message_key(m) != checkpoint.last_message_id),
+            key=lambda m: m.get('receivedDateTime') or ''
+        )[:limit]
+        logger.info(f"Processing folder {folder}: {len(messages)} messages since {checkpoint.last_received_at}")
+
+        if not messages:
+            return stats
+
+        # Deduplicación en lote: una sola query para todos los mensajes listados
+        message_keys = [self._message_key(m) for m in messages]
+        already_processed = set(
+            EmailProcessingLog.objects.filter(
+                message_id__in=message_keys
+            ).values_list('message_id', flat=True)
+        )
+
+        done = [False] * len(messages)
+        next_pending = 0
+
+        def advance_checkpoint():
+            nonlocal next_pending
+            advanced = False
+            while next_pending < len(messages) and done[next_pending]:
+                message = messages[next_pending]
+                checkpoint.last_received_at = self._parse_received(message.get('receivedDateTime'))
+                checkpoint.last_message_id = self._message_key(message)
+                checkpoint.messages_processed += 1
+                next_pending += 1
+                advanced = True
+            if advanced:
+                checkpoint.save(update_fields=[
+                    'last_received_at', 'last_message_id', 'messages_processed', 'updated_at'
+                ])
+
+        def record(result):
+            status = result.get('status')
+            for totals in (stats, self.stats):
+                totals['processed'] += 1
+                if status in ('success', 'partial'):
+                    totals['success'] += 1
+                    totals['invoices_created'] += result.get('invoices_count', 0)
+                elif status == 'failed':
+                    totals['failed'] += 1
+                elif status == 'skipped':
+                    totals['skipped'] += 1
+
+        in_flight = {}
+        window = self.concurrency * 2
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='mailbox') as pool:
+            try:
+                for index, message in enumerate(messages):
+                    key = message_keys[index]
+
+                    if key in already_processed:
+                        logger.debug(f"Message already processed: {key}")
+                        record({'status': 'skipped', 'reason': 'already_processed'})
+                        done[index] = True
+                        advance_checkpoint()
+                        continue
+
+                    sender = self._sender(message)
+                    if self.config.sender_whitelist and sender not in self.config.sender_whitelist:
+                        self.processor._log_processing(
+                            message_id=key,
+                            subject=message.get('subject', 'No Subject'),
+                            sender=sender,
+                            received_date=message.get('receivedDateTime'),
+                            folder=folder,
+                            status='skipped',
+                            error_message=f"Sender not in whitelist: {sender}"
+                        )
+                        record({'status': 'skipped', 'reason': 'sender_not_whitelisted'})
+                        done[index] = True
+                        advance_checkpoint()
+                        continue
+
+                    while len(in_flight) >= window:
+                        self._drain(in_flight, folder, done, record, advance_checkpoint, FIRST_COMPLETED)
+
+                    self._throttle()
+                    in_flight[pool.submit(self._fetch_message, message)] = index
+
+                while in_flight:
+                    self._drain(in_flight, folder, done, record, advance_checkpoint, FIRST_COMPLETED)
+            finally:
+                # Si algo falla a mitad de camino, liberar presupuesto y temporales
+                for future in in_flight:
+                    future.cancel()
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        self._cleanup(future.result())
+
+        return stats
+
+    def _drain(self, in_flight, folder, done, record, advance_checkpoint, return_when):
+        """Espera workers terminados y persiste sus resultados en este hilo."""
+        completed, _ = wait(list(in_flight), return_when=return_when)
+        for future in completed:
+            index = in_flight.pop(future)
+            fetched = future.result()
+            try:
+                record(self._persist(fetched, folder))
+            finally:
+                self._cleanup(fetched)
+            done[index] = True
+        advance_checkpoint()
+
+    def _throttle(self):
+        """Respeta max_messages_per_minute entre despachos."""
+        if not self.min_dispatch_interval:
+            return
+        wait_for = self._last_dispatch + self.min_dispatch_interval - time.monotonic()
+        if wait_for > 0:
+            time.sleep(wait_for)
+        self._last_dispatch = time.monotonic()
+
+    # ------------------------------------------------------------------ #
+    # Workers (solo red y disco, sin ORM)
+    # ------------------------------------------------------------------ #
+
+    def _fetch_message(self, message: Dict) -> Dict:
+        """
+        Lista y descarga los adjuntos soportados de un mensaje a archivos temporales.
+
+        Returns:
+            Dict con el mensaje, los nombres de todos los adjuntos, los archivos
+            descargados y el error (si lo hubo).
+        """
+        fetched = {'message': message, 'attachment_names': [], 'files': [], 'error': None, 'reserved': 0}
+        message_id = message.get('id')
+
+        try:
+            attachments = self.graph_client.list_attachments(message_id, select=ATTACHMENT_METADATA_FIELDS)
+            fetched['attachment_names'] = [att.get('name') for att in attachments]
+
+            supported = [
+                attachment for attachment in attachments
+                if any(
+                    attachment.get('name', 'unknown.dat').lower().endswith(ext)
+                    for ext in self.processor.SUPPORTED_EXTENSIONS
+                )
+            ]
+            if supported:
+                # Una sola reserva por mensaje: un worker nunca espera presupuesto
+                # mientras retiene reservas parciales (evita bloqueos entre workers)
+                fetched['reserved'] = self.budget.acquire(
+                    sum(attachment.get('size') or DEFAULT_ATTACHMENT_SIZE for attachment in supported)
+                )
+
+            for attachment in supported:
+                name = attachment.get('name', 'unknown.dat')
+                entry = {
+                    'name': name,
+                    'content_type': attachment.get('contentType', 'application/octet-stream'),
+                    'path': None,
+                    'error': None,
+                }
+                fetched['files'].append(entry)
+
+                try:
+                    entry['path'] = self._download_to_tempfile(message_id, attachment)
+                except Exception as e:
+                    logger.error(f"Failed to download attachment {name}: {e}")
+                    entry['error'] = str(e)
+
+        except Exception as e:
+            logger.error(f"Failed to fetch message {message.get('subject')}: {e}", exc_info=True)
+            fetched['error'] = str(e)
+
+        return fetched
+
+    def _download_to_tempfile(self, message_id: str, attachment: Dict) -> str:
+        """Descarga un adjunto a un archivo temporal y retorna su ruta."""
+        suffix = os.path.splitext(attachment.get('name', ''))[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            try:
+                if attachment.get('contentBytes'):
+                    # El listado ya trajo el contenido: decodificar por chunks
+                    encoded = attachment['contentBytes']
+                    for start in range(0, len(encoded), BASE64_CHUNK):
+                        tmp.write(base64.b64decode(encoded[start:start + BASE64_CHUNK]))
+                else:
+                    self.graph_client.download_attachment_to_file(message_id, attachment['id'], tmp)
+            except Exception:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+            return tmp.name
+
+    def _cleanup(self, fetched: Dict) -> None:
+        """Borra temporales y libera el presupuesto de un mensaje."""
+        for entry in fetched.get('files', []):
+            if entry.get('path'):
+                try:
+                    os.unlink(entry['path'])
+                except OSError:
+                    pass
+                entry['path'] = None
+        if fetched.get('reserved'):
+            self.budget.release(fetched['reserved'])
+            fetched['reserved'] = 0
+
+    # ------------------------------------------------------------------ #
+    # Persistencia (hilo principal)
+    # ------------------------------------------------------------------ #
+
+    def _persist(self, fetched: Dict, folder: str) -> Dict[str, any]:
+        """Crea facturas y el EmailProcessingLog de un mensaje descargado."""
+        message = fetched['message']
+        message_id = message.get('id')
+        key = self._message_key(message)
+        subject = message.get('subject', 'No Subject')
+        sender = self._sender(message)
+        received_date = message.get('receivedDateTime')
+        attachment_names = fetched['attachment_names']
+        start_time = datetime.now()
+
+        log_kwargs = {
+            'message_id': key,
+            'subject': subject,
+            'sender': sender,
+            'received_date': received_date,
+            'folder': folder,
+            'attachment_count': len(attachment_names),
+            'attachment_filenames': attachment_names,
+        }
+
+        if fetched['error']:
+            self.processor._log_processing(status='failed', error_message=fetched['error'], **log_kwargs)
+            return {'status': 'failed', 'error': fetched['error']}
+
+        if not attachment_names:
+            self.processor._log_processing(status='skipped', error_message="No attachments found", **log_kwargs)
+            return {'status': 'skipped', 'reason': 'no_attachments'}
+
+        if not fetched['files']:
+            self.processor._log_processing(
+                status='skipped', error_message="No supported file types found", **log_kwargs
+            )
+            return {'status': 'skipped', 'reason': 'unsupported_files'}
+
+        created_invoices = []
+        errors = []
+        for entry in fetched['files']:
+            if entry['error']:
+                errors.append(f"{entry['name']}: {entry['error']}")
+                continue
+            try:
+                invoice = self.processor._create_invoice_from_path(
+                    entry['name'], entry['path'], entry['content_type']
+                )
+                if invoice:
+                    created_invoices.append(invoice)
+            except Exception as e:
+                logger.error(f"Failed to process attachment {entry['name']}: {e}")
+                errors.append(f"{entry['name']}: {str(e)}")
+
+        if created_invoices and not errors:
+            status = 'success'
+        elif created_invoices and errors:
+            status = 'partial'
+        else:
+            status = 'failed'
+
+        log = self.processor._log_processing(
+            status=status,
+            invoices_count=len(created_invoices),
+            error_message='; '.join(errors) if errors else '',
+            processing_time=(datetime.now() - start_time).total_seconds(),
+            **log_kwargs
+        )
+
+        if created_invoices:
+            log.invoices_created.set(created_invoices)
+            log.auto_matched_ots = sum(1 for inv in created_invoices if inv.ot is not None)
+            log.save(update_fields=['auto_matched_ots', 'updated_at'])
+
+        try:
+            self.graph_client.mark_as_read(message_id)
+        except Exception as e:
+            logger.warning(f"Failed to mark message as read: {e}")
+
+        return {'status': status, 'invoices_count': len(created_invoices), 'errors': errors}
+
+    # ------------------------------------------------------------------ #
+    # Helpers
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _message_key(message: Dict) -> str:
+        return message.get('internetMessageId', message.get('id'))
+
+    @staticmethod
+    def _sender(message: Dict) -> str:
+        return message.get('from', {}).get('emailAddress', {}).get('address', 'unknown@sender.com')
+
+    @staticmethod
+    def _parse_received(value: Optional[str]):
+        if not value:
+            return timezone.now()
+        if isinstance(value, str):
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return value
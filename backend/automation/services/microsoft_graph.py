@@ -9,9 +9,10 @@ Requiere:
 import os
 import logging
 from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import requests
 from django.conf import settings
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -126,6 +127,7 @@ class MicrosoftGraphClient:
         filter_query: Optional[str] = None,
         top: int = 50,
         select: Optional[List[str]] = None,
+        oldest_first: bool = False,
     ) -> List[Dict]:
         """
         Lista mensajes de una carpeta.
@@ -135,6 +137,7 @@ class MicrosoftGraphClient:
             filter_query: OData filter query (ej: "subject eq 'DTE'")
             top: Cantidad máxima de mensajes (default: 50)
             select: Campos a seleccionar (default: todos)
+            oldest_first: Ordenar por receivedDateTime ascendente (default: descendente)
         
         Returns:
             Lista de mensajes como dicts
@@ -145,7 +148,7 @@ class MicrosoftGraphClient:
         # Construir query params
         params = {
             '$top': top,
-            '$orderby': 'receivedDateTime desc'
+            '$orderby': f"receivedDateTime {'asc' if oldest_first else 'desc'}"
         }
         
         if filter_query:
@@ -186,20 +189,23 @@ class MicrosoftGraphClient:
             logger.error(f"Failed to get message {message_id}: {e}")
             raise
     
-    def list_attachments(self, message_id: str) -> List[Dict]:
+    def list_attachments(self, message_id: str, select: Optional[List[str]] = None) -> List[Dict]:
         """
         Lista los attachments de un mensaje.
         
         Args:
             message_id: ID del mensaje
+            select: Campos a seleccionar. Con ['id', 'name', 'contentType', 'size']
+                se obtiene solo metadata, sin el contenido en base64.
         
         Returns:
             Lista de attachments como dicts
         """
         endpoint = f"/users/{self.user_email}/messages/{message_id}/attachments"
+        params = {'$select': ','.join(select)} if select else None
         
         try:
-            response = self._make_request('GET', endpoint)
+            response = self._make_request('GET', endpoint, params=params)
             attachments = response.get('value', [])
             
             logger.debug(f"Message {message_id} has {len(attachments)} attachments")
@@ -231,12 +237,57 @@ class MicrosoftGraphClient:
             logger.error(f"Failed to download attachment {attachment_id}: {e}")
             raise
     
+    def download_attachment_to_file(
+        self,
+        message_id: str,
+        attachment_id: str,
+        destination,
+        chunk_size: int = 64 * 1024,
+    ) -> int:
+        """
+        Descarga el contenido crudo de un attachment directo a un archivo.
+        
+        Usa el endpoint /$value, que entrega los bytes sin codificar en
+        base64, y los escribe por chunks: el adjunto nunca está completo en
+        memoria.
+        
+        Args:
+            message_id: ID del mensaje
+            attachment_id: ID del attachment
+            destination: Archivo abierto en modo binario
+            chunk_size: Tamaño de cada chunk en bytes
+        
+        Returns:
+            Cantidad de bytes escritos
+        """
+        endpoint = f"/users/{self.user_email}/messages/{message_id}/attachments/{attachment_id}/$value"
+        url = f"{self.GRAPH_API_ENDPOINT}{endpoint}"
+        headers = {'Authorization': f'Bearer {self._get_access_token()}'}
+        
+        written = 0
+        try:
+            with requests.get(url, headers=headers, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        destination.write(chunk)
+                        written += len(chunk)
+            
+            logger.debug(f"Streamed attachment {attachment_id}: {written} bytes")
+            return written
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to stream attachment {attachment_id}: {e}")
+            raise
+    
     def search_messages_by_subject(
         self,
         keywords: List[str],
         folder: str = "Inbox",
         days_back: int = 7,
         max_results: int = 50,
+        received_after: Optional[datetime] = None,
+        oldest_first: bool = False,
     ) -> List[Dict]:
         """
         Busca mensajes por palabras clave en el subject.
@@ -246,13 +297,20 @@ class MicrosoftGraphClient:
             folder: Carpeta donde buscar
             days_back: Días hacia atrás para buscar
             max_results: Máximo de resultados
+            received_after: Si se indica y es más reciente que la ventana de
+                days_back, buscar solo desde esa fecha (checkpoint)
+            oldest_first: Retornar primero los más antiguos
         
         Returns:
             Lista de mensajes que coinciden
         """
-        # Construir filter query
-        date_filter = datetime.now() - timedelta(days=days_back)
-        date_str = date_filter.strftime('%Y-%m-%dT%H:%M:%SZ')
+        # Construir filter query (Graph espera UTC: comparar siempre datetimes aware)
+        date_filter = timezone.now() - timedelta(days=days_back)
+        if received_after is not None:
+            if timezone.is_naive(received_after):
+                received_after = timezone.make_aware(received_after, dt_timezone.utc)
+            date_filter = max(date_filter, received_after)
+        date_str = date_filter.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
         
         # Construir OR condition para keywords
         subject_filters = [f"contains(subject, '{kw}')" for kw in keywords]
@@ -265,7 +323,8 @@ class MicrosoftGraphClient:
         return self.list_messages(
             folder=folder,
             filter_query=filter_query,
-            top=max_results
+            top=max_results,
+            oldest_first=oldest_first
         )
     
     def mark_as_read(self, message_id: str) -> None:
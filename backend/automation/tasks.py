@@ -1,8 +1,10 @@
 """
 Celery Tasks for Email Automation.
 
-DEPRECATED: Email automation disabled to save memory (~3GB).
-Tasks are kept for backward compatibility but should not be used.
+El procesamiento del buzón corre con MailboxProcessingEngine: concurrencia,
+memoria y ritmo acotados por EmailAutoProcessingConfig, y checkpoints por
+carpeta para retomar ejecuciones interrumpidas. No está agendado en beat;
+se dispara manualmente o desde un schedule explícito.
 """
 
 import logging
@@ -25,20 +27,31 @@ logger = logging.getLogger(__name__)
 )
 def process_dte_mailbox(self):
     """
-    DEPRECATED: Email auto-processing disabled.
+    Procesa el buzón de DTEs y crea facturas a partir de los adjuntos.
 
-    This task is disabled to save memory in production.
-    Returns immediately without processing.
+    El uso de memoria queda acotado por memory_budget_mb (los adjuntos se
+    descargan en streaming a disco) y el progreso se guarda por carpeta, así
+    que un reintento o timeout no reprocesa lo ya confirmado.
 
     Returns:
-        dict: Status indicating task is disabled
+        dict: Estadísticas de EmailProcessor.process_mailbox()
     """
-    logger.warning("Email auto-processing is DISABLED - task skipped")
+    logger.info("Starting DTE mailbox processing")
 
-    return {
-        'status': 'disabled',
-        'message': 'Email auto-processing is permanently disabled to save memory'
-    }
+    try:
+        result = EmailProcessor().process_mailbox()
+    except Exception as exc:
+        logger.error(f"DTE mailbox processing failed: {exc}", exc_info=True)
+        raise self.retry(exc=exc)
+
+    # process_mailbox captura los errores del motor y devuelve status='error'
+    # (con last_run_status ya guardado): reintentar desde el checkpoint
+    if result.get('status') == 'error':
+        logger.warning(f"DTE mailbox processing ended with error, retrying: {result.get('error')}")
+        raise self.retry(exc=RuntimeError(result.get('error')))
+
+    logger.info(f"DTE mailbox processing finished: {result}")
+    return result
 
 
 @shared_task(name='automation.test_graph_connection')
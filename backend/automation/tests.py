@@ -260,6 +260,165 @@ class TestEmailProcessor:
             assert any('json' in att['name'] for att in valid)
 
 
+@pytest.mark.django_db
+class TestMailboxProcessingEngine:
+    """Tests for MailboxProcessingEngine (batch dedup, checkpoints, memory budget)"""
+    
+    def _message(self, n):
+        return {
+            'id': f'graph-{n}',
+            'internetMessageId': f'<msg-{n}@example.com>',
+            'subject': f'DTE {n}',
+            'from': {'emailAddress': {'address': 'proveedor@example.com'}},
+            'receivedDateTime': f'2025-01-01T10:00:{n:02d}Z',
+        }
+    
+    def _processor(self, messages, **config):
+        EmailAutoProcessingConfig.objects.create(
+            id=1, is_active=True, target_folders=['Inbox'], **config
+        )
+        client = MagicMock()
+        client.search_messages_by_subject.return_value = messages
+        client.list_attachments.return_value = [
+            {'id': 'att-1', 'name': 'dte.json', 'contentType': 'application/json', 'size': 1024}
+        ]
+        client.download_attachment_to_file.side_effect = (
+            lambda message_id, attachment_id, destination: destination.write(b'{}') or 2
+        )
+        return EmailProcessor(graph_client=client), client
+    
+    def test_batch_deduplication_single_query(self):
+        """Already processed messages are filtered with one query, not one per message"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from automation.services.mailbox_engine import MailboxProcessingEngine
+        
+        messages = [self._message(n) for n in range(20)]
+        for message in messages:
+            EmailProcessingLog.objects.create(
+                message_id=message['internetMessageId'],
+                subject='Test',
+                sender_email='proveedor@example.com',
+                received_date=timezone.now(),
+                status='success'
+            )
+        processor, client = self._processor(messages)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            stats = MailboxProcessingEngine(processor).run()
+        
+        log_queries = [q for q in ctx.captured_queries if 'automation_email_processing_log' in q['sql']]
+        assert len(log_queries) == 1
+        assert stats['skipped'] == 20
+        client.list_attachments.assert_not_called()
+    
+    def test_checkpoint_resumes_after_interruption(self):
+        """A run that crashes mid-way keeps its partial stats and the next run resumes from the checkpoint"""
+        from automation.models import MailboxFolderCheckpoint
+        from automation.services.mailbox_engine import MailboxProcessingEngine
+        
+        messages = [self._message(n) for n in range(4)]
+        processor, client = self._processor(messages, max_concurrent_downloads=1)
+        
+        def search(received_after=None, **kwargs):
+            # Como Graph: solo mensajes con receivedDateTime >= received_after
+            return [
+                m for m in messages
+                if received_after is None
+                or MailboxProcessingEngine._parse_received(m['receivedDateTime']) >= received_after
+            ]
+        
+        client.search_messages_by_subject.side_effect = search
+        log_processing = processor._log_processing
+        
+        def crash_on_third_message(**kwargs):
+            if kwargs['message_id'] == '<msg-2@example.com>':
+                raise RuntimeError('DB caída')
+            return log_processing(**kwargs)
+        
+        with patch.object(processor, '_create_invoice_from_path', return_value=MagicMock(ot=None)), \
+                patch.object(EmailProcessingLog, 'invoices_created', MagicMock()):
+            with patch.object(processor, '_log_processing', side_effect=crash_on_third_message):
+                interrupted = processor.process_mailbox()
+            
+            checkpoint = MailboxFolderCheckpoint.objects.get(folder_path='Inbox')
+            assert interrupted['status'] == 'error'
+            assert (interrupted['processed'], interrupted['success']) == (2, 2)
+            assert checkpoint.last_message_id == '<msg-1@example.com>'
+            assert checkpoint.messages_processed == 2
+            
+            resumed = processor.process_mailbox()
+        
+        checkpoint.refresh_from_db()
+        assert resumed['status'] == 'completed'
+        assert (resumed['processed'], resumed['success'], resumed['skipped']) == (2, 2, 0)
+        assert client.search_messages_by_subject.call_args.kwargs['oldest_first'] is True
+        assert checkpoint.last_message_id == '<msg-3@example.com>'
+        assert checkpoint.messages_processed == 4
+        assert set(EmailProcessingLog.objects.values_list('message_id', flat=True)) == {
+            m['internetMessageId'] for m in messages
+        }
+    
+    def test_task_retries_when_engine_fails(self):
+        """process_dte_mailbox retries when the run ends with status='error'"""
+        from celery.exceptions import Retry
+        from automation.services.mailbox_engine import MailboxProcessingEngine
+        from automation.tasks import process_dte_mailbox
+        
+        EmailAutoProcessingConfig.objects.create(id=1, is_active=True, target_folders=['Inbox'])
+        
+        with patch('automation.services.email_processor.MicrosoftGraphClient'), \
+                patch.object(MailboxProcessingEngine, 'run', side_effect=RuntimeError('Graph caído')), \
+                patch.object(process_dte_mailbox, 'retry', side_effect=Retry()) as retry, \
+                pytest.raises(Retry):
+            process_dte_mailbox.apply(throw=True)
+        
+        retry.assert_called_once()
+        assert str(retry.call_args.kwargs['exc']) == 'Graph caído'
+        assert 'Error: Graph caído' in EmailAutoProcessingConfig.objects.get(id=1).last_run_status
+    
+    def test_memory_budget_bounds_inflight_bytes(self):
+        """Downloads never hold more bytes than memory_budget_mb"""
+        from automation.services.mailbox_engine import MailboxProcessingEngine
+        
+        messages = [self._message(n) for n in range(12)]
+        processor, client = self._processor(
+            messages, max_concurrent_downloads=4, memory_budget_mb=1
+        )
+        client.list_attachments.return_value = [
+            {'id': 'att-1', 'name': 'dte.pdf', 'contentType': 'application/pdf', 'size': 400 * 1024}
+        ]
+        
+        with patch.object(processor, '_create_invoice_from_path', return_value=None):
+            stats = MailboxProcessingEngine(processor).run()
+        
+        assert stats['processed'] == 12
+        assert 0 < stats['peak_inflight_bytes'] <= 1024 * 1024
+        assert client.download_attachment_to_file.call_count == 12
+    
+    def test_memory_budget_reserves_whole_message_at_once(self):
+        """Multi-attachment messages reserve their total size in one call, so workers cannot deadlock"""
+        from automation.services.mailbox_engine import MailboxProcessingEngine, MemoryBudget
+        
+        messages = [self._message(n) for n in range(6)]
+        processor, client = self._processor(
+            messages, max_concurrent_downloads=3, memory_budget_mb=1
+        )
+        client.list_attachments.return_value = [
+            {'id': f'att-{n}', 'name': f'dte-{n}.pdf', 'contentType': 'application/pdf', 'size': 300 * 1024}
+            for n in range(3)
+        ]
+        
+        with patch.object(MemoryBudget, 'acquire', autospec=True, side_effect=MemoryBudget.acquire) as acquire, \
+                patch.object(processor, '_create_invoice_from_path', return_value=None):
+            engine = MailboxProcessingEngine(processor)
+            stats = engine.run()
+        
+        assert stats['processed'] == 6
+        assert [call.args[1] for call in acquire.call_args_list] == [900 * 1024] * 6
+        assert engine.budget.in_use == 0
+
+
 @pytest.mark.django_db
 class TestMicrosoftGraphClient:
     """Tests for MicrosoftGraphClient"""
@@ -318,6 +477,28 @@ class TestMicrosoftGraphClient:
             assert token1 == token2
             # Should only make one POST request
             assert mock_post.call_count == 1
+    
+    def test_search_date_filter_uses_aware_utc(self):
+        """The checkpoint (aware, any timezone) and the days_back window are compared in UTC"""
+        from datetime import timezone as dt_timezone
+        from zoneinfo import ZoneInfo
+        from automation.services.microsoft_graph import MicrosoftGraphClient
+        
+        client = MicrosoftGraphClient('id', 'secret', 'tenant', 'test@example.com')
+        received_after = (timezone.now() - timedelta(hours=1)).replace(microsecond=0)
+        
+        with patch.object(client, 'list_messages', return_value=[]) as list_messages:
+            client.search_messages_by_subject(
+                ['DTE'], received_after=received_after.astimezone(ZoneInfo('America/El_Salvador'))
+            )
+            client.search_messages_by_subject(['DTE'], days_back=7, received_after=datetime(2000, 1, 1))
+        
+        recent, old = [c.kwargs['filter_query'] for c in list_messages.call_args_list]
+        expected = received_after.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        assert recent.startswith(f"receivedDateTime ge {expected} ")
+        # Un checkpoint más antiguo que la ventana no la amplía
+        window = (timezone.now() - timedelta(days=7)).astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:')
+        assert old.startswith(f"receivedDateTime ge {window}")
 
 
 @pytest.mark.django_db
@@ -66,8 +66,8 @@ class InvoicePatternChildInline(admin.TabularInline):
     model = InvoicePatternCatalog
     fk_name = 'grupo_padre'
     extra = 0
-    fields = ['nombre', 'campo_objetivo', 'patron_regex', 'prioridad', 'activo', 'uso_count', 'tasa_exito']
-    readonly_fields = ['uso_count', 'tasa_exito']
+    fields = ['nombre', 'campo_objetivo', 'patron_regex', 'prioridad', 'activo', 'uso_total', 'tasa_exito']
+    readonly_fields = ['uso_total', 'tasa_exito']
     verbose_name = 'Patrón Individual'
     verbose_name_plural = 'Patrones Individuales del Grupo'
 
@@ -90,7 +90,7 @@ class InvoicePatternCatalogAdmin(admin.ModelAdmin):
         'campo_objetivo',
         'activo',
         'prioridad',
-        'uso_count',
+        'uso_total',
         'get_tasa_exito_display',
         'created_at',
     ]
@@ -115,7 +115,7 @@ class InvoicePatternCatalogAdmin(admin.ModelAdmin):
     
     ordering = ['tipo_patron', '-es_grupo_principal', 'prioridad', 'nombre']
     
-    readonly_fields = ['created_at', 'updated_at', 'deleted_at', 'uso_count', 'exito_count', 'ultima_uso', 'tasa_exito']
+    readonly_fields = ['created_at', 'updated_at', 'deleted_at', 'uso_total', 'exito_total', 'ultima_uso_efectiva', 'tasa_exito']
     
     inlines = []  # Se agregará condicionalmente en get_inline_instances
     
@@ -138,9 +138,9 @@ class InvoicePatternCatalogAdmin(admin.ModelAdmin):
             'fields': ('nombre', 'notas')
         }),
         ('📊 Estadísticas de Uso', {
-            'fields': ('uso_count', 'exito_count', 'tasa_exito', 'ultima_uso'),
+            'fields': ('uso_total', 'exito_total', 'tasa_exito', 'ultima_uso_efectiva'),
             'classes': ('collapse',),
-            'description': 'Estadísticas automáticas de uso del patrón'
+            'description': 'Estadísticas automáticas de uso del patrón (incluye usos aún no volcados del buffer)'
         }),
         ('🧪 Pruebas', {
             'fields': ('casos_prueba', 'ejemplo_texto'),
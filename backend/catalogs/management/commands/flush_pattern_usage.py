@@ -0,0 +1,24 @@
+"""
+Management command para volcar la telemetría de uso de patrones.
+
+Persiste los contadores acumulados en el buffer (memoria del proceso o Redis)
+en InvoicePatternCatalog con un UPDATE por patrón. Con el buffer en Redis
+conviene ejecutarlo periódicamente (cron) para no depender del volcado
+automático de los workers.
+
+Uso:
+    python manage.py flush_pattern_usage
+"""
+
+from django.core.management.base import BaseCommand
+from catalogs.services.pattern_usage import get_pattern_usage_buffer
+
+
+class Command(BaseCommand):
+    help = 'Vuelca a la base de datos la telemetría de uso de patrones pendiente'
+
+    def handle(self, *args, **options):
+        updated = get_pattern_usage_buffer().flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Telemetría volcada: {updated} patrones actualizados'
+        ))
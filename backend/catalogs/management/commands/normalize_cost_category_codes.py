@@ -8,6 +8,7 @@ Uso:
 
 from django.core.management.base import BaseCommand
 from catalogs.models import CostCategory
+from common.model_versions import bump_model_version
 
 
 class Command(BaseCommand):
@@ -61,6 +62,10 @@ class Command(BaseCommand):
             else:
                 unchanged_count += 1
 
+        if updated_count and not dry_run:
+            # .update() no dispara señales: invalidar caches de categorías
+            bump_model_version(CostCategory)
+
         # Resumen
         self.stdout.write('\n' + '='*60)
         if dry_run:
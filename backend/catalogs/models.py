@@ -144,6 +144,11 @@ class CostType(TimeStampedModel, SoftDeleteModel):
     
     def __str__(self):
         return f"{self.name} ({self.code})"
+
+    @classmethod
+    def names_by_code(cls):
+        """{code: name} de los tipos activos, en una consulta (para listados)."""
+        return dict(cls.objects.filter(is_active=True, is_deleted=False).values_list('code', 'name'))
     
     def save(self, *args, **kwargs):
         # Normalizar código antes de guardar (uppercase, sin espacios)
@@ -563,18 +568,54 @@ class InvoicePatternCatalog(TimeStampedModel, SoftDeleteModel):
         else:
             return f"🎯 {self.campo_objetivo or 'Campo'}: {self.nombre}"
     
+    def _uso_pendiente(self):
+        """Incrementos de uso aún en el buffer de telemetría (no persistidos)"""
+        if not hasattr(self, '_pending_usage'):
+            from catalogs.services.pattern_usage import get_pattern_usage_buffer
+            pending = get_pattern_usage_buffer().pending([self.pk]) if self.pk else {}
+            self._pending_usage = pending.get(self.pk) or {}
+        return self._pending_usage
+
+    @property
+    def uso_total(self):
+        """uso_count persistido + usos pendientes en el buffer"""
+        return self.uso_count + self._uso_pendiente().get('uso', 0)
+
+    @property
+    def exito_total(self):
+        """exito_count persistido + éxitos pendientes en el buffer"""
+        return self.exito_count + self._uso_pendiente().get('exito', 0)
+
+    @property
+    def ultima_uso_efectiva(self):
+        """Último uso considerando el buffer"""
+        from datetime import datetime, timezone as dt_timezone
+        ultima = self._uso_pendiente().get('ultima')
+        if not ultima:
+            return self.ultima_uso
+        pendiente = datetime.fromtimestamp(ultima, tz=dt_timezone.utc)
+        return max(pendiente, self.ultima_uso) if self.ultima_uso else pendiente
+
     @property
     def tasa_exito(self):
         """Calcula el porcentaje de éxito del patrón"""
-        if self.uso_count == 0:
+        uso = self.uso_total
+        if uso == 0:
             return 0
-        return round((self.exito_count / self.uso_count) * 100, 1)
+        return round((self.exito_total / uso) * 100, 1)
     
     def incrementar_uso(self, exitoso=True):
-        """Incrementa contadores de uso y actualiza última fecha"""
-        from django.utils import timezone
-        self.uso_count += 1
-        if exitoso:
-            self.exito_count += 1
-        self.ultima_uso = timezone.now()
-        self.save(update_fields=['uso_count', 'exito_count', 'ultima_uso'])
+        """
+        Registra un uso del patrón en el buffer de telemetría.
+
+        No escribe en la fila: los contadores se vuelcan en lote
+        (ver catalogs/services/pattern_usage.py).
+        """
+        from catalogs.services.pattern_usage import get_pattern_usage_buffer
+        get_pattern_usage_buffer().record(self.pk, exitoso)
+        self.__dict__.pop('_pending_usage', None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        """Recarga la fila y descarta los usos pendientes leídos antes (pueden ya estar volcados)"""
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('_pending_usage', None)
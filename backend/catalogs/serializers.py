@@ -349,6 +349,19 @@ class ProviderSerializer(serializers.ModelSerializer):
         return value
 
 
+class InvoicePatternCatalogListSerializer(serializers.ListSerializer):
+    """Carga la telemetría pendiente de todos los patrones en una sola lectura"""
+
+    def to_representation(self, data):
+        from catalogs.services.pattern_usage import get_pattern_usage_buffer
+
+        patterns = list(data.all() if hasattr(data, 'all') else data)
+        pending = get_pattern_usage_buffer().pending([p.pk for p in patterns])
+        for pattern in patterns:
+            pattern._pending_usage = pending.get(pattern.pk) or {}
+        return super().to_representation(patterns)
+
+
 class InvoicePatternCatalogSerializer(serializers.ModelSerializer):
     """
     Serializer para el Catálogo de Patrones de Facturas (Sistema Unificado)
@@ -363,7 +376,10 @@ class InvoicePatternCatalogSerializer(serializers.ModelSerializer):
     # Información del grupo padre
     grupo_padre_nombre = serializers.CharField(source='grupo_padre.nombre', read_only=True)
     
-    # Estadísticas calculadas
+    # Estadísticas calculadas (persistido + pendiente en el buffer de telemetría)
+    uso_count = serializers.IntegerField(source='uso_total', read_only=True)
+    exito_count = serializers.IntegerField(source='exito_total', read_only=True)
+    ultima_uso = serializers.DateTimeField(source='ultima_uso_efectiva', read_only=True)
     tasa_exito = serializers.ReadOnlyField()
     
     # Cantidad de patrones hijos (si es grupo)
@@ -371,6 +387,7 @@ class InvoicePatternCatalogSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = InvoicePatternCatalog
+        list_serializer_class = InvoicePatternCatalogListSerializer
         fields = [
             'id',
             'nombre',
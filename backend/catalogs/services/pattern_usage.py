@@ -0,0 +1,257 @@
+"""
+Telemetría de uso de patrones (InvoicePatternCatalog) con buffer.
+
+Antes, cada aplicación de un patrón hacía un save() de la fila del catálogo
+(uso_count, exito_count, ultima_uso): durante cargas masivas o corridas del
+buzón eso generaba escrituras y bloqueos sobre las mismas filas "calientes".
+
+Ahora los incrementos se acumulan en un buffer y se vuelcan a la base de
+datos periódicamente con un UPDATE por patrón (F() expressions, sin señales):
+- 'memory': dict en memoria del proceso (protegido con lock). Cada proceso
+  tiene su propio buffer; se vuelca también al terminar el proceso.
+- 'redis': hash compartido con HINCRBY, visible para todos los procesos.
+  Se usa automáticamente si el cache por defecto es django-redis.
+
+El volcado ocurre cuando pasan PATTERN_USAGE_FLUSH_SECONDS desde el último
+(al registrar un uso) o manualmente con `python manage.py flush_pattern_usage`.
+
+Lectura: InvoicePatternCatalog.uso_total / exito_total / tasa_exito combinan
+lo persistido con lo pendiente en el buffer.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_entry() -> Dict:
+    return {'uso': 0, 'exito': 0, 'ultima': None}
+
+
+class MemoryUsageStore:
+    """Buffer en memoria del proceso: {pattern_id: {'uso', 'exito', 'ultima'}}"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[int, Dict] = {}
+
+    def record(self, pattern_id: int, exitoso: bool, ts: float) -> None:
+        with self._lock:
+            entry = self._data.setdefault(pattern_id, _empty_entry())
+            entry['uso'] += 1
+            if exitoso:
+                entry['exito'] += 1
+            if entry['ultima'] is None or ts > entry['ultima']:
+                entry['ultima'] = ts
+
+    def pending(self, pattern_ids: Iterable[int]) -> Dict[int, Dict]:
+        with self._lock:
+            return {pk: dict(self._data[pk]) for pk in pattern_ids if pk in self._data}
+
+    def drain(self) -> Dict[int, Dict]:
+        with self._lock:
+            data, self._data = self._data, {}
+        return data
+
+    def restore(self, data: Dict[int, Dict]) -> None:
+        for pattern_id, entry in data.items():
+            with self._lock:
+                current = self._data.setdefault(pattern_id, _empty_entry())
+                current['uso'] += entry['uso']
+                current['exito'] += entry['exito']
+                if entry['ultima'] and (current['ultima'] is None or entry['ultima'] > current['ultima']):
+                    current['ultima'] = entry['ultima']
+
+
+class RedisUsageStore:
+    """
+    Buffer compartido en un hash de Redis.
+
+    Campos: 'uso:<id>', 'exito:<id>' (HINCRBY) y 'ultima:<id>' (epoch). El
+    volcado lee y borra el hash en una sola transacción (MULTI/EXEC), así
+    que los incrementos concurrentes caen en un hash nuevo y no se pierden.
+    """
+
+    KEY = 'pattern_usage:pending'
+
+    def __init__(self, client):
+        self.client = client
+
+    def record(self, pattern_id: int, exitoso: bool, ts: float) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(self.KEY, f'uso:{pattern_id}', 1)
+        if exitoso:
+            pipe.hincrby(self.KEY, f'exito:{pattern_id}', 1)
+        pipe.hset(self.KEY, f'ultima:{pattern_id}', ts)
+        pipe.execute()
+
+    def pending(self, pattern_ids: Iterable[int]) -> Dict[int, Dict]:
+        pattern_ids = list(pattern_ids)
+        if not pattern_ids:
+            return {}
+        fields = []
+        for pk in pattern_ids:
+            fields.extend([f'uso:{pk}', f'exito:{pk}', f'ultima:{pk}'])
+        values = self.client.hmget(self.KEY, fields)
+
+        result = {}
+        for i, pk in enumerate(pattern_ids):
+            uso, exito, ultima = values[i * 3:i * 3 + 3]
+            if uso is None:
+                continue
+            result[pk] = {
+                'uso': int(uso),
+                'exito': int(exito or 0),
+                'ultima': float(ultima) if ultima is not None else None,
+            }
+        return result
+
+    def drain(self) -> Dict[int, Dict]:
+        # HGETALL + DEL en un MULTI/EXEC: lectura y borrado atómicos, sin
+        # claves intermedias que queden huérfanas si el proceso muere
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(self.KEY)
+        pipe.delete(self.KEY)
+        raw, _ = pipe.execute()
+
+        data: Dict[int, Dict] = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            kind, _, pk = field.partition(':')
+            entry = data.setdefault(int(pk), _empty_entry())
+            entry[kind] = float(value) if kind == 'ultima' else int(value)
+        return data
+
+    def restore(self, data: Dict[int, Dict]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for pattern_id, entry in data.items():
+            pipe.hincrby(self.KEY, f'uso:{pattern_id}', entry['uso'])
+            if entry['exito']:
+                pipe.hincrby(self.KEY, f'exito:{pattern_id}', entry['exito'])
+            if entry['ultima']:
+                pipe.hset(self.KEY, f'ultima:{pattern_id}', entry['ultima'])
+        pipe.execute()
+
+
+class PatternUsageBuffer:
+    """
+    Registra usos de patrones sin escribir en InvoicePatternCatalog.
+
+    Args:
+        store: MemoryUsageStore o RedisUsageStore
+        flush_interval: Segundos entre volcados automáticos (0 = solo manual)
+    """
+
+    def __init__(self, store=None, flush_interval: Optional[int] = None):
+        self.store = store or MemoryUsageStore()
+        if flush_interval is None:
+            flush_interval = getattr(settings, 'PATTERN_USAGE_FLUSH_SECONDS', 60)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+
+    def record(self, pattern_id: int, exitoso: bool = True) -> None:
+        """Registra un uso del patrón; vuelca el buffer si ya toca."""
+        self.store.record(pattern_id, exitoso, time.time())
+        self.maybe_flush()
+
+    def pending(self, pattern_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Incrementos aún no persistidos, por patrón."""
+        return self.store.pending(pattern_ids)
+
+    def maybe_flush(self) -> int:
+        if not self.flush_interval:
+            return 0
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """
+        Vuelca los incrementos pendientes: un UPDATE por patrón.
+
+        Returns:
+            Cantidad de patrones actualizados
+        """
+        from catalogs.models import InvoicePatternCatalog
+
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # Otro hilo ya está volcando
+
+        try:
+            self._last_flush = time.monotonic()
+            data = self.store.drain()
+            if not data:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    for pattern_id in sorted(data):
+                        entry = data[pattern_id]
+                        changes = {
+                            'uso_count': F('uso_count') + entry['uso'],
+                            'exito_count': F('exito_count') + entry['exito'],
+                        }
+                        if entry['ultima']:
+                            ultima = Value(datetime.fromtimestamp(entry['ultima'], tz=dt_timezone.utc))
+                            changes['ultima_uso'] = Greatest(Coalesce(F('ultima_uso'), ultima), ultima)
+                        # .update() no dispara señales ni toca updated_at
+                        InvoicePatternCatalog.all_objects.filter(pk=pattern_id).update(**changes)
+            except Exception as e:
+                logger.error(f"[PATTERN_USAGE] Error volcando telemetría, se reintentará: {e}", exc_info=True)
+                self.store.restore(data)
+                return 0
+
+            logger.info(f"[PATTERN_USAGE] Telemetría volcada para {len(data)} patrones")
+            return len(data)
+        finally:
+            self._flush_lock.release()
+
+
+_buffer: Optional[PatternUsageBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def _build_store():
+    mode = getattr(settings, 'PATTERN_USAGE_BUFFER', 'auto')
+    if mode == 'auto':
+        backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+        mode = 'redis' if 'django_redis' in backend else 'memory'
+
+    if mode == 'redis':
+        try:
+            from django_redis import get_redis_connection
+            return RedisUsageStore(get_redis_connection('default'))
+        except Exception as e:
+            logger.warning(f"[PATTERN_USAGE] Redis no disponible, usando buffer en memoria: {e}")
+
+    return MemoryUsageStore()
+
+
+def get_pattern_usage_buffer() -> PatternUsageBuffer:
+    """Buffer compartido del proceso (se crea en el primer uso)."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = PatternUsageBuffer(_build_store())
+                if isinstance(_buffer.store, MemoryUsageStore):
+                    atexit.register(_flush_at_exit, _buffer)
+    return _buffer
+
+
+def _flush_at_exit(buffer: PatternUsageBuffer) -> None:
+    try:
+        buffer.flush()
+    except Exception:
+        pass
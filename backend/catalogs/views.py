@@ -2,7 +2,7 @@ from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import Count, Q
 
 from .models import Provider, CostType, CostCategory, InvoicePatternCatalog
 from .serializers import (
@@ -16,6 +16,10 @@ from .serializers import (
 )
 from common.permissions import IsAdmin, IsJefeOperaciones, ReadOnly
 from common.pagination import StandardResultsSetPagination, LargeResultsSetPagination
+from common.http_cache import cache_response
+
+
+COST_TYPE_MODELS = ['catalogs.CostType', 'catalogs.CostCategory']
 
 
 class CostCategoryViewSet(viewsets.ModelViewSet):
@@ -178,8 +182,17 @@ class CostTypeViewSet(viewsets.ModelViewSet):
                 queryset = CostType.all_objects.all()
         
         return queryset
-    
+
+    @cache_response(depends_on=COST_TYPE_MODELS)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response(depends_on=COST_TYPE_MODELS)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'])
+    @cache_response(depends_on=['catalogs.CostCategory'])
     def categorias(self, request):
         """
         Endpoint para obtener las categorías activas de tipos de costo
@@ -190,6 +203,7 @@ class CostTypeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response(depends_on=COST_TYPE_MODELS)
     def activos(self, request):
         """
         Endpoint para obtener solo tipos de costo activos
@@ -280,7 +294,15 @@ class ProviderViewSet(viewsets.ModelViewSet):
                 queryset = Provider.all_objects.all()
         
         return queryset
-    
+
+    @cache_response(depends_on=['catalogs.Provider'])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response(depends_on=['catalogs.Provider'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'])
     def tipos(self, request):
         """
@@ -306,6 +328,7 @@ class ProviderViewSet(viewsets.ModelViewSet):
         return Response(categorias)
     
     @action(detail=False, methods=['get'])
+    @cache_response(depends_on=['catalogs.Provider'])
     def navieras(self, request):
         """
         Endpoint para obtener solo navieras activas
@@ -316,6 +339,7 @@ class ProviderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response(depends_on=['catalogs.Provider'])
     def agentes(self, request):
         """
         Endpoint para obtener solo agentes locales activos
@@ -469,6 +493,7 @@ class InvoicePatternCatalogViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['get'], url_path='campos-objetivo')
+    @cache_response(depends_on=['catalogs.InvoicePatternCatalog'])
     def campos_objetivo(self, request):
         """
         Obtener lista de campos objetivo disponibles.
@@ -502,19 +527,18 @@ class InvoicePatternCatalogViewSet(viewsets.ModelViewSet):
             'nombre_emisor': ('Nombre Emisor', 'text', 'Emisor'),
         }
 
-        # Obtener campos objetivo únicos de patrones activos
-        campos_en_uso = self.get_queryset().filter(
-            activo=True
-        ).values_list('campo_objetivo', flat=True).distinct()
+        # Cuántos patrones activos usan cada campo (una sola consulta agrupada)
+        counts = dict(
+            self.get_queryset().filter(activo=True)
+            .values_list('campo_objetivo')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
 
         # Construir respuesta con todos los campos disponibles
         campos_response = []
         for code, (name, data_type, category) in field_mapping.items():
-            # Contar cuántos patrones usan este campo
-            count = self.get_queryset().filter(
-                campo_objetivo=code,
-                activo=True
-            ).count()
+            count = counts.get(code, 0)
 
             campos_response.append({
                 'code': code,
@@ -522,7 +546,7 @@ class InvoicePatternCatalogViewSet(viewsets.ModelViewSet):
                 'data_type': data_type,
                 'category': category,
                 'count': count,
-                'in_use': code in campos_en_uso
+                'in_use': code in counts
             })
 
         # Ordenar por categoría y nombre
@@ -531,6 +555,7 @@ class InvoicePatternCatalogViewSet(viewsets.ModelViewSet):
         return Response(campos_response)
 
     @action(detail=False, methods=['get'], url_path='by_provider/(?P<provider_id>[^/.]+)')
+    @cache_response(depends_on=['catalogs.InvoicePatternCatalog', 'catalogs.Provider'])
     def by_provider(self, request, provider_id=None):
         """
         Obtener patrones para un proveedor específico.
@@ -7,12 +7,28 @@ Este módulo implementa un algoritmo de similitud multi-capa que:
 3. Filtra stop words inteligentemente
 4. Combina múltiples métricas de similitud con pesos
 5. Valida palabras clave comunes
+
+El preprocesamiento de cada nombre (sufijo legal, parte de negocio, tokens
+significativos, tokens ordenados para token_sort_ratio) se calcula una vez
+por nombre en un NameFeatures (name_features, con cache LRU) y
+calculate_smart_similarity acepta nombres o NameFeatures ya calculados, así
+las comparaciones por pares no repiten el mismo trabajo millones de veces.
+ClientAlias persiste los suyos en match_features.
 """
 
-from fuzzywuzzy import fuzz
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from fuzzywuzzy import fuzz, utils as fuzz_utils
 import re
 
 
+# Versión de calculate_smart_similarity. Cambiarla cuando cambien los scores:
+# la siguiente actualización de sugerencias pendientes (similarity_refresh)
+# re-puntúa todas, no solo las de aliases modificados.
+ALGORITHM_VERSION = 'smart-v1'
+
+
 # Sufijos legales COMPLETOS (en orden de especificidad - más largo primero)
 LEGAL_SUFFIXES_COMPLETE = [
     'S.A. DE C.V.', 'SA DE CV', 'S.A DE C.V', 'S.A.,DE C.V.',
@@ -39,6 +55,65 @@ STOP_WORDS = {
     ',', '.', '-', '_', '/', '\\',
 }
 
+# Puntuación que get_significant_tokens reemplaza por espacios
+TOKEN_SEPARATORS = str.maketrans({char: ' ' for char in ',.-_/\\&'})
+
+# Nombres distintos con NameFeatures en cache (name_features)
+FEATURES_CACHE_SIZE = 100_000
+
+
+def _normalize_suffix_search(text):
+    """Comas y puntos a espacios y espacios colapsados: la forma en que se comparan los sufijos."""
+    return ' '.join(text.replace(',', ' ').replace('.', ' ').split())
+
+
+# Marca de fin de sufijo en los nodos del trie (ningún carácter es '')
+_SUFFIX_END = ''
+
+
+def _build_suffix_trie(suffixes):
+    """
+    Trie de los sufijos normalizados al revés, para recorrer el nombre desde
+    el final. El nodo donde termina un sufijo guarda
+    (posición, sufijo, sufijo_normalizado, tipo_sufijo); si dos sufijos
+    normalizan igual se queda el primero de la lista.
+    """
+    trie = {}
+    for index, suffix in enumerate(suffixes):
+        suffix_normalized = _normalize_suffix_search(suffix)
+        node = trie
+        for char in reversed(suffix_normalized):
+            node = node.setdefault(char, {})
+        if _SUFFIX_END not in node:
+            if 'DE C' in suffix or 'DE CV' in suffix_normalized:
+                suffix_type = 'complete_cv'  # S.A. DE C.V., LTDA. DE C.V., etc.
+            else:
+                suffix_type = 'simple'  # S.A., LTDA., etc.
+            node[_SUFFIX_END] = (index, suffix, suffix_normalized, suffix_type)
+    return trie
+
+
+_SUFFIX_TRIE = _build_suffix_trie(LEGAL_SUFFIXES_COMPLETE)
+
+
+def _match_legal_suffix(normalized_search):
+    """
+    Sufijo de LEGAL_SUFFIXES_COMPLETE con el que termina el nombre, o None.
+
+    Entre varios que coinciden gana el primero de la lista, igual que
+    recorrerla en orden con endswith().
+    """
+    node = _SUFFIX_TRIE
+    best = None
+    for char in reversed(normalized_search):
+        node = node.get(char)
+        if node is None:
+            break
+        match = node.get(_SUFFIX_END)
+        if match is not None and (best is None or match[0] < best[0]):
+            best = match
+    return best
+
 
 def extract_legal_suffix(name):
     """
@@ -57,28 +132,19 @@ def extract_legal_suffix(name):
     normalized = name.upper().strip()
 
     # Normalizar puntuación para mejor detección
-    normalized_search = normalized.replace(',', ' ').replace('.', ' ')
-    normalized_search = ' '.join(normalized_search.split())  # Eliminar espacios múltiples
+    normalized_search = _normalize_suffix_search(normalized)
 
-    # Buscar sufijos en orden de especificidad (más largo primero)
-    for suffix in LEGAL_SUFFIXES_COMPLETE:
-        suffix_normalized = suffix.replace(',', ' ').replace('.', ' ')
-        suffix_normalized = ' '.join(suffix_normalized.split())
+    # Buscar el sufijo en el trie precompilado (gana el primero de la lista)
+    match = _match_legal_suffix(normalized_search)
+    if match is None:
+        return normalized, None, 'none'
 
-        # Verificar si termina con este sufijo
-        if normalized_search.endswith(suffix_normalized):
-            # Extraer la parte del negocio
-            business_part = normalized_search[:-len(suffix_normalized)].strip()
-
-            # Determinar tipo de sufijo
-            if 'DE C' in suffix or 'DE CV' in suffix_normalized:
-                suffix_type = 'complete_cv'  # S.A. DE C.V., LTDA. DE C.V., etc.
-            else:
-                suffix_type = 'simple'  # S.A., LTDA., etc.
+    _, suffix, suffix_normalized, suffix_type = match
 
-            return business_part, suffix, suffix_type
+    # Extraer la parte del negocio
+    business_part = normalized_search[:-len(suffix_normalized)].strip()
 
-    return normalized, None, 'none'
+    return business_part, suffix, suffix_type
 
 
 def normalize_society_type(suffix):
@@ -123,12 +189,8 @@ def get_significant_tokens(name):
     if not name:
         return []
 
-    # Normalizar: uppercase, remover puntuación extra
-    normalized = name.upper().strip()
-
-    # Reemplazar puntuación por espacios para tokenizar mejor
-    for char in [',', '.', '-', '_', '/', '\\', '&']:
-        normalized = normalized.replace(char, ' ')
+    # Normalizar: uppercase, reemplazar puntuación por espacios para tokenizar mejor
+    normalized = name.upper().strip().translate(TOKEN_SEPARATORS)
 
     # Tokenizar por espacios
     tokens = normalized.split()
@@ -167,6 +229,69 @@ def has_common_keywords(tokens1, tokens2, min_common=1):
     return common_count >= min_common, common_count
 
 
+class NameFeatures(NamedTuple):
+    """Preprocesamiento de un nombre para calculate_smart_similarity."""
+    name: str  # nombre sin espacios al inicio/final
+    normalized: str  # uppercase, comas/puntos como espacios
+    business: str  # parte de negocio, sin sufijo legal
+    suffix: Optional[str]
+    suffix_type: str  # 'complete_cv' | 'simple' | 'none'
+    society_type: Optional[str]  # normalize_society_type(suffix)
+    tokens: Tuple[str, ...]  # tokens significativos de la parte de negocio
+    clean: str  # tokens unidos por espacios
+    sorted_tokens: str  # clean procesado y ordenado como en fuzz.token_sort_ratio
+
+
+def compute_name_features(name):
+    """Calcula el NameFeatures de un nombre (sin cache; ver name_features)."""
+    name = name.strip() if name else ''
+    business, suffix, suffix_type = extract_legal_suffix(name)
+    tokens = tuple(get_significant_tokens(business))
+    clean = ' '.join(tokens)
+    return NameFeatures(
+        name=name,
+        normalized=_normalize_suffix_search(name.upper()),
+        business=business,
+        suffix=suffix,
+        suffix_type=suffix_type,
+        society_type=normalize_society_type(suffix),
+        tokens=tokens,
+        clean=clean,
+        sorted_tokens=' '.join(sorted(fuzz_utils.full_process(clean, force_ascii=True).split())),
+    )
+
+
+@lru_cache(maxsize=FEATURES_CACHE_SIZE)
+def name_features(name):
+    """NameFeatures de un nombre, en cache por nombre."""
+    return compute_name_features(name)
+
+
+def features_to_dict(features):
+    """NameFeatures serializable en JSON (ClientAlias.match_features), con la versión del algoritmo."""
+    data = features._asdict()
+    data['tokens'] = list(features.tokens)
+    data['version'] = ALGORITHM_VERSION
+    return data
+
+
+def features_from_dict(data):
+    """NameFeatures guardado con features_to_dict, o None si falta o es de otra versión."""
+    if not data or data.get('version') != ALGORITHM_VERSION:
+        return None
+    try:
+        return NameFeatures(**{
+            field: tuple(data[field]) if field == 'tokens' else data[field]
+            for field in NameFeatures._fields
+        })
+    except (KeyError, TypeError):
+        return None
+
+
+def _as_features(name):
+    return name if isinstance(name, NameFeatures) else name_features(name)
+
+
 def calculate_smart_similarity(name1, name2):
     """
     Calcula similitud inteligente entre dos nombres usando múltiples capas.
@@ -180,8 +305,8 @@ def calculate_smart_similarity(name1, name2):
     6. Combina múltiples métricas de fuzzy matching con penalizaciones estrictas
 
     Args:
-        name1 (str): Primer nombre
-        name2 (str): Segundo nombre
+        name1 (str | NameFeatures): Primer nombre o sus features precalculados
+        name2 (str | NameFeatures): Segundo nombre o sus features precalculados
 
     Returns:
         dict: {
@@ -203,20 +328,20 @@ def calculate_smart_similarity(name1, name2):
             }
         }
     """
-    # Normalizar nombres
-    n1 = name1.strip() if name1 else ''
-    n2 = name2.strip() if name2 else ''
+    # Preprocesamiento de cada nombre (en cache o precalculado)
+    features1 = _as_features(name1)
+    features2 = _as_features(name2)
 
-    if not n1 or not n2:
+    if not features1.name or not features2.name:
         return {
             'score': 0.0,
             'confidence': 'very_low',
             'details': {'reason': 'Empty names'}
         }
 
-    # Paso 1: Extraer sufijos legales
-    business1, suffix1, suffix_type1 = extract_legal_suffix(n1)
-    business2, suffix2, suffix_type2 = extract_legal_suffix(n2)
+    # Paso 1: Sufijos legales
+    business1, suffix1, suffix_type1 = features1.business, features1.suffix, features1.suffix_type
+    business2, suffix2, suffix_type2 = features2.business, features2.suffix, features2.suffix_type
 
     penalties = []
     suffix_mismatch = False
@@ -241,18 +366,15 @@ def calculate_smart_similarity(name1, name2):
     elif suffix_type1 == 'complete_cv' and suffix_type2 == 'complete_cv':
         # Ambos tienen sufijos completos (ej: S.A. DE C.V. vs LTDA. DE C.V.)
         # Verificar si solo difiere el tipo societario
-        society1 = normalize_society_type(suffix1)
-        society2 = normalize_society_type(suffix2)
-
-        if society1 != society2:
+        if features1.society_type != features2.society_type:
             # Tipos societarios diferentes (S.A. vs LTDA)
             # Esto puede ser un ERROR DE CAPTURA si el nombre base es igual
             society_type_only_diff = True
             penalties.append('society_type_diff_possible_typo')
 
-    # Paso 3: Extraer tokens significativos de las partes de negocio
-    tokens1 = get_significant_tokens(business1)
-    tokens2 = get_significant_tokens(business2)
+    # Paso 3: Tokens significativos de las partes de negocio
+    tokens1 = list(features1.tokens)
+    tokens2 = list(features2.tokens)
 
     if not tokens1 or not tokens2:
         return {
@@ -295,12 +417,12 @@ def calculate_smart_similarity(name1, name2):
             first2 in first1
         )
 
-    # Reconstruir nombres de negocio sin stop words
-    clean_b1 = ' '.join(tokens1)
-    clean_b2 = ' '.join(tokens2)
+    # Nombres de negocio sin stop words
+    clean_b1 = features1.clean
+    clean_b2 = features2.clean
 
-    # Calcular métricas de fuzzy matching
-    token_sort = fuzz.token_sort_ratio(clean_b1, clean_b2)
+    # Calcular métricas de fuzzy matching (token_sort_ratio sobre los tokens ya ordenados)
+    token_sort = fuzz.ratio(features1.sorted_tokens, features2.sorted_tokens)
     partial = fuzz.partial_ratio(clean_b1, clean_b2)
     exact = fuzz.ratio(clean_b1, clean_b2)
 
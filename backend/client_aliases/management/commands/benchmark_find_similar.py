@@ -0,0 +1,156 @@
+"""
+Management command para medir la latencia de find_similar.
+
+Genera N aliases sintéticos, y para un lote de consultas (nombres existentes
+con variaciones de puntuación, sufijo legal o una palabra de más) compara la
+búsqueda por vecinos más cercanos (client_aliases.nearest) contra el
+recorrido completo con calculate_smart_similarity. Reporta p50/p95 de ambas
+y el recall: fracción de los resultados del recorrido completo que también
+devuelve la búsqueda por vecinos (en total y solo los sugeridos, score >= 85).
+Todo ocurre dentro de una transacción que se revierte al final.
+
+Uso:
+    python manage.py benchmark_find_similar --aliases 50000 --consultas 200
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client_aliases import nearest
+from client_aliases.fuzzy_utils import calculate_smart_similarity
+from client_aliases.models import ClientAlias
+from common.model_versions import bump_model_version
+
+SILABAS = [
+    'AL', 'BA', 'CA', 'DO', 'EL', 'FA', 'GA', 'HO', 'IN', 'JU', 'KA', 'LA', 'MA', 'NE', 'OR', 'PA', 'QUI', 'RO',
+    'SA', 'TE', 'UR', 'VI', 'XO', 'ZA', 'MER', 'TRA', 'SOL', 'NOR', 'SUR', 'PRO', 'TEC', 'AGRO', 'CEN', 'MAR',
+]
+PALABRAS = [
+    'ALMACENES', 'DISTRIBUIDORA', 'IMPORTADORA', 'COMERCIAL', 'INDUSTRIAS', 'GRUPO', 'CORPORACION',
+    'SERVICIOS', 'LOGISTICA', 'TRANSPORTES', 'AGROINDUSTRIAS', 'FARMACEUTICA', 'TEXTILES', 'PLASTICOS',
+    'ALIMENTOS', 'BEBIDAS', 'CENTROAMERICANA', 'NACIONAL', 'SALVADORENA', 'DEL PACIFICO', 'DE ORIENTE',
+]
+SUFIJOS = ['S.A. DE C.V.', 'SA DE CV', 'S.A.', 'LTDA', '']
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def variacion(rng, nombre):
+    """Nombre parecido al original, como llega en un Excel o una factura."""
+    opcion = rng.randrange(3)
+    if opcion == 0:
+        return nombre.replace(' ', ', ', 1).lower()
+    if opcion == 1:
+        return f'{nombre} {rng.choice(SUFIJOS[:3])}'
+    return f'{rng.choice(PALABRAS)} {nombre}'
+
+
+class Command(BaseCommand):
+    help = 'Compara p50/p95 de find_similar por vecinos más cercanos vs recorrido completo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aliases', type=int, default=50000, help='Aliases sintéticos (default: 50000)')
+        parser.add_argument('--consultas', type=int, default=200, help='Consultas medidas (default: 200)')
+        parser.add_argument(
+            '--consultas-completo',
+            type=int,
+            default=20,
+            help='Consultas medidas con el recorrido completo (default: 20)'
+        )
+        parser.add_argument('--threshold', type=float, default=80.0, help='Score mínimo (default: 80)')
+        parser.add_argument('--limit', type=int, default=10, help='Resultados por consulta (default: 10)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        threshold, limit = options['threshold'], options['limit']
+
+        with transaction.atomic():
+            nombres = self._seed(rng, options['aliases'])
+            consultas = [variacion(rng, rng.choice(nombres)) for _ in range(options['consultas'])]
+            queryset = ClientAlias.objects.filter(merged_into__isnull=True)
+
+            self.stdout.write(f"Aliases: {queryset.count()}")
+            self.stdout.write(f"Backend: {'pg_trgm' if nearest.trigram_disponible(queryset.db) else 'índice en memoria'}")
+
+            if not nearest.trigram_disponible(queryset.db):
+                start = time.perf_counter()
+                nearest.indice_en_memoria()
+                self.stdout.write(f"Construcción del índice en memoria: {time.perf_counter() - start:.2f}s")
+
+            tiempos_nn, resultados_nn = [], []
+            for consulta in consultas:
+                start = time.perf_counter()
+                matches = nearest.buscar_similares(consulta, threshold, limit=limit, queryset=queryset)
+                tiempos_nn.append(time.perf_counter() - start)
+                resultados_nn.append(matches)
+
+            tiempos_completo = []
+            # Recall general y de los resultados que se sugieren (score >= 85)
+            recall = {'todos': [0, 0], 'sugeridos': [0, 0]}
+            aliases = list(queryset.only('id', 'original_name'))
+            for consulta, matches in list(zip(consultas, resultados_nn))[:options['consultas_completo']]:
+                start = time.perf_counter()
+                completos = []
+                for alias in aliases:
+                    score = calculate_smart_similarity(consulta, alias.original_name)['score']
+                    if score >= threshold:
+                        completos.append((score, alias.pk))
+                completos.sort(reverse=True)
+                tiempos_completo.append(time.perf_counter() - start)
+
+                # Los empates en el corte del limit pueden ordenarse distinto: no cuentan
+                top = completos[:limit]
+                if len(completos) > limit:
+                    top = [(score, pk) for score, pk in top if score > completos[limit][0]]
+                devueltos = {m['alias'].pk for m in matches}
+                for clave, minimo in [('todos', threshold), ('sugeridos', 85)]:
+                    esperados_ids = {pk for score, pk in top if score >= minimo}
+                    recall[clave][0] += len(esperados_ids & devueltos)
+                    recall[clave][1] += len(esperados_ids)
+
+            # Descartar los datos sintéticos
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"\n{'modo':<12} {'consultas':>9} {'p50 ms':>10} {'p95 ms':>10}")
+        for nombre, tiempos in [('vecinos', tiempos_nn), ('completo', tiempos_completo)]:
+            if tiempos:
+                self.stdout.write(
+                    f"{nombre:<12} {len(tiempos):>9} {statistics.median(tiempos) * 1000:>10.1f} "
+                    f"{percentil(tiempos, 95) * 1000:>10.1f}"
+                )
+
+        for clave, (encontrados, esperados) in recall.items():
+            if esperados:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Recall vs recorrido completo ({clave}): {encontrados / esperados:.1%} ({encontrados}/{esperados})"
+                ))
+
+    def _seed(self, rng, cantidad):
+        nombres = set()
+        while len(nombres) < cantidad:
+            # Una marca inventada (3-4 sílabas) más 0-2 palabras comunes del rubro
+            marca = ''.join(rng.choice(SILABAS) for _ in range(rng.randint(3, 4)))
+            partes = rng.sample(PALABRAS, rng.randint(0, 2)) + [marca]
+            nombres.add(' '.join(partes))
+        nombres = sorted(nombres)
+
+        ClientAlias.objects.bulk_create(
+            [
+                ClientAlias(
+                    original_name=f'{nombre} {rng.choice(SUFIJOS)}'.strip(),
+                    normalized_name=ClientAlias.normalize_name(nombre),
+                )
+                for nombre in nombres
+            ],
+            batch_size=2000,
+        )
+        # bulk_create no dispara signals: invalidar el índice en memoria
+        bump_model_version(ClientAlias)
+        return nombres
@@ -0,0 +1,96 @@
+"""
+Management command para medir calculate_smart_similarity en comparaciones por pares.
+
+Genera N nombres sintéticos de clientes (con sufijos legales y puntuación
+variados) y ejecuta M comparaciones entre pares aleatorios:
+
+- por comparación: el preprocesamiento de ambos nombres (sufijo legal,
+  tokens, tokens ordenados) se repite en cada comparación, como antes de
+  fuzzy_utils.NameFeatures.
+- precalculado: un NameFeatures por nombre, calculado una sola vez.
+
+Verifica que ambos modos den exactamente los mismos scores.
+
+Uso:
+    python manage.py benchmark_fuzzy_matching --comparaciones 1000000 --nombres 5000
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from client_aliases.fuzzy_utils import calculate_smart_similarity, compute_name_features
+
+PALABRAS = [
+    'ALMACENES', 'SIMAN', 'DISTRIBUIDORA', 'ZABLAH', 'IMPORTADORA', 'COMERCIAL', 'INDUSTRIAS', 'GRUPO',
+    'SUPER', 'SELECTOS', 'LOGISTICA', 'TRANSPORTES', 'DEL', 'PACIFICO', 'DE', 'ORIENTE', 'AGRO', 'PEÑA',
+    'FARMACEUTICA', 'TEXTILES', 'ALIMENTOS', 'BEBIDAS', 'LA', 'CONSTANCIA', 'Y', 'CIA', 'EL', 'SALVADOR',
+]
+SUFIJOS = ['S.A. DE C.V.', 'SA DE CV', 'S.A.', 'LTDA.', 'LTDA. DE C.V.', 'S.R.L.', 'INC', '']
+
+
+def build_names(rng, cantidad):
+    """Nombres con 1-4 palabras, un sufijo legal y variaciones de puntuación."""
+    nombres = []
+    for _ in range(cantidad):
+        nombre = ' '.join(rng.choice(PALABRAS) for _ in range(rng.randint(1, 4)))
+        sufijo = rng.choice(SUFIJOS)
+        separador = rng.choice([' ', ', '])
+        nombres.append(f'{nombre}{separador}{sufijo}'.strip(' ,'))
+    return nombres
+
+
+class Command(BaseCommand):
+    help = 'Compara calculate_smart_similarity con preprocesamiento por comparación vs NameFeatures precalculados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--comparaciones',
+            type=int,
+            default=1_000_000,
+            help='Comparaciones por modo (default: 1000000)'
+        )
+        parser.add_argument('--nombres', type=int, default=5000, help='Nombres distintos (default: 5000)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        nombres = build_names(rng, options['nombres'])
+        pares = [
+            (rng.randrange(len(nombres)), rng.randrange(len(nombres)))
+            for _ in range(options['comparaciones'])
+        ]
+
+        # Preprocesamiento repetido en cada comparación
+        start = time.perf_counter()
+        total_por_comparacion = 0.0
+        for i, j in pares:
+            total_por_comparacion += calculate_smart_similarity(
+                compute_name_features(nombres[i]), compute_name_features(nombres[j])
+            )['score']
+        por_comparacion = time.perf_counter() - start
+
+        # Un NameFeatures por nombre
+        start = time.perf_counter()
+        features = [compute_name_features(nombre) for nombre in nombres]
+        preprocesamiento = time.perf_counter() - start
+
+        start = time.perf_counter()
+        total_precalculado = 0.0
+        for i, j in pares:
+            total_precalculado += calculate_smart_similarity(features[i], features[j])['score']
+        precalculado = time.perf_counter() - start
+
+        comparaciones = len(pares)
+        self.stdout.write(f"Nombres: {len(nombres)} | Comparaciones por modo: {comparaciones}")
+        self.stdout.write(f"Preprocesamiento de los nombres: {preprocesamiento * 1000:.1f} ms\n")
+        self.stdout.write(f"{'modo':<18} {'segundos':>10} {'µs/comp':>10}")
+        for nombre, elapsed in [('por comparación', por_comparacion), ('precalculado', precalculado)]:
+            self.stdout.write(f"{nombre:<18} {elapsed:>10.2f} {elapsed / comparaciones * 1e6:>10.2f}")
+
+        if total_por_comparacion != total_precalculado:
+            self.stdout.write(self.style.ERROR('\nLos scores difieren entre modos'))
+        elif precalculado:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nMismos scores. Speedup: {por_comparacion / (precalculado + preprocesamiento):.1f}x"
+            ))
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+INDEX_NAME = 'client_aliases_normalized_trgm_idx'
+
+
+def crear_indice_trgm(apps, schema_editor):
+    """
+    Índice GiST de trigramas sobre normalized_name (búsqueda de vecinos más
+    cercanos con ORDER BY normalized_name <-> %s). Solo si el servidor tiene
+    pg_trgm disponible; si no, client_aliases.nearest usa el índice en memoria.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON client_aliases USING gist (normalized_name gist_trgm_ops)'
+    )
+
+
+def borrar_indice_trgm(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_aliases', '0008_clientalias_acepta_credito_fiscal_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_trgm, borrar_indice_trgm),
+    ]
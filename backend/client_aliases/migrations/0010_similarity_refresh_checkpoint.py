@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_aliases', '0009_normalized_name_trgm_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRefreshCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('last_alias_change_at', models.DateTimeField(blank=True, help_text='Corte de updated_at de ClientAlias hasta el que las sugerencias están re-puntuadas', null=True)),
+                ('algorithm_version', models.CharField(blank=True, help_text='fuzzy_utils.ALGORITHM_VERSION con el que se calcularon los scores', max_length=20)),
+                ('rescored_count', models.IntegerField(default=0, help_text='Sugerencias re-puntuadas en la última corrida')),
+                ('rejected_count', models.IntegerField(default=0, help_text='Sugerencias rechazadas en la última corrida')),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de sugerencias',
+                'verbose_name_plural': 'Checkpoints de sugerencias',
+                'db_table': 'similarity_refresh_checkpoint',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='clientalias',
+            index=models.Index(fields=['updated_at'], name='client_alia_updated_c1b1a0_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_aliases', '0010_similarity_refresh_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientalias',
+            name='match_features',
+            field=models.JSONField(blank=True, editable=False, help_text='Sufijo legal, tokens significativos, etc. de original_name, calculados al guardar', null=True),
+        ),
+    ]
@@ -15,6 +15,8 @@ from decimal import Decimal
 from common.models import TimeStampedModel, SoftDeleteModel
 from catalogs.models import Provider
 
+from .fuzzy_utils import compute_name_features, features_from_dict, features_to_dict, name_features
+
 
 class ClientAlias(TimeStampedModel, SoftDeleteModel):
     """
@@ -182,6 +184,14 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
         help_text="Actividad económica principal del cliente"
     )
 
+    # Preprocesamiento de original_name para fuzzy matching (fuzzy_utils.NameFeatures)
+    match_features = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Sufijo legal, tokens significativos, etc. de original_name, calculados al guardar"
+    )
+
     class Meta:
         db_table = 'client_aliases'
         verbose_name = 'Alias de Cliente'
@@ -190,6 +200,8 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
         indexes = [
             models.Index(fields=['normalized_name']),
             models.Index(fields=['is_verified']),
+            # Watermark de similarity_refresh: aliases modificados desde la última corrida
+            models.Index(fields=['updated_at']),
         ]
         unique_together = []  # No forzamos unicidad aquí
     
@@ -220,9 +232,24 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
         # Auto-generar short_name si no existe
         if not self.short_name:
             self.short_name = self.generate_short_name()
+
+        self.match_features = features_to_dict(compute_name_features(self.original_name))
         
         self.full_clean()
         super().save(*args, **kwargs)
+
+    def get_match_features(self):
+        """
+        NameFeatures de original_name para calculate_smart_similarity.
+
+        Usa los persistidos en match_features si corresponden al nombre actual
+        y a la versión del algoritmo; si no (p.ej. filas de bulk_create), los
+        calcula con la cache de fuzzy_utils.
+        """
+        features = features_from_dict(self.match_features)
+        if features is not None and features.name == (self.original_name or '').strip():
+            return features
+        return name_features(self.original_name)
     
     @staticmethod
     def normalize_name(name):
@@ -245,7 +272,18 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
     
     def generate_short_name(self):
         """
-        Genera un alias corto basado en el nombre original con manejo inteligente.
+        Genera un alias corto único basado en el nombre original (ver
+        base_short_name). Para muchos aliases a la vez usar
+        client_aliases.short_names.regenerar_short_names.
+        """
+        base_short_name = self.base_short_name()
+        if base_short_name is None:
+            return None
+        return self._ensure_unique_short_name(base_short_name)
+
+    def base_short_name(self):
+        """
+        Alias corto basado en el nombre original, sin sufijo de unicidad.
 
         Mejoras v2:
         - Convierte guiones y guiones bajos a ESPACIOS para mejor legibilidad
@@ -296,8 +334,7 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
 
         if not significant_words:
             # Si no quedan palabras, usar el nombre limpio completo
-            base_short_name = clean[:50] if len(clean) <= 50 else clean[:47] + '...'
-            return self._ensure_unique_short_name(base_short_name)
+            return clean[:50] if len(clean) <= 50 else clean[:47] + '...'
 
         # PASO 5: Generar alias basado en palabras significativas
         # PREFERIR PALABRAS COMPLETAS CON ESPACIOS en lugar de guiones bajos
@@ -325,11 +362,12 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
         if len(base_short_name) > 50:
             base_short_name = base_short_name[:47] + '...'
 
-        return self._ensure_unique_short_name(base_short_name)
+        return base_short_name
 
     def _ensure_unique_short_name(self, base_short_name):
         """
         Asegura que el short_name sea único agregando sufijo numérico si es necesario.
+        Los short_names ocupados se cargan en una sola consulta.
 
         Args:
             base_short_name: Nombre base a hacer único
@@ -337,25 +375,10 @@ class ClientAlias(TimeStampedModel, SoftDeleteModel):
         Returns:
             str: Nombre único con sufijo si fue necesario
         """
-        short_name = base_short_name
-        counter = 1
-
-        while ClientAlias.objects.filter(short_name=short_name).exclude(pk=self.pk).exists():
-            # Agregar sufijo con espacio (más legible que guión bajo)
-            suffix = f" {counter}"
-            max_len = 50 - len(suffix)
-            short_name = f"{base_short_name[:max_len]}{suffix}"
-            counter += 1
-
-            # Evitar loops infinitos
-            if counter > 1000:
-                # Usar timestamp como último recurso
-                import time
-                timestamp = int(time.time() * 1000) % 100000
-                short_name = f"{base_short_name[:40]} {timestamp}"
-                break
-
-        return short_name
+        from client_aliases.short_names import ShortNameAllocator
+
+        excluir = [self.pk] if self.pk else []
+        return ShortNameAllocator([base_short_name], excluir_ids=excluir).asignar(base_short_name)
     
     def increment_usage(self):
         """Incrementa el contador de uso cuando aparece en un documento"""
@@ -475,6 +498,39 @@ class SimilarityMatch(TimeStampedModel):
         super().save(*args, **kwargs)
 
 
+class SimilarityRefreshCheckpoint(TimeStampedModel):
+    """
+    Última actualización de las sugerencias pendientes (ver similarity_refresh.py).
+
+    Guarda hasta qué updated_at de ClientAlias se re-puntuaron las sugerencias
+    y con qué versión del algoritmo, para que la siguiente corrida solo
+    re-puntúe las sugerencias cuyos aliases cambiaron desde entonces.
+    """
+
+    key = models.CharField(max_length=50, unique=True)
+    last_alias_change_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Corte de updated_at de ClientAlias hasta el que las sugerencias están re-puntuadas"
+    )
+    algorithm_version = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="fuzzy_utils.ALGORITHM_VERSION con el que se calcularon los scores"
+    )
+    rescored_count = models.IntegerField(default=0, help_text="Sugerencias re-puntuadas en la última corrida")
+    rejected_count = models.IntegerField(default=0, help_text="Sugerencias rechazadas en la última corrida")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'similarity_refresh_checkpoint'
+        verbose_name = 'Checkpoint de sugerencias'
+        verbose_name_plural = 'Checkpoints de sugerencias'
+
+    def __str__(self):
+        return f"{self.key} @ {self.last_alias_change_at or '-'} ({self.algorithm_version or '-'})"
+
+
 class ClientResolution(TimeStampedModel):
     """
     Cachea decisiones de normalización de nombres de clientes.
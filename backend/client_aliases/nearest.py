@@ -0,0 +1,180 @@
+"""
+Búsqueda de los aliases más parecidos a un nombre (vecinos más cercanos).
+
+find_similar calculaba calculate_smart_similarity contra TODOS los aliases
+para responder una sola consulta. Aquí primero se obtienen los K aliases más
+cercanos por similitud de trigramas de normalized_name y solo esos se
+re-puntúan con calculate_smart_similarity / get_match_recommendation:
+
+- PostgreSQL con pg_trgm: ORDER BY normalized_name <-> 'nombre' LIMIT K,
+  resuelto con el índice GiST gist_trgm_ops (migración 0009).
+- Sin pg_trgm (o en SQLite): NGramIndex, un índice invertido de trigramas
+  en memoria con la misma definición de trigramas que pg_trgm. Se construye
+  una vez por proceso y se reconstruye cuando cambia la versión de
+  ClientAlias (common.model_versions).
+
+Un alias con score alto comparte palabras con el nombre buscado (sin
+palabras comunes calculate_smart_similarity multiplica el score por 0.2),
+así que queda entre los vecinos por trigramas; total_matches cuenta solo
+los candidatos re-puntuados.
+
+Uso:
+    buscar_similares('ALMACENES SIMAN SA', threshold=80, limit=10)
+"""
+
+import heapq
+import logging
+import re
+import threading
+from collections import defaultdict
+from operator import itemgetter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from django.contrib.postgres.search import TrigramDistance
+from django.db import connections
+
+from common.model_versions import get_model_version
+
+from .fuzzy_utils import calculate_smart_similarity, get_match_recommendation, name_features
+
+logger = logging.getLogger(__name__)
+
+
+# Candidatos por trigramas que se re-puntúan con calculate_smart_similarity
+CANDIDATOS_K = 200
+
+PALABRA_PATTERN = re.compile(r'[^\W_]+')
+
+
+def trigramas(texto: str) -> FrozenSet[str]:
+    """Trigramas como los calcula pg_trgm: por palabra, en minúsculas, con '  ' delante y ' ' detrás."""
+    resultado = set()
+    for palabra in PALABRA_PATTERN.findall((texto or '').lower()):
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return frozenset(resultado)
+
+
+class NGramIndex:
+    """Índice invertido trigrama -> ids, con similitud de Jaccard como pg_trgm."""
+
+    def __init__(self, items: Iterable[Tuple[int, str]]):
+        self._trigramas: Dict[int, FrozenSet[str]] = {}
+        self._invertido: Dict[str, List[int]] = defaultdict(list)
+        for pk, texto in items:
+            grams = trigramas(texto)
+            self._trigramas[pk] = grams
+            for gram in grams:
+                self._invertido[gram].append(pk)
+
+    def __len__(self):
+        return len(self._trigramas)
+
+    def buscar(self, texto: str, k: int) -> List[Tuple[int, float]]:
+        """Los k ids más similares con su similitud (0-1), de mayor a menor."""
+        consulta = trigramas(texto)
+        if not consulta:
+            return []
+
+        comunes = defaultdict(int)
+        for gram in consulta:
+            for pk in self._invertido.get(gram, ()):
+                comunes[pk] += 1
+
+        total = len(consulta)
+        similitudes = (
+            (pk, n / (total + len(self._trigramas[pk]) - n))
+            for pk, n in comunes.items()
+        )
+        return heapq.nlargest(k, similitudes, key=itemgetter(1))
+
+
+_indice_lock = threading.Lock()
+_indice: Dict = {'version': None, 'index': None}
+_trgm_disponible: Dict[str, bool] = {}
+
+
+def trigram_disponible(using: str = 'default') -> bool:
+    """True si la base de datos tiene la extensión pg_trgm instalada."""
+    if using not in _trgm_disponible:
+        connection = connections[using]
+        disponible = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                disponible = cursor.fetchone() is not None
+        _trgm_disponible[using] = disponible
+    return _trgm_disponible[using]
+
+
+def _base_queryset():
+    from client_aliases.models import ClientAlias
+
+    return ClientAlias.objects.filter(merged_into__isnull=True)
+
+
+def indice_en_memoria() -> NGramIndex:
+    """NGramIndex de los aliases sin fusionar, reconstruido si cambió ClientAlias."""
+    from client_aliases.models import ClientAlias
+
+    version = get_model_version(ClientAlias)
+    with _indice_lock:
+        if _indice['version'] != version or _indice['index'] is None:
+            _indice['index'] = NGramIndex(_base_queryset().values_list('id', 'normalized_name').iterator())
+            _indice['version'] = version
+            logger.info(f"[NEAREST] Índice de trigramas en memoria: {len(_indice['index'])} aliases")
+        return _indice['index']
+
+
+def buscar_candidatos(nombre: str, k: int = CANDIDATOS_K, queryset=None) -> List:
+    """
+    Los k aliases (sin fusionar) más cercanos a nombre por trigramas de
+    normalized_name, del más al menos parecido.
+
+    queryset restringe la búsqueda (debe ser un subconjunto de los aliases
+    sin fusionar); con el índice en memoria se filtra sobre los k vecinos.
+    """
+    from client_aliases.models import ClientAlias
+
+    normalizado = ClientAlias.normalize_name(nombre)
+    if queryset is None:
+        queryset = _base_queryset()
+
+    if trigram_disponible(queryset.db):
+        return list(
+            queryset.annotate(distancia=TrigramDistance('normalized_name', normalizado)).order_by('distancia', 'id')[:k]
+        )
+
+    vecinos = indice_en_memoria().buscar(normalizado, k)
+    orden = {pk: posicion for posicion, (pk, _) in enumerate(vecinos)}
+    aliases = queryset.filter(pk__in=list(orden))
+    return sorted(aliases, key=lambda alias: orden[alias.pk])
+
+
+def buscar_similares(nombre: str, threshold: float, limit: Optional[int] = None, queryset=None,
+                     k: int = CANDIDATOS_K) -> List[Dict]:
+    """
+    Candidatos de buscar_candidatos re-puntuados con calculate_smart_similarity
+    (score >= threshold), ordenados por score descendente.
+
+    Cada resultado: {'alias', 'similarity_score', 'confidence',
+    'recommended_action', 'match_details'}.
+    """
+    resultados = []
+    consulta = name_features(nombre)
+    for alias in buscar_candidatos(nombre, k=k, queryset=queryset):
+        similarity_result = calculate_smart_similarity(consulta, alias.get_match_features())
+        score = similarity_result['score']
+        if score < threshold:
+            continue
+        recommendation = get_match_recommendation(score, similarity_result['confidence'])
+        resultados.append({
+            'alias': alias,
+            'similarity_score': score,
+            'confidence': similarity_result['confidence'],
+            'recommended_action': recommendation['action'],
+            'match_details': similarity_result['details'],
+        })
+
+    resultados.sort(key=itemgetter('similarity_score'), reverse=True)
+    return resultados[:limit] if limit else resultados
@@ -0,0 +1,124 @@
+"""
+Asignación de short_names únicos por lotes.
+
+ClientAlias._ensure_unique_short_name probaba "BASE", "BASE 1", "BASE 2", ...
+con un exists() por intento (hasta 1000), y generate_short_names lo hacía
+alias por alias con un save() + full_clean() cada uno.
+
+ShortNameAllocator carga en UNA consulta todos los short_names (incluidos
+los de aliases eliminados, que también cuentan para el UNIQUE) que empiezan
+con el prefijo de alguna de las bases del lote, y asigna los sufijos en
+memoria. regenerar_short_names lo usa para un lote completo y guarda con
+bulk_update.
+
+Uso:
+    ShortNameAllocator(['WALMART'], excluir_ids=[alias.pk]).asignar('WALMART')
+    regenerar_short_names(ClientAlias.objects.filter(short_name__isnull=True))
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Left
+from django.db.models.lookups import In
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+
+logger = logging.getLogger(__name__)
+
+
+MAX_LENGTH = 50
+# Todo candidato "BASE n" empieza con los primeros PREFIJO caracteres de la
+# base (el sufijo trunca la base a 50 - len(sufijo), nunca por debajo de 40)
+PREFIJO = 40
+
+
+def _prefijo(base: str) -> str:
+    return base[:PREFIJO]
+
+
+def _candidato(base: str, n: int) -> str:
+    """Mismo formato que _ensure_unique_short_name: sufijo con espacio."""
+    if n == 0:
+        return base
+    sufijo = f" {n}"
+    return f"{base[:MAX_LENGTH - len(sufijo)]}{sufijo}"
+
+
+class ShortNameAllocator:
+    """Short_names ocupados con los prefijos de un lote y asignación en memoria."""
+
+    def __init__(self, bases: Iterable[str], excluir_ids: Iterable[int] = ()):
+        from client_aliases.models import ClientAlias
+
+        # Una condición LEFT(short_name, n) IN (...) por largo de prefijo
+        por_largo = defaultdict(set)
+        for base in bases:
+            if base:
+                prefijo = _prefijo(base)
+                por_largo[len(prefijo)].add(prefijo)
+
+        self._ocupados = set()
+        self._siguiente: Dict[str, int] = {}
+        if not por_largo:
+            return
+
+        condicion = Q()
+        for largo, prefijos in por_largo.items():
+            condicion |= Q(In(Left('short_name', largo), sorted(prefijos)))
+
+        self._ocupados = set(
+            ClientAlias.all_objects.filter(condicion).exclude(
+                pk__in=list(excluir_ids)
+            ).values_list('short_name', flat=True)
+        )
+
+    def asignar(self, base: str) -> str:
+        """Primer candidato libre para la base ("BASE", "BASE 1", ...), que queda ocupado."""
+        n = self._siguiente.get(base, 0)
+        candidato = _candidato(base, n)
+        while candidato in self._ocupados:
+            n += 1
+            candidato = _candidato(base, n)
+        self._siguiente[base] = n + 1
+        self._ocupados.add(candidato)
+        return candidato
+
+
+def regenerar_short_names(aliases: Iterable, batch_size: int = 1000) -> List:
+    """
+    Genera el short_name de cada alias (ClientAlias.base_short_name) y lo hace
+    único dentro del lote y contra la BD.
+
+    Los short_names actuales del lote se liberan primero, así que un alias
+    puede conservar el suyo o tomar el que deja otro del mismo lote. Los
+    aliases se procesan en el orden recibido. Retorna los aliases con el
+    short_name nuevo.
+    """
+    from client_aliases.models import ClientAlias
+
+    aliases = list(aliases)
+    if not aliases:
+        return []
+
+    bases = {alias.pk: alias.base_short_name() for alias in aliases}
+    ids = list(bases)
+
+    with transaction.atomic():
+        allocator = ShortNameAllocator(bases.values(), excluir_ids=ids)
+        now = timezone.now()
+        for alias in aliases:
+            alias.short_name = allocator.asignar(bases[alias.pk]) if bases[alias.pk] else None
+            alias.updated_at = now
+
+        # Liberar los short_names del lote (el UNIQUE se verifica fila por fila)
+        ClientAlias.all_objects.filter(pk__in=ids, short_name__isnull=False).update(short_name=None)
+        ClientAlias.all_objects.bulk_update(aliases, ['short_name', 'updated_at'], batch_size=batch_size)
+        transaction.on_commit(lambda: bump_model_version(ClientAlias))
+
+    logger.info(f"[SHORT NAMES] {len(aliases)} short_names regenerados")
+    return aliases
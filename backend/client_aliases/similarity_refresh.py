@@ -0,0 +1,138 @@
+"""
+Actualización incremental de las sugerencias de similitud pendientes.
+
+_clean_obsolete_suggestions recalculaba calculate_smart_similarity para TODAS
+las sugerencias pendientes en cada corrida y rechazaba las de score bajo con
+un UPDATE por fila, aunque ningún alias hubiera cambiado.
+
+El score solo depende de los nombres de los dos aliases, así que aquí:
+
+1. Se re-puntúan solo las sugerencias pendientes con algún alias modificado
+   (updated_at) después del watermark de la corrida anterior, guardado en
+   SimilarityRefreshCheckpoint. Si cambió fuzzy_utils.ALGORITHM_VERSION (o
+   no hay checkpoint) se re-puntúan todas. Los scores nuevos se guardan con
+   bulk_update.
+2. Las obsoletas (alias fusionado, eliminado o sin OTs, o score guardado bajo
+   el umbral) se rechazan con UN solo UPDATE. Se rechazan en lugar de
+   borrarse para conservar el historial y que no se vuelvan a sugerir.
+
+Uso:
+    refrescar_sugerencias(threshold=85, user=request.user)
+"""
+
+import logging
+from datetime import timedelta
+from typing import Dict
+
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from .fuzzy_utils import ALGORITHM_VERSION, calculate_smart_similarity
+
+logger = logging.getLogger(__name__)
+
+
+CHECKPOINT_KEY = 'pending_matches'
+BATCH_SIZE = 1000
+# Aliases guardados en transacciones que confirmaron después de leer el
+# watermark: se vuelven a considerar en la corrida siguiente
+MARGEN_WATERMARK = timedelta(minutes=5)
+
+NOTA_FUSIONADO = 'Auto-rechazado: uno o ambos clientes ya fueron fusionados/normalizados'
+NOTA_INACTIVO = 'Auto-rechazado: alias sin actividad vigente (0 OTs o eliminado)'
+
+
+def _filtros_obsoletas():
+    """(fusionada, inactiva) como Q sobre SimilarityMatch, con subconsultas en lugar de JOINs (válidas en UPDATE)."""
+    from client_aliases.models import ClientAlias
+
+    fusionados = ClientAlias.all_objects.filter(merged_into__isnull=False).values('pk')
+    inactivos = ClientAlias.all_objects.filter(Q(deleted_at__isnull=False) | Q(usage_count__lte=0)).values('pk')
+    fusionada = Q(alias_1_id__in=fusionados) | Q(alias_2_id__in=fusionados)
+    inactiva = Q(alias_1_id__in=inactivos) | Q(alias_2_id__in=inactivos)
+    return fusionada, inactiva
+
+
+def refrescar_sugerencias(threshold: float, user=None, completo: bool = False) -> Dict:
+    """
+    Re-puntúa las sugerencias pendientes de aliases modificados y rechaza las
+    obsoletas.
+
+    Args:
+        threshold: Umbral mínimo de similitud de las sugerencias pendientes
+        user: Usuario registrado como revisor de las rechazadas
+        completo: Re-puntuar todas las pendientes, no solo las modificadas
+
+    Returns:
+        dict: {'rescored', 'score_changed', 'rejected', 'full'}
+    """
+    from client_aliases.models import SimilarityMatch, SimilarityRefreshCheckpoint
+
+    corte = timezone.now()
+
+    with transaction.atomic():
+        checkpoint, _ = SimilarityRefreshCheckpoint.objects.select_for_update().get_or_create(key=CHECKPOINT_KEY)
+        completo = (
+            completo
+            or checkpoint.last_alias_change_at is None
+            or checkpoint.algorithm_version != ALGORITHM_VERSION
+        )
+
+        fusionada, inactiva = _filtros_obsoletas()
+        pendientes = SimilarityMatch.objects.filter(status='pending')
+
+        # PASO 1: Re-puntuar las vigentes cuyos aliases cambiaron
+        a_repuntuar = pendientes.exclude(fusionada | inactiva)
+        if not completo:
+            desde = checkpoint.last_alias_change_at - MARGEN_WATERMARK
+            a_repuntuar = a_repuntuar.filter(Q(alias_1__updated_at__gt=desde) | Q(alias_2__updated_at__gt=desde))
+
+        rescored = 0
+        cambiadas = []
+        consulta = a_repuntuar.select_related('alias_1', 'alias_2').only(
+            'id', 'similarity_score', 'alias_1', 'alias_2',
+            'alias_1__original_name', 'alias_2__original_name', 'alias_1__match_features', 'alias_2__match_features',
+        )
+        for match in consulta.iterator(chunk_size=BATCH_SIZE):
+            rescored += 1
+            score = calculate_smart_similarity(
+                match.alias_1.get_match_features(), match.alias_2.get_match_features()
+            )['score']
+            if score != match.similarity_score:
+                match.similarity_score = score
+                match.updated_at = corte
+                cambiadas.append(match)
+
+        SimilarityMatch.objects.bulk_update(cambiadas, ['similarity_score', 'updated_at'], batch_size=BATCH_SIZE)
+
+        # PASO 2: Rechazar todas las obsoletas en un solo UPDATE
+        rejected = pendientes.filter(fusionada | inactiva | Q(similarity_score__lt=threshold)).update(
+            status='rejected',
+            review_notes=Case(
+                When(fusionada, then=Value(NOTA_FUSIONADO)),
+                When(inactiva, then=Value(NOTA_INACTIVO)),
+                default=Value(f'Auto-rechazado: el algoritmo actual calcula un score bajo el umbral ({threshold}%)'),
+            ),
+            reviewed_by=user,
+            reviewed_at=corte,
+            updated_at=corte,
+        )
+
+        checkpoint.last_alias_change_at = corte
+        checkpoint.algorithm_version = ALGORITHM_VERSION
+        checkpoint.rescored_count = rescored
+        checkpoint.rejected_count = rejected
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save()
+
+    logger.info(
+        f"[SIMILARITY REFRESH] {'completa' if completo else 'incremental'}: {rescored} re-puntuadas, "
+        f"{len(cambiadas)} con score nuevo, {rejected} rechazadas"
+    )
+    return {
+        'rescored': rescored,
+        'score_changed': len(cambiadas),
+        'rejected': rejected,
+        'full': completo,
+    }
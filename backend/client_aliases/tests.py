@@ -1,3 +1,228 @@
+from datetime import timedelta
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from client_aliases.fuzzy_utils import (
+    calculate_smart_similarity, compute_name_features, extract_legal_suffix, features_from_dict, features_to_dict,
+)
+from client_aliases.models import ClientAlias, SimilarityMatch, SimilarityRefreshCheckpoint
+from client_aliases.nearest import NGramIndex
+from client_aliases.short_names import ShortNameAllocator, regenerar_short_names
+from client_aliases.similarity_refresh import NOTA_FUSIONADO, refrescar_sugerencias
+
+
+class ShortNameAllocatorTestCase(TestCase):
+    """Sufijos de short_name asignados en memoria"""
+
+    def test_single_alias_uses_one_query(self):
+        ClientAlias.objects.bulk_create([
+            ClientAlias(original_name='WALMART S.A.', normalized_name='WALMART S.A', short_name='WALMART'),
+            ClientAlias(original_name='WALMART 1', normalized_name='WALMART 1', short_name='WALMART 1'),
+            # Los eliminados también ocupan el short_name (UNIQUE)
+            ClientAlias(original_name='WALMART 2', normalized_name='WALMART 2', short_name='WALMART 2', is_deleted=True),
+        ])
+        alias = ClientAlias(original_name='WALMART, S.A. DE C.V.')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(alias.generate_short_name(), 'WALMART 3')
+
+    def test_truncated_bases_share_prefix(self):
+        base = 'X' * 50
+        ClientAlias.objects.create(original_name='A', normalized_name='A', short_name=base)
+        allocator = ShortNameAllocator([base])
+        self.assertEqual(allocator.asignar(base), 'X' * 48 + ' 1')
+        self.assertEqual(allocator.asignar(base), 'X' * 48 + ' 2')
+
+    def test_batch_regeneration_is_a_few_queries(self):
+        aliases = ClientAlias.objects.bulk_create([
+            ClientAlias(
+                original_name=f'SUPER SELECTOS, S.A. DE C.V.{"." * n}',
+                normalized_name=f'SUPER SELECTOS {n}',
+                short_name=f'VIEJO {n}',
+            )
+            for n in range(30)
+        ] + [
+            ClientAlias(original_name='PRICESMART EL SALVADOR', normalized_name='PRICESMART', short_name='SUPER SELECTOS'),
+        ])
+
+        with CaptureQueriesContext(connection) as ctx:
+            regenerar_short_names(aliases)
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+
+        nombres = list(
+            ClientAlias.objects.filter(pk__in=[a.pk for a in aliases]).order_by('pk').values_list('short_name', flat=True)
+        )
+        # El último alias libera 'SUPER SELECTOS' dentro del mismo lote
+        self.assertEqual(nombres[:3], ['SUPER SELECTOS', 'SUPER SELECTOS 1', 'SUPER SELECTOS 2'])
+        self.assertEqual(nombres[-1], 'PRICESMART SALVADOR')
+        self.assertEqual(len(set(nombres)), len(nombres))
+
+
+class GenerateShortNamesAPITestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='jefeops_alias', email='alias@example.com', password='password123', role='jefe_operaciones'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_force_regenerates_all(self):
+        ClientAlias.objects.bulk_create([
+            ClientAlias(original_name='ALMACENES_SIMAN', normalized_name='ALMACENES SIMAN', short_name='AS'),
+            ClientAlias(original_name='ALMACENES-SIMAN S.A.', normalized_name='ALMACENES SIMAN S.A'),
+        ])
+
+        response = self.client.post(reverse('client-alias-generate-short-names'), {'force': True}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['generated'], 2)
+        self.assertEqual(
+            [s['new_short_name'] for s in response.data['sample']],
+            ['ALMACENES SIMAN', 'ALMACENES SIMAN 1']
+        )
+
+
+class NearestAliasTestCase(TestCase):
+    """find_similar: vecinos por trigramas re-puntuados con calculate_smart_similarity"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='jefeops_similar', email='similar@example.com', password='password123', role='jefe_operaciones'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_ngram_index_ranks_closest_first(self):
+        index = NGramIndex([(1, 'DISTRIBUIDORA ZABLAH'), (2, 'ALMACENES SIMAN'), (3, 'SIMAN EXPRESS'), (4, 'PRICESMART')])
+
+        resultados = index.buscar('ALMACENES SIMAN S.A', k=2)
+
+        self.assertEqual([pk for pk, _ in resultados], [2, 3])
+        self.assertEqual(index.buscar('', k=2), [])
+
+    def test_find_similar_matches_full_scan(self):
+        nombres = [
+            'ALMACENES SIMAN, S.A. DE C.V.', 'ALMACENES SIMAN', 'SIMAN EXPRESS', 'ALMACENES EL TESORO',
+            'DISTRIBUIDORA ZABLAH', 'PRICESMART EL SALVADOR', 'SUPER SELECTOS',
+        ]
+        for nombre in nombres:
+            ClientAlias.objects.create(original_name=nombre)
+        ClientAlias.objects.create(
+            original_name='ALMACENES SIMAN SA', merged_into=ClientAlias.objects.get(original_name='ALMACENES SIMAN')
+        )
+
+        response = self.client.post(
+            reverse('client-alias-find-similar'), {'name': 'Almacenes Siman S.A.', 'threshold': 60}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        esperados = sorted(
+            (
+                (calculate_smart_similarity('Almacenes Siman S.A.', nombre)['score'], nombre)
+                for nombre in nombres
+            ),
+            reverse=True
+        )
+        esperados = [nombre for score, nombre in esperados if score >= 60]
+        self.assertEqual([m['alias']['original_name'] for m in response.data['matches']], esperados)
+        self.assertEqual(response.data['total_matches'], len(esperados))
+
+
+class SimilarityRefreshTestCase(TestCase):
+    """Re-puntuación incremental de sugerencias pendientes con watermark"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jefeops_refresh', email='refresh@example.com', password='password123', role='jefe_operaciones'
+        )
+        self.siman = ClientAlias.objects.create(original_name='ALMACENES SIMAN, S.A. DE C.V.', usage_count=3)
+        self.siman_2 = ClientAlias.objects.create(original_name='ALMACENES SIMAN SA DE CV', usage_count=1)
+        self.selectos = ClientAlias.objects.create(original_name='SUPER SELECTOS', usage_count=2)
+        self.selectos_2 = ClientAlias.objects.create(original_name='SUPER SELECTOS S.A.', usage_count=2)
+        self.match_siman = SimilarityMatch.objects.create(alias_1=self.siman, alias_2=self.siman_2, similarity_score=90)
+        self.match_selectos = SimilarityMatch.objects.create(
+            alias_1=self.selectos, alias_2=self.selectos_2, similarity_score=90
+        )
+
+    def _envejecer_aliases(self):
+        ClientAlias.all_objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_only_changed_aliases_are_rescored(self):
+        primera = refrescar_sugerencias(85, self.user)
+        self.assertTrue(primera['full'])
+        self.assertEqual(primera['rescored'], 2)
+        self.assertIsNotNone(SimilarityRefreshCheckpoint.objects.get().last_alias_change_at)
+
+        self._envejecer_aliases()
+        self.assertEqual(refrescar_sugerencias(85, self.user)['rescored'], 0)
+
+        # Cambia el nombre de un alias: solo su sugerencia se re-puntúa y queda bajo el umbral
+        self.selectos_2.original_name = 'DISTRIBUIDORA ZABLAH'
+        self.selectos_2.save()
+        resultado = refrescar_sugerencias(85, self.user)
+
+        self.assertFalse(resultado['full'])
+        self.assertEqual((resultado['rescored'], resultado['rejected']), (1, 1))
+        self.match_selectos.refresh_from_db()
+        self.assertEqual(self.match_selectos.status, 'rejected')
+        self.assertLess(self.match_selectos.similarity_score, 85)
+        self.assertEqual(SimilarityMatch.objects.get(pk=self.match_siman.pk).status, 'pending')
+
+    def test_obsolete_suggestions_rejected_in_one_update(self):
+        refrescar_sugerencias(85, self.user)
+        self._envejecer_aliases()
+        self.siman_2.merged_into = self.siman
+        self.siman_2.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = refrescar_sugerencias(85, self.user)
+
+        self.assertEqual(resultado['rejected'], 1)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "similarity_matches"')]), 1)
+        self.match_siman.refresh_from_db()
+        self.assertEqual((self.match_siman.status, self.match_siman.review_notes), ('rejected', NOTA_FUSIONADO))
+        self.assertEqual(self.match_siman.reviewed_by, self.user)
+
+
+class NameFeaturesTestCase(TestCase):
+    """Preprocesamiento de nombres precalculado y persistido en ClientAlias"""
+
+    def test_suffix_trie_keeps_list_order(self):
+        self.assertEqual(
+            extract_legal_suffix('Almacenes Siman, S.A. de C.V.'),
+            ('ALMACENES SIMAN', 'S.A. DE C.V.', 'complete_cv')
+        )
+        self.assertEqual(extract_legal_suffix('SUPER SELECTOS S.A.,'), ('SUPER SELECTOS', 'S.A.', 'simple'))
+        self.assertEqual(extract_legal_suffix('PRICESMART'), ('PRICESMART', None, 'none'))
+
+    def test_precomputed_features_give_same_score(self):
+        pares = [
+            ('ALMACENES SIMAN, S.A. DE C.V.', 'ALMACENES SIMAN, S.A.'),
+            ('JUGUESAL S.A. DE C.V.', 'JUGUESAL LTDA. DE C.V.'),
+            ('DISTRIBUIDORA ZABLAH', 'ZABLAH DISTRIBUIDORA SA DE CV'),
+        ]
+        for name1, name2 in pares:
+            features1 = features_from_dict(features_to_dict(compute_name_features(name1)))
+            self.assertEqual(
+                calculate_smart_similarity(features1, compute_name_features(name2)),
+                calculate_smart_similarity(name1, name2)
+            )
+
+    def test_alias_persists_features(self):
+        alias = ClientAlias.objects.create(original_name='Almacenes Siman, S.A. de C.V.')
+        alias.refresh_from_db()
+
+        self.assertEqual(alias.match_features['tokens'], ['ALMACENES', 'SIMAN'])
+        self.assertEqual(alias.get_match_features(), compute_name_features(alias.original_name))
 
-# Create your tests here.
+        # Nombre cambiado sin save(): no se usan los features guardados
+        ClientAlias.objects.filter(pk=alias.pk).update(original_name='SUPER SELECTOS')
+        alias.refresh_from_db()
+        self.assertEqual(alias.get_match_features().tokens, ('SUPER', 'SELECTOS'))
@@ -25,7 +25,11 @@ from .serializers import (
     MergeRejectionSerializer,
 )
 from common.permissions import IsAdmin, IsJefeOperaciones
-from .fuzzy_utils import calculate_smart_similarity, get_match_recommendation
+from common.model_versions import bump_model_version
+from .fuzzy_utils import calculate_smart_similarity
+from .nearest import buscar_similares
+from .short_names import regenerar_short_names
+from .similarity_refresh import refrescar_sugerencias
 
 
 class ClientAliasViewSet(viewsets.ModelViewSet):
@@ -124,38 +128,28 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
         # Normalizar el nombre de búsqueda
         normalized = ClientAlias.normalize_name(name)
 
-        # Obtener todos los aliases activos
-        queryset = self.get_queryset().filter(merged_into__isnull=True)
-        
-        # Calcular similitud para cada alias usando algoritmo mejorado
-        results = []
-        for alias in queryset:
-            # Usar algoritmo inteligente multi-capa
-            similarity_result = calculate_smart_similarity(name, alias.original_name)
-            score = similarity_result['score']
-
-            if score >= threshold:
-                # Obtener recomendación de acción
-                recommendation = get_match_recommendation(score, similarity_result['confidence'])
-
-                results.append({
-                    'alias': ClientAliasListSerializer(alias).data,
-                    'similarity_score': score,
-                    'match_type': self._get_match_type(score),
-                    'confidence': similarity_result['confidence'],
-                    'recommended_action': recommendation['action'],
-                    'match_details': similarity_result['details']
-                })
-        
-        # Ordenar por score descendente
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
+        # Vecinos más cercanos por trigramas (índice pg_trgm o en memoria),
+        # re-puntuados con el algoritmo inteligente multi-capa
+        matches = buscar_similares(name, threshold, queryset=self.get_queryset().filter(merged_into__isnull=True))
+
+        results = [
+            {
+                'alias': ClientAliasListSerializer(match['alias']).data,
+                'similarity_score': match['similarity_score'],
+                'match_type': self._get_match_type(match['similarity_score']),
+                'confidence': match['confidence'],
+                'recommended_action': match['recommended_action'],
+                'match_details': match['match_details']
+            }
+            for match in matches[:limit]
+        ]
         
         return Response({
             'query': name,
             'normalized_query': normalized,
             'threshold': threshold,
-            'total_matches': len(results),
-            'matches': results[:limit]
+            'total_matches': len(matches),
+            'matches': results
         })
     
     def _get_match_type(self, score):
@@ -289,6 +283,8 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
 
         # Comparar cada alias con los siguientes
         aliases_list = list(aliases)
+        # Preprocesamiento de cada nombre una sola vez (no por cada par)
+        features = {alias.id: alias.get_match_features() for alias in aliases_list}
         for i, alias_1 in enumerate(aliases_list):
             suggestions_for_this = 0
 
@@ -309,8 +305,8 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
 
                 # Calcular similitud usando algoritmo inteligente
                 similarity_result = calculate_smart_similarity(
-                    alias_1.original_name,
-                    alias_2.original_name
+                    features[alias_1.id],
+                    features[alias_2.id]
                 )
                 score = similarity_result['score']
 
@@ -335,11 +331,14 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
 
     def _clean_obsolete_suggestions(self, current_threshold, user):
         """
-        Limpia sugerencias obsoletas que ya no cumplen con el nuevo algoritmo.
+        Limpia sugerencias obsoletas que ya no cumplen con el algoritmo actual.
 
-        Esto elimina:
-        1. Falsos positivos antiguos cuando mejoramos el algoritmo de fuzzy matching
-        2. Sugerencias donde alguno de los aliases ya está fusionado
+        Esto rechaza:
+        1. Sugerencias donde alguno de los aliases ya está fusionado
+        2. Sugerencias con aliases eliminados o sin OTs
+        3. Falsos positivos: score bajo el umbral (solo se re-puntúan las
+           sugerencias con aliases modificados desde la última corrida, o
+           todas si cambió el algoritmo; ver similarity_refresh.py)
 
         Args:
             current_threshold: Umbral mínimo de similitud
@@ -348,91 +347,7 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
         Returns:
             int: Cantidad de sugerencias eliminadas/rechazadas
         """
-        obsolete_count = 0
-        # PASO 1: Rechazar sugerencias donde algún alias ya está fusionado
-        merged_suggestions = SimilarityMatch.objects.filter(
-            status='pending'
-        ).filter(
-            Q(alias_1__merged_into__isnull=False) | Q(alias_2__merged_into__isnull=False)
-        )
-
-        merged_ids = list(merged_suggestions.values_list('id', flat=True))
-
-        if merged_ids:
-            count = SimilarityMatch.objects.filter(id__in=merged_ids).update(
-                status='rejected',
-                review_notes='Auto-rechazado: uno o ambos clientes ya fueron fusionados/normalizados',
-                reviewed_by=user,
-                reviewed_at=timezone.now()
-            )
-            obsolete_count += count
-
-        # Rechazar sugerencias sin actividad (aliases eliminados o sin OTs)
-        inactive_suggestions = SimilarityMatch.objects.filter(
-            status='pending'
-        ).filter(
-            Q(alias_1__deleted_at__isnull=False) |
-            Q(alias_2__deleted_at__isnull=False) |
-            Q(alias_1__usage_count__lte=0) |
-            Q(alias_2__usage_count__lte=0)
-        ).exclude(id__in=merged_ids)
-
-        inactive_ids = list(inactive_suggestions.values_list('id', flat=True))
-
-        if inactive_ids:
-            count = SimilarityMatch.objects.filter(id__in=inactive_ids).update(
-                status='rejected',
-                review_notes='Auto-rechazado: alias sin actividad vigente (0 OTs o eliminado)',
-                reviewed_by=user,
-                reviewed_at=timezone.now()
-            )
-            obsolete_count += count
-
-        # PASO 2: Obtener sugerencias pendientes con aliases activos y NO fusionados
-        pending_matches = SimilarityMatch.objects.filter(
-            status='pending',
-            alias_1__deleted_at__isnull=True,
-            alias_2__deleted_at__isnull=True,
-            alias_1__merged_into__isnull=True,
-            alias_2__merged_into__isnull=True,
-            alias_1__usage_count__gt=0,
-            alias_2__usage_count__gt=0
-        ).select_related('alias_1', 'alias_2')
-
-        # Preparar IDs para rechazo por score bajo
-        low_score_updates = []
-
-        for match in pending_matches:
-            # Recalcular similitud con el algoritmo mejorado actual
-            similarity_result = calculate_smart_similarity(
-                match.alias_1.original_name,
-                match.alias_2.original_name
-            )
-
-            new_score = similarity_result['score']
-
-            # Si el nuevo score está por debajo del umbral, agregarlo a la lista
-            if new_score < current_threshold:
-                low_score_updates.append({
-                    'id': match.id,
-                    'notes': (
-                        f'Auto-rechazado: el algoritmo mejorado calculó {new_score:.1f}% '
-                        f'(umbral: {current_threshold}%). Penalizaciones: {similarity_result["details"].get("penalties_applied", [])}'
-                    )
-                })
-
-        # Rechazar en batch
-        if low_score_updates:
-            for update_data in low_score_updates:
-                SimilarityMatch.objects.filter(id=update_data['id']).update(
-                    status='rejected',
-                    review_notes=update_data['notes'],
-                    reviewed_by=user,
-                    reviewed_at=timezone.now()
-                )
-            obsolete_count += len(low_score_updates)
-
-        return obsolete_count
+        return refrescar_sugerencias(current_threshold, user)['rejected']
     
     @action(detail=False, methods=['post'], permission_classes=[IsJefeOperaciones])
     def apply_normalization(self, request):
@@ -475,6 +390,8 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
             cliente=source,
             deleted_at__isnull=True
         ).update(cliente=target)
+        # QuerySet.update no dispara señales: invalidar caches de OT
+        bump_model_version(OT)
         
         # Buscar y actualizar sugerencia si existe
         suggestion_updated = False
@@ -647,34 +564,31 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
         if not force:
             queryset = queryset.filter(Q(short_name__isnull=True) | Q(short_name=''))
         
-        generated = 0
-        skipped = 0
-        errors = []
-        sample = []
-        
-        for alias in queryset:
-            try:
-                old_short_name = alias.short_name
-                # Forzar regeneración limpiando el campo
-                if force:
-                    alias.short_name = None
-                alias.save()  # El save() llamará a generate_short_name()
-                
-                generated += 1
-                if len(sample) < 10:
-                    sample.append({
-                        'id': alias.id,
-                        'original_name': alias.original_name,
-                        'old_short_name': old_short_name,
-                        'new_short_name': alias.short_name,
-                    })
-            except Exception as e:
-                skipped += 1
-                errors.append({
-                    'alias_id': alias.id,
-                    'original_name': alias.original_name,
-                    'error': str(e)
-                })
+        aliases = list(queryset.order_by('id'))
+        old_short_names = {alias.id: alias.short_name for alias in aliases}
+
+        # Sufijos asignados en memoria y un bulk_update para todo el lote
+        regenerar_short_names(aliases)
+
+        generated = sum(1 for alias in aliases if alias.short_name is not None)
+        skipped = len(aliases) - generated
+        errors = [
+            {
+                'alias_id': alias.id,
+                'original_name': alias.original_name,
+                'error': 'No se pudo generar un short_name (nombre vacío)'
+            }
+            for alias in aliases if alias.short_name is None
+        ]
+        sample = [
+            {
+                'id': alias.id,
+                'original_name': alias.original_name,
+                'old_short_name': old_short_names[alias.id],
+                'new_short_name': alias.short_name,
+            }
+            for alias in aliases[:10]
+        ]
         
         return Response({
             'message': f'Generación completada: {generated} aliases procesados',
@@ -1029,21 +943,15 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
             verified_at=timezone.now()
         )
 
-        # Actualizar facturas que usan cualquiera de las variantes
-        invoices_updated = 0
-
-        for variant_name in variants:
-            variant_name = variant_name.strip()
-            if not variant_name:
-                continue
-
-            # Actualizar facturas que tienen este nombre de proveedor
-            updated = Invoice.objects.filter(
-                proveedor_nombre=variant_name,
-                is_deleted=False
-            ).update(proveedor=None)  # Limpiar referencia a proveedor viejo
+        # Actualizar facturas que usan cualquiera de las variantes (un solo UPDATE)
+        variant_names = {variant_name.strip() for variant_name in variants if variant_name.strip()}
+        invoices_updated = Invoice.objects.filter(
+            proveedor_nombre__in=variant_names,
+            is_deleted=False
+        ).update(proveedor=None) if variant_names else 0  # Limpiar referencia a proveedor viejo
 
-            invoices_updated += updated
+        if invoices_updated:
+            bump_model_version(Invoice)
 
         # Incrementar usage_count
         alias.usage_count = invoices_updated
@@ -1127,6 +1035,9 @@ class ClientAliasViewSet(viewsets.ModelViewSet):
 
             invoices_updated += updated
 
+        if invoices_updated:
+            bump_model_version(Invoice)
+
         # Incrementar usage_count
         target_alias.usage_count += invoices_updated
         target_alias.save(update_fields=['usage_count'])
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CommonConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'common'
+    verbose_name = 'Común'
+
+    def ready(self):
+        import common.signals  # noqa
@@ -0,0 +1,114 @@
+"""
+Backend PostgreSQL (psycopg2) con pool de conexiones por worker.
+
+Se activa con DB_POOL_MODE=pool (ver proyecto/settings/base.py), que cambia
+el ENGINE a este módulo y agrega al alias la clave POOL:
+
+    'POOL': {'max_size': 10, 'timeout': 10.0, 'max_idle': 300}
+
+Cada DatabaseWrapper (uno por hilo/greenlet) pide prestada una conexión al
+pool al conectar y la devuelve al cerrar; con CONN_MAX_AGE=0 Django cierra
+al final de cada request, así que las conexiones físicas se reparten entre
+los requests activos en vez de quedar atadas a cada hilo.
+"""
+
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.db.backends.base.base import NO_DB_ALIAS
+from psycopg2 import extensions
+
+from common.db_pool import PoolTimeout, get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    _pool_conn = None
+
+    @property
+    def connection_pool(self):
+        """Pool del proceso para este alias, o None si no aplica."""
+        pool_options = self.settings_dict.get('POOL')
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+        key = (
+            self.alias,
+            self.settings_dict['NAME'],
+            self.settings_dict['HOST'],
+            self.settings_dict['PORT'],
+            self.settings_dict['USER'],
+        )
+        options = pool_options if isinstance(pool_options, dict) else {}
+        return get_pool(key, **options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.connection_pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        try:
+            connection, created = pool.acquire(
+                connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                ping=self._ping,
+            )
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+
+        if not created:
+            # super() fija isolation_level al abrir; en una reutilizada hay que
+            # restaurarlo desde OPTIONS (el nivel real lo mantiene la conexión)
+            isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+            self.isolation_level = IsolationLevel(
+                isolation_level if isolation_level is not None
+                else IsolationLevel.READ_COMMITTED
+            )
+        self._pool_conn = pool
+        return connection
+
+    def _close(self):
+        pool = self._pool_conn
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        self._pool_conn = None
+        connection = self.connection
+        # Cerrada dentro de un atomic(), el wrapper conserva la referencia
+        # hasta el rollback: no se puede prestar a otro hilo
+        reusable = not self.in_atomic_block and self._reset(connection)
+        pool.release(connection, reusable=reusable)
+
+    def close_pool(self):
+        # Llamado por la creación/destrucción de la base de test y al cambiar
+        # TIME_ZONE: las conexiones ociosas no deben sobrevivir
+        pool = self.connection_pool
+        if pool is not None:
+            pool.close_all()
+        super().close_pool()
+
+    @staticmethod
+    def _reset(connection) -> bool:
+        """Deja la conexión sin transacción abierta; False si no es reutilizable."""
+        if connection.closed:
+            return False
+        try:
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _ping(connection) -> bool:
+        """Verifica que una conexión ociosa siga viva."""
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
@@ -0,0 +1,262 @@
+"""
+Pool de conexiones a PostgreSQL por proceso.
+
+Django 5.1 trae un pool nativo, pero solo para psycopg 3; este proyecto usa
+psycopg2. Con CONN_MAX_AGE cada hilo/greenlet de gunicorn (workers gevent)
+mantiene su propia conexión persistente, así que el número de conexiones
+abiertas crece con la concurrencia y no con la carga real.
+
+ConnectionPool limita las conexiones físicas por worker:
+- Como máximo `max_size` conexiones abiertas por proceso; si están todas en
+  uso, acquire() espera hasta `timeout` segundos y luego lanza PoolTimeout.
+- Las conexiones liberadas quedan ociosas para el siguiente request; las que
+  llevan más de `max_idle` segundos sin uso se cierran.
+- Antes de reutilizar una conexión ociosa por más de `ping_after` segundos se
+  verifica que siga viva (la base de datos o un proxy pudo haberla cerrado).
+- Lleva métricas de espera (cantidad, total y máximo en ms, timeouts) para
+  dimensionar el pool; ver pool_stats() y el health check.
+
+El pool es genérico: recibe las funciones para abrir, verificar y cerrar
+conexiones. El backend common.backends.pooled_postgresql lo conecta con el
+DatabaseWrapper de Django.
+
+Después de un fork (preload de gunicorn) las conexiones heredadas no se
+pueden compartir: get_pool() detecta el cambio de PID y descarta el pool
+heredado sin cerrar sus sockets (pertenecen al proceso padre).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera."""
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones reutilizables.
+
+    Uso:
+        pool = ConnectionPool(max_size=10, timeout=5)
+        conn, created = pool.acquire(connect=abrir, ping=verificar)
+        ...
+        pool.release(conn, reusable=True)
+    """
+
+    def __init__(self, max_size: int = 10, timeout: float = 10.0,
+                 max_idle: float = 300.0, ping_after: float = 30.0,
+                 close: Optional[Callable[[Any], None]] = None):
+        if max_size < 1:
+            raise ValueError('max_size debe ser mayor que 0')
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._close = close or (lambda conn: conn.close())
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, liberada_en)
+        self._size = 0  # conexiones abiertas (ociosas + en uso)
+        self._metrics = {
+            'acquired': 0,
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'timeouts': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def acquire(self, connect: Callable[[], Any],
+                ping: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+        """
+        Obtiene una conexión: una ociosa si hay, una nueva si hay cupo, o
+        espera a que otra se libere.
+
+        Returns:
+            (conexión, creada) donde `creada` indica si se abrió en esta llamada.
+
+        Raises:
+            PoolTimeout: si no hubo conexión disponible en `timeout` segundos.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                conn = self._pop_idle(ping)
+                if conn is not None:
+                    self._record_acquire(start, waited, reused=True)
+                    return conn, False
+
+                if self._size < self.max_size:
+                    # Reservar el cupo antes de conectar fuera del lock
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No hay conexiones disponibles (max_size={self.max_size}, '
+                        f'espera={self.timeout}s)'
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            conn = connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._metrics['created'] += 1
+            self._record_acquire(start, waited, reused=False)
+        return conn, True
+
+    def release(self, conn: Any, reusable: bool = True) -> None:
+        """Devuelve la conexión al pool, o la cierra si no es reutilizable."""
+        if not reusable:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self) -> None:
+        """Cierra las conexiones ociosas (las que están en uso se cierran al liberarse)."""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._safe_close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas acumuladas y estado actual del pool."""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats['wait_ms_total'] = round(stats['wait_ms_total'], 2)
+            stats['wait_ms_max'] = round(stats['wait_ms_max'], 2)
+            stats['wait_ms_avg'] = (
+                round(stats['wait_ms_total'] / stats['waits'], 2) if stats['waits'] else 0.0
+            )
+            stats.update({
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+            })
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internos (llamar con self._cond tomado salvo que se indique)
+    # ------------------------------------------------------------------
+
+    def _pop_idle(self, ping: Optional[Callable[[Any], bool]]):
+        """Saca la conexión ociosa más reciente que siga siendo válida."""
+        now = time.monotonic()
+        while self._idle:
+            conn, released_at = self._idle.pop()  # LIFO: la más "caliente"
+            idle_for = now - released_at
+            if idle_for > self.max_idle or (
+                ping is not None and idle_for > self.ping_after and not ping(conn)
+            ):
+                self._size -= 1
+                self._metrics['discarded'] += 1
+                self._safe_close(conn)
+                continue
+            self._expire_idle(now)
+            return conn
+        return None
+
+    def _expire_idle(self, now: float) -> None:
+        """Cierra las conexiones ociosas más antiguas que max_idle."""
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._metrics['discarded'] += 1
+            self._safe_close(conn)
+
+    def _record_acquire(self, start: float, waited: bool, reused: bool) -> None:
+        self._metrics['acquired'] += 1
+        if reused:
+            self._metrics['reused'] += 1
+        if waited:
+            wait_ms = (time.monotonic() - start) * 1000
+            self._metrics['waits'] += 1
+            self._metrics['wait_ms_total'] += wait_ms
+            self._metrics['wait_ms_max'] = max(self._metrics['wait_ms_max'], wait_ms)
+
+    def _discard(self, conn: Any) -> None:
+        """Cierra una conexión en uso y libera su cupo (sin lock tomado)."""
+        self._safe_close(conn)
+        with self._cond:
+            self._size -= 1
+            self._metrics['discarded'] += 1
+            self._cond.notify()
+
+    def _safe_close(self, conn: Any) -> None:
+        try:
+            self._close(conn)
+        except Exception as e:
+            logger.debug(f"Error cerrando conexión del pool: {e}")
+
+
+# ----------------------------------------------------------------------
+# Registro de pools por proceso
+# ----------------------------------------------------------------------
+
+_pools: Dict[Any, ConnectionPool] = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def get_pool(key: Any, **options) -> ConnectionPool:
+    """
+    Retorna el pool del proceso actual para `key`, creándolo con `options`
+    (argumentos de ConnectionPool) la primera vez.
+    """
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Proceso hijo: los sockets heredados son del padre, no se cierran
+            _pools = {}
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(**options)
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos los pools del proceso, por alias de base de datos."""
+    with _pools_lock:
+        pools = list(_pools.items()) if _pools_pid == os.getpid() else []
+    return {key[0] if isinstance(key, tuple) else str(key): pool.stats() for key, pool in pools}
+
+
+def close_pools() -> None:
+    """Cierra las conexiones ociosas de todos los pools del proceso."""
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,122 @@
+"""
+Enrutamiento de lecturas a una réplica de solo lectura.
+
+Si DATABASE_REPLICA_URL está configurada, settings agrega el alias
+DATABASE_REPLICA_ALIAS ('replica'). Las lecturas NO se envían a la réplica
+por defecto: solo dentro de un contexto use_replica(), que activan
+- ReplicaReadMixin en las acciones de lectura de los viewsets (listados,
+  stats, exportaciones) y
+- los comandos de reportes que solo leen.
+
+Las escrituras siempre van a 'default'. Para que un usuario vea lo que acaba
+de escribir aunque la réplica tenga retraso (read-your-writes), el middleware
+ReplicaStickinessMiddleware fija al usuario al primario durante
+REPLICA_STICKY_SECONDS después de cada POST/PUT/PATCH/DELETE exitoso.
+
+Sin réplica configurada todo esto es un no-op: replica_alias() retorna None
+y todas las consultas van a 'default'.
+"""
+
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_replica_reads: ContextVar[bool] = ContextVar('replica_reads', default=False)
+
+STICKY_KEY_PREFIX = 'replica_sticky'
+
+
+def replica_alias() -> Optional[str]:
+    """Alias de la réplica si está configurada, si no None."""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    if alias and alias in connections.settings:
+        return alias
+    return None
+
+
+class use_replica(ContextDecorator):
+    """
+    Envía las lecturas del bloque a la réplica (si existe).
+
+    Uso:
+        with use_replica():
+            ...
+
+        @use_replica()
+        def handle(self, *args, **options):
+            ...
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._tokens = []
+
+    def _recreate_cm(self):
+        # Una instancia por llamada: el decorador puede usarse desde varios hilos
+        return type(self)(self.enabled)
+
+    def __enter__(self):
+        self._tokens.append(_replica_reads.set(self.enabled))
+        return self
+
+    def __exit__(self, *exc):
+        _replica_reads.reset(self._tokens.pop())
+        return False
+
+
+def reading_from_replica() -> bool:
+    """True si las lecturas del contexto actual van a la réplica."""
+    return _replica_reads.get() and replica_alias() is not None
+
+
+class ReadReplicaRouter:
+    """Router de DATABASE_ROUTERS: lecturas a la réplica solo dentro de use_replica()."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica tienen los mismos datos
+        dbs = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
+
+
+# ----------------------------------------------------------------------
+# Read-your-writes
+# ----------------------------------------------------------------------
+
+def _sticky_key(user_id) -> str:
+    return f"{STICKY_KEY_PREFIX}:{user_id}"
+
+
+def pin_to_primary(user_id, seconds: Optional[int] = None) -> None:
+    """Envía las lecturas del usuario al primario durante `seconds` segundos."""
+    if user_id is None or replica_alias() is None:
+        return
+    if seconds is None:
+        seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+    cache.set(_sticky_key(user_id), 1, timeout=seconds)
+
+
+def is_pinned(user_id) -> bool:
+    """True si el usuario escribió hace menos de REPLICA_STICKY_SECONDS."""
+    if user_id is None:
+        return False
+    return cache.get(_sticky_key(user_id)) is not None
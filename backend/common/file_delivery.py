@@ -0,0 +1,476 @@
+"""
+Servicio unificado de entrega de archivos almacenados.
+
+Reemplaza la lógica duplicada de los endpoints retrieve_file (facturas de
+costo, notas de crédito, facturas de venta, comprobantes de pago), que
+descargaban el archivo completo de Cloudinary en memoria probando varias
+combinaciones de public_id/tipo en cada request.
+
+Características:
+- Resolución cacheada: la combinación public_id/type/format que funcionó para
+  un archivo se guarda en el cache, así que solo la primera vista prueba
+  variantes.
+- Dos modos para archivos remotos (settings.FILE_DELIVERY_MODE o ?delivery=):
+  - 'redirect': 302 a una URL firmada de Cloudinary que expira en
+    FILE_DELIVERY_SIGNED_URL_TTL segundos. El worker queda libre de inmediato.
+  - 'proxy': el archivo se descarga en streaming a un cache LRU en disco y se
+    sirve desde ahí por chunks.
+- Respuestas con ETag / If-None-Match (304), Accept-Ranges y Range (206).
+
+Uso en un ViewSet:
+
+    return FileDeliveryService().serve(
+        request,
+        storage_path=invoice.uploaded_file.path,
+        filename='FACTURA.pdf',
+        content_type='application/pdf',
+        etag=invoice.uploaded_file.sha256,
+    )
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from typing import Dict, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import storages
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from common.utils import etag_matches
+
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_CACHE_PREFIX = 'file_delivery:resolved'
+RESOLUTION_CACHE_TIMEOUT = 7 * 24 * 3600
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileNotAvailable(Exception):
+    """El archivo no existe en el almacenamiento."""
+
+
+class FileSourceError(Exception):
+    """Error del almacenamiento remoto (red, timeout, estado inesperado)."""
+
+    def __init__(self, message: str, status_code: int = status.HTTP_502_BAD_GATEWAY):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LocalDiskLRUCache:
+    """
+    Cache LRU en disco para archivos remotos vistos recientemente.
+
+    La recencia se guarda en el mtime de cada archivo (se actualiza en cada
+    hit), así que el cache se comparte entre workers del mismo contenedor sin
+    estado adicional. Al superar max_bytes se eliminan los menos recientes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key: str) -> Optional[str]:
+        """Retorna la ruta del archivo cacheado (marcándolo como usado) o None."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, chunks: Iterator[bytes]) -> str:
+        """Escribe el contenido por chunks y lo publica de forma atómica."""
+        path = self.path_for(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, 'wb') as fh:
+                for chunk in chunks:
+                    if chunk:
+                        fh.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Elimina los archivos menos recientes hasta quedar bajo max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith('.part'):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+class StorageFileSource:
+    """Archivos en un storage de Django que se puede abrir (filesystem local)."""
+
+    remote = False
+
+    def __init__(self, storage=None):
+        self.storage = storage or storages['default']
+
+    def open(self, storage_path: str):
+        if not self.storage.exists(storage_path):
+            raise FileNotAvailable(storage_path)
+        return self.storage.open(storage_path, 'rb')
+
+    def iter_content(self, storage_path: str) -> Iterator[bytes]:
+        with self.open(storage_path) as fh:
+            for chunk in iter(lambda: fh.read(STREAM_CHUNK_SIZE), b''):
+                yield chunk
+
+    def signed_url(self, storage_path: str, expires_in: int) -> Optional[str]:
+        # El storage local no tiene URLs firmadas: siempre se sirve por proxy
+        return None
+
+
+class CloudinaryFileSource:
+    """Archivos raw en Cloudinary, resueltos una vez y cacheados."""
+
+    remote = True
+    DELIVERY_TYPES = ('authenticated', 'upload')
+
+    def __init__(self, timeout: int = 30):
+        self.timeout = timeout
+
+    # ------------------------------------------------------------------ #
+    # Resolución de public_id/type/format
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _resolution_key(storage_path: str) -> str:
+        return f"{RESOLUTION_CACHE_PREFIX}:{hashlib.sha1(storage_path.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def candidates(storage_path: str):
+        """
+        Variantes posibles para un archivo.
+
+        Los archivos raw se guardan SIN extensión en el public_id, pero algunas
+        subidas antiguas la conservan: se prueba primero sin extensión.
+        """
+        base_name, ext = os.path.splitext(storage_path)
+        ext_clean = ext.lstrip('.')
+        public_ids = [base_name, storage_path] if ext else [storage_path]
+
+        for public_id in public_ids:
+            fmt = None
+            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
+                fmt = ext_clean
+            for delivery_type in CloudinaryFileSource.DELIVERY_TYPES:
+                yield {'public_id': public_id, 'type': delivery_type, 'format': fmt, 'resource_type': 'raw'}
+
+    @staticmethod
+    def _delivery_url(resolved: Dict) -> str:
+        import cloudinary.utils
+
+        options = {
+            'resource_type': resolved['resource_type'],
+            'type': resolved['type'],
+            'secure': True,
+            'sign_url': True,
+        }
+        if resolved['format']:
+            options['format'] = resolved['format']
+        url, _ = cloudinary.utils.cloudinary_url(resolved['public_id'], **options)
+        return url
+
+    def resolve(self, storage_path: str) -> Dict:
+        """Retorna la variante que existe en Cloudinary (cacheada por archivo)."""
+        import requests
+
+        key = self._resolution_key(storage_path)
+        resolved = cache.get(key)
+        if resolved:
+            return resolved
+
+        last_status = None
+        for candidate in self.candidates(storage_path):
+            try:
+                response = requests.head(self._delivery_url(candidate), timeout=self.timeout, allow_redirects=True)
+            except requests.exceptions.Timeout:
+                raise FileSourceError('Timeout al consultar Cloudinary', status.HTTP_504_GATEWAY_TIMEOUT)
+            except requests.exceptions.RequestException as exc:
+                raise FileSourceError(f'Error de conexión con Cloudinary: {exc}')
+
+            if response.status_code == 200:
+                cache.set(key, candidate, RESOLUTION_CACHE_TIMEOUT)
+                logger.info(f"[FILE_DELIVERY] {storage_path} resuelto como {candidate}")
+                return candidate
+            last_status = response.status_code
+            logger.debug(f"[FILE_DELIVERY] {candidate['public_id']} ({candidate['type']}): {response.status_code}")
+
+        if last_status in (None, 404):
+            raise FileNotAvailable(storage_path)
+        raise FileSourceError(f'Error al descargar archivo de Cloudinary: {last_status}')
+
+    def forget(self, storage_path: str) -> None:
+        cache.delete(self._resolution_key(storage_path))
+
+    # ------------------------------------------------------------------ #
+    # Acceso
+    # ------------------------------------------------------------------ #
+
+    def signed_url(self, storage_path: str, expires_in: int) -> Optional[str]:
+        """URL de descarga firmada que expira en expires_in segundos."""
+        from cloudinary.utils import private_download_url
+
+        resolved = self.resolve(storage_path)
+        return private_download_url(
+            resolved['public_id'],
+            resolved['format'] or '',
+            resource_type=resolved['resource_type'],
+            type=resolved['type'],
+            expires_at=int(time.time()) + expires_in,
+        )
+
+    def iter_content(self, storage_path: str) -> Iterator[bytes]:
+        """Descarga el archivo por chunks (sin cargarlo completo en memoria)."""
+        import requests
+
+        resolved = self.resolve(storage_path)
+        try:
+            response = requests.get(self._delivery_url(resolved), stream=True, timeout=self.timeout)
+        except requests.exceptions.Timeout:
+            raise FileSourceError('Timeout al descargar el archivo. Intente nuevamente.', status.HTTP_504_GATEWAY_TIMEOUT)
+        except requests.exceptions.RequestException as exc:
+            raise FileSourceError(f'Error de conexión con Cloudinary: {exc}')
+
+        with response:
+            if response.status_code == 404:
+                # La variante cacheada ya no existe (archivo re-subido o borrado)
+                self.forget(storage_path)
+                raise FileNotAvailable(storage_path)
+            if response.status_code != 200:
+                raise FileSourceError(f'Error al descargar archivo de Cloudinary: {response.status_code}')
+            yield from response.iter_content(STREAM_CHUNK_SIZE)
+
+
+def default_source():
+    """Fuente según la configuración: Cloudinary o el storage por defecto."""
+    if getattr(settings, 'USE_CLOUDINARY', False):
+        return CloudinaryFileSource()
+    return StorageFileSource()
+
+
+def default_disk_cache() -> Optional[LocalDiskLRUCache]:
+    directory = getattr(settings, 'FILE_DELIVERY_CACHE_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'nextops_file_cache'
+    )
+    max_mb = getattr(settings, 'FILE_DELIVERY_CACHE_MAX_MB', 200)
+    if not max_mb:
+        return None
+    try:
+        return LocalDiskLRUCache(directory, max_mb * 1024 * 1024)
+    except OSError as exc:
+        logger.warning(f"[FILE_DELIVERY] Cache en disco deshabilitado ({directory}): {exc}")
+        return None
+
+
+class FileDeliveryService:
+    """
+    Sirve archivos almacenados con ETag, Range y cache local.
+
+    Args:
+        source: Fuente de archivos (por defecto según USE_CLOUDINARY)
+        disk_cache: Cache LRU para fuentes remotas (por defecto según
+            settings; con FILE_DELIVERY_CACHE_MAX_MB=0 no se cachea)
+        mode: 'proxy' o 'redirect' (por defecto settings.FILE_DELIVERY_MODE)
+    """
+
+    def __init__(self, source=None, disk_cache: Optional[LocalDiskLRUCache] = None,
+                 mode: Optional[str] = None):
+        self.source = source or default_source()
+        self.disk_cache = disk_cache or default_disk_cache()
+        self.mode = mode or getattr(settings, 'FILE_DELIVERY_MODE', 'proxy')
+        self.signed_url_ttl = getattr(settings, 'FILE_DELIVERY_SIGNED_URL_TTL', 300)
+
+    def serve(self, request, storage_path: str, filename: str, content_type: str,
+              etag: Optional[str] = None, not_found_detail: Optional[str] = None):
+        """
+        Construye la respuesta para descargar o previsualizar un archivo.
+
+        Args:
+            request: Request de DRF
+            storage_path: Ruta/public_id guardado en el modelo
+            filename: Nombre para Content-Disposition
+            content_type: MIME type de la respuesta
+            etag: Identificador del contenido (ej: sha256 del UploadedFile).
+                Si no se indica se deriva de storage_path (las rutas no se
+                reutilizan entre archivos distintos).
+            not_found_detail: Mensaje del 404
+
+        Query params:
+            download: 'true' para Content-Disposition attachment
+            delivery: 'redirect' o 'proxy' para forzar el modo
+        """
+        etag = quote_etag(etag or hashlib.sha1(storage_path.encode('utf-8')).hexdigest())
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if etag_matches(if_none_match, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        mode = request.query_params.get('delivery') or self.mode
+        download_flag = str(request.query_params.get('download', '')).lower()
+        disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
+
+        try:
+            if mode == 'redirect' and self.source.remote:
+                url = self.source.signed_url(storage_path, self.signed_url_ttl)
+                if url:
+                    response = HttpResponseRedirect(url)
+                    response['Cache-Control'] = f'private, max-age={max(self.signed_url_ttl - 30, 0)}'
+                    return response
+
+            fileobj = self._open(storage_path)
+        except FileNotAvailable:
+            logger.warning(f"[FILE_DELIVERY] Archivo no encontrado: {storage_path}")
+            return Response(
+                {'detail': not_found_detail or 'Archivo no encontrado en el almacenamiento.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except FileSourceError as exc:
+            logger.error(f"[FILE_DELIVERY] {storage_path}: {exc}")
+            return Response({'detail': str(exc)}, status=exc.status_code)
+
+        response = self._file_response(request, fileobj, content_type, etag)
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+        return response
+
+    def _open(self, storage_path: str):
+        """Abre el archivo desde el storage local o desde el cache en disco."""
+        if not self.source.remote:
+            return self.source.open(storage_path)
+
+        if self.disk_cache is None:
+            # Sin cache: descargar a un temporal anónimo para poder servir Range
+            tmp = tempfile.TemporaryFile()
+            for chunk in self.source.iter_content(storage_path):
+                tmp.write(chunk)
+            tmp.seek(0)
+            return tmp
+
+        cached_path = self.disk_cache.get(storage_path)
+        if cached_path is None:
+            logger.info(f"[FILE_DELIVERY] Cache miss, descargando {storage_path}")
+            cached_path = self.disk_cache.put(storage_path, self.source.iter_content(storage_path))
+        return open(cached_path, 'rb')
+
+    @staticmethod
+    def _file_size(fileobj) -> int:
+        if hasattr(fileobj, 'size') and fileobj.size is not None:
+            return fileobj.size
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        return size
+
+    @staticmethod
+    def _stream(fileobj, start: int, length: int) -> Iterator[bytes]:
+        try:
+            fileobj.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = fileobj.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            fileobj.close()
+
+    @staticmethod
+    def parse_range(header: str, size: int):
+        """
+        Interpreta un header Range de un solo rango.
+
+        Returns:
+            (inicio, fin_inclusivo), None si el header no aplica (se sirve el
+            archivo completo) o False si el rango no es satisfacible.
+        """
+        match = RANGE_RE.match(header.strip()) if header else None
+        if not match:
+            return None
+        start, end = match.groups()
+        if start == '' and end == '':
+            return None
+        if start == '':
+            # Sufijo: los últimos N bytes
+            length = int(end)
+            if length == 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    def _file_response(self, request, fileobj, content_type: str, etag: str):
+        size = self._file_size(fileobj)
+        byte_range = None
+
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = self.parse_range(range_header, size)
+
+        if byte_range is False:
+            fileobj.close()
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                self._stream(fileobj, start, end - start + 1),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = StreamingHttpResponse(self._stream(fileobj, 0, size), content_type=content_type)
+            response['Content-Length'] = size
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
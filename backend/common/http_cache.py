@@ -0,0 +1,190 @@
+"""
+GET condicional y cache de respuestas para acciones de DRF.
+
+El SPA vuelve a pedir constantemente catálogos (tipos de costo, proveedores,
+patrones) y las cards del dashboard, que casi nunca cambian entre pedidos.
+El decorador cache_response() hace que una acción:
+
+1. Calcule un ETag a partir de la ruta, los query params, el rol (o el
+   usuario) y las versiones de los modelos de los que depende
+   (common.model_versions). Con If-None-Match (o If-Modified-Since) vigente
+   responde 304 sin ejecutar la vista ni el serializer.
+2. Opcionalmente guarde response.data en el cache (Redis en producción) bajo
+   esa misma clave, de modo que un cliente sin la versión local recibe la
+   respuesta sin recalcularla.
+3. Agregue ETag, Last-Modified y Cache-Control: private, no-cache (el
+   navegador siempre revalida; el 304 es casi gratis).
+
+Cuando cambia cualquiera de los modelos de `depends_on` (post_save /
+post_delete, o bump_model_version() tras updates masivos) la versión cambia,
+la clave cambia y las entradas viejas expiran solas.
+
+Cada respuesta suma un contador por acción (not_modified, hit, miss); ver
+cache_stats() y el comando http_cache_stats.
+
+Uso:
+    class CostTypeViewSet(viewsets.ModelViewSet):
+        @cache_response(depends_on=['catalogs.CostType', 'catalogs.CostCategory'])
+        def list(self, request, *args, **kwargs):
+            return super().list(request, *args, **kwargs)
+
+        @action(detail=False, methods=['get'])
+        @cache_response(depends_on=['catalogs.CostType'], vary_on='user')
+        def activos(self, request):
+            ...
+"""
+
+import functools
+import hashlib
+import logging
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from common.model_versions import get_model_versions, get_models_last_modified
+from common.utils import etag_matches
+
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_PREFIX = 'http_cache'
+STATS_KEY_PREFIX = 'http_cache_stats'
+OUTCOMES = ('not_modified', 'hit', 'miss')
+VARY_OPTIONS = ('role', 'user', None)
+
+# Acciones decoradas (para reportar métricas de todas)
+_registry = set()
+
+
+def _vary_value(request, vary_on: Optional[str]) -> str:
+    user = getattr(request, 'user', None)
+    if vary_on is None:
+        return '-'
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    if vary_on == 'user':
+        return f"user:{user.pk}"
+    return f"role:{getattr(user, 'role', '')}"
+
+
+def response_cache_key(name: str, request, depends_on: Iterable, vary_on: Optional[str], view_kwargs: Dict) -> str:
+    """Clave de cache de la respuesta; también es la base del ETag."""
+    versions = get_model_versions(depends_on)
+    version_token = '.'.join(str(versions[label]) for label in sorted(versions))
+    raw = '|'.join([
+        request.path,
+        '&'.join(f"{k}={v}" for k in sorted(request.query_params) for v in request.query_params.getlist(k)),
+        _vary_value(request, vary_on),
+        '&'.join(f"{k}={view_kwargs[k]}" for k in sorted(view_kwargs)),
+    ])
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f"{RESPONSE_CACHE_PREFIX}:{name}:{version_token}:{digest}"
+
+
+def _record(name: str, outcome: str) -> None:
+    key = f"{STATS_KEY_PREFIX}:{name}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_stats(names: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """
+    Métricas por acción: {'nombre': {'not_modified', 'hit', 'miss',
+    'requests', 'hit_rate'}}. hit_rate cuenta 304 y respuestas del cache.
+    """
+    names = sorted(names if names is not None else _registry)
+    keys = {f"{STATS_KEY_PREFIX}:{name}:{outcome}": (name, outcome) for name in names for outcome in OUTCOMES}
+    found = cache.get_many(list(keys))
+
+    stats = {name: {outcome: 0 for outcome in OUTCOMES} for name in names}
+    for key, (name, outcome) in keys.items():
+        stats[name][outcome] = found.get(key, 0)
+    for values in stats.values():
+        values['requests'] = sum(values[outcome] for outcome in OUTCOMES)
+        served = values['not_modified'] + values['hit']
+        values['hit_rate'] = round(served / values['requests'], 4) if values['requests'] else 0.0
+    return stats
+
+
+def reset_cache_stats(names: Optional[Iterable[str]] = None) -> None:
+    names = names if names is not None else _registry
+    cache.delete_many([f"{STATS_KEY_PREFIX}:{name}:{outcome}" for name in names for outcome in OUTCOMES])
+
+
+def _not_modified(request, etag: str, last_modified: float) -> bool:
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # If-None-Match tiene precedencia sobre If-Modified-Since (RFC 9110)
+        return etag_matches(if_none_match, etag)
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def cache_response(depends_on: Iterable, vary_on: Optional[str] = 'role',
+                   cache_body: bool = True, timeout: Optional[int] = None,
+                   name: Optional[str] = None):
+    """
+    Decorador para acciones GET de viewsets/APIViews.
+
+    Args:
+        depends_on: Modelos (clases o 'app.Model') cuyo cambio invalida la
+            respuesta. Deben estar en common.signals.VERSIONED_MODELS.
+        vary_on: 'role' (default: la respuesta depende solo del rol),
+            'user' (depende del usuario) o None (igual para todos).
+        cache_body: Guardar response.data en el cache además del ETag.
+        timeout: Segundos en el cache (default: settings.HTTP_CACHE_TIMEOUT).
+        name: Nombre para métricas (default: Vista.metodo).
+    """
+    if vary_on not in VARY_OPTIONS:
+        raise ValueError(f"vary_on debe ser uno de {VARY_OPTIONS}")
+    depends_on = list(depends_on)
+
+    def decorator(func):
+        metric_name = name or f"{func.__qualname__.split('.')[0]}.{func.__name__}"
+        _registry.add(metric_name)
+
+        @functools.wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not getattr(settings, 'HTTP_CACHE_ENABLED', True):
+                return func(view, request, *args, **kwargs)
+
+            key = response_cache_key(metric_name, request, depends_on, vary_on, kwargs)
+            etag = quote_etag(hashlib.sha1(key.encode('utf-8')).hexdigest())
+            last_modified = get_models_last_modified(depends_on)
+            headers = {
+                'ETag': etag,
+                'Last-Modified': http_date(last_modified),
+                'Cache-Control': 'private, no-cache',
+            }
+
+            if _not_modified(request, etag, last_modified):
+                _record(metric_name, 'not_modified')
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            if cache_body:
+                data = cache.get(key)
+                if data is not None:
+                    _record(metric_name, 'hit')
+                    return Response(data, headers=headers)
+
+            _record(metric_name, 'miss')
+            response = func(view, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            if cache_body and isinstance(response, Response):
+                cache.set(key, response.data, timeout=timeout or getattr(settings, 'HTTP_CACHE_TIMEOUT', 300))
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,45 @@
+"""
+Muestra las métricas del cache de respuestas HTTP (common/http_cache.py).
+
+Uso:
+    python manage.py http_cache_stats          # Tabla por acción
+    python manage.py http_cache_stats --reset  # Reiniciar contadores
+
+Los contadores viven en el cache compartido (Redis en producción), así que
+suman lo de todos los workers.
+"""
+
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common import http_cache
+
+
+class Command(BaseCommand):
+    help = 'Tasa de aciertos (304 + cache) de las acciones con cache_response'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reiniciar los contadores',
+        )
+
+    def handle(self, *args, **options):
+        # Importar las URLs registra las acciones decoradas
+        import_module(settings.ROOT_URLCONF)
+
+        if options['reset']:
+            http_cache.reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✅ Contadores reiniciados'))
+            return
+
+        stats = http_cache.cache_stats()
+        self.stdout.write(f"{'acción':<48} {'requests':>9} {'304':>7} {'hit':>7} {'miss':>7} {'hit %':>7}")
+        for name, values in stats.items():
+            self.stdout.write(
+                f"{name:<48} {values['requests']:>9} {values['not_modified']:>7} "
+                f"{values['hit']:>7} {values['miss']:>7} {values['hit_rate'] * 100:>6.1f}%"
+            )
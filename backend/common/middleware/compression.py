@@ -0,0 +1,129 @@
+"""
+Compression Middleware
+Comprime respuestas de la API (JSON, CSV, texto) con brotli o gzip según
+Accept-Encoding, solo por encima de COMPRESSION_MIN_SIZE bytes.
+"""
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/problem+json',
+    'text/',
+)
+
+ENCODING_RE = re.compile(r'\s*([a-z0-9*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.IGNORECASE)
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """'br;q=1.0, gzip;q=0.8' -> {'br': 1.0, 'gzip': 0.8}"""
+    encodings = {}
+    for part in header.split(','):
+        match = ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            q = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        encodings[match.group(1).lower()] = q
+    return encodings
+
+
+def choose_encoding(header: str):
+    """Codificación a usar ('br', 'gzip') o None si el cliente no acepta ninguna."""
+    accepted = parse_accept_encoding(header or '')
+    wildcard = accepted.get('*', 0.0)
+    candidates = [('gzip', accepted.get('gzip', wildcard))]
+    if brotli is not None:
+        # A igual q se prefiere brotli (mejor ratio para JSON)
+        candidates.insert(0, ('br', accepted.get('br', wildcard)))
+    encoding, q = max(candidates, key=lambda item: item[1])
+    return encoding if q > 0 else None
+
+
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresión negociada de respuestas.
+
+    A diferencia de django.middleware.gzip.GZipMiddleware:
+    - Negocia brotli (si el paquete está instalado) o gzip respetando los q
+      de Accept-Encoding.
+    - Umbral configurable (COMPRESSION_MIN_SIZE, default 1024 bytes): las
+      respuestas chicas no compensan el costo de CPU.
+    - Solo comprime tipos de texto: PDFs, imágenes y xlsx ya están
+      comprimidos.
+
+    Igual que GZipMiddleware: agrega Vary: Accept-Encoding, debilita el ETag
+    (W/) y no toca respuestas que ya traen Content-Encoding.
+    """
+
+    max_random_bytes = 100  # Mitigación BREACH de Django para gzip
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            if encoding == 'br':
+                response.streaming_content = _brotli_sequence(response.streaming_content, self.brotli_quality)
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes
+                )
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
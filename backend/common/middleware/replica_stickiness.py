@@ -0,0 +1,31 @@
+"""
+Replica Stickiness Middleware
+Read-your-writes: después de una escritura, las lecturas del usuario van al
+primario durante REPLICA_STICKY_SECONDS (ver common/db_router.py).
+"""
+from common.db_router import pin_to_primary, replica_alias
+
+UNSAFE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Fija al usuario al primario después de cada request de escritura exitoso.
+
+    La autenticación JWT ocurre dentro de DRF; DRF copia el usuario
+    autenticado al HttpRequest, así que aquí ya está disponible después de
+    get_response(). Sin réplica configurada no hace nada.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if request.method in UNSAFE_METHODS and response.status_code < 400 and replica_alias():
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.pk)
+
+        return response
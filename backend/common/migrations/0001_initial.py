@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(help_text="Modelo y modo de la purga: 'app_label.Model:deleted', ':all' u ':orphans'", max_length=150, unique=True)),
+                ('last_pk', models.BigIntegerField(default=0)),
+                ('cutoff', models.DateTimeField(blank=True, help_text='Corte de fecha con el que se inició la purga', null=True)),
+                ('status', models.CharField(choices=[('running', 'En curso'), ('completed', 'Completada')], default='running', max_length=20)),
+                ('deleted_count', models.IntegerField(default=0)),
+                ('skipped_count', models.IntegerField(default=0)),
+                ('chunks', models.IntegerField(default=0)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de purga',
+                'verbose_name_plural': 'Checkpoints de purga',
+                'db_table': 'common_purge_checkpoint',
+            },
+        ),
+    ]
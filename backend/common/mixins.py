@@ -3,10 +3,13 @@ Custom mixins for NextOps project.
 
 Mixins:
     - RoleBasedFieldValidationMixin: Validates editable fields based on user role
+    - ReplicaReadMixin: Sends read-only actions to the read replica (if configured)
 """
 from rest_framework import status
 from rest_framework.response import Response
 
+from common.db_router import is_pinned, replica_alias, use_replica
+
 
 class RoleBasedFieldValidationMixin:
     """
@@ -97,3 +100,43 @@ class RoleBasedFieldValidationMixin:
             )
 
         return super().partial_update(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Mixin to run read-only actions against the read replica.
+
+    Usage in ViewSet:
+        class OTViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+            replica_actions = {'list', 'retrieve', 'statistics'}
+
+    For APIViews (no `action`), the handler method name is used ('get').
+
+    Only safe methods (GET/HEAD) are routed, and only when the user has not
+    written recently (see ReplicaStickinessMiddleware). Without a replica
+    configured this mixin does nothing.
+    """
+
+    replica_actions = frozenset({'list', 'retrieve'})
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        action = getattr(self, 'action', None) or request.method.lower()
+        if (
+            request.method in ('GET', 'HEAD')
+            and action in self.replica_actions
+            and replica_alias() is not None
+            and not is_pinned(getattr(request.user, 'pk', None))
+        ):
+            self._replica_context = use_replica()
+            self._replica_context.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        try:
+            return super().finalize_response(request, response, *args, **kwargs)
+        finally:
+            context = getattr(self, '_replica_context', None)
+            if context is not None:
+                self._replica_context = None
+                context.__exit__(None, None, None)
@@ -0,0 +1,143 @@
+"""
+Contadores de versión por modelo.
+
+Cada modelo registrado con track_model_versions() mantiene un contador en el
+cache por defecto (Redis en producción) que se incrementa en cada
+post_save/post_delete. Las capas de cache construyen sus claves a partir de
+estas versiones: cuando un modelo cambia, las claves viejas simplemente dejan
+de usarse y expiran solas, sin necesidad de borrarlas una por una.
+
+Junto al contador se guarda la hora del último cambio (get_models_last_modified),
+que common/http_cache.py usa para el header Last-Modified.
+
+Los updates masivos (QuerySet.update / bulk_update) no disparan signals; quien
+los use y necesite invalidar debe llamar bump_model_version() explícitamente.
+"""
+
+import logging
+import time
+from typing import Dict, Iterable
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = 'model_version'
+MODIFIED_KEY_PREFIX = 'model_modified'
+
+
+def _resolve_model(model):
+    """Acepta una clase de modelo o un label 'app_label.ModelName'."""
+    if isinstance(model, str):
+        return apps.get_model(model)
+    return model
+
+
+def version_key(model) -> str:
+    """Clave de cache donde vive el contador de versión del modelo."""
+    model = _resolve_model(model)
+    return f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}"
+
+
+def modified_key(model) -> str:
+    """Clave de cache con el timestamp del último cambio del modelo."""
+    model = _resolve_model(model)
+    return f"{MODIFIED_KEY_PREFIX}:{model._meta.label_lower}"
+
+
+def _seed_version() -> int:
+    """
+    Valor inicial de un contador.
+
+    Se usa el timestamp en milisegundos para que, si el contador se pierde
+    (reinicio de Redis, eviction), la nueva secuencia nunca coincida con
+    versiones ya usadas en claves cacheadas.
+    """
+    return int(time.time() * 1000)
+
+
+def get_model_version(model) -> int:
+    """Retorna la versión actual del modelo, inicializándola si no existe."""
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_model_versions(models: Iterable) -> Dict[str, int]:
+    """
+    Retorna las versiones de varios modelos con un solo round-trip al cache.
+
+    Returns:
+        Dict {label_lower: version}
+    """
+    keys = {version_key(model): _resolve_model(model)._meta.label_lower for model in models}
+    found = cache.get_many(list(keys))
+
+    versions = {}
+    for key, label in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = get_model_version(apps.get_model(label))
+        versions[label] = version
+    return versions
+
+
+def get_models_last_modified(models: Iterable) -> float:
+    """
+    Timestamp (epoch) del cambio más reciente entre varios modelos.
+
+    Si no hay registro (primer uso o eviction) se siembra con la hora actual:
+    es seguro, porque solo puede adelantar la fecha y forzar una descarga.
+    """
+    keys = [modified_key(model) for model in models]
+    found = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if found.get(key) is None:
+            cache.add(key, now, timeout=None)
+            found[key] = cache.get(key) or now
+    return max(found[key] for key in keys) if keys else now
+
+
+def bump_model_version(model) -> None:
+    """Incrementa la versión del modelo, invalidando todo lo cacheado con ella."""
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # La clave no existe (primer uso o eviction): sembrar una versión nueva
+        cache.set(key, _seed_version(), timeout=None)
+    cache.set(modified_key(model), time.time(), timeout=None)
+
+
+def _bump_on_change(sender, **kwargs):
+    """
+    Handler de post_save/post_delete.
+
+    Se incrementa de inmediato (para que el mismo proceso no lea datos
+    viejos) y de nuevo al hacer commit, para que un lector concurrente que
+    cacheó la foto previa al commit no la deje fijada bajo la versión nueva.
+    """
+    bump_model_version(sender)
+    transaction.on_commit(lambda: bump_model_version(sender))
+
+
+def track_model_versions(*models) -> None:
+    """
+    Conecta los signals que mantienen el contador de versión de cada modelo.
+
+    Es idempotente: llamar varias veces con el mismo modelo no duplica handlers.
+    """
+    for model in models:
+        model = _resolve_model(model)
+        uid = f"model_versions:{model._meta.label_lower}"
+        post_save.connect(_bump_on_change, sender=model, dispatch_uid=f"{uid}:save", weak=False)
+        post_delete.connect(_bump_on_change, sender=model, dispatch_uid=f"{uid}:delete", weak=False)
+        logger.debug(f"Versionado de cache activo para {model._meta.label}")
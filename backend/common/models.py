@@ -61,3 +61,41 @@ class SoftDeleteModel(models.Model):
         self.is_deleted = False
         self.deleted_at = None
         self.save()
+
+
+class PurgeCheckpoint(TimeStampedModel):
+    """
+    Progreso de una purga por lotes (ver common/purge.py).
+
+    Guarda la última clave procesada para que una purga interrumpida
+    continúe donde quedó, con el mismo corte de fecha.
+    """
+    STATUS_CHOICES = [
+        ('running', 'En curso'),
+        ('completed', 'Completada'),
+    ]
+
+    key = models.CharField(
+        max_length=150,
+        unique=True,
+        help_text="Modelo y modo de la purga: 'app_label.Model:deleted', ':all' u ':orphans'"
+    )
+    last_pk = models.BigIntegerField(default=0)
+    cutoff = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Corte de fecha con el que se inició la purga"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    deleted_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    chunks = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'common_purge_checkpoint'
+        verbose_name = 'Checkpoint de purga'
+        verbose_name_plural = 'Checkpoints de purga'
+
+    def __str__(self):
+        return f"{self.key} ({self.status}, pk>{self.last_pk})"
@@ -1,8 +1,14 @@
 """
 Custom pagination classes for NextOps project.
 """
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -64,3 +70,102 @@ class SmallResultsSetPagination(PageNumberPagination):
             'current_page': self.page.number,
             'results': data
         })
+
+
+class KeysetPagination:
+    """
+    Paginación por llave (keyset / seek) para listados grandes.
+
+    En lugar de OFFSET (que recorre y descarta todas las filas anteriores)
+    filtra por la posición de la última fila de la página: con orden
+    (fecha, id) la siguiente página es WHERE (fecha, id) > (ultima_fecha,
+    ultimo_id). El costo por página es constante y las filas insertadas
+    mientras se navega no desplazan páginas. No calcula `count`; los totales
+    se piden aparte.
+
+    `ordering` debe terminar en un campo único (normalmente 'id') y sus
+    campos no deben ser nulos (usar Coalesce en una anotación si hace falta).
+    Los campos con '-' se recorren en orden descendente.
+
+    Respuesta:
+        {'next': url|None, 'next_cursor': str|None, 'page_size': n, 'results': [...]}
+    """
+
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+
+    def __init__(self, ordering, page_size=None):
+        self.ordering = list(ordering)
+        if page_size is not None:
+            self.page_size = page_size
+
+    @staticmethod
+    def encode_cursor(values):
+        raw = json.dumps([str(value) for value in values]).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(token):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        except (ValueError, UnicodeError):
+            raise NotFound('Cursor inválido')
+        if not isinstance(values, list):
+            raise NotFound('Cursor inválido')
+        return values
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _after(self, values):
+        """Q de las filas posteriores a `values` según self.ordering."""
+        if len(values) != len(self.ordering):
+            raise NotFound('Cursor inválido')
+        condition = Q(pk__in=[])
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        token = request.query_params.get(self.cursor_query_param)
+
+        queryset = queryset.order_by(*self.ordering)
+        if token:
+            queryset = queryset.filter(self._after(self.decode_cursor(token)))
+
+        # Una fila extra para saber si hay página siguiente
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        rows = rows[:self.limit]
+        self.next_cursor = None
+        if self.has_next:
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field.lstrip('-')) for field in self.ordering)
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data, **extra):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'page_size': self.limit,
+            **extra,
+            'results': data,
+        })
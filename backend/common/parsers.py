@@ -0,0 +1,42 @@
+"""
+Parser JSON rápido basado en orjson (pareja de common.renderers.ORJSONRenderer).
+
+Devuelve los mismos tipos que rest_framework.parsers.JSONParser (números con
+decimales como float, enteros como int). Para cuerpos que orjson no acepta
+(encoding distinto de UTF-8) o que interpretaría distinto (orjson convierte
+a float los enteros de más de 64 bits) delega en el parser de DRF, que
+también genera el mensaje de error de JSON inválido.
+"""
+
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from common.renderers import ORJSONRenderer, orjson
+
+# 20+ dígitos seguidos: posible entero fuera de 64 bits (también calza dentro
+# de strings, en cuyo caso solo se pierde la aceleración)
+BIG_INT_RE = re.compile(rb'\d{20}')
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser que decodifica con orjson."""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if BIG_INT_RE.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Mensaje de error estándar de DRF
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,400 @@
+"""
+Motor de purga por lotes para modelos con soft delete.
+
+El borrado con el ORM (QuerySet.delete()) carga todos los objetos, resuelve
+las cascadas en Python y ejecuta todo en una sola transacción larga: en
+tablas grandes consume mucha memoria y bloquea filas durante minutos.
+
+SoftDeletePurgeEngine en cambio:
+- Recorre las filas en orden de clave primaria, en lotes de `batch_size`.
+- Cada lote es una transacción corta: las dependencias se resuelven con SQL
+  por conjuntos a partir de los metadatos del modelo (CASCADE → DELETE,
+  SET_NULL → UPDATE, M2M → DELETE en la tabla intermedia).
+- Filas referenciadas por relaciones PROTECT/RESTRICT se omiten (no se
+  pueden borrar sin romper la integridad) y se reportan como omitidas.
+- Los archivos de FileFields de las filas borradas se eliminan del storage
+  después del commit de cada lote.
+- Guarda un checkpoint (common.PurgeCheckpoint) después de cada lote: si la
+  purga se interrumpe, la siguiente ejecución continúa desde la última clave
+  con el mismo corte de fecha.
+- Pausa `sleep_seconds` entre lotes para no saturar la base de datos.
+
+Los DELETE/UPDATE directos no disparan signals; al terminar cada lote se
+incrementa la versión de cache (common.model_versions) de cada modelo tocado.
+
+Uso:
+    engine = SoftDeletePurgeEngine(batch_size=500, sleep_seconds=0.1)
+    stats = engine.purge(Invoice, older_than=timedelta(days=30))
+    stats = engine.purge_orphans(UploadedFile, path_field='path', older_than=timedelta(days=1))
+"""
+
+import logging
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+from common.models import PurgeCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+class SoftDeletePurgeEngine:
+    """
+    Args:
+        batch_size: Filas por lote (una transacción por lote)
+        sleep_seconds: Pausa entre lotes
+        dry_run: Solo cuenta lo que se borraría, sin modificar nada
+        resume: Continuar desde el checkpoint de una purga interrumpida
+        progress: Callback opcional progress(key, stats) después de cada lote
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        sleep_seconds: float = 0.0,
+        dry_run: bool = False,
+        resume: bool = True,
+        progress: Optional[Callable[[str, Dict], None]] = None,
+    ):
+        self.batch_size = batch_size
+        self.sleep_seconds = sleep_seconds
+        self.dry_run = dry_run
+        self.resume = resume
+        self.progress = progress
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def purge(self, model, older_than: Optional[timedelta] = None, only_deleted: bool = True) -> Dict:
+        """
+        Borra permanentemente filas de un SoftDeleteModel.
+
+        Args:
+            model: Clase del modelo
+            older_than: Solo filas con deleted_at anterior a ahora - older_than
+            only_deleted: False borra TODAS las filas (purga de desarrollo)
+        """
+        key = f"{model._meta.label}:{'deleted' if only_deleted else 'all'}"
+
+        def candidates(cutoff):
+            qs = model._base_manager.all()
+            if only_deleted:
+                qs = qs.filter(is_deleted=True)
+                if cutoff is not None:
+                    qs = qs.filter(deleted_at__lt=cutoff)
+            return qs
+
+        return self._run(
+            key, model, candidates, older_than, path_field=None,
+            # Si la fila se restauró mientras corría la purga, no se borra
+            root_where='is_deleted' if only_deleted else None,
+        )
+
+    def purge_orphans(self, model, path_field: Optional[str] = None,
+                      older_than: Optional[timedelta] = None) -> Dict:
+        """
+        Borra filas que ninguna otra tabla referencia (p. ej. UploadedFile
+        cuya factura ya fue purgada) y, si se indica, el archivo en
+        `path_field` dentro del storage por defecto.
+
+        Args:
+            older_than: Solo filas con created_at anterior a ahora - older_than,
+                para no competir con cargas en curso que aún no crean la factura
+        """
+        key = f"{model._meta.label}:orphans"
+
+        def candidates(cutoff):
+            qs = model._base_manager.all()
+            for rel in self._reverse_relations(model):
+                if rel.many_to_many:
+                    through = rel.through
+                    fk = self._fk_to(through, model)
+                    qs = qs.filter(~Exists(through._base_manager.filter(**{fk.name: OuterRef('pk')})))
+                else:
+                    target = rel.field.target_field.attname
+                    qs = qs.filter(~Exists(
+                        rel.related_model._base_manager.filter(**{rel.field.name: OuterRef(target)})
+                    ))
+            if cutoff is not None and hasattr(model, 'created_at'):
+                qs = qs.filter(created_at__lt=cutoff)
+            return qs
+
+        return self._run(key, model, candidates, older_than, path_field=path_field)
+
+    # ------------------------------------------------------------------
+    # Recorrido por lotes con checkpoint
+    # ------------------------------------------------------------------
+
+    def _run(self, key, model, candidates, older_than, path_field, root_where=None) -> Dict:
+        start = time.monotonic()
+        checkpoint = self._load_checkpoint(key)
+        cutoff = checkpoint.cutoff if checkpoint else (
+            timezone.now() - older_than if older_than is not None else None
+        )
+        last_pk = checkpoint.last_pk if checkpoint else 0
+
+        stats = {
+            'model': model._meta.label,
+            'deleted': checkpoint.deleted_count if checkpoint else 0,
+            'skipped': checkpoint.skipped_count if checkpoint else 0,
+            'chunks': 0,
+            'files_deleted': 0,
+            'dependents': {},
+            'resumed_from': last_pk if checkpoint else None,
+        }
+
+        while True:
+            ids = list(
+                candidates(cutoff)
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                break
+
+            protected = self._protected_ids(model, ids)
+            deletable = [pk for pk in ids if pk not in protected]
+            stats['skipped'] += len(protected)
+            last_pk = ids[-1]
+
+            if self.dry_run:
+                stats['deleted'] += len(deletable)
+            else:
+                deleted, files = self._delete_chunk(model, deletable, path_field, root_where, stats['dependents'])
+                stats['deleted'] += deleted
+                stats['files_deleted'] += self._delete_files(files)
+                checkpoint = self._save_checkpoint(key, checkpoint, cutoff, last_pk, stats)
+
+            stats['chunks'] += 1
+            if self.progress:
+                self.progress(key, stats)
+            if len(ids) < self.batch_size:
+                break
+            if self.sleep_seconds:
+                time.sleep(self.sleep_seconds)
+
+        if not self.dry_run:
+            self._finish_checkpoint(key, checkpoint, cutoff, last_pk, stats)
+
+        stats['duration_ms'] = int((time.monotonic() - start) * 1000)
+        log = logger.debug if self.dry_run else logger.info
+        log(
+            f"[PURGE] {key}: {stats['deleted']} borrados, {stats['skipped']} omitidos "
+            f"(protegidos), {stats['files_deleted']} archivos, {stats['chunks']} lotes "
+            f"en {stats['duration_ms']}ms"
+        )
+        return stats
+
+    def _load_checkpoint(self, key) -> Optional[PurgeCheckpoint]:
+        if self.dry_run:
+            return None
+        checkpoint = PurgeCheckpoint.objects.filter(key=key).first()
+        if checkpoint and checkpoint.status == 'running' and self.resume:
+            logger.info(f"[PURGE] Reanudando {key} desde pk>{checkpoint.last_pk}")
+            return checkpoint
+        return None
+
+    def _save_checkpoint(self, key, checkpoint, cutoff, last_pk, stats) -> PurgeCheckpoint:
+        values = {
+            'last_pk': last_pk,
+            'cutoff': cutoff,
+            'status': 'running',
+            'deleted_count': stats['deleted'],
+            'skipped_count': stats['skipped'],
+            'chunks': (checkpoint.chunks if checkpoint else 0) + 1,
+            'finished_at': None,
+        }
+        checkpoint, _ = PurgeCheckpoint.objects.update_or_create(key=key, defaults=values)
+        return checkpoint
+
+    def _finish_checkpoint(self, key, checkpoint, cutoff, last_pk, stats) -> None:
+        PurgeCheckpoint.objects.update_or_create(key=key, defaults={
+            'last_pk': last_pk,
+            'cutoff': cutoff,
+            'status': 'completed',
+            'deleted_count': stats['deleted'],
+            'skipped_count': stats['skipped'],
+            'chunks': checkpoint.chunks if checkpoint else 0,
+            'finished_at': timezone.now(),
+        })
+
+    # ------------------------------------------------------------------
+    # Borrado por conjuntos
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _reverse_relations(model) -> List:
+        return [rel for rel in model._meta.related_objects]
+
+    @staticmethod
+    def _fk_to(through, model):
+        for field in through._meta.fields:
+            if field.is_relation and field.related_model is model:
+                return field
+        raise ValueError(f"{through._meta.label} no tiene FK a {model._meta.label}")
+
+    @staticmethod
+    def _is_blocking(rel) -> bool:
+        """Relaciones que impiden borrar al padre (PROTECT, RESTRICT o no soportadas)."""
+        on_delete = rel.field.remote_field.on_delete
+        return on_delete not in (models.CASCADE, models.SET_NULL, models.DO_NOTHING)
+
+    def _protected_ids(self, model, ids) -> Set:
+        """IDs del lote referenciados por alguna relación bloqueante."""
+        protected = set()
+        for rel in self._reverse_relations(model):
+            if rel.many_to_many or not self._is_blocking(rel):
+                continue
+            target = rel.field.target_field
+            if target.primary_key:
+                referenced = rel.related_model._base_manager.filter(
+                    **{f"{rel.field.attname}__in": ids}
+                ).values_list(rel.field.attname, flat=True).distinct()
+                protected.update(referenced)
+            else:
+                protected.update(
+                    model._base_manager.filter(pk__in=ids).filter(Exists(
+                        rel.related_model._base_manager.filter(**{rel.field.name: OuterRef(target.attname)})
+                    )).values_list('pk', flat=True)
+                )
+        return protected
+
+    def _delete_chunk(self, model, ids, path_field, root_where, dependents: Dict):
+        """
+        Borra un lote y sus dependencias en una transacción corta.
+
+        Returns:
+            (filas borradas, archivos a borrar del storage)
+        """
+        if not ids:
+            return 0, []
+
+        files = []
+        touched = set()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                deleted = self._delete_rows(
+                    cursor, model, model._meta.pk, ids, path_field, files, dependents, touched,
+                    root=True, extra_where=root_where,
+                )
+            for touched_model in touched:
+                transaction.on_commit(lambda m=touched_model: bump_model_version(m))
+        return deleted, files
+
+    def _delete_rows(self, cursor, model, key_field, values, path_field, files, dependents, touched,
+                     root=False, extra_where=None) -> int:
+        """
+        DELETE ... WHERE key_field = ANY(values) RETURNING pk, archivos, y
+        resolución recursiva de las filas que dependen de las borradas.
+        """
+        if not values:
+            return 0
+
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        pk_col = model._meta.pk.column
+
+        # Columnas que las relaciones hijas usan como destino (normalmente solo el pk)
+        target_cols = {pk_col}
+        for rel in self._reverse_relations(model):
+            if not rel.many_to_many:
+                target_cols.add(rel.field.target_field.column)
+        target_cols = sorted(target_cols)
+
+        file_fields = [f for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+        returning = [qn(c) for c in target_cols] + [qn(f.column) for f in file_fields]
+        if path_field:
+            returning.append(qn(model._meta.get_field(path_field).column))
+
+        # Primero liberar relaciones SET_NULL y tablas intermedias M2M,
+        # para que el DELETE del padre no viole las FKs.
+        self._clear_links(cursor, model, key_field, values, extra_where, dependents, touched)
+
+        where = f"{qn(key_field.column)} = ANY(%s)"
+        if extra_where:
+            where += f" AND {extra_where}"
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {where} RETURNING {', '.join(returning)}",
+            [list(values)],
+        )
+        rows = cursor.fetchall()
+        touched.add(model)
+        if not root:
+            dependents[model._meta.label] = dependents.get(model._meta.label, 0) + len(rows)
+
+        offset = len(target_cols)
+        for row in rows:
+            for i, field in enumerate(file_fields):
+                if row[offset + i]:
+                    files.append((field.storage, row[offset + i]))
+            if path_field and row[-1]:
+                files.append((default_storage, row[-1]))
+
+        # Cascadas: borrar hijos que referencian las filas borradas
+        deleted_by_col = {col: [row[i] for row in rows] for i, col in enumerate(target_cols)}
+        for rel in self._reverse_relations(model):
+            if rel.many_to_many or rel.field.remote_field.on_delete is not models.CASCADE:
+                continue
+            parent_values = deleted_by_col[rel.field.target_field.column]
+            self._delete_rows(
+                cursor, rel.related_model, rel.field,
+                [v for v in parent_values if v is not None], None, files, dependents, touched,
+            )
+        return len(rows)
+
+    def _clear_links(self, cursor, model, key_field, values, extra_where, dependents, touched):
+        """SET NULL en hijos SET_NULL y borrado de filas M2M, para las filas a borrar."""
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        where = f"{qn(key_field.column)} = ANY(%s)" + (f" AND {extra_where}" if extra_where else "")
+
+        def parent_subquery(target_col):
+            return f"SELECT {qn(target_col)} FROM {table} WHERE {where}"
+
+        for rel in self._reverse_relations(model):
+            if rel.many_to_many:
+                fk = self._fk_to(rel.through, model)
+                cursor.execute(
+                    f"DELETE FROM {qn(rel.through._meta.db_table)} WHERE {qn(fk.column)} IN "
+                    f"({parent_subquery(fk.target_field.column)})",
+                    [list(values)],
+                )
+            elif rel.field.remote_field.on_delete is models.SET_NULL:
+                child = rel.related_model
+                cursor.execute(
+                    f"UPDATE {qn(child._meta.db_table)} SET {qn(rel.field.column)} = NULL "
+                    f"WHERE {qn(rel.field.column)} IN ({parent_subquery(rel.field.target_field.column)})",
+                    [list(values)],
+                )
+                if cursor.rowcount:
+                    touched.add(child)
+                    label = f"{child._meta.label} (desvinculados)"
+                    dependents[label] = dependents.get(label, 0) + cursor.rowcount
+
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            fk = self._fk_to(through, model)
+            cursor.execute(
+                f"DELETE FROM {qn(through._meta.db_table)} WHERE {qn(fk.column)} IN "
+                f"({parent_subquery(fk.target_field.column)})",
+                [list(values)],
+            )
+
+    @staticmethod
+    def _delete_files(files) -> int:
+        deleted = 0
+        for storage, name in files:
+            try:
+                storage.delete(name)
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"[PURGE] No se pudo borrar el archivo {name}: {e}")
+        return deleted
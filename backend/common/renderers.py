@@ -0,0 +1,68 @@
+"""
+Renderer JSON rápido basado en orjson.
+
+Los listados admiten page_size hasta 10000 (StandardResultsSetPagination);
+con el módulo json de la librería estándar la serialización de esas páginas
+domina el tiempo de respuesta. ORJSONRenderer produce JSON semánticamente
+idéntico al de rest_framework.renderers.JSONRenderer con la configuración por
+defecto de DRF (UNICODE_JSON y COMPACT_JSON activos): json.loads de ambas
+salidas da el mismo objeto.
+- Decimal, date/datetime/time, timedelta, UUID, QuerySet, lazy strings: se
+  convierten con el mismo encoder de DRF (ej. datetime UTC termina en 'Z').
+- U+2028/U+2029 se escapan igual que DRF.
+- Claves no-str de diccionarios se convierten a str como en json.
+- Los floats (y los Decimal, que el encoder de DRF convierte a float) pueden
+  escribirse distinto con el mismo valor: orjson emite 1e20 y 0.00001 donde
+  json emite 1e+20 y 1e-05.
+- NaN/Infinity salen como null (DRF lanza ValueError).
+
+Se activa con FAST_JSON=True (ver settings). Si orjson no está instalado, o
+la petición pide indentación (Accept: application/json; indent=4) o ASCII,
+delega en el renderer de DRF.
+"""
+
+import logging
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+_drf_default = encoders.JSONEncoder().default
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+else:
+    ORJSON_OPTIONS = 0
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer con salida semánticamente idéntica a la de DRF, serializado con orjson."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError as e:
+            # Enteros > 64 bits, claves no soportadas, etc.
+            logger.debug(f"orjson no pudo serializar, usando json: {e}")
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Igual que DRF: JSON que también sea un subconjunto válido de JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,22 @@
+"""
+Registro de modelos con contador de versión para invalidación de cache.
+
+Ver common/model_versions.py. Cualquier cache cuyo contenido dependa de uno de
+estos modelos debe incluir su versión en la clave.
+"""
+
+from common.model_versions import track_model_versions
+
+
+VERSIONED_MODELS = [
+    'ots.OT',
+    'invoices.Invoice',
+    'invoices.Dispute',
+    'catalogs.Provider',
+    'catalogs.CostType',
+    'catalogs.CostCategory',
+    'catalogs.InvoicePatternCatalog',
+    'client_aliases.ClientAlias',
+]
+
+track_model_versions(*VERSIONED_MODELS)
@@ -0,0 +1,394 @@
+import copy
+import datetime
+import gzip
+import io
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.utils import OperationalError, load_backend
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from catalogs.models import CostCategory, CostType
+from client_aliases.models import ClientAlias
+from common.db_pool import ConnectionPool, PoolTimeout
+from common.http_cache import cache_stats
+from common.db_router import ReadReplicaRouter, is_pinned, use_replica
+from common.middleware.compression import CompressionMiddleware, choose_encoding
+from common.middleware.replica_stickiness import ReplicaStickinessMiddleware
+from common.parsers import ORJSONParser
+from common.renderers import ORJSONRenderer
+from ots.models import OT
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    """Pool acotado de conexiones: reutilización, espera, timeout y métricas"""
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection(len(self.opened))
+        self.opened.append(conn)
+        return conn
+
+    def test_released_connection_is_reused(self):
+        pool = ConnectionPool(max_size=2)
+
+        conn, created = pool.acquire(self.connect)
+        self.assertTrue(created)
+        pool.release(conn)
+        again, created = pool.acquire(self.connect)
+
+        self.assertIs(again, conn)
+        self.assertFalse(created)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 1))
+
+    def test_timeout_when_pool_is_exhausted(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.acquire(self.connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        conn, _ = pool.acquire(self.connect)
+
+        timer = threading.Timer(0.05, pool.release, args=[conn])
+        timer.start()
+        again, created = pool.acquire(self.connect)
+        timer.join()
+
+        self.assertIs(again, conn)
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_ms_max'], 0)
+
+    def test_discarded_and_expired_connections_are_closed(self):
+        pool = ConnectionPool(max_size=2, max_idle=0.01)
+
+        broken, _ = pool.acquire(self.connect)
+        pool.release(broken, reusable=False)
+        self.assertTrue(broken.closed)
+
+        idle, _ = pool.acquire(self.connect)
+        pool.release(idle)
+        time.sleep(0.02)
+        fresh, created = pool.acquire(self.connect)
+
+        self.assertTrue(idle.closed)
+        self.assertTrue(created)
+        self.assertIsNot(fresh, idle)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+
+        def fail():
+            raise OSError('sin red')
+
+        with self.assertRaises(OSError):
+            pool.acquire(fail)
+        conn, created = pool.acquire(self.connect)
+
+        self.assertTrue(created)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requiere PostgreSQL')
+class PooledPostgresBackendTestCase(TestCase):
+    """El backend pooled_postgresql presta y devuelve conexiones reales"""
+
+    def wrapper(self, max_size=1):
+        settings_dict = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+        settings_dict.update({
+            'ENGINE': 'common.backends.pooled_postgresql',
+            'CONN_MAX_AGE': 0,
+            'POOL': {'max_size': max_size, 'timeout': 0.1},
+        })
+        backend = load_backend(settings_dict['ENGINE'])
+        # Alias existente: django.contrib.postgres consulta connections[alias] al conectar
+        wrapper = backend.DatabaseWrapper(settings_dict, alias=DEFAULT_DB_ALIAS)
+        self.addCleanup(wrapper.close_pool)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_connection_returns_to_pool(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+        self.assertIs(second.connection, raw)
+        self.assertFalse(raw.closed)
+
+    def test_pool_exhaustion_raises_operational_error(self):
+        first = self.wrapper()
+        first.ensure_connection()
+
+        with self.assertRaises(OperationalError):
+            self.wrapper().ensure_connection()
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        first = self.wrapper()
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = first.connection
+        first.close()
+
+        self.assertEqual(raw.info.transaction_status, 0)  # IDLE
+
+
+class ReadReplicaRoutingTestCase(TransactionTestCase):
+    """
+    Lecturas de los viewsets a la réplica, con read-your-writes.
+
+    La réplica es un segundo alias sobre la misma base de test.
+    """
+
+    databases = {'default', 'replica'}
+    # El flush entre tests se limita a estas apps
+    available_apps = ['accounts', 'catalogs', 'client_aliases', 'ots']
+
+    @classmethod
+    def setUpClass(cls):
+        replica = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+        replica['TEST']['MIRROR'] = DEFAULT_DB_ALIAS
+        connections.settings['replica'] = replica
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='finanzas', email='finanzas@example.com', password='password123', role='admin'
+        )
+        cliente = ClientAlias.objects.create(original_name='Cliente Réplica', normalized_name='CLIENTE REPLICA')
+        OT.objects.create(numero_ot='25REPL001', cliente=cliente)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('ot-list')
+
+    def _queries(self, alias):
+        return CaptureQueriesContext(connections[alias])
+
+    def test_router_only_reads_from_replica_inside_context(self):
+        router = ReadReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(OT))
+        with use_replica():
+            self.assertEqual(router.db_for_read(OT), 'replica')
+            self.assertEqual(router.db_for_write(OT), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate('replica', 'ots'))
+
+    def test_list_reads_from_replica(self):
+        with self._queries('replica') as replica:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertTrue(replica.captured_queries)
+
+    def test_write_pins_user_to_primary(self):
+        request = RequestFactory().post('/api/ots/')
+        request.user = self.user
+        ReplicaStickinessMiddleware(lambda r: HttpResponse(status=201))(request)
+        self.assertTrue(is_pinned(self.user.pk))
+
+        with self._queries('replica') as replica:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(replica.captured_queries)
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    """ORJSONRenderer/ORJSONParser producen lo mismo que los de DRF"""
+
+    def test_output_matches_drf_renderer(self):
+        data = {
+            'count': 2,
+            'results': [
+                {
+                    'id': 1,
+                    'monto': Decimal('1234.50'),
+                    'monto_str': '1234.50',
+                    'fecha': datetime.date(2025, 1, 31),
+                    'creado': datetime.datetime(2025, 1, 31, 12, 30, 5, 123456, tzinfo=datetime.timezone.utc),
+                    'hora': datetime.time(8, 15),
+                    'plazo': datetime.timedelta(days=2),
+                    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+                    'proveedor': 'Ñandú S.A. de C.V.\u2028',
+                    'ratio': 0.1,
+                    'flags': (True, False, None),
+                },
+                {1: 'clave entera', 'grande': 2 ** 70},
+            ],
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_float_and_decimal_output_is_semantically_equal(self):
+        data = {
+            'floats': [1e20, 0.00001, 1.5, -0.0, 123456789.125, 1 / 3],
+            'decimales': [Decimal('1e-7'), Decimal('12345678901234567890.5'), Decimal('0.10')],
+        }
+
+        rendered = ORJSONRenderer().render(data)
+        expected = JSONRenderer().render(data)
+
+        # Mismo JSON, aunque los números pueden escribirse distinto (1e20 vs 1e+20)
+        self.assertEqual(json.loads(rendered), json.loads(expected))
+        self.assertIn(b'1e+20', expected)
+        self.assertNotEqual(rendered, expected)
+
+    def test_indent_falls_back_to_drf(self):
+        data = {'a': [1, 2]}
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type, {}),
+            JSONRenderer().render(data, media_type, {}),
+        )
+
+    def test_parser_matches_drf_parser(self):
+        body = '{"monto": 10.5, "ids": [1, 2], "nombre": "Ñandú", "grande": 12345678901234567890123}'.encode()
+
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+
+class CompressionMiddlewareTestCase(SimpleTestCase):
+    """Compresión negociada por Accept-Encoding y umbral de tamaño"""
+
+    def _response(self, body, content_type='application/json', **headers):
+        def get_response(request):
+            response = HttpResponse(body, content_type=content_type)
+            for name, value in headers.items():
+                response[name] = value
+            return response
+        return get_response
+
+    def _request(self, accept_encoding):
+        return RequestFactory().get('/api/invoices/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_large_json_is_gzipped(self):
+        body = b'{"results": [' + b'{"numero": "FAC-0001"},' * 200 + b'{}]}'
+        middleware = CompressionMiddleware(self._response(body, ETag='"abc"'))
+
+        with self.settings(COMPRESSION_MIN_SIZE=1024):
+            response = middleware(self._request('gzip;q=1.0, br;q=0'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_or_binary_responses_are_untouched(self):
+        small = CompressionMiddleware(self._response(b'{"ok": true}'))(self._request('gzip'))
+        pdf = CompressionMiddleware(self._response(b'%PDF' * 1000, content_type='application/pdf'))(
+            self._request('gzip')
+        )
+
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertFalse(pdf.has_header('Content-Encoding'))
+
+    def test_encoding_negotiation(self):
+        self.assertIsNone(choose_encoding(''))
+        self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+        self.assertEqual(choose_encoding('deflate, gzip'), 'gzip')
+        self.assertEqual(choose_encoding('*'), choose_encoding('br, gzip'))
+
+
+class ResponseCacheTestCase(TestCase):
+    """GET condicional (304) y cache de respuestas en catálogos"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='operativo', email='operativo@example.com', password='password123', role='operativo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category = CostCategory.objects.create(code='PRUEBA_CACHE', name='Prueba cache')
+        self.cost_type = CostType.objects.create(code='PRUEBA_CACHE', name='Prueba', category=self.category)
+        self.url = reverse('cost-type-list')
+
+    def test_revalidation_returns_304_without_queries(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+        with self.assertNumQueries(0):
+            by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_body_is_served_from_cache_until_model_changes(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.data, first.data)
+
+        self.cost_type.name = 'Prueba modificada'
+        self.cost_type.save()
+        fresh = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], first['ETag'])
+        names = {row['code']: row['name'] for row in fresh.data['results']}
+        self.assertEqual(names['PRUEBA_CACHE'], 'Prueba modificada')
+
+    def test_hit_rate_metrics(self):
+        first = self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.client.get(self.url, {'search': 'prueba'})
+
+        stats = cache_stats(['CostTypeViewSet.list'])['CostTypeViewSet.list']
+
+        self.assertEqual((stats['miss'], stats['hit'], stats['not_modified']), (2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
@@ -5,6 +5,7 @@ import hashlib
 import re
 from datetime import datetime
 from typing import Optional
+from django.utils.http import parse_etags
 from unidecode import unidecode
 
 
@@ -199,3 +200,28 @@ def truncate_text(text: str, max_length: int = 100, suffix: str = '...') -> str:
         return text
     
     return text[:max_length - len(suffix)] + suffix
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara If-None-Match con un ETag usando comparación débil (RFC 9110).
+
+    Las respuestas comprimidas llevan el ETag debilitado (W/"...") y el
+    cliente lo devuelve así; para revalidar basta que coincida el valor.
+
+    Args:
+        if_none_match: Valor del header If-None-Match (puede ser None)
+        etag: ETag actual del recurso (con comillas)
+
+    Returns:
+        True si el cliente ya tiene esta versión
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    def opaque(tag: str) -> str:
+        return tag[2:] if tag.startswith('W/') else tag
+
+    return opaque(etag) in {opaque(tag) for tag in parse_etags(if_none_match)}
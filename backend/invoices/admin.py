@@ -6,7 +6,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Invoice, UploadedFile, Dispute, CreditNote, DisputeEvent
+from .models import Invoice, UploadedFile, Dispute, CreditNote, DisputeEvent, DueDateAlertRun
 
 
 @admin.register(UploadedFile)
@@ -353,3 +353,29 @@ class DisputeEventAdmin(admin.ModelAdmin):
             return f"{obj.descripcion[:47]}..."
         return obj.descripcion
     descripcion_short.short_description = 'Descripción'
+
+
+@admin.register(DueDateAlertRun)
+class DueDateAlertRunAdmin(admin.ModelAdmin):
+    """Admin de solo lectura para el historial de corridas de alertas"""
+
+    list_display = [
+        'fecha_corrida',
+        'status',
+        'dry_run',
+        'alertas_marcadas',
+        'alertas_quitadas',
+        'facturas_vencidas',
+        'duracion_ms',
+        'created_at',
+    ]
+
+    list_filter = ['status', 'dry_run', 'fecha_corrida']
+
+    readonly_fields = [f.name for f in DueDateAlertRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,138 @@
+"""
+Management command para comparar memoria y tiempo del parser DTE.
+
+Genera un lote sintético de DTEs (arreglo JSON) y lo parsea con el modo
+normal (json.loads de todo el archivo) y con el modo incremental, midiendo el
+pico de memoria con tracemalloc.
+
+Uso:
+    python manage.py benchmark_dte_parser --documentos 2000 --items 40
+    python manage.py benchmark_dte_parser --archivo lote.json
+"""
+
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from invoices.parsers import dte_json
+from invoices.parsers.dte_json import DTEJsonParser
+
+
+def build_sample_batch(documentos: int, items: int) -> bytes:
+    """Lote sintético con la forma de un DTE real (cuerpo, receptor, apéndices)."""
+    docs = []
+    for n in range(documentos):
+        docs.append({
+            'identificacion': {
+                'version': 3,
+                'tipoDte': '03',
+                'numeroControl': f'DTE-03-M001P001-{n:015d}',
+                'codigoGeneracion': f'{n:08X}-0000-0000-0000-000000000000',
+                'fecEmi': '2025-01-15',
+                'tipoMoneda': 'USD',
+            },
+            'emisor': {'nit': '0614-120589-001-4', 'nombre': 'MAERSK LINE EL SALVADOR SA DE CV'},
+            'receptor': {
+                'nit': '0614-200595-001-1',
+                'nombre': 'DISTRIBUIDORA NACIONAL SA DE CV',
+                'direccion': {'departamento': '06', 'municipio': '14', 'complemento': 'Zona Industrial ' * 5},
+            },
+            'cuerpoDocumento': [
+                {
+                    'numItem': i + 1,
+                    'codigo': f'SERV-{i:03d}',
+                    'descripcion': f'Servicio {i} contenedor MSCU{n % 10000000:07d} OT-2025-{n:03d}',
+                    'cantidad': 1,
+                    'precioUni': 125.5,
+                    'ventaGravada': 125.5,
+                    'tributos': ['20'],
+                    'ivaItem': 16.32,
+                }
+                for i in range(items)
+            ],
+            'resumen': {'totalGravada': 125.5 * items, 'totalPagar': round(141.82 * items, 2)},
+            'apendice': [{'campo': f'dato{i}', 'valor': 'x' * 40} for i in range(10)],
+        })
+    return json.dumps(docs).encode('utf-8')
+
+
+def measure(func):
+    """Ejecuta func y retorna (resultado, segundos, pico_bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+class Command(BaseCommand):
+    help = 'Compara pico de memoria y tiempo del parser DTE normal vs incremental'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--documentos',
+            type=int,
+            default=1000,
+            help='Cantidad de DTEs en el lote sintético (default: 1000)'
+        )
+        parser.add_argument(
+            '--items',
+            type=int,
+            default=30,
+            help='Ítems de cuerpoDocumento por DTE (default: 30)'
+        )
+        parser.add_argument(
+            '--archivo',
+            type=str,
+            help='Usar un archivo JSON real en lugar del lote sintético'
+        )
+
+    def handle(self, *args, **options):
+        if options['archivo']:
+            with open(options['archivo'], 'rb') as fh:
+                payload = fh.read()
+        else:
+            payload = build_sample_batch(options['documentos'], options['items'])
+
+        self.stdout.write(f"Tamaño del lote: {len(payload) / (1024 * 1024):.1f} MB")
+        self.stdout.write(f"Backend incremental: {'ijson' if dte_json.ijson else 'python puro'}\n")
+
+        def normal():
+            # Lo que hace parse() en modo normal: json.loads del archivo
+            # completo y extracción sobre el árbol ya construido.
+            parser = DTEJsonParser()
+            data = json.loads(payload.decode('utf-8'))
+            results = []
+            for document in (data if isinstance(data, list) else [data]):
+                parser.data = document
+                results.append(parser._build_result())
+            return results
+
+        def incremental():
+            # Consumir sin acumular, como lo haría un proceso de importación
+            count = 0
+            for _ in DTEJsonParser(incremental=True).parse_documents(payload):
+                count += 1
+            return count
+
+        normal_results, normal_time, normal_peak = measure(normal)
+        count, incremental_time, incremental_peak = measure(incremental)
+
+        rows = [
+            ('normal', len(normal_results), normal_time, normal_peak),
+            ('incremental', count, incremental_time, incremental_peak),
+        ]
+        self.stdout.write(f"{'modo':<12} {'docs':>6} {'segundos':>10} {'pico MB':>10}")
+        for name, docs, elapsed, peak in rows:
+            self.stdout.write(f"{name:<12} {docs:>6} {elapsed:>10.2f} {peak / (1024 * 1024):>10.1f}")
+
+        if incremental_peak:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nReducción de pico de memoria: {normal_peak / incremental_peak:.1f}x"
+            ))
@@ -0,0 +1,145 @@
+"""
+Management command para medir renderizado JSON y compresión de listados.
+
+Genera facturas sintéticas dentro de una transacción que se revierte al
+final, las serializa una vez con InvoiceListSerializer (lo que devuelve el
+listado de facturas) y sobre páginas de 100, 1000 y 10000 filas mide:
+- Renderizado con JSONRenderer de DRF vs ORJSONRenderer (verifica que ambas
+  salidas decodifiquen al mismo JSON)
+- Tamaño y tiempo de compresión gzip vs brotli (si está instalado)
+
+Uso:
+    python manage.py benchmark_json_rendering
+    python manage.py benchmark_json_rendering --filas 100 1000 10000 --repeticiones 5
+"""
+
+import json
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from client_aliases.models import ClientAlias
+from common.middleware import compression
+from common.renderers import ORJSONRenderer, orjson
+from invoices.models import Invoice, UploadedFile
+from invoices.serializers import InvoiceListSerializer
+from ots.models import OT
+
+PREFIX = 'BENCHJSON'
+
+
+def measure(func, repeat):
+    """Ejecuta func `repeat` veces; retorna (resultado, mediana_ms)."""
+    tiempos = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        tiempos.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(tiempos)
+
+
+class Command(BaseCommand):
+    help = 'Compara JSONRenderer vs ORJSONRenderer y gzip vs brotli sobre listados de facturas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas',
+            nargs='+',
+            type=int,
+            default=[100, 1000, 10000],
+            help='Tamaños de página a medir (default: 100 1000 10000)'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=5,
+            help='Repeticiones por medición (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson no está instalado (pip install orjson)')
+
+        sizes = sorted(options['filas'])
+        repeat = options['repeticiones']
+
+        with transaction.atomic():
+            self._generate(max(sizes))
+            queryset = Invoice.objects.filter(numero_factura__startswith=PREFIX).select_related(
+                'ot', 'proveedor', 'uploaded_file'
+            ).order_by('id')
+            request = Request(APIRequestFactory().get('/api/invoices/'))
+            start = time.perf_counter()
+            data = list(InvoiceListSerializer(queryset, many=True, context={'request': request}).data)
+            serialize_ms = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Serialización de {len(data)} facturas: {serialize_ms:.0f} ms (no incluida abajo)")
+        self.stdout.write(f"Brotli: {'disponible' if compression.brotli else 'no instalado'}\n")
+
+        drf, fast = JSONRenderer(), ORJSONRenderer()
+        header = f"{'filas':>6} {'KB':>8} {'json ms':>9} {'orjson ms':>10} {'x':>6} {'gzip KB':>8} {'gzip ms':>8}"
+        if compression.brotli:
+            header += f" {'br KB':>7} {'br ms':>7}"
+        self.stdout.write(header)
+
+        for size in sizes:
+            page = {'count': len(data), 'results': data[:size]}
+            expected, json_ms = measure(lambda: drf.render(page), repeat)
+            rendered, orjson_ms = measure(lambda: fast.render(page), repeat)
+            if json.loads(rendered) != json.loads(expected):
+                raise CommandError(f'La salida de ORJSONRenderer difiere de JSONRenderer ({size} filas)')
+
+            gz, gzip_ms = measure(lambda: compress_string(rendered, max_random_bytes=100), repeat)
+            line = (
+                f"{size:>6} {len(rendered) / 1024:>8.0f} {json_ms:>9.1f} {orjson_ms:>10.1f} "
+                f"{json_ms / orjson_ms:>6.1f} {len(gz) / 1024:>8.0f} {gzip_ms:>8.1f}"
+            )
+            if compression.brotli:
+                br, br_ms = measure(lambda: compression.brotli.compress(rendered, quality=4), repeat)
+                line += f" {len(br) / 1024:>7.0f} {br_ms:>7.1f}"
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS('\n✅ JSON de orjson equivalente al de DRF en todos los tamaños'))
+
+    def _generate(self, rows):
+        cliente = ClientAlias.objects.create(
+            original_name=f'{PREFIX} Cliente', normalized_name=f'{PREFIX} CLIENTE', short_name=PREFIX
+        )
+        ots = OT.objects.bulk_create([
+            OT(numero_ot=f'{PREFIX}-{n:05d}', cliente=cliente) for n in range(max(rows // 10, 1))
+        ])
+        archivos = UploadedFile.objects.bulk_create([
+            UploadedFile(
+                filename=f'{PREFIX}-{n}.pdf',
+                path=f'benchmark/{PREFIX}-{n}.pdf',
+                sha256=f'{PREFIX.lower()}{n:055d}',
+                size=1,
+                content_type='application/pdf',
+            )
+            for n in range(rows)
+        ], batch_size=2000)
+        Invoice.objects.bulk_create([
+            Invoice(
+                numero_factura=f'{PREFIX}-{n:07d}',
+                fecha_emision=date(2025, 1, 1) + timedelta(days=n % 365),
+                fecha_vencimiento=date(2025, 2, 1) + timedelta(days=n % 365),
+                monto=Decimal(f'{100 + n % 5000}.{n % 100:02d}'),
+                monto_aplicable=Decimal(f'{100 + n % 5000}.{n % 100:02d}'),
+                tipo_costo='FLETE',
+                proveedor_nombre=f'Proveedor Ñandú {n % 50}',
+                ot=ots[n % len(ots)],
+                ot_number=ots[n % len(ots)].numero_ot,
+                uploaded_file=archivo,
+            )
+            for n, archivo in enumerate(archivos)
+        ], batch_size=2000)
@@ -4,23 +4,58 @@ Comando de mantenimiento para limpiar facturas eliminadas (soft delete).
 Uso:
     python manage.py cleanup_deleted_invoices --dry-run      # Ver qué se eliminaría
     python manage.py cleanup_deleted_invoices --hard-delete  # Eliminar permanentemente
+    python manage.py cleanup_deleted_invoices --hard-delete --models ots.OT client_aliases.ClientAlias
 
 ⚠️ ADVERTENCIA: --hard-delete elimina permanentemente los registros de la BD.
    Solo usar cuando estés seguro de que no necesitas recuperar esas facturas.
 
+El borrado se hace por lotes con SoftDeletePurgeEngine (common/purge.py):
+transacciones cortas, dependencias resueltas con SQL por conjuntos, pausa
+entre lotes y checkpoint para reanudar si se interrumpe. Al final se borran
+los UploadedFile que quedaron sin factura/nota de crédito y su archivo.
+
 Útil para:
 - Liberar espacio en la base de datos
 - Limpiar uploaded_file_id para permitir re-carga de archivos
 - Mantenimiento periódico de la BD
 """
 
-from django.core.management.base import BaseCommand
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from django.db.models import Count, Q
-from invoices.models import Invoice, CreditNote, Dispute, UploadedFile
-from ots.models import OT
 from django.utils import timezone
 
+from common.models import SoftDeleteModel
+from common.purge import SoftDeletePurgeEngine
+from invoices.models import UploadedFile
+
+
+# Orden de purga por defecto: dependientes antes que sus padres
+DEFAULT_MODELS = ['invoices.Dispute', 'invoices.CreditNote', 'invoices.Invoice']
+
+# Orden para --all-models (todo SoftDeleteModel del proyecto)
+ALL_MODELS = [
+    'invoices.Dispute',
+    'invoices.CreditNote',
+    'invoices.Invoice',
+    'sales.CreditNote',
+    'sales.Payment',
+    'sales.SalesInvoiceItem',
+    'sales.SalesInvoice',
+    'supplier_payments.SupplierPayment',
+    'ots.OT',
+    'client_aliases.ClientAlias',
+    'catalogs.InvoicePatternCatalog',
+    'catalogs.Provider',
+    'catalogs.CostType',
+    'catalogs.CostCategory',
+]
+
+# Gracia para UploadedFile huérfanos: una carga en curso crea el archivo antes que la factura
+ORPHAN_FILE_GRACE = timedelta(hours=1)
+
 
 class Command(BaseCommand):
     help = (
@@ -50,6 +85,79 @@ class Command(BaseCommand):
             action='store_true',
             help='Elimina TODAS las facturas, notas de crédito y disputas (solo usar en entornos de desarrollo).'
         )
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            help=f'Modelos a purgar (app_label.Model). Default: {" ".join(DEFAULT_MODELS)}'
+        )
+        parser.add_argument(
+            '--all-models',
+            action='store_true',
+            help='Purgar todos los modelos con soft delete (OTs, alias, pagos, catálogos...)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Filas por lote/transacción (default: 500)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Segundos de pausa entre lotes (default: 0.1)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignorar el checkpoint de una purga interrumpida y empezar de cero'
+        )
+        parser.add_argument(
+            '--no-input',
+            action='store_true',
+            help='No pedir confirmación (para cron)'
+        )
+
+    def _resolve_models(self, options):
+        labels = ALL_MODELS if options['all_models'] else (options['models'] or DEFAULT_MODELS)
+        resolved = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f'Modelo desconocido: {label}')
+            if not issubclass(model, SoftDeleteModel):
+                raise CommandError(f'{label} no usa soft delete')
+            resolved.append(model)
+        return resolved
+
+    def _engine(self, options, dry_run=False):
+        def progress(key, stats):
+            self.stdout.write(
+                f"  … {key}: lote {stats['chunks']} | {stats['deleted']} borrados | "
+                f"{stats['skipped']} omitidos"
+            )
+
+        return SoftDeletePurgeEngine(
+            batch_size=options['batch_size'],
+            sleep_seconds=options['sleep'],
+            dry_run=dry_run,
+            resume=not options['restart'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+
+    def _write_stats(self, stats, dry_run=False):
+        verbo = 'se eliminarían' if dry_run else 'eliminados'
+        line = f"  • {stats['model']}: {stats['deleted']} {verbo}"
+        if stats['skipped']:
+            line += f", {stats['skipped']} omitidos (referenciados por registros protegidos)"
+        if stats['files_deleted']:
+            line += f", {stats['files_deleted']} archivos"
+        if stats.get('resumed_from'):
+            line += f" (reanudado desde ID {stats['resumed_from']})"
+        self.stdout.write(line)
+        for label, count in stats['dependents'].items():
+            self.stdout.write(f"      ↳ {label}: {count}")
 
     def handle(self, *args, **options):
         days = options['days']
@@ -58,32 +166,11 @@ class Command(BaseCommand):
         purge = options['purge']
 
         if purge:
-            if not settings.DEBUG:
-                self.stdout.write(self.style.ERROR('❌ Cancelado: --purge solo está permitido en entornos de desarrollo (DEBUG=True).'))
-                return
-
-            self.stdout.write(self.style.WARNING('⚠ Eliminando TODAS las facturas, notas de crédito, disputas, OTs huérfanas y archivos subidos...'))
-            deleted_invoices, _ = Invoice.objects.all().delete()
-            deleted_credit_notes, _ = CreditNote.objects.all().delete()
-            deleted_disputes, _ = Dispute.objects.all().delete()
-
-            # Eliminar OTs sin facturas asociadas
-            orphan_ots = OT.objects.filter(facturas__isnull=True)
-            deleted_ots = orphan_ots.count()
-            orphan_ots.delete()
-
-            # Eliminar archivos subidos sin factura
-            orphan_files = UploadedFile.objects.filter(invoice__isnull=True)
-            deleted_files = orphan_files.count()
-            orphan_files.delete()
-
-            self.stdout.write(self.style.SUCCESS(
-                f'✅ Purga completa: {deleted_invoices} facturas, '
-                f'{deleted_credit_notes} notas de crédito, {deleted_disputes} disputas, '
-                f'{deleted_ots} OTs y {deleted_files} archivos eliminados.'
-            ))
+            self._handle_purge(options)
             return
 
+        models = self._resolve_models(options)
+
         if dry_run:
             self.stdout.write(self.style.WARNING('🔍 Modo DRY RUN - No se aplicarán cambios'))
         elif hard_delete:
@@ -91,49 +178,76 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.SUCCESS('🧹 Limpiando facturas eliminadas...'))
 
-        cutoff_date = timezone.now() - timezone.timedelta(days=days)
+        older_than = timedelta(days=days)
+        cutoff_date = timezone.now() - older_than
+        self.stdout.write(f'📅 Registros eliminados (soft delete) antes de: {cutoff_date:%Y-%m-%d %H:%M}')
 
-        invoices_deleted = Invoice.objects.filter(deleted_at__isnull=False)
-        total_deleted = invoices_deleted.count()
-        deleted_invoices = Invoice.objects.filter(deleted_at__isnull=False)
-        total_deleted = deleted_invoices.count()
+        # Conteo previo (mismo criterio que usará el motor)
+        preview = self._engine(options, dry_run=True)
+        previews = [preview.purge(model, older_than=older_than) for model in models]
+        total = sum(stats['deleted'] for stats in previews)
 
-        self.stdout.write(f'📊 Total de facturas eliminadas (soft delete): {total_deleted}')
+        self.stdout.write('')
+        self.stdout.write('📊 Registros a eliminar:')
+        for stats in previews:
+            self._write_stats(stats, dry_run=True)
 
-        if total_deleted == 0:
-            self.stdout.write(self.style.SUCCESS('✅ No hay facturas eliminadas para limpiar'))
+        if total == 0:
+            self.stdout.write(self.style.SUCCESS('\n✅ No hay registros eliminados para limpiar'))
             return
 
-        # Mostrar algunos ejemplos
-        self.stdout.write('')
-        self.stdout.write('📋 Primeras 10 facturas eliminadas:')
-        for inv in deleted_invoices[:10]:
-            self.stdout.write(
-                f'  • ID: {inv.id:5d} | Factura: {inv.numero_factura:20s} | '
-                f'File: {inv.uploaded_file_id:5d} | Eliminada: {inv.deleted_at}'
-            )
+        if not hard_delete or dry_run:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING('⚠️  Ejecuta con --hard-delete para eliminar permanentemente'))
+            self.stdout.write(self.style.WARNING('   ADVERTENCIA: Esta acción NO se puede deshacer'))
+            return
 
-        if not dry_run and hard_delete:
+        if not options['no_input']:
             # Confirmar acción peligrosa
             self.stdout.write('')
             self.stdout.write(self.style.ERROR('=' * 60))
             self.stdout.write(self.style.ERROR('⚠️  ADVERTENCIA: Esta acción NO se puede deshacer'))
-            self.stdout.write(self.style.ERROR(f'Se eliminarán permanentemente {total_deleted} facturas'))
+            self.stdout.write(self.style.ERROR(f'Se eliminarán permanentemente {total} registros'))
             self.stdout.write(self.style.ERROR('=' * 60))
-            
+
             confirm = input('\n¿Estás seguro? Escribe "DELETE" para confirmar: ')
-            
+
             if confirm != 'DELETE':
                 self.stdout.write(self.style.WARNING('❌ Operación cancelada'))
                 return
 
-            # Eliminar permanentemente
-            deleted_count, _ = deleted_invoices.delete()
-            
-            self.stdout.write('')
-            self.stdout.write(self.style.SUCCESS(f'✅ Eliminadas permanentemente: {deleted_count} facturas'))
-        
-        elif dry_run:
-            self.stdout.write('')
-            self.stdout.write(self.style.WARNING('⚠️  Ejecuta con --hard-delete para eliminar permanentemente'))
-            self.stdout.write(self.style.WARNING('   ADVERTENCIA: Esta acción NO se puede deshacer'))
+        engine = self._engine(options)
+        self.stdout.write('')
+        for model in models:
+            self._write_stats(engine.purge(model, older_than=older_than))
+
+        files = engine.purge_orphans(UploadedFile, path_field='path', older_than=ORPHAN_FILE_GRACE)
+        self.stdout.write(f"  • Archivos huérfanos: {files['deleted']} registros, {files['files_deleted']} archivos")
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('✅ Limpieza completada'))
+
+    def _handle_purge(self, options):
+        if not settings.DEBUG:
+            self.stdout.write(self.style.ERROR('❌ Cancelado: --purge solo está permitido en entornos de desarrollo (DEBUG=True).'))
+            return
+
+        from invoices.models import Invoice, CreditNote, Dispute
+        from ots.models import OT
+
+        self.stdout.write(self.style.WARNING('⚠ Eliminando TODAS las facturas, notas de crédito, disputas, OTs huérfanas y archivos subidos...'))
+        engine = self._engine(options)
+
+        deleted_disputes = engine.purge(Dispute, only_deleted=False)['deleted']
+        deleted_credit_notes = engine.purge(CreditNote, only_deleted=False)['deleted']
+        deleted_invoices = engine.purge(Invoice, only_deleted=False)['deleted']
+
+        # OTs y archivos que ya nada referencia
+        deleted_ots = engine.purge_orphans(OT)['deleted']
+        deleted_files = engine.purge_orphans(UploadedFile, path_field='path')['deleted']
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Purga completa: {deleted_invoices} facturas, '
+            f'{deleted_credit_notes} notas de crédito, {deleted_disputes} disputas, '
+            f'{deleted_ots} OTs y {deleted_files} archivos eliminados.'
+        ))
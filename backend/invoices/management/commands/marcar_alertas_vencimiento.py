@@ -1,17 +1,21 @@
 """
 Management command para marcar facturas próximas a vencer.
 Se ejecuta diariamente vía Celery Beat.
+
+Las transiciones se aplican en lote con DueDateAlertEngine (una sola
+sentencia SQL); el comando solo reporta el resultado de la corrida.
 """
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import date, timedelta
+from datetime import timedelta
 from invoices.models import Invoice
+from invoices.services.due_date_alerts import DueDateAlertEngine
 
 
 class Command(BaseCommand):
     help = 'Marca facturas próximas a vencer (7 días o menos)'
-    
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--dias',
@@ -19,105 +23,64 @@ class Command(BaseCommand):
             default=7,
             help='Días de anticipación para marcar alerta (default: 7)'
         )
-        
+
         parser.add_argument(
             '--dry-run',
             action='store_true',
             help='Modo simulación - no guarda cambios'
         )
-    
+
     def handle(self, *args, **options):
         dias_alerta = options['dias']
         dry_run = options['dry_run']
-        
-        hoy = date.today()
+
+        hoy = timezone.localdate()
         fecha_limite = hoy + timedelta(days=dias_alerta)
-        
+
         self.stdout.write(f"\n{'=' * 60}")
         self.stdout.write(f"🔔 VERIFICACIÓN DE ALERTAS DE VENCIMIENTO")
         self.stdout.write(f"{'=' * 60}")
         self.stdout.write(f"Fecha actual: {hoy}")
         self.stdout.write(f"Fecha límite: {fecha_limite} ({dias_alerta} días)")
         self.stdout.write(f"Modo: {'DRY-RUN (simulación)' if dry_run else 'PRODUCCIÓN'}\n")
-        
-        # Buscar facturas de crédito con fecha de vencimiento
-        facturas_credito = Invoice.objects.filter(
-            tipo_pago='credito',
-            fecha_vencimiento__isnull=False,
-            is_deleted=False
-        )
-        
-        self.stdout.write(f"📊 Total facturas a crédito: {facturas_credito.count()}")
-        
-        # Marcar como alerta las que están próximas a vencer
-        facturas_alerta = facturas_credito.filter(
-            fecha_vencimiento__lte=fecha_limite,
-            fecha_vencimiento__gt=hoy,
-            alerta_vencimiento=False
-        )
-        
-        # Quitar alerta a las que ya pasaron el periodo
-        facturas_quitar_alerta = facturas_credito.filter(
-            alerta_vencimiento=True
-        ).exclude(
-            fecha_vencimiento__lte=fecha_limite,
-            fecha_vencimiento__gt=hoy
-        )
-        
-        # Facturas vencidas
-        facturas_vencidas = facturas_credito.filter(
-            fecha_vencimiento__lt=hoy
-        )
-        
+
+        run = DueDateAlertEngine(dias_alerta=dias_alerta).run(dry_run=dry_run, hoy=hoy)
+
+        if run.status == 'skipped':
+            self.stdout.write(self.style.WARNING(
+                "⚠️  Otra corrida de alertas está en curso, no se procesó nada"
+            ))
+            self.stdout.write(f"\n{'=' * 60}\n")
+            return
+
         self.stdout.write(f"\n📋 RESUMEN:")
-        self.stdout.write(f"  • Facturas a marcar con alerta: {facturas_alerta.count()}")
-        self.stdout.write(f"  • Facturas a quitar alerta: {facturas_quitar_alerta.count()}")
-        self.stdout.write(f"  • Facturas vencidas: {facturas_vencidas.count()}")
-        
-        if not dry_run:
-            # Marcar alertas
-            if facturas_alerta.exists():
-                self.stdout.write(f"\n⚠️  MARCANDO ALERTAS:")
-                for factura in facturas_alerta:
-                    dias_faltantes = (factura.fecha_vencimiento - hoy).days
-                    factura.alerta_vencimiento = True
-                    factura.save(update_fields=['alerta_vencimiento'])
-                    self.stdout.write(
-                        f"  ✓ {factura.numero_factura} - {factura.proveedor_nombre} "
-                        f"(Vence en {dias_faltantes} días: {factura.fecha_vencimiento})"
-                    )
-            
-            # Quitar alertas
-            if facturas_quitar_alerta.exists():
-                self.stdout.write(f"\n✅ QUITANDO ALERTAS:")
-                for factura in facturas_quitar_alerta:
-                    factura.alerta_vencimiento = False
-                    factura.save(update_fields=['alerta_vencimiento'])
-                    self.stdout.write(
-                        f"  ✓ {factura.numero_factura} - {factura.proveedor_nombre} "
-                        f"(Vencimiento: {factura.fecha_vencimiento})"
-                    )
-            
-            # Listar vencidas
-            if facturas_vencidas.exists():
-                self.stdout.write(f"\n❌ FACTURAS VENCIDAS:")
-                for factura in facturas_vencidas:
-                    dias_vencido = (hoy - factura.fecha_vencimiento).days
-                    self.stdout.write(
-                        f"  • {factura.numero_factura} - {factura.proveedor_nombre} "
-                        f"(Vencida hace {dias_vencido} días: {factura.fecha_vencimiento})"
-                    )
-            
-            self.stdout.write(f"\n✅ Proceso completado exitosamente")
-        else:
+        self.stdout.write(f"  • Facturas a marcar con alerta: {run.alertas_marcadas}")
+        self.stdout.write(f"  • Facturas a quitar alerta: {run.alertas_quitadas}")
+        self.stdout.write(f"  • Facturas vencidas desde la última corrida: {run.facturas_vencidas}")
+        self.stdout.write(f"  • Duración: {run.duracion_ms} ms")
+
+        secciones = [
+            ('marcadas', "⚠️  ALERTAS MARCADAS:" if not dry_run else "📋 Facturas que se marcarían con alerta:"),
+            ('quitadas', "✅ ALERTAS QUITADAS:" if not dry_run else "📋 Facturas a las que se quitaría la alerta:"),
+            ('vencidas', "❌ FACTURAS VENCIDAS:"),
+        ]
+        for clave, titulo in secciones:
+            ids = run.detalle.get(clave) or []
+            if not ids:
+                continue
+            self.stdout.write(f"\n{titulo}")
+            facturas = Invoice.objects.filter(id__in=ids).only(
+                'numero_factura', 'proveedor_nombre', 'fecha_vencimiento'
+            ).order_by('fecha_vencimiento')
+            for factura in facturas:
+                self.stdout.write(
+                    f"  • {factura.numero_factura} - {factura.proveedor_nombre} "
+                    f"(Vencimiento: {factura.fecha_vencimiento})"
+                )
+
+        if dry_run:
             self.stdout.write(f"\n⚠️  DRY-RUN: No se guardaron cambios")
-            
-            if facturas_alerta.exists():
-                self.stdout.write(f"\n📋 Facturas que se marcarían con alerta:")
-                for factura in facturas_alerta:
-                    dias_faltantes = (factura.fecha_vencimiento - hoy).days
-                    self.stdout.write(
-                        f"  • {factura.numero_factura} - Vence en {dias_faltantes} días"
-                    )
-        
+        else:
+            self.stdout.write(f"\n✅ Proceso completado exitosamente")
+
         self.stdout.write(f"\n{'=' * 60}\n")
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0024_dispute_fecha_disputa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DueDateAlertRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('fecha_corrida', models.DateField(db_index=True, help_text='Fecha (local) para la que se calcularon las alertas')),
+                ('dias_alerta', models.PositiveIntegerField(default=7, help_text='Días de anticipación usados para marcar alertas')),
+                ('status', models.CharField(choices=[('success', 'Exitosa'), ('skipped', 'Omitida (otra ejecución en curso)'), ('error', 'Error')], db_index=True, default='success', max_length=16)),
+                ('dry_run', models.BooleanField(default=False)),
+                ('alertas_marcadas', models.PositiveIntegerField(default=0)),
+                ('alertas_quitadas', models.PositiveIntegerField(default=0)),
+                ('facturas_vencidas', models.PositiveIntegerField(default=0, help_text='Facturas que vencieron desde la corrida anterior')),
+                ('detalle', models.JSONField(blank=True, default=dict, help_text='IDs de facturas por transición (marcadas, quitadas, vencidas)')),
+                ('duracion_ms', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Corrida de alertas de vencimiento',
+                'verbose_name_plural': 'Corridas de alertas de vencimiento',
+                'db_table': 'invoices_due_date_alert_run',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
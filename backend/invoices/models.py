@@ -409,23 +409,30 @@ class Invoice(TimeStampedModel, SoftDeleteModel):
     def __str__(self):
         return f"Factura {self.numero_factura} - {self.proveedor_nombre}"
 
-    def get_tipo_costo_display(self):
+    def get_tipo_costo_display(self, cost_type_names=None):
         """
         Retorna el nombre legible del tipo de costo.
         Consulta CostType para tipos dinámicos, usa legacy para tipos hardcoded.
+
+        En listados pasar cost_type_names=CostType.names_by_code() (cargado una
+        vez) para no hacer una consulta por fila.
         """
-        # Primero intentar desde CostType (dinámico)
-        from catalogs.models import CostType
-        try:
-            cost_type = CostType.objects.filter(
-                code=self.tipo_costo,
-                is_active=True,
-                is_deleted=False
-            ).first()
-            if cost_type:
-                return cost_type.name
-        except Exception:
-            pass
+        if cost_type_names is not None:
+            if self.tipo_costo in cost_type_names:
+                return cost_type_names[self.tipo_costo]
+        else:
+            # Primero intentar desde CostType (dinámico)
+            from catalogs.models import CostType
+            try:
+                cost_type = CostType.objects.filter(
+                    code=self.tipo_costo,
+                    is_active=True,
+                    is_deleted=False
+                ).first()
+                if cost_type:
+                    return cost_type.name
+            except Exception:
+                pass
 
         # Fallback a choices legacy
         for code, name in self.TIPO_COSTO_CHOICES:
@@ -632,121 +639,41 @@ class Invoice(TimeStampedModel, SoftDeleteModel):
         if not self.ot:
             return
 
-        # Obtener TODAS las facturas vinculadas a esta OT (no eliminadas, no anuladas)
-        facturas_vinculadas = Invoice.objects.filter(
-            ot=self.ot,
-            is_deleted=False
-        ).exclude(
-            estado_provision__in=['anulada', 'anulada_parcialmente', 'rechazada']
-        ).filter(
-            tipo_costo__in=['FLETE', 'CARGOS_NAVIERA']
+        # Consolidación en SQL (una consulta agrupada), mismas reglas que la
+        # reconciliación masiva de sync_invoices_to_ots
+        from invoices.services.ot_reconciliation import InvoiceOTReconciler, consolidate
+
+        row = InvoiceOTReconciler().aggregates([self.ot_id]).first()
+        if row is None:
+            # Sin facturas vinculadas: resetear OT a pendiente
+            row = {
+                'tiene_provisionada': False,
+                'tiene_disputada': False,
+                'tiene_revision': False,
+                'min_provision': None,
+                'min_facturacion': None,
+            }
+
+        consolidado = consolidate(
+            bool(row['tiene_provisionada']),
+            bool(row['tiene_disputada']),
+            bool(row['tiene_revision']),
+            row['min_provision'],
+            row['min_facturacion'],
+            self.ot.estado_facturado,
         )
 
-        # También incluir facturas con tipos dinámicos vinculados
-        from catalogs.models import CostType
-        tipos_vinculados = CostType.objects.filter(
-            is_linked_to_ot=True,
-            is_active=True,
-            is_deleted=False
-        ).values_list('code', flat=True)
-
-        if tipos_vinculados:
-            facturas_vinculadas = facturas_vinculadas | Invoice.objects.filter(
-                ot=self.ot,
-                is_deleted=False,
-                tipo_costo__in=list(tipos_vinculados)
-            ).exclude(
-                estado_provision__in=['anulada', 'anulada_parcialmente', 'rechazada']
-            )
-
-        facturas_vinculadas = facturas_vinculadas.distinct()
-
-        if not facturas_vinculadas.exists():
-            # Si no hay facturas vinculadas activas, resetear OT a pendiente
-            self.ot.estado_provision = 'pendiente'
-            self.ot.fecha_provision = None
-            self.ot.fecha_recepcion_factura = None
-            self.ot._skip_invoice_sync = True
-            self.ot.save(update_fields=['estado_provision', 'fecha_provision', 'fecha_recepcion_factura', 'updated_at'])
-            self.ot._skip_invoice_sync = False
-            return
-
-        # CONSOLIDAR ESTADOS - Nueva lógica optimista
-        # Prioridad: provisionada > disputada > revision > pendiente
-        # Si AL MENOS UNA está provisionada → OT = provisionada
-        estado_consolidado = 'pendiente'  # Default pesimista
-        fecha_provision_consolidada = None
-        fecha_facturacion_consolidada = None
-
-        tiene_provisionada = False
-        tiene_disputada = False
-        tiene_revision = False
-        tiene_pendiente = False
-        fechas_provision = []
-        fechas_facturacion = []
-
-        for factura in facturas_vinculadas:
-            # Verificar estados
-            if factura.estado_provision == 'provisionada':
-                tiene_provisionada = True
-            elif factura.estado_provision == 'disputada':
-                tiene_disputada = True
-            elif factura.estado_provision == 'revision':
-                tiene_revision = True
-            elif factura.estado_provision == 'pendiente':
-                tiene_pendiente = True
-
-            # Recolectar fechas de provisión SOLO de facturas provisionadas
-            if factura.fecha_provision and factura.estado_provision == 'provisionada':
-                fechas_provision.append(factura.fecha_provision)
-
-            # Recolectar fechas de facturación de TODAS las facturas
-            if factura.fecha_facturacion:
-                fechas_facturacion.append(factura.fecha_facturacion)
-
-        # Determinar estado consolidado según NUEVA prioridad
-        if tiene_provisionada:
-            # Si AL MENOS UNA está provisionada → OT = provisionada
-            estado_consolidado = 'provisionada'
-            # Usar la fecha MÁS ANTIGUA de las provisionadas
-            if fechas_provision:
-                fecha_provision_consolidada = min(fechas_provision)
-        elif tiene_disputada:
-            # Si ninguna provisionada pero hay disputada → OT = disputada
-            estado_consolidado = 'disputada'
-            fecha_provision_consolidada = None
-        elif tiene_revision:
-            # Si ninguna provisionada/disputada pero hay revision → OT = revision
-            estado_consolidado = 'revision'
-            fecha_provision_consolidada = None
-        else:
-            # Todas están pendientes
-            estado_consolidado = 'pendiente'
-            fecha_provision_consolidada = None
-
-        # Fecha de facturación: usar la MÁS ANTIGUA
-        if fechas_facturacion:
-            fecha_facturacion_consolidada = min(fechas_facturacion)
-
         # Actualizar OT solo si hay cambios
         fields_to_update = []
-
-        if self.ot.estado_provision != estado_consolidado:
-            self.ot.estado_provision = estado_consolidado
-            fields_to_update.append('estado_provision')
-
-        if self.ot.fecha_provision != fecha_provision_consolidada:
-            self.ot.fecha_provision = fecha_provision_consolidada
-            fields_to_update.append('fecha_provision')
-
-        if self.ot.fecha_recepcion_factura != fecha_facturacion_consolidada:
-            self.ot.fecha_recepcion_factura = fecha_facturacion_consolidada
-            fields_to_update.append('fecha_recepcion_factura')
+        for field_name, value in consolidado.items():
+            if getattr(self.ot, field_name) != value:
+                setattr(self.ot, field_name, value)
+                fields_to_update.append(field_name)
 
         if fields_to_update:
             fields_to_update.append('updated_at')
             self.ot._skip_invoice_sync = True
-            self.ot.save(update_fields=list(set(fields_to_update)))
+            self.ot.save(update_fields=fields_to_update)
             self.ot._skip_invoice_sync = False
     
     def calcular_dias_hasta_vencimiento(self):
@@ -1401,3 +1328,64 @@ class CreditNote(TimeStampedModel, SoftDeleteModel):
                 invoice.estado_provision = 'anulada_parcialmente'
             
             invoice.save()
+
+
+class DueDateAlertRun(TimeStampedModel):
+    """
+    Registro de cada ejecución del motor de alertas de vencimiento.
+
+    Permite auditar qué facturas cambiaron de estado en cada corrida y hace
+    idempotente el cálculo de facturas recién vencidas: solo se reportan las
+    que vencieron desde la última corrida exitosa.
+    """
+
+    STATUS_CHOICES = [
+        ('success', 'Exitosa'),
+        ('skipped', 'Omitida (otra ejecución en curso)'),
+        ('error', 'Error'),
+    ]
+
+    fecha_corrida = models.DateField(
+        db_index=True,
+        help_text="Fecha (local) para la que se calcularon las alertas"
+    )
+
+    dias_alerta = models.PositiveIntegerField(
+        default=7,
+        help_text="Días de anticipación usados para marcar alertas"
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default='success',
+        db_index=True
+    )
+
+    dry_run = models.BooleanField(default=False)
+
+    alertas_marcadas = models.PositiveIntegerField(default=0)
+    alertas_quitadas = models.PositiveIntegerField(default=0)
+    facturas_vencidas = models.PositiveIntegerField(
+        default=0,
+        help_text="Facturas que vencieron desde la corrida anterior"
+    )
+
+    detalle = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="IDs de facturas por transición (marcadas, quitadas, vencidas)"
+    )
+
+    duracion_ms = models.PositiveIntegerField(default=0)
+
+    error_message = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'invoices_due_date_alert_run'
+        ordering = ['-created_at']
+        verbose_name = 'Corrida de alertas de vencimiento'
+        verbose_name_plural = 'Corridas de alertas de vencimiento'
+
+    def __str__(self):
+        return f"Alertas {self.fecha_corrida} ({self.get_status_display()})"
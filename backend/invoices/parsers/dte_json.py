@@ -1,11 +1,261 @@
 """
 Parser para archivos DTE (Documento Tributario Electrónico) de El Salvador en formato JSON.
+
+Modos:
+- Normal: json.loads del archivo completo (se conserva todo el DTE en raw_data).
+- Incremental: recorre el JSON como stream de eventos y solo construye las
+  rutas que usan los extractores (identificación, emisor, resumen, documento
+  y descripciones del cuerpo). Soporta archivos con varios DTEs (arreglo JSON,
+  objetos concatenados o NDJSON) procesando un documento a la vez. Usa ijson
+  si está instalado y un tokenizador en Python puro si no.
 """
 
+import codecs
+import io
 import json
+import re
+from json.decoder import scanstring
+from json.scanner import NUMBER_RE
 from decimal import Decimal
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Union
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# Rutas que se construyen en modo incremental.
+# True = subárbol completo; dict = solo las claves indicadas ('item' = elementos de un arreglo)
+DTE_STREAM_PATHS = {
+    'identificacion': True,
+    'emisor': True,
+    'resumen': True,
+    'condicionOperacion': True,
+    'documento': True,
+    'factura': True,
+    'proveedor': True,
+    'extension': True,
+    'observaciones': True,
+    'descripcion': True,
+    'notas': True,
+    'cuerpoDocumento': {'item': {'descripcion': True}},
+    'detalle': {'item': {'descripcion': True}},
+}
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _JsonEventReader:
+    """
+    Tokenizador JSON incremental en Python puro.
+
+    Lee el stream por chunks y genera los mismos eventos que
+    ijson.basic_parse (start_map, map_key, end_map, start_array, end_array,
+    string, number, boolean, null). Acepta varios valores top-level seguidos.
+    Las cadenas se decodifican con el scanstring de la librería estándar.
+    """
+
+    _LITERALS = {'true': ('boolean', True), 'false': ('boolean', False), 'null': ('null', None)}
+    _WHITESPACE = ' \t\n\r'
+    _TOKEN_END = re.compile(r'[\s,\]}]')
+
+    def __init__(self, stream, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Agrega un chunk al buffer. Retorna False si ya no hay más datos."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if self.pos > self.chunk_size:
+            # Descartar lo ya consumido para que el buffer no crezca
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        if not chunk:
+            self.eof = True
+            self.buf += self.decoder.decode(b'', final=True)
+            return False
+        self.buf += self.decoder.decode(chunk)
+        return True
+
+    def _next_char(self) -> Optional[str]:
+        """Salta espacios y retorna el siguiente carácter sin consumirlo."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self._WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def _error(self, msg: str):
+        raise json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def _read_string(self) -> str:
+        while True:
+            try:
+                value, end = scanstring(self.buf, self.pos + 1)
+                self.pos = end
+                return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def _read_scalar(self):
+        # Asegurar que el token completo está en el buffer (no cortado entre chunks)
+        while not self.eof and not self._TOKEN_END.search(self.buf, self.pos):
+            self._fill()
+        match = NUMBER_RE.match(self.buf, self.pos)
+        if match:
+            integer, frac, exp = match.groups()
+            self.pos = match.end()
+            if frac or exp:
+                return 'number', float(integer + (frac or '') + (exp or ''))
+            return 'number', int(integer)
+        for literal, event in self._LITERALS.items():
+            if self.buf.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return event
+        self._error('Valor inesperado')
+
+    def events(self) -> Iterator:
+        stack = []  # 'map' | 'array'
+        expect_value = True  # False = se espera ',' o cierre
+        while True:
+            char = self._next_char()
+            if char is None:
+                if stack:
+                    self._error('JSON incompleto')
+                return
+
+            in_map = bool(stack) and stack[-1] == 'map'
+
+            if not expect_value:
+                if char == ',' and stack:
+                    self.pos += 1
+                    expect_value = True
+                    if in_map:
+                        if self._next_char() != '"':
+                            self._error('Se esperaba una clave')
+                        key = self._read_string()
+                        if self._next_char() != ':':
+                            self._error("Se esperaba ':'")
+                        self.pos += 1
+                        yield 'map_key', key
+                    continue
+                if char == '}' and in_map:
+                    self.pos += 1
+                    stack.pop()
+                    yield 'end_map', None
+                    continue
+                if char == ']' and stack and not in_map:
+                    self.pos += 1
+                    stack.pop()
+                    yield 'end_array', None
+                    continue
+                if not stack:
+                    # Siguiente documento top-level (objetos concatenados / NDJSON)
+                    expect_value = True
+                else:
+                    self._error("Se esperaba ',' o cierre")
+
+            if char == '{':
+                self.pos += 1
+                stack.append('map')
+                yield 'start_map', None
+                char = self._next_char()
+                if char == '}':
+                    self.pos += 1
+                    stack.pop()
+                    expect_value = False
+                    yield 'end_map', None
+                    continue
+                if char != '"':
+                    self._error('Se esperaba una clave')
+                key = self._read_string()
+                if self._next_char() != ':':
+                    self._error("Se esperaba ':'")
+                self.pos += 1
+                yield 'map_key', key
+            elif char == '[':
+                self.pos += 1
+                stack.append('array')
+                yield 'start_array', None
+                if self._next_char() == ']':
+                    self.pos += 1
+                    stack.pop()
+                    expect_value = False
+                    yield 'end_array', None
+            elif char == '"':
+                yield 'string', self._read_string()
+                expect_value = False
+            else:
+                yield self._read_scalar()
+                expect_value = False
+
+
+def _iter_json_events(stream) -> Iterator:
+    """Eventos JSON del stream: ijson (si está instalado) o el tokenizador propio."""
+    if ijson is not None:
+        return ijson.basic_parse(stream, use_float=True, multiple_values=True)
+    return _JsonEventReader(stream).events()
+
+
+def _collect(events: Iterator, event: str, value: Any, spec) -> Any:
+    """
+    Construye el valor que empieza con `event` conservando solo lo indicado por `spec`.
+
+    Con spec=True arma el subárbol completo; con un dict descarta (consumiendo
+    sus eventos sin construir nada) las claves que no están en el spec.
+    """
+    if event == 'start_map':
+        result = {}
+        for event, value in events:
+            if event == 'end_map':
+                return result
+            # map_key
+            sub_spec = True if spec is True else spec.get(value)
+            event_value = next(events)
+            if sub_spec:
+                result[value] = _collect(events, *event_value, sub_spec)
+            else:
+                _skip(events, event_value[0])
+        raise json.JSONDecodeError('JSON incompleto', '', 0)
+
+    if event == 'start_array':
+        item_spec = True if spec is True else spec.get('item')
+        result = []
+        for event, value in events:
+            if event == 'end_array':
+                return result
+            if item_spec:
+                result.append(_collect(events, event, value, item_spec))
+            else:
+                _skip(events, event)
+        raise json.JSONDecodeError('JSON incompleto', '', 0)
+
+    return value
+
+
+def _skip(events: Iterator, event: str) -> None:
+    """Consume los eventos de un valor sin construirlo."""
+    if event not in ('start_map', 'start_array'):
+        return
+    depth = 1
+    for event, _ in events:
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+            if depth == 0:
+                return
 
 
 class DTEJsonParser:
@@ -15,16 +265,29 @@ class DTEJsonParser:
     El DTE es el estándar de facturación electrónica de El Salvador.
     """
     
-    def __init__(self):
+    # Archivos más grandes que esto se parsean en modo incremental al subirlos
+    INCREMENTAL_THRESHOLD = 1024 * 1024
+    
+    def __init__(self, incremental: bool = False):
+        """
+        Args:
+            incremental: Si True, parse() recorre el JSON como stream y solo
+                construye las rutas necesarias (ver DTE_STREAM_PATHS). En ese
+                modo raw_data contiene únicamente esas rutas.
+        """
+        self.incremental = incremental
         self.data = None
         self.errors = []
     
-    def parse(self, file_content: bytes) -> Dict[str, Any]:
+    def parse(self, file_content: Union[bytes, Any]) -> Dict[str, Any]:
         """
         Parsea el contenido del archivo JSON DTE.
         
+        Si el archivo trae varios DTEs, retorna el primero (ver parse_documents).
+        
         Args:
-            file_content: Contenido del archivo JSON en bytes
+            file_content: Contenido del archivo JSON en bytes, o un archivo
+                abierto en modo binario (solo en modo incremental)
             
         Returns:
             Diccionario con la información extraída:
@@ -40,25 +303,18 @@ class DTEJsonParser:
                 'confidence': float,  # Confianza en la extracción (0.0-1.0)
             }
         """
+        if self.incremental:
+            for result in self.parse_documents(file_content):
+                return result
+            if not self.errors:
+                self.errors.append("El archivo no contiene documentos DTE")
+            return self._empty_result()
+        
         try:
             # Decodificar JSON
             json_str = file_content.decode('utf-8')
             self.data = json.loads(json_str)
-            
-            # Extraer información básica
-            result = {
-                'numero_factura': self._extract_numero_factura(),
-                'fecha_emision': self._extract_fecha_emision(),
-                'fecha_vencimiento': self._extract_fecha_vencimiento(),
-                'monto': self._extract_monto(),
-                'proveedor_nit': self._extract_proveedor_nit(),
-                'proveedor_nombre': self._extract_proveedor_nombre(),
-                'referencias': self._extract_referencias(),
-                'raw_data': self.data,
-                'confidence': self._calculate_confidence(),
-            }
-            
-            return result
+            return self._build_result()
             
         except json.JSONDecodeError as e:
             self.errors.append(f"Error al decodificar JSON: {str(e)}")
@@ -67,6 +323,69 @@ class DTEJsonParser:
             self.errors.append(f"Error inesperado: {str(e)}")
             return self._empty_result()
     
+    def parse_documents(self, source: Union[bytes, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Parsea en modo incremental uno o varios DTEs.
+        
+        Acepta un objeto DTE, un arreglo de DTEs u objetos concatenados
+        (NDJSON). Solo se mantiene en memoria el documento actual y únicamente
+        con las rutas de DTE_STREAM_PATHS.
+        
+        Args:
+            source: Contenido en bytes o archivo abierto en modo binario
+            
+        Yields:
+            Un diccionario por documento, con la misma estructura que parse()
+        """
+        stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        events = iter(_iter_json_events(stream))
+        
+        try:
+            for event, value in events:
+                if event == 'start_array':
+                    # Arreglo de DTEs
+                    for event, value in events:
+                        if event == 'end_array':
+                            break
+                        result = self._parse_document(events, event, value)
+                        if result is not None:
+                            yield result
+                else:
+                    result = self._parse_document(events, event, value)
+                    if result is not None:
+                        yield result
+        except ValueError as e:
+            # JSONDecodeError e ijson.JSONError son subclases de ValueError
+            self.errors.append(f"Error al decodificar JSON: {str(e)}")
+    
+    def _parse_document(self, events: Iterator, event: str, value: Any) -> Optional[Dict[str, Any]]:
+        """Construye un documento (solo rutas necesarias) y extrae sus datos."""
+        if event != 'start_map':
+            # Valores sueltos que no son objetos DTE
+            _skip(events, event)
+            return None
+        self.data = _collect(events, event, value, DTE_STREAM_PATHS)
+        try:
+            return self._build_result()
+        except Exception as e:
+            self.errors.append(f"Error inesperado: {str(e)}")
+            return self._empty_result()
+    
+    def _build_result(self) -> Dict[str, Any]:
+        """Extrae la información del documento cargado en self.data"""
+        result = {
+            'numero_factura': self._extract_numero_factura(),
+            'fecha_emision': self._extract_fecha_emision(),
+            'fecha_vencimiento': self._extract_fecha_vencimiento(),
+            'monto': self._extract_monto(),
+            'proveedor_nit': self._extract_proveedor_nit(),
+            'proveedor_nombre': self._extract_proveedor_nombre(),
+            'referencias': self._extract_referencias(),
+            'raw_data': self.data,
+            'confidence': self._calculate_confidence(),
+        }
+        return result
+    
     def _extract_numero_factura(self) -> str:
         """Extrae el número de factura del DTE"""
         try:
@@ -607,7 +607,10 @@ class InvoiceCreateSerializer(serializers.ModelSerializer):
                     uploaded_file.save(update_fields=['content_type'])
 
                 if content_type == 'application/json':
-                    parser = DTEJsonParser()
+                    # Lotes grandes: solo se construyen las rutas que se usan
+                    parser = DTEJsonParser(
+                        incremental=len(file_content) > DTEJsonParser.INCREMENTAL_THRESHOLD
+                    )
                     parsed_data = parser.parse(file_content)
                 else:
                     # Fallback a PDF si el tipo es desconocido pero la extensión es .pdf
@@ -0,0 +1,168 @@
+"""
+Motor de alertas de vencimiento de facturas a crédito.
+
+Calcula en UNA sola sentencia SQL (CTE con UPDATE ... RETURNING) las tres
+transiciones de cada corrida:
+- marcadas: facturas que entran a la ventana de alerta (vencen en 1..N días)
+- quitadas: facturas con alerta que ya no están en la ventana (vencidas,
+  pasadas a contado, eliminadas, fecha cambiada)
+- vencidas: facturas que vencieron desde la última corrida exitosa
+
+La corrida toma un advisory lock de PostgreSQL dentro de la transacción, así
+que dos ejecuciones simultáneas (beat duplicado, comando manual) no procesan
+lo mismo: la segunda queda registrada como 'skipped'. Cada corrida se guarda
+en DueDateAlertRun con sus conteos, IDs y duración.
+"""
+
+import logging
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+from invoices.models import DueDateAlertRun, Invoice
+
+logger = logging.getLogger(__name__)
+
+
+LOCK_NAME = 'invoices.due_date_alerts'
+MAX_DETAIL_IDS = 1000  # IDs guardados por transición en el log
+
+ALERT_TRANSITIONS_SQL = """
+WITH candidatos AS (
+    SELECT
+        id,
+        alerta_vencimiento AS alerta_anterior,
+        (tipo_pago = 'credito' AND NOT is_deleted
+         AND fecha_vencimiento > %(hoy)s AND fecha_vencimiento <= %(limite)s) AS alerta_nueva,
+        (tipo_pago = 'credito' AND NOT is_deleted
+         AND fecha_vencimiento >= %(vencidas_desde)s AND fecha_vencimiento < %(hoy)s) AS recien_vencida
+    FROM invoices_invoice
+    WHERE alerta_vencimiento
+       OR (tipo_pago = 'credito' AND NOT is_deleted
+           AND fecha_vencimiento >= %(vencidas_desde)s AND fecha_vencimiento <= %(limite)s)
+    FOR UPDATE
+),
+actualizadas AS (
+    UPDATE invoices_invoice AS inv
+    SET alerta_vencimiento = c.alerta_nueva
+    FROM candidatos AS c
+    WHERE inv.id = c.id
+      AND %(aplicar)s
+      AND inv.alerta_vencimiento IS DISTINCT FROM c.alerta_nueva
+    RETURNING inv.id
+)
+SELECT c.id, c.alerta_anterior, c.alerta_nueva, c.recien_vencida, (a.id IS NOT NULL) AS actualizada
+FROM candidatos AS c
+LEFT JOIN actualizadas AS a ON a.id = c.id
+WHERE c.alerta_anterior IS DISTINCT FROM c.alerta_nueva OR c.recien_vencida
+ORDER BY c.id
+"""
+
+
+class DueDateAlertEngine:
+    """
+    Aplica las transiciones de alertas de vencimiento.
+
+    Args:
+        dias_alerta: Días de anticipación para marcar alerta (default: 7)
+    """
+
+    def __init__(self, dias_alerta: int = 7):
+        self.dias_alerta = dias_alerta
+
+    def _vencidas_desde(self, hoy: date) -> date:
+        """
+        Inicio de la ventana de facturas recién vencidas.
+
+        Desde la fecha de la última corrida exitosa (exclusiva de lo ya
+        reportado), o solo ayer si nunca se ha corrido. Repetir la corrida el
+        mismo día no vuelve a reportar las mismas facturas.
+        """
+        ultima = (
+            DueDateAlertRun.objects
+            .filter(status='success', dry_run=False, fecha_corrida__lte=hoy)
+            .order_by('-fecha_corrida', '-created_at')
+            .values_list('fecha_corrida', flat=True)
+            .first()
+        )
+        return ultima if ultima else hoy - timedelta(days=1)
+
+    def run(self, dry_run: bool = False, hoy: Optional[date] = None) -> DueDateAlertRun:
+        """
+        Ejecuta una corrida completa.
+
+        Args:
+            dry_run: Si True calcula las transiciones sin modificar facturas
+            hoy: Fecha de la corrida (default: fecha local actual)
+
+        Returns:
+            DueDateAlertRun con el resultado
+        """
+        hoy = hoy or timezone.localdate()
+        limite = hoy + timedelta(days=self.dias_alerta)
+        start = time.monotonic()
+
+        run = DueDateAlertRun(fecha_corrida=hoy, dias_alerta=self.dias_alerta, dry_run=dry_run)
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", [LOCK_NAME])
+                    if not cursor.fetchone()[0]:
+                        logger.warning("[DUE_DATES] Otra corrida de alertas está en curso, se omite")
+                        run.status = 'skipped'
+                    else:
+                        cursor.execute(ALERT_TRANSITIONS_SQL, {
+                            'hoy': hoy,
+                            'limite': limite,
+                            'vencidas_desde': self._vencidas_desde(hoy),
+                            'aplicar': not dry_run,
+                        })
+                        rows = cursor.fetchall()
+                        self._summarize(run, rows)
+
+                        if any(row[4] for row in rows):
+                            # El UPDATE directo no dispara signals: invalidar caches de Invoice
+                            transaction.on_commit(lambda: bump_model_version(Invoice))
+
+                run.duracion_ms = int((time.monotonic() - start) * 1000)
+                run.save()
+
+        except Exception as e:
+            logger.error(f"[DUE_DATES] Error en corrida de alertas: {e}", exc_info=True)
+            run.pk = None
+            run.status = 'error'
+            run.error_message = str(e)
+            run.duracion_ms = int((time.monotonic() - start) * 1000)
+            run.save()
+            raise
+
+        logger.info(
+            f"[DUE_DATES] {hoy} ({run.status}): +{run.alertas_marcadas} alertas, "
+            f"-{run.alertas_quitadas} alertas, {run.facturas_vencidas} vencidas en {run.duracion_ms}ms"
+        )
+        return run
+
+    @staticmethod
+    def _summarize(run: DueDateAlertRun, rows) -> None:
+        marcadas, quitadas, vencidas = [], [], []
+        for invoice_id, alerta_anterior, alerta_nueva, recien_vencida, _ in rows:
+            if alerta_nueva and not alerta_anterior:
+                marcadas.append(invoice_id)
+            elif alerta_anterior and not alerta_nueva:
+                quitadas.append(invoice_id)
+            if recien_vencida:
+                vencidas.append(invoice_id)
+
+        run.alertas_marcadas = len(marcadas)
+        run.alertas_quitadas = len(quitadas)
+        run.facturas_vencidas = len(vencidas)
+        run.detalle = {
+            'marcadas': marcadas[:MAX_DETAIL_IDS],
+            'quitadas': quitadas[:MAX_DETAIL_IDS],
+            'vencidas': vencidas[:MAX_DETAIL_IDS],
+        }
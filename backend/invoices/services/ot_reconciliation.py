@@ -0,0 +1,254 @@
+"""
+Reconciliación por conjuntos Factura → OT.
+
+Calcula el estado consolidado de cada OT (estado_provision, fecha_provision,
+fecha_recepcion_factura) a partir de sus facturas vinculadas con UNA consulta
+agrupada (bool_or / MIN condicionales por OT), y aplica las diferencias con
+un solo bulk_update.
+
+Reglas de consolidación (las mismas de Invoice._sincronizar_estado_con_ot):
+- Facturas consideradas: no eliminadas, no anuladas/rechazadas, de tipo de
+  costo vinculado a OT (FLETE, CARGOS_NAVIERA y CostType.is_linked_to_ot).
+- Estado optimista: provisionada > disputada > revision > pendiente.
+- fecha_provision: la más antigua de las facturas provisionadas.
+- fecha_recepcion_factura: la más antigua fecha_facturacion de todas.
+- Sin facturas activas: la OT vuelve a pendiente sin fechas.
+
+Solo se reconcilian OTs que tienen al menos una factura de costo vinculado
+(activa o no); las OTs sin facturas conservan sus datos manuales.
+
+La dirección contraria (OT → facturas, lo que hace la señal
+sync_ot_to_invoices) está en sincronizar_facturas_desde_ots, que agrupa las
+OTs con los mismos valores en un solo UPDATE.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from django.contrib.postgres.aggregates import BoolOr
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Min, Q
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+
+logger = logging.getLogger(__name__)
+
+
+LINKED_COST_TYPES = ['FLETE', 'CARGOS_NAVIERA']
+ESTADOS_EXCLUIDOS = ['anulada', 'anulada_parcialmente', 'rechazada']
+# Estados que OT.save() respeta aunque no haya fecha de provisión
+ESTADOS_MANUALES_OT = ['rechazada', 'disputada', 'revision', 'anulada', 'anulada_parcialmente']
+# Facturas que la sincronización OT -> facturas nunca modifica
+ESTADOS_ANULADOS = ['anulada', 'anulada_parcialmente']
+
+
+@dataclass
+class OTDiff:
+    """Diferencias entre el estado actual de una OT y el consolidado."""
+    ot_id: int
+    numero_ot: str
+    cambios: Dict[str, tuple] = field(default_factory=dict)  # campo -> (actual, nuevo)
+    valores: Dict = field(default_factory=dict)  # valores destino completos
+
+
+def linked_cost_types() -> List[str]:
+    """Códigos de tipo de costo cuyas facturas se sincronizan con la OT."""
+    from catalogs.models import CostType
+
+    dinamicos = CostType.objects.filter(
+        is_linked_to_ot=True,
+        is_active=True,
+        is_deleted=False
+    ).values_list('code', flat=True)
+    return sorted(set(LINKED_COST_TYPES) | set(dinamicos))
+
+
+def consolidate(tiene_provisionada: bool, tiene_disputada: bool, tiene_revision: bool,
+                min_provision: Optional[date], min_facturacion: Optional[date],
+                estado_facturado_actual: str) -> Dict:
+    """
+    Valores destino de la OT a partir de los agregados de sus facturas.
+
+    Aplica además las reglas derivadas de OT.save() (que bulk_update no
+    ejecuta): 'provisionada' sin fecha queda 'pendiente', y estado_facturado
+    sigue a fecha_recepcion_factura.
+    """
+    if tiene_provisionada:
+        estado = 'provisionada'
+        fecha_provision = min_provision
+    elif tiene_disputada:
+        estado, fecha_provision = 'disputada', None
+    elif tiene_revision:
+        estado, fecha_provision = 'revision', None
+    else:
+        estado, fecha_provision = 'pendiente', None
+
+    if estado not in ESTADOS_MANUALES_OT and not fecha_provision:
+        estado = 'pendiente'
+
+    estado_facturado = estado_facturado_actual
+    if min_facturacion and estado_facturado == 'pendiente':
+        estado_facturado = 'facturado'
+    elif not min_facturacion and estado_facturado == 'facturado':
+        estado_facturado = 'pendiente'
+
+    return {
+        'estado_provision': estado,
+        'fecha_provision': fecha_provision,
+        'fecha_recepcion_factura': min_facturacion,
+        'estado_facturado': estado_facturado,
+    }
+
+
+def valores_facturas_desde_ot(estado_provision: str, fecha_provision: Optional[date],
+                              fecha_recepcion_factura: Optional[date]) -> Dict:
+    """Valores que una OT propaga a sus facturas vinculadas."""
+    if estado_provision in ('disputada', 'revision', 'pendiente'):
+        valores = {'estado_provision': estado_provision, 'fecha_provision': None}
+    else:
+        valores = {'estado_provision': estado_provision, 'fecha_provision': fecha_provision}
+
+    # Fecha de facturación: se aplica a todas las facturas no anuladas
+    if fecha_recepcion_factura:
+        valores.update(fecha_facturacion=fecha_recepcion_factura, estado_facturacion='facturada')
+    else:
+        valores.update(fecha_facturacion=None, estado_facturacion='pendiente')
+    return valores
+
+
+def sincronizar_facturas_desde_ots(ots: Iterable, codigos: Optional[List[str]] = None) -> int:
+    """
+    Propaga estado_provision, fecha_provision y fecha_recepcion_factura de
+    cada OT a sus facturas vinculadas (no eliminadas ni anuladas).
+
+    Las OTs con los mismos valores se actualizan con un solo UPDATE. Retorna
+    el total de facturas actualizadas.
+    """
+    from invoices.models import Invoice
+
+    grupos = defaultdict(list)
+    for ot in ots:
+        valores = valores_facturas_desde_ot(ot.estado_provision, ot.fecha_provision, ot.fecha_recepcion_factura)
+        grupos[tuple(sorted(valores.items()))].append(ot.pk)
+    if not grupos:
+        return 0
+
+    if codigos is None:
+        codigos = linked_cost_types()
+
+    total = 0
+    for valores, ot_ids in grupos.items():
+        total += Invoice.objects.filter(
+            ot_id__in=ot_ids,
+            is_deleted=False,
+            tipo_costo__in=codigos,
+        ).exclude(
+            estado_provision__in=ESTADOS_ANULADOS
+        ).update(**dict(valores))
+
+    if total:
+        bump_model_version(Invoice)
+    return total
+
+
+class InvoiceOTReconciler:
+    """
+    Args:
+        batch_size: Tamaño de lote del bulk_update
+    """
+
+    FIELDS = ['estado_provision', 'fecha_provision', 'fecha_recepcion_factura', 'estado_facturado']
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+
+    def aggregates(self, ot_ids: Optional[Iterable[int]] = None):
+        """
+        Una fila por OT con sus valores actuales y los agregados de facturas.
+        Una sola consulta (GROUP BY ot_id con agregados condicionales).
+        """
+        from invoices.models import Invoice
+
+        activa = Q(is_deleted=False) & ~Q(estado_provision__in=ESTADOS_EXCLUIDOS)
+
+        def tiene(estado):
+            return BoolOr(
+                ExpressionWrapper(Q(estado_provision=estado), output_field=BooleanField()),
+                filter=activa,
+            )
+
+        qs = Invoice.all_objects.filter(
+            ot__isnull=False,
+            ot__is_deleted=False,
+            tipo_costo__in=linked_cost_types(),
+        )
+        if ot_ids is not None:
+            qs = qs.filter(ot_id__in=list(ot_ids))
+
+        return (
+            qs.values(
+                'ot_id',
+                'ot__numero_ot',
+                'ot__estado_provision',
+                'ot__fecha_provision',
+                'ot__fecha_recepcion_factura',
+                'ot__estado_facturado',
+            )
+            .annotate(
+                tiene_provisionada=tiene('provisionada'),
+                tiene_disputada=tiene('disputada'),
+                tiene_revision=tiene('revision'),
+                min_provision=Min('fecha_provision', filter=activa & Q(estado_provision='provisionada')),
+                min_facturacion=Min('fecha_facturacion', filter=activa),
+            )
+            .order_by('ot_id')
+        )
+
+    def diff(self, ot_ids: Optional[Iterable[int]] = None) -> List[OTDiff]:
+        """Calcula las OTs cuyo estado difiere del consolidado (sin escribir)."""
+        diffs = []
+        for row in self.aggregates(ot_ids):
+            target = consolidate(
+                bool(row['tiene_provisionada']),
+                bool(row['tiene_disputada']),
+                bool(row['tiene_revision']),
+                row['min_provision'],
+                row['min_facturacion'],
+                row['ot__estado_facturado'],
+            )
+            cambios = {
+                name: (row[f'ot__{name}'], value)
+                for name, value in target.items()
+                if row[f'ot__{name}'] != value
+            }
+            if cambios:
+                diffs.append(OTDiff(row['ot_id'], row['ot__numero_ot'], cambios, target))
+        return diffs
+
+    def apply(self, diffs: List[OTDiff]) -> int:
+        """Aplica las diferencias con un bulk_update. Retorna OTs actualizadas."""
+        from ots.models import OT
+
+        if not diffs:
+            return 0
+
+        now = timezone.now()
+        objs = [OT(pk=d.ot_id, updated_at=now, **d.valores) for d in diffs]
+
+        with transaction.atomic():
+            OT.all_objects.bulk_update(objs, self.FIELDS + ['updated_at'], batch_size=self.batch_size)
+            # bulk_update no dispara señales: invalidar caches de OT
+            transaction.on_commit(lambda: bump_model_version(OT))
+
+        logger.info(f"[OT_SYNC] {len(objs)} OTs reconciliadas con sus facturas")
+        return len(objs)
+
+    def run(self, dry_run: bool = False, ot_ids: Optional[Iterable[int]] = None) -> List[OTDiff]:
+        diffs = self.diff(ot_ids)
+        if not dry_run:
+            self.apply(diffs)
+        return diffs
@@ -8,6 +8,9 @@ from django.dispatch import receiver
 from ots.models import OT
 from invoices.models import Invoice
 
+# Campos de la OT que sync_ot_to_invoices copia a sus facturas vinculadas
+OT_SYNC_FIELDS = frozenset(['estado_provision', 'fecha_provision', 'fecha_recepcion_factura'])
+
 
 @receiver(post_save, sender=OT)
 def sync_ot_to_invoices(sender, instance, created, **kwargs):
@@ -26,81 +29,22 @@ def sync_ot_to_invoices(sender, instance, created, **kwargs):
 
     if getattr(instance, '_skip_invoice_sync', False):
         return
-    
-    from invoices.models import Invoice
-    from catalogs.models import CostType
-    from django.db.models import Q
-    
-    # Obtener todos los códigos de tipos vinculados desde el catálogo
-    tipos_vinculados_dinamicos = list(CostType.objects.filter(
-        is_linked_to_ot=True,
-        is_active=True,
-        is_deleted=False
-    ).values_list('code', flat=True))
-    
-    # Tipos hardcodeados legacy (siempre vinculados)
-    tipos_hardcoded = ['FLETE', 'CARGOS_NAVIERA']
-    
-    # Combinar ambas listas
-    todos_tipos_vinculados = set(tipos_hardcoded + tipos_vinculados_dinamicos)
-    
-    # Obtener facturas vinculadas asociadas a esta OT
-    # EXCLUIR INMEDIATAMENTE las facturas anuladas para que no sean afectadas por ningún cambio
-    invoices_to_update = Invoice.objects.filter(
-        ot=instance,
-        is_deleted=False,
-        tipo_costo__in=list(todos_tipos_vinculados)
-    ).exclude(
-        estado_provision__in=['anulada', 'anulada_parcialmente']
-    )
-    
-    if not invoices_to_update.exists():
-        # Logging para debug: No hay facturas vinculadas
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"[SIGNAL OT->INVOICE] OT {instance.numero_ot}: No hay facturas vinculadas activas para sincronizar")
+
+    # Nada que propagar si no cambió ninguno de los campos sincronizados
+    dirty = instance.get_dirty_fields()
+    if dirty is not None and not dirty & OT_SYNC_FIELDS:
         return
     
-    update_data = {}
-    estado_ot = instance.estado_provision
-
-    # Lógica para determinar qué datos actualizar en las facturas válidas
-    if estado_ot in ['disputada', 'revision']:
-        update_data['estado_provision'] = estado_ot
-        update_data['fecha_provision'] = None
-    elif estado_ot == 'provisionada':
-        update_data['estado_provision'] = 'provisionada'
-        update_data['fecha_provision'] = instance.fecha_provision
-    elif estado_ot == 'pendiente':
-        update_data['estado_provision'] = 'pendiente'
-        update_data['fecha_provision'] = None
-    else:
-        # Fallback para cualquier otro estado que pueda tener la OT
-        update_data['estado_provision'] = estado_ot
-        update_data['fecha_provision'] = instance.fecha_provision
-
-    # Sincronizar fecha de facturación (esto se aplica a todas las facturas no anuladas)
-    if instance.fecha_recepcion_factura:
-        update_data['fecha_facturacion'] = instance.fecha_recepcion_factura
-        update_data['estado_facturacion'] = 'facturada'
-    else:
-        update_data['fecha_facturacion'] = None
-        update_data['estado_facturacion'] = 'pendiente'
+    from invoices.services.ot_reconciliation import sincronizar_facturas_desde_ots
 
-    if not update_data:
-        return
+    count = sincronizar_facturas_desde_ots([instance])
 
-    count = invoices_to_update.update(**update_data)
-    
-    # Logging mejorado
     import logging
     logger = logging.getLogger(__name__)
     if count > 0:
         logger.info(f"[SIGNAL OT->INVOICE] OT {instance.numero_ot}: Sincronizadas {count} facturas vinculadas.")
-        logger.debug(f"  - Tipos vinculados considerados: {list(todos_tipos_vinculados)}")
-        logger.debug(f"  - Datos aplicados: {update_data}")
     else:
-        logger.warning(f"[SIGNAL OT->INVOICE] OT {instance.numero_ot}: No se actualizó ninguna factura (posible error de filtro)")
+        logger.info(f"[SIGNAL OT->INVOICE] OT {instance.numero_ot}: No hay facturas vinculadas activas para sincronizar")
 
 
 @receiver(post_save, sender=Invoice)
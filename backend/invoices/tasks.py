@@ -3,26 +3,36 @@ Celery tasks para el módulo de Invoices.
 """
 
 from celery import shared_task
-from django.core.management import call_command
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 @shared_task(name='invoices.tasks.check_invoice_due_dates')
-def check_invoice_due_dates():
+def check_invoice_due_dates(dias_alerta=7):
     """
     Task periódico para verificar fechas de vencimiento de facturas.
     Se ejecuta diariamente a las 7:00 AM vía Celery Beat.
+
+    Idempotente: repetirlo el mismo día no produce cambios, y si otra
+    corrida está en curso queda registrado como 'skipped'.
     """
+    from invoices.services.due_date_alerts import DueDateAlertEngine
+
     logger.info("🔔 Iniciando verificación de alertas de vencimiento...")
-    
+
     try:
-        # Ejecutar el management command
-        call_command('marcar_alertas_vencimiento', dias=7)
+        run = DueDateAlertEngine(dias_alerta=dias_alerta).run()
         logger.info("✅ Verificación de alertas completada exitosamente")
-        return {"status": "success", "message": "Alertas procesadas correctamente"}
-    
+        return {
+            "status": run.status,
+            "run_id": run.id,
+            "alertas_marcadas": run.alertas_marcadas,
+            "alertas_quitadas": run.alertas_quitadas,
+            "facturas_vencidas": run.facturas_vencidas,
+            "duracion_ms": run.duracion_ms,
+        }
+
     except Exception as e:
         logger.error(f"❌ Error al verificar alertas: {str(e)}", exc_info=True)
         return {"status": "error", "message": str(e)}
@@ -758,6 +758,27 @@ class InvoiceViewSetTestCase(APITestCase):
         file_bytes = b''.join(response.streaming_content)
         self.assertGreater(len(file_bytes), 0)
     
+    def test_retrieve_invoice_file_range_and_etag(self):
+        """El archivo se sirve con Range (206) y revalidación por ETag (304)."""
+        url = f'/api/invoices/{self.invoice.id}/file/'
+        full = self.client.get(url)
+        content = b''.join(full.streaming_content)
+        etag = full['ETag']
+
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        self.assertIn(self.uploaded_file.sha256, etag)
+
+        partial = self.client.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(partial.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(partial['Content-Range'], f'bytes 2-5/{len(content)}')
+        self.assertEqual(b''.join(partial.streaming_content), content[2:6])
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        out_of_range = self.client.get(url, HTTP_RANGE=f'bytes={len(content) + 10}-')
+        self.assertEqual(out_of_range.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+    
     def test_get_pending_invoices(self):
         """Test endpoint de facturas pendientes de revisión"""
         # Crear factura que requiere revisión
@@ -787,7 +808,25 @@ class InvoiceViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # Al menos 1 factura requiere revisión
         self.assertGreaterEqual(len(response.data['results']), 1)
-    
+
+    def test_filter_values_with_etag(self):
+        """Test filter_values: proveedores/tipos con facturas, ETag y 304"""
+        from django.core.cache import cache
+        cache.clear()
+
+        url = '/api/invoices/filter_values/'
+        response = self.client.get(url, {'counts': 'true'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['proveedores'],
+            [{'id': self.proveedor.id, 'nombre': self.proveedor.nombre}]
+        )
+        self.assertEqual(response.data['counts']['tipos_costo'], {'FLETE': 1})
+
+        not_modified = self.client.get(url, {'counts': 'true'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_authentication_required(self):
         """Test que los endpoints requieren autenticación"""
         self.client.force_authenticate(user=None)
@@ -797,6 +836,151 @@ class InvoiceViewSetTestCase(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+class DTEJsonParserIncrementalTestCase(TestCase):
+    """Tests para el modo incremental (streaming) de DTEJsonParser"""
+    
+    def setUp(self):
+        self.dte = {
+            'identificacion': {'numeroControl': 'DTE-03-M001P001-000000000000001', 'fecEmi': '2025-01-15'},
+            'emisor': {'nit': '0614-120589-001-4', 'nombre': 'MAERSK LINE'},
+            'receptor': {'nombre': 'CLIENTE', 'direccion': {'complemento': 'x' * 200}},
+            'cuerpoDocumento': [
+                {'numItem': 1, 'descripcion': 'Flete MBL MAEU1234567890 OT-2025-001', 'precioUni': 1200.5},
+                {'numItem': 2, 'descripcion': 'Contenedor MSCU1234567', 'precioUni': 0.0},
+            ],
+            'resumen': {'totalPagar': 1356.57},
+            'apendice': [{'campo': 'a', 'valor': 'b'}],
+        }
+        self.content = json.dumps(self.dte).encode('utf-8')
+    
+    def _without_raw(self, result):
+        return {k: v for k, v in result.items() if k != 'raw_data'}
+    
+    def test_same_output_as_full_parser(self):
+        """El modo incremental extrae lo mismo que json.loads del archivo completo"""
+        from .parsers import DTEJsonParser
+        
+        full = DTEJsonParser().parse(self.content)
+        incremental = DTEJsonParser(incremental=True).parse(self.content)
+        
+        self.assertEqual(self._without_raw(incremental), self._without_raw(full))
+        self.assertEqual(incremental['monto'], Decimal('1356.57'))
+        # Solo se construyen las rutas necesarias
+        self.assertNotIn('receptor', incremental['raw_data'])
+        self.assertNotIn('apendice', incremental['raw_data'])
+        self.assertEqual(
+            incremental['raw_data']['cuerpoDocumento'][0],
+            {'descripcion': 'Flete MBL MAEU1234567890 OT-2025-001'}
+        )
+    
+    def test_pure_python_fallback_with_small_chunks(self):
+        """El tokenizador propio maneja tokens cortados entre chunks"""
+        import io
+        from .parsers import dte_json
+        
+        for chunk_size in (1, 3, 7, 64):
+            events = dte_json._JsonEventReader(io.BytesIO(self.content), chunk_size=chunk_size).events()
+            event, value = next(events)
+            self.assertEqual(dte_json._collect(events, event, value, True), self.dte)
+    
+    def test_multi_document_files(self):
+        """Arreglo JSON y objetos concatenados (NDJSON) producen un resultado por DTE"""
+        import io
+        from .parsers import DTEJsonParser
+        
+        second = dict(self.dte, identificacion={'numeroControl': 'DTE-2', 'fecEmi': '2025-02-01'})
+        second_content = json.dumps(second).encode('utf-8')
+        
+        as_array = b'[' + self.content + b',' + second_content + b']'
+        as_ndjson = io.BytesIO(self.content + b'\n' + second_content + b'\n')
+        
+        for source in (as_array, as_ndjson):
+            results = list(DTEJsonParser(incremental=True).parse_documents(source))
+            self.assertEqual(
+                [r['numero_factura'] for r in results],
+                ['DTE-03-M001P001-000000000000001', 'DTE-2']
+            )
+    
+    def test_invalid_json_returns_empty_result(self):
+        """JSON inválido se reporta en errors igual que en el modo normal"""
+        from .parsers import DTEJsonParser
+        
+        parser = DTEJsonParser(incremental=True)
+        result = parser.parse(b'{"identificacion": {"numeroControl": "X"')
+        
+        self.assertEqual(result['confidence'], 0.0)
+        self.assertTrue(any('Error al decodificar JSON' in e for e in parser.errors))
+
+
+class FileDeliveryServiceTestCase(TestCase):
+    """Tests para common.file_delivery usando un storage local como fuente remota"""
+    
+    def setUp(self):
+        from django.core.files.storage import FileSystemStorage
+        from common.file_delivery import LocalDiskLRUCache, StorageFileSource
+        
+        self.storage_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        storage = FileSystemStorage(location=self.storage_dir)
+        self.paths = []
+        for n in range(3):
+            self.paths.append(storage.save(f'invoices/file_{n}.pdf', ContentFile(bytes([65 + n]) * 1000)))
+        
+        class RemoteSource(StorageFileSource):
+            remote = True
+            downloads = 0
+            
+            def iter_content(self, storage_path):
+                RemoteSource.downloads += 1
+                return super().iter_content(storage_path)
+        
+        self.source = RemoteSource(storage)
+        self.disk_cache = LocalDiskLRUCache(self.cache_dir, max_bytes=2500)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.storage_dir, ignore_errors=True)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+    
+    def _get(self, path, **headers):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from common.file_delivery import FileDeliveryService
+        
+        request = Request(APIRequestFactory().get('/file/', **headers))
+        service = FileDeliveryService(source=self.source, disk_cache=self.disk_cache, mode='proxy')
+        return service.serve(request, path, 'file.pdf', 'application/pdf')
+    
+    def test_remote_files_are_cached_on_disk(self):
+        first = b''.join(self._get(self.paths[0]).streaming_content)
+        second = b''.join(self._get(self.paths[0]).streaming_content)
+        
+        self.assertEqual(first, b'A' * 1000)
+        self.assertEqual(second, first)
+        self.assertEqual(self.source.downloads, 1)
+    
+    def test_lru_evicts_least_recently_used(self):
+        for path in self.paths[:2]:
+            b''.join(self._get(path).streaming_content)
+        # Marcar el segundo como el menos reciente (el mtime puede tener resolución gruesa)
+        os.utime(self.disk_cache.path_for(self.paths[1]), (0, 0))
+        b''.join(self._get(self.paths[2]).streaming_content)
+        
+        self.assertIsNotNone(self.disk_cache.get(self.paths[0]))
+        self.assertIsNone(self.disk_cache.get(self.paths[1]))
+        self.assertIsNotNone(self.disk_cache.get(self.paths[2]))
+    
+    def test_suffix_range_and_missing_file(self):
+        response = self._get(self.paths[1], HTTP_RANGE='bytes=-10')
+        
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 990-999/1000')
+        self.assertEqual(b''.join(response.streaming_content), b'B' * 10)
+        
+        missing = self._get('invoices/no_existe.pdf')
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class InvoiceStateLogicTestCase(TestCase):
     """
     Tests para la lógica de estados y sincronización de facturas,
@@ -980,3 +1164,321 @@ class InvoiceStateLogicTestCase(TestCase):
         self.ot.refresh_from_db()
         self.assertEqual(self.ot.fecha_provision, date(2025, 11, 10), "Guardar la factura anulada no debió resetear la fecha de la OT.")
         self.assertEqual(self.ot.estado_provision, 'provisionada', "Guardar la factura anulada no debió cambiar el estado de la OT.")
+
+
+class DueDateAlertEngineTestCase(TestCase):
+    """Tests para el motor de alertas de vencimiento en lote"""
+
+    HOY = date(2025, 3, 10)
+
+    def setUp(self):
+        self.proveedor = Provider.objects.create(
+            nombre="Proveedor Crédito",
+            tipo="naviera",
+            categoria="internacional"
+        )
+        self.proxima = self._create_credit_invoice("FAC-PROXIMA", self.HOY + timedelta(days=3))
+        self.lejana = self._create_credit_invoice("FAC-LEJANA", self.HOY + timedelta(days=20))
+        self.vencida_ayer = self._create_credit_invoice(
+            "FAC-VENCIDA", self.HOY - timedelta(days=1), alerta=True
+        )
+        self.vencida_antigua = self._create_credit_invoice("FAC-ANTIGUA", self.HOY - timedelta(days=40))
+
+    def _create_credit_invoice(self, numero, fecha_vencimiento, alerta=False):
+        content = numero.encode()
+        uploaded_file = UploadedFile.objects.create(
+            filename=f"{numero}.pdf",
+            path=f"invoices/test/{numero}.pdf",
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type="application/pdf"
+        )
+        invoice = Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=fecha_vencimiento - timedelta(days=30),
+            monto=Decimal("100.00"),
+            proveedor=self.proveedor,
+            tipo_costo="FLETE",
+            uploaded_file=uploaded_file,
+        )
+        # Sin pasar por save(): el cálculo automático depende del proveedor
+        Invoice.objects.filter(pk=invoice.pk).update(
+            tipo_pago='credito',
+            fecha_vencimiento=fecha_vencimiento,
+            alerta_vencimiento=alerta,
+        )
+        return invoice
+
+    def _alertas(self):
+        return set(
+            Invoice.objects.filter(alerta_vencimiento=True).values_list('numero_factura', flat=True)
+        )
+
+    def test_run_applies_transitions_in_batch(self):
+        from invoices.services.due_date_alerts import DueDateAlertEngine
+
+        run = DueDateAlertEngine(dias_alerta=7).run(hoy=self.HOY)
+
+        self.assertEqual(run.status, 'success')
+        self.assertEqual(self._alertas(), {"FAC-PROXIMA"})
+        self.assertEqual(run.detalle['marcadas'], [self.proxima.pk])
+        self.assertEqual(run.detalle['quitadas'], [self.vencida_ayer.pk])
+        # Primera corrida: solo lo vencido desde ayer, no el histórico
+        self.assertEqual(run.detalle['vencidas'], [self.vencida_ayer.pk])
+
+    def test_run_is_idempotent(self):
+        from invoices.models import DueDateAlertRun
+        from invoices.services.due_date_alerts import DueDateAlertEngine
+
+        engine = DueDateAlertEngine(dias_alerta=7)
+        engine.run(hoy=self.HOY)
+        second = engine.run(hoy=self.HOY)
+
+        self.assertEqual(
+            (second.alertas_marcadas, second.alertas_quitadas, second.facturas_vencidas),
+            (0, 0, 0)
+        )
+        self.assertEqual(DueDateAlertRun.objects.filter(status='success').count(), 2)
+
+        # Días después: la alerta se quita y la vencida se reporta una sola vez
+        later = engine.run(hoy=self.HOY + timedelta(days=5))
+        self.assertEqual(self._alertas(), set())
+        self.assertEqual(later.detalle['quitadas'], [self.proxima.pk])
+        self.assertEqual(later.detalle['vencidas'], [self.proxima.pk])
+
+    def test_dry_run_does_not_modify_invoices(self):
+        from invoices.services.due_date_alerts import DueDateAlertEngine
+
+        run = DueDateAlertEngine(dias_alerta=7).run(dry_run=True, hoy=self.HOY)
+
+        self.assertEqual(run.alertas_marcadas, 1)
+        self.assertEqual(run.alertas_quitadas, 1)
+        self.assertEqual(self._alertas(), {"FAC-VENCIDA"})
+
+    def test_run_skipped_when_lock_is_held(self):
+        from django.db import connections
+        from invoices.services.due_date_alerts import DueDateAlertEngine, LOCK_NAME
+
+        other = connections.create_connection('default')
+        try:
+            with other.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", [LOCK_NAME])
+            run = DueDateAlertEngine(dias_alerta=7).run(hoy=self.HOY)
+        finally:
+            other.close()
+
+        self.assertEqual(run.status, 'skipped')
+        self.assertEqual(self._alertas(), {"FAC-VENCIDA"})
+
+    def test_command_uses_engine(self):
+        from io import StringIO
+        from unittest.mock import patch
+        from django.core.management import call_command
+
+        out = StringIO()
+        with patch('django.utils.timezone.localdate', return_value=self.HOY):
+            call_command('marcar_alertas_vencimiento', dias=7, stdout=out)
+
+        self.assertIn("FAC-PROXIMA", out.getvalue())
+        self.assertEqual(self._alertas(), {"FAC-PROXIMA"})
+
+    def test_task_is_scheduled_in_celery_beat(self):
+        from django.conf import settings
+        from invoices import tasks
+        from workers.celery import app
+
+        entry = settings.CELERY_BEAT_SCHEDULE['check-invoice-due-dates']
+        self.assertEqual(entry['task'], 'invoices.tasks.check_invoice_due_dates')
+        self.assertEqual(app.tasks[entry['task']], tasks.check_invoice_due_dates)
+        self.assertEqual(entry['schedule'].hour, {7})
+        self.assertEqual(app.conf.beat_schedule, settings.CELERY_BEAT_SCHEDULE)
+
+
+class SoftDeletePurgeEngineTestCase(TestCase):
+    """Tests para la purga por lotes de registros soft-deleted"""
+
+    def setUp(self):
+        self.proveedor = Provider.objects.create(
+            nombre="Proveedor Purga",
+            tipo="naviera",
+            categoria="internacional"
+        )
+        self.old = timezone.now() - timedelta(days=60)
+
+    def _create_invoice(self, numero, deleted=True):
+        content = numero.encode()
+        path = f"invoices/test/purge_{numero}.pdf"
+        default_storage.delete(path)
+        default_storage.save(path, ContentFile(content))
+        self.addCleanup(default_storage.delete, path)
+        uploaded_file = UploadedFile.objects.create(
+            filename=f"{numero}.pdf",
+            path=path,
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type="application/pdf"
+        )
+        invoice = Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=date(2025, 1, 15),
+            monto=Decimal("100.00"),
+            proveedor=self.proveedor,
+            tipo_costo="FLETE",
+            uploaded_file=uploaded_file,
+        )
+        if deleted:
+            Invoice.all_objects.filter(pk=invoice.pk).update(is_deleted=True, deleted_at=self.old)
+        UploadedFile.objects.filter(pk=uploaded_file.pk).update(created_at=self.old)
+        return invoice
+
+    def test_purge_resolves_dependents_and_orphan_files(self):
+        from common.purge import SoftDeletePurgeEngine
+        from invoices.models import Dispute, DisputeEvent
+
+        invoice = self._create_invoice("PURGE-001")
+        live = self._create_invoice("PURGE-LIVE", deleted=False)
+        dispute = Dispute.objects.create(
+            numero_caso="CASO-1", invoice=invoice, tipo_disputa="cantidad",
+            detalle="Cobro duplicado", monto_disputa=Decimal("10.00"),
+        )
+        DisputeEvent.objects.create(dispute=dispute, tipo="comentario", descripcion="x", usuario="test")
+
+        engine = SoftDeletePurgeEngine(batch_size=10)
+        stats = engine.purge(Invoice, older_than=timedelta(days=30))
+
+        self.assertEqual(stats['deleted'], 1)
+        self.assertFalse(Invoice.all_objects.filter(pk=invoice.pk).exists())
+        self.assertFalse(Dispute.all_objects.filter(pk=dispute.pk).exists())
+        self.assertFalse(DisputeEvent.objects.filter(dispute_id=dispute.pk).exists())
+        self.assertTrue(Invoice.objects.filter(pk=live.pk).exists())
+
+        files = engine.purge_orphans(UploadedFile, path_field='path', older_than=timedelta(hours=1))
+        self.assertEqual(files['deleted'], 1)
+        self.assertFalse(default_storage.exists("invoices/test/purge_PURGE-001.pdf"))
+        self.assertTrue(UploadedFile.objects.filter(pk=live.uploaded_file_id).exists())
+
+    def test_purge_resumes_from_checkpoint(self):
+        from common.models import PurgeCheckpoint
+        from common.purge import SoftDeletePurgeEngine
+
+        first, second, third = (self._create_invoice(f"PURGE-R{n}") for n in range(3))
+        # Purga interrumpida después del primer lote
+        PurgeCheckpoint.objects.create(
+            key='invoices.Invoice:deleted', last_pk=first.pk,
+            cutoff=timezone.now(), status='running', deleted_count=1,
+        )
+
+        stats = SoftDeletePurgeEngine(batch_size=1).purge(Invoice, older_than=timedelta(days=30))
+
+        self.assertEqual(stats['resumed_from'], first.pk)
+        self.assertEqual(stats['deleted'], 3)
+        self.assertEqual(stats['chunks'], 2)
+        self.assertTrue(Invoice.all_objects.filter(pk=first.pk).exists())
+        self.assertFalse(Invoice.all_objects.filter(pk__in=[second.pk, third.pk]).exists())
+        checkpoint = PurgeCheckpoint.objects.get(key='invoices.Invoice:deleted')
+        self.assertEqual((checkpoint.status, checkpoint.last_pk), ('completed', third.pk))
+
+    def test_protected_rows_are_skipped(self):
+        from common.purge import SoftDeletePurgeEngine
+
+        self._create_invoice("PURGE-P1", deleted=False)
+        Provider.all_objects.filter(pk=self.proveedor.pk).update(is_deleted=True, deleted_at=self.old)
+
+        stats = SoftDeletePurgeEngine().purge(Provider)
+
+        self.assertEqual((stats['deleted'], stats['skipped']), (0, 1))
+        self.assertTrue(Provider.all_objects.filter(pk=self.proveedor.pk).exists())
+
+
+class InvoiceOTReconcilerTestCase(TestCase):
+    """Tests para la reconciliación por conjuntos Factura → OT"""
+
+    def setUp(self):
+        self.cliente = ClientAlias.objects.create(
+            original_name="Cliente Reconciliación",
+            normalized_name="CLIENTE RECONCILIACION"
+        )
+        self.proveedor = Provider.objects.create(
+            nombre="Naviera Reconciliación",
+            tipo="naviera",
+            categoria="internacional"
+        )
+        self.ot_provisionada = OT.objects.create(numero_ot="OT-REC-001", cliente=self.cliente)
+        self.ot_disputada = OT.objects.create(numero_ot="OT-REC-002", cliente=self.cliente)
+        self.ot_manual = OT.objects.create(
+            numero_ot="OT-REC-003", cliente=self.cliente, fecha_provision=date(2025, 2, 1)
+        )
+
+        self._invoice("REC-A", self.ot_provisionada, 'provisionada', date(2025, 1, 10), date(2025, 1, 20))
+        self._invoice("REC-B", self.ot_provisionada, 'provisionada', date(2025, 1, 5), None)
+        self._invoice("REC-C", self.ot_provisionada, 'anulada', date(2024, 12, 1), date(2024, 12, 2))
+        self._invoice("REC-D", self.ot_disputada, 'disputada', None, None)
+
+        # Desincronizar las OTs sin pasar por señales
+        OT.objects.filter(pk__in=[self.ot_provisionada.pk, self.ot_disputada.pk]).update(
+            estado_provision='pendiente', fecha_provision=None, fecha_recepcion_factura=None,
+            estado_facturado='pendiente',
+        )
+
+    def _invoice(self, numero, ot, estado, fecha_provision, fecha_facturacion):
+        content = numero.encode()
+        uploaded_file = UploadedFile.objects.create(
+            filename=f"{numero}.pdf",
+            path=f"invoices/test/{numero}.pdf",
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type="application/pdf"
+        )
+        invoice = Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=date(2025, 1, 1),
+            monto=Decimal("100.00"),
+            proveedor=self.proveedor,
+            tipo_costo="FLETE",
+            ot=ot,
+            uploaded_file=uploaded_file,
+        )
+        Invoice.objects.filter(pk=invoice.pk).update(
+            estado_provision=estado, fecha_provision=fecha_provision, fecha_facturacion=fecha_facturacion
+        )
+        return invoice
+
+    def test_dry_run_reports_diffs_without_writing(self):
+        from invoices.services.ot_reconciliation import InvoiceOTReconciler
+
+        diffs = InvoiceOTReconciler().run(dry_run=True)
+
+        by_ot = {d.numero_ot: d.cambios for d in diffs}
+        self.assertEqual(set(by_ot), {"OT-REC-001", "OT-REC-002"})
+        self.assertEqual(by_ot["OT-REC-001"]['estado_provision'], ('pendiente', 'provisionada'))
+        self.assertEqual(by_ot["OT-REC-001"]['fecha_provision'], (None, date(2025, 1, 5)))
+        self.ot_provisionada.refresh_from_db()
+        self.assertEqual(self.ot_provisionada.estado_provision, 'pendiente')
+
+    def test_sync_applies_consolidated_state_in_bulk(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from invoices.services.ot_reconciliation import InvoiceOTReconciler
+
+        with CaptureQueriesContext(connection) as ctx:
+            diffs = InvoiceOTReconciler().run()
+        self.assertEqual(len(diffs), 2)
+        selects = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual((len(selects), len(updates)), (2, 1))  # tipos vinculados + agregado; bulk_update
+
+        self.ot_provisionada.refresh_from_db()
+        self.assertEqual(self.ot_provisionada.estado_provision, 'provisionada')
+        self.assertEqual(self.ot_provisionada.fecha_provision, date(2025, 1, 5))
+        self.assertEqual(self.ot_provisionada.fecha_recepcion_factura, date(2025, 1, 20))
+        self.assertEqual(self.ot_provisionada.estado_facturado, 'facturado')
+
+        self.ot_disputada.refresh_from_db()
+        self.assertEqual(self.ot_disputada.estado_provision, 'disputada')
+
+        # La OT sin facturas conserva sus datos manuales
+        self.ot_manual.refresh_from_db()
+        self.assertEqual(self.ot_manual.fecha_provision, date(2025, 2, 1))
+
+        # Idempotente
+        self.assertEqual(InvoiceOTReconciler().run(), [])
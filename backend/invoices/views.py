@@ -50,10 +50,33 @@ from .serializers import (
     CreditNoteUpdateSerializer,
 )
 from common.permissions import IsAdminOrJefeOps, IsAdminOrFinanzas, CanImportData
-from common.mixins import RoleBasedFieldValidationMixin
+from common.mixins import RoleBasedFieldValidationMixin, ReplicaReadMixin
+from common.facets import FacetService
+from common.file_delivery import FileDeliveryService
+from common.model_versions import bump_model_version
+
+
+INVOICE_FILTER_FACETS = FacetService(
+    namespace='invoices',
+    facets={
+        'proveedores': 'proveedor_id',
+        'tipos_costo': 'tipo_costo',
+    },
+    depends_on=['invoices.Invoice', 'catalogs.Provider', 'catalogs.CostType'],
+)
+
+DISPUTE_FILTER_FACETS = FacetService(
+    namespace='disputes',
+    facets={
+        'estados': 'estado',
+        'tipos_disputa': 'tipo_disputa',
+        'resultados': 'resultado',
+    },
+    depends_on=['invoices.Dispute'],
+)
 
 
-class InvoiceViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
+class InvoiceViewSet(ReplicaReadMixin, RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de facturas.
     
@@ -70,6 +93,7 @@ class InvoiceViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
     """
     
     permission_classes = [IsAuthenticated]
+    replica_actions = {'list', 'retrieve', 'pending', 'stats', 'filter_values', 'export_excel'}
     queryset = Invoice.objects.filter(is_deleted=False).select_related(
         'ot', 'proveedor', 'uploaded_file'
     )
@@ -252,10 +276,10 @@ class InvoiceViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'], url_path='file')
     def retrieve_file(self, request, pk=None):
-        """Permite descargar o previsualizar el archivo original de la factura."""
-        from django.shortcuts import redirect
-        from django.conf import settings
-
+        """
+        Permite descargar o previsualizar el archivo original de la factura.
+        Ver common/file_delivery.py (redirect firmado o proxy con Range/ETag).
+        """
         invoice = self.get_object()
 
         if not invoice.uploaded_file:
@@ -266,172 +290,20 @@ class InvoiceViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
 
         storage_path = invoice.uploaded_file.path
 
-        # If using Cloudinary, fetch and serve file (proxy)
-        # CRITICAL: Cloudinary raw files (PDFs) cannot be accessed directly via public URLs
-        # We need to download from Cloudinary using signed URLs and serve through our backend
-        if getattr(settings, 'USE_CLOUDINARY', False):
-            try:
-                import cloudinary.utils
-                import requests
-
-                logger.info(f"Fetching file from Cloudinary: {storage_path}")
-                logger.info(f"Invoice ID: {invoice.id}, Filename: {invoice.uploaded_file.filename}")
-
-                # CRITICAL: Cloudinary stores raw files WITHOUT extension in the public_id
-                # But we may have saved it WITH extension in older uploads
-                # Try both approaches
-
-                import os
-                base_name, ext = os.path.splitext(storage_path)
-                ext_clean = ext.lstrip('.')
-
-                # Try 1: Without extension (correct for raw files)
-                public_id_candidates = []
-                if ext:
-                    public_id_candidates.append(base_name)
-                public_id_candidates.append(storage_path)
-                unique_candidates = []
-                for candidate in public_id_candidates:
-                    if candidate and candidate not in unique_candidates:
-                        unique_candidates.append(candidate)
-
-                cloudinary_response = None
-                last_status = None
-
-                for public_id in unique_candidates:
-                    logger.info(f"Trying public_id: {public_id}")
-                    for cloudinary_type in ('authenticated', 'upload'):
-                        try:
-                            format_arg = None
-                            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
-                                format_arg = ext_clean
-
-                            cloudinary_options = {
-                                'resource_type': 'raw',
-                                'type': cloudinary_type,
-                                'secure': True,
-                                'sign_url': True,
-                            }
-                            if format_arg:
-                                cloudinary_options['format'] = format_arg
-
-                            download_url, _ = cloudinary.utils.cloudinary_url(
-                                public_id,
-                                **cloudinary_options,
-                            )
-                            logger.info(f"Generated signed CDN URL ({cloudinary_type}): {download_url[:100]}...")
-                        except Exception as url_error:
-                            logger.error(f"Error generating signed URL ({cloudinary_type}): {url_error}")
-                            continue
-
-                        logger.info(f"Downloading from Cloudinary CDN...")
-                        response = requests.get(download_url, timeout=30)
-                        logger.info(f"Cloudinary response status: {response.status_code}")
-
-                        if response.status_code == 200:
-                            cloudinary_response = response
-                            break
-
-                        if response.status_code == 404:
-                            logger.error(f"File not found in Cloudinary: {public_id}")
-                            last_status = 404
-                            continue
-
-                        logger.error(f"Cloudinary download failed: {response.status_code}")
-                        logger.error(f"Response: {response.text[:500]}")
-                        last_status = response.status_code
-
-                    if cloudinary_response:
-                        break
-
-                if not cloudinary_response:
-                    if last_status == 404:
-                        return Response(
-                            {'detail': f'Archivo no encontrado en Cloudinary. Por favor, suba la factura nuevamente.'},
-                            status=status.HTTP_404_NOT_FOUND
-                        )
-
-                    detail_status = last_status or 'desconocido'
-                    return Response(
-                        {'detail': f'Error al descargar archivo de Cloudinary: {detail_status}'},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
-
-                # Serve file content through our backend
-                from django.http import HttpResponse
-
-                content_type = invoice.uploaded_file.content_type or 'application/pdf'
-                file_content = cloudinary_response.content
-
-                logger.info(f"File downloaded, size: {len(file_content)} bytes")
-
-                # Generate friendly filename
-                filename = self._generate_friendly_filename(invoice)
-                if not filename:
-                    filename = invoice.uploaded_file.filename or storage_path.split('/')[-1]
-
-                response = HttpResponse(file_content, content_type=content_type)
-
-                download_flag = str(request.query_params.get('download', '')).lower()
-                disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-                response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-                response['Content-Length'] = len(file_content)
-                response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-                logger.info(f"✓ File served successfully: {filename}")
-                return response
-
-            except requests.exceptions.Timeout:
-                logger.error(f'Timeout al descargar de Cloudinary')
-                return Response(
-                    {'detail': 'Timeout al descargar el archivo. Intente nuevamente.'},
-                    status=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            except requests.exceptions.RequestException as req_exc:
-                logger.error(f'Error de red al descargar de Cloudinary: {req_exc}', exc_info=True)
-                return Response(
-                    {'detail': f'Error de conexión con Cloudinary: {req_exc}'},
-                    status=status.HTTP_502_BAD_GATEWAY
-                )
-            except Exception as exc:
-                logger.error(f'Error inesperado al servir archivo de Cloudinary: {exc}', exc_info=True)
-                return Response(
-                    {'detail': f'Error al obtener archivo: {str(exc)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        # For local filesystem, serve file normally
-        if not get_storage().exists(storage_path):
-            return Response(
-                {'detail': 'Archivo no encontrado en el almacenamiento.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        try:
-            file_handle = get_storage().open(storage_path, 'rb')
-        except Exception as exc:  # pragma: no cover
-            return Response(
-                {'detail': f'No se pudo abrir el archivo: {exc}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
         # Generar nombre de archivo amigable usando short_name del cliente si existe
         filename = self._generate_friendly_filename(invoice)
         if not filename:
             # Fallback al nombre original
             filename = invoice.uploaded_file.filename or storage_path.split('/')[-1]
 
-        content_type = invoice.uploaded_file.content_type or 'application/octet-stream'
-
-        response = FileResponse(file_handle, content_type=content_type)
-
-        download_flag = str(request.query_params.get('download', '')).lower()
-        disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-        response['Content-Length'] = invoice.uploaded_file.size
-        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-        return response
+        return FileDeliveryService().serve(
+            request,
+            storage_path=storage_path,
+            filename=filename,
+            content_type=invoice.uploaded_file.content_type or 'application/pdf',
+            etag=invoice.uploaded_file.sha256,
+            not_found_detail='Archivo no encontrado. Por favor, suba la factura nuevamente.',
+        )
     
     def _generate_friendly_filename(self, invoice):
         """
@@ -1002,53 +874,53 @@ class InvoiceViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
 
         Retorna solo proveedores y tipos de costo que tienen facturas activas.
         Útil para poblar dropdowns de filtros dinámicamente.
+
+        Los valores salen de una sola consulta sobre todas las facturas activas
+        y se cachean (ver common/facets.py). Con ?counts=true se agregan los
+        conteos por valor bajo los filtros actuales del listado.
         """
         # Usar queryset base sin filtros para obtener TODOS los valores posibles
         base_queryset = Invoice.objects.filter(is_deleted=False)
 
-        # Proveedores que tienen facturas (con nombre y ID)
-        proveedores_ids = base_queryset.exclude(
-            proveedor__isnull=True
-        ).values_list('proveedor_id', flat=True).distinct()
-
-        from catalogs.models import Provider
-        proveedores = Provider.objects.filter(
-            id__in=proveedores_ids,
-            is_active=True,
-            is_deleted=False
-        ).values('id', 'nombre').order_by('nombre')
-
-        # Tipos de costo que tienen facturas
-        tipos_costo_codes = base_queryset.exclude(
-            tipo_costo__isnull=True
-        ).values_list('tipo_costo', flat=True).distinct()
-
-        from catalogs.models import CostType
-        tipos_costo = CostType.objects.filter(
-            code__in=tipos_costo_codes,
-            is_active=True,
-            is_deleted=False
-        ).values('code', 'name').order_by('name')
-
-        # Estados únicos (desde los choices del modelo)
-        estados_provision = [
-            {'value': code, 'label': label}
-            for code, label in Invoice.ESTADO_PROVISION_CHOICES
-        ]
-
-        estados_facturacion = [
-            {'value': code, 'label': label}
-            for code, label in Invoice.ESTADO_FACTURACION_CHOICES
-        ]
-
-        data = {
-            'proveedores': list(proveedores),
-            'tipos_costo': list(tipos_costo),
-            'estados_provision': estados_provision,
-            'estados_facturacion': estados_facturacion,
-        }
-
-        return Response(data)
+        def build(facets):
+            from catalogs.models import CostType
+
+            proveedores = Provider.objects.filter(
+                id__in=facets['proveedores'],
+                is_active=True,
+                is_deleted=False
+            ).values('id', 'nombre').order_by('nombre')
+
+            tipos_costo = CostType.objects.filter(
+                code__in=facets['tipos_costo'],
+                is_active=True,
+                is_deleted=False
+            ).values('code', 'name').order_by('name')
+
+            # Estados únicos (desde los choices del modelo)
+            estados_provision = [
+                {'value': code, 'label': label}
+                for code, label in Invoice.ESTADO_PROVISION_CHOICES
+            ]
+
+            estados_facturacion = [
+                {'value': code, 'label': label}
+                for code, label in Invoice.ESTADO_FACTURACION_CHOICES
+            ]
+
+            return {
+                'proveedores': list(proveedores),
+                'tipos_costo': list(tipos_costo),
+                'estados_provision': estados_provision,
+                'estados_facturacion': estados_facturacion,
+            }
+
+        return INVOICE_FILTER_FACETS.respond(
+            request,
+            base_queryset,
+            counts_queryset=self.get_queryset(),
+            build=build,
+        )
 
     @action(detail=True, methods=['post'])
     def assign_ot(self, request, pk=None):
@@ -1149,6 +1021,8 @@ class InvoiceViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
         # Filtrar solo las facturas que existen y no están ya eliminadas
         invoices_to_delete = Invoice.objects.filter(id__in=invoice_ids, is_deleted=False)
         deleted_count = invoices_to_delete.update(is_deleted=True)
+        # QuerySet.update no dispara señales: invalidar caches de facturas
+        bump_model_version(Invoice)
 
         return Response(
             {'message': f'{deleted_count} facturas eliminadas exitosamente.'},
@@ -1924,23 +1798,18 @@ class DisputeViewSet(viewsets.ModelViewSet):
     def filter_values(self, request):
         """
         Obtener valores únicos para los filtros.
+
+        Una sola consulta cacheada (ver common/facets.py); con ?counts=true
+        incluye los conteos por valor bajo los filtros actuales.
         """
         # Usar queryset base sin filtros aplicados para obtener todos los valores posibles
         base_queryset = Dispute.objects.filter(is_deleted=False)
-        
-        # Obtener valores únicos de cada campo usando set para garantizar unicidad
-        estados = set(base_queryset.values_list('estado', flat=True))
-        tipos_disputa = set(base_queryset.values_list('tipo_disputa', flat=True))
-        resultados = set(base_queryset.exclude(resultado__isnull=True).values_list('resultado', flat=True))
-        
-        # Filtrar valores nulos y ordenar
-        data = {
-            'estados': sorted([e for e in estados if e]),
-            'tipos_disputa': sorted([t for t in tipos_disputa if t]),
-            'resultados': sorted([r for r in resultados if r]),
-        }
-        
-        return Response(data)
+
+        return DISPUTE_FILTER_FACETS.respond(
+            request,
+            base_queryset,
+            counts_queryset=self.get_queryset(),
+        )
 
 
 @api_view(['POST'])
@@ -2304,11 +2173,8 @@ class CreditNoteViewSet(viewsets.ModelViewSet):
     def retrieve_file(self, request, pk=None):
         """
         Permite descargar o previsualizar el archivo original de la nota de crédito.
-        Actúa como proxy para servir archivos desde Cloudinary.
+        Ver common/file_delivery.py (redirect firmado o proxy con Range/ETag).
         """
-        from django.shortcuts import redirect
-        from django.conf import settings
-
         credit_note = self.get_object()
 
         if not credit_note.uploaded_file:
@@ -2317,129 +2183,13 @@ class CreditNoteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        storage_path = credit_note.uploaded_file.path
-
-        # Si usamos Cloudinary, servir archivo como proxy (igual que facturas de costo)
-        if getattr(settings, 'USE_CLOUDINARY', False):
-            try:
-                import cloudinary.utils
-                import requests
-
-                logger.info(f"Fetching credit note file from Cloudinary: {storage_path}")
-                logger.info(f"Credit Note ID: {credit_note.id}, Filename: {credit_note.uploaded_file.filename}")
-
-                # CRITICAL: Cloudinary stores raw files WITHOUT extension in the public_id
-                # But we may have saved it WITH extension in older uploads
-                # Try both approaches
-
-                import os
-                base_name, ext = os.path.splitext(storage_path)
-                ext_clean = ext.lstrip('.')
-
-                # Try 1: Without extension (correct for raw files)
-                public_id_candidates = []
-                if ext:
-                    public_id_candidates.append(base_name)
-                public_id_candidates.append(storage_path)
-                unique_candidates = []
-                for candidate in public_id_candidates:
-                    if candidate and candidate not in unique_candidates:
-                        unique_candidates.append(candidate)
-
-                cloudinary_response = None
-                last_status = None
-
-                for public_id in unique_candidates:
-                    logger.info(f"Trying public_id: {public_id}")
-                    for cloudinary_type in ('authenticated', 'upload'):
-                        try:
-                            format_arg = None
-                            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
-                                format_arg = ext_clean
-
-                            cloudinary_options = {
-                                'resource_type': 'raw',
-                                'type': cloudinary_type,
-                                'secure': True,
-                                'sign_url': True,
-                            }
-                            if format_arg:
-                                cloudinary_options['format'] = format_arg
-
-                            download_url, _ = cloudinary.utils.cloudinary_url(
-                                public_id,
-                                **cloudinary_options,
-                            )
-                            logger.info(f"Generated signed CDN URL ({cloudinary_type}): {download_url[:100]}...")
-                        except Exception as url_error:
-                            logger.error(f"Error generating signed URL ({cloudinary_type}): {url_error}")
-                            continue
-
-                        logger.info(f"Downloading from Cloudinary CDN...")
-                        response = requests.get(download_url, timeout=30)
-                        logger.info(f"Cloudinary response status: {response.status_code}")
-
-                        if response.status_code == 200:
-                            cloudinary_response = response
-                            logger.info(f"✅ SUCCESS: Downloaded {len(response.content)} bytes")
-                            break
-                        elif response.status_code == 404:
-                            logger.warning(f"404: File not found with public_id={public_id}, type={cloudinary_type}")
-                        else:
-                            logger.warning(f"Unexpected status {response.status_code} for {public_id}")
-
-                    if cloudinary_response:
-                        break
-
-                if cloudinary_response is None:
-                    logger.error(f"All download attempts failed for credit note {credit_note.id}")
-                    return Response(
-                        {'detail': 'No se pudo descargar el archivo desde Cloudinary después de múltiples intentos.'},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-
-                # Servir el archivo descargado
-                filename = credit_note.uploaded_file.filename or f"NC_{credit_note.numero_nota}.pdf"
-                content_type = credit_note.uploaded_file.content_type or 'application/pdf'
-
-                response_file = HttpResponse(cloudinary_response.content, content_type=content_type)
-                download_flag = str(request.query_params.get('download', '')).lower()
-                disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-                response_file['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-                response_file['Content-Length'] = len(cloudinary_response.content)
-                response_file['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-                return response_file
-
-            except Exception as e:
-                logger.error(f"Error al obtener archivo de Cloudinary: {e}", exc_info=True)
-                return Response(
-                    {'detail': f'Error al obtener el archivo: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        # Para almacenamiento local, servir normalmente
-        if not get_storage().exists(storage_path):
-            return Response(
-                {'detail': 'Archivo no encontrado en el almacenamiento.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        try:
-            file_handle = get_storage().open(storage_path, 'rb')
-        except Exception as exc:
-            return Response(
-                {'detail': f'No se pudo abrir el archivo: {exc}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        filename = credit_note.uploaded_file.filename or f"NC_{credit_note.numero_nota}.pdf"
-        content_type = credit_note.uploaded_file.content_type or 'application/octet-stream'
-        response = FileResponse(file_handle, content_type=content_type)
-        download_flag = str(request.query_params.get('download', '')).lower()
-        disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-        response['Content-Length'] = credit_note.uploaded_file.size
-        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-        return response
+        return FileDeliveryService().serve(
+            request,
+            storage_path=credit_note.uploaded_file.path,
+            filename=credit_note.uploaded_file.filename or f"NC_{credit_note.numero_nota}.pdf",
+            content_type=credit_note.uploaded_file.content_type or 'application/pdf',
+            etag=credit_note.uploaded_file.sha256,
+        )
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
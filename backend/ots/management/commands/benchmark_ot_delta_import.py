@@ -0,0 +1,148 @@
+"""
+Management command para medir la re-importación delta del Excel de OTs.
+
+Genera un reporte sintético de N filas, registra sus OTs (con el row_hash que
+calcularía el ExcelProcessor) y re-importa una copia con un porcentaje de
+filas modificadas, con y sin modo delta. Todo ocurre dentro de una
+transacción que se revierte al final.
+
+Uso:
+    python manage.py benchmark_ot_delta_import --filas 20000 --cambios 0.01
+"""
+
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from client_aliases.models import ClientAlias
+from ots.models import OT
+from ots.services.excel_processor import ExcelProcessor
+
+PREFIX = 'BENCHDELTA'
+FILENAME = 'benchmark_delta.xlsx'
+
+
+class QueryCounter:
+    """execute_wrapper que cuenta las consultas ejecutadas."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Re-importa un Excel sintético con pocos cambios, con y sin modo delta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=20000, help='Filas del reporte (default: 20000)')
+        parser.add_argument('--cambios', type=float, default=0.01, help='Fracción de filas modificadas (default: 0.01)')
+        parser.add_argument('--clientes', type=int, default=200, help='Clientes distintos (default: 200)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        filas = self._generate_rows(rng, options['filas'], options['clientes'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            base_path = os.path.join(tmp, 'base.xlsx')
+            modificado_path = os.path.join(tmp, 'modificado.xlsx')
+            pd.DataFrame(filas).to_excel(base_path, index=False)
+
+            cambiadas = rng.sample(range(len(filas)), int(len(filas) * options['cambios']))
+            for i in cambiadas:
+                filas[i]['Barco'] = f'{filas[i]["Barco"]} V2'
+            pd.DataFrame(filas).to_excel(modificado_path, index=False)
+
+            resultados = []
+            with transaction.atomic():
+                self._seed(base_path, options['clientes'])
+
+                for nombre, delta in [('delta', True), ('completo', False)]:
+                    # Cada corrida parte del mismo estado
+                    sid = transaction.savepoint()
+                    processor = ExcelProcessor(filename=FILENAME, delta=delta)
+                    counter = QueryCounter()
+                    with connection.execute_wrapper(counter):
+                        start = time.perf_counter()
+                        stats = processor.process_multiple_files([(modificado_path, FILENAME)])
+                        elapsed = time.perf_counter() - start
+                    transaction.savepoint_rollback(sid)
+                    resultados.append((nombre, elapsed, counter.count, stats))
+
+                # Descartar los datos sintéticos
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"{len(filas)} filas, {len(cambiadas)} modificadas\n")
+        self.stdout.write(
+            f"{'modo':<10} {'s':>8} {'consultas':>10} {'nuevas':>7} {'cambiadas':>10} "
+            f"{'sin cambio':>11} {'actualizadas':>13}"
+        )
+        for nombre, elapsed, queries, stats in resultados:
+            self.stdout.write(
+                f"{nombre:<10} {elapsed:>8.2f} {queries:>10} {stats['new']:>7} {stats['changed']:>10} "
+                f"{stats['unchanged']:>11} {stats['updated']:>13}"
+            )
+
+        delta_s, completo_s = resultados[0][1], resultados[1][1]
+        if delta_s:
+            self.stdout.write(self.style.SUCCESS(f"\nModo delta: {completo_s / delta_s:.1f}x más rápido"))
+
+    def _generate_rows(self, rng, total, clientes):
+        inicio = date(2025, 1, 1)
+        return [
+            {
+                'OT': f'25{PREFIX}-{n:06d}',
+                'Cliente': f'{PREFIX} CLIENTE {rng.randrange(clientes)}',
+                'Operativo': 'BENCH',
+                'MBL': f'MBL{n:08d}',
+                'Contenedor': f'MSCU{n:07d}',
+                'ETA': inicio + timedelta(days=rng.randrange(365)),
+                'Barco': f'MSC {rng.randrange(50)}',
+                'Estatus': rng.choice(['Transito', 'Puerto', 'Bodega']),
+            }
+            for n in range(total)
+        ]
+
+    def _seed(self, base_path, clientes):
+        """OTs del reporte base con el row_hash que calcula _load_row_data."""
+        alias = {
+            cliente.original_name: cliente
+            for cliente in ClientAlias.objects.bulk_create([
+                ClientAlias(
+                    original_name=f'{PREFIX} CLIENTE {n}',
+                    normalized_name=f'{PREFIX} CLIENTE {n}',
+                    short_name=f'{PREFIX}{n}',
+                )
+                for n in range(clientes)
+            ])
+        }
+
+        processor = ExcelProcessor(filename=FILENAME)
+        df = pd.read_excel(base_path, header=None)
+        header_row, column_map = processor._detect_headers(df)
+        df_mapped = processor._map_columns(pd.read_excel(base_path, header=header_row), column_map)
+
+        ots = []
+        for _, row in df_mapped.iterrows():
+            numero_ot, cliente, operativo = processor._extract_row_keys(row)
+            ot_data = processor._extract_complete_row_data(row, cliente, operativo, 'importacion')
+            ots.append(OT(
+                numero_ot=numero_ot,
+                cliente=alias[cliente],
+                operativo=operativo,
+                master_bl=ot_data['master_bl'],
+                contenedores=ot_data['contenedores'],
+                fecha_eta=ot_data['fecha_eta'],
+                barco=ot_data['barco'],
+                estado=ot_data['estado'],
+                row_hash=processor._calculate_row_hash(ot_data),
+            ))
+        OT.objects.bulk_create(ots, batch_size=2000)
@@ -0,0 +1,77 @@
+"""
+Management command para comparar las mutaciones de contenedores y provisiones.
+
+Sobre una OT sintética (dentro de una transacción que se revierte al final)
+mide la latencia por operación de:
+- el camino anterior: cargar la OT, modificar el JSON en Python y OT.save()
+- el UPDATE ... RETURNING con operadores jsonb (ots/services/jsonb_ops.py)
+
+Uso:
+    python manage.py benchmark_ot_json_ops --repeticiones 500
+"""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client_aliases.models import ClientAlias
+from ots.models import OT
+from ots.services import jsonb_ops
+
+PREFIX = 'BENCHJSON'
+
+
+def medir(func, repeat):
+    """Ejecuta func(n) para n en range(repeat); retorna la mediana en ms."""
+    tiempos = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        func(n)
+        tiempos.append((time.perf_counter() - start) * 1000)
+    return statistics.median(tiempos)
+
+
+class Command(BaseCommand):
+    help = 'Latencia de agregar contenedores y provisiones: OT.save() vs UPDATE jsonb'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=500, help='Operaciones por modo (default: 500)')
+
+    def handle(self, *args, **options):
+        repeat = options['repeticiones']
+
+        with transaction.atomic():
+            cliente = ClientAlias.objects.create(
+                original_name=f'{PREFIX} Cliente', normalized_name=f'{PREFIX} CLIENTE', short_name=PREFIX,
+            )
+            ot_id = OT.objects.create(numero_ot=f'{PREFIX}-1', cliente=cliente).pk
+
+            def contenedor_save(n):
+                ot = OT.objects.get(pk=ot_id)
+                ot.add_contenedor(f'MSCU{n:07d}')
+                ot.save()
+
+            def provision_save(n):
+                ot = OT.objects.get(pk=ot_id)
+                ot.set_provision(f'Save {n}', 10)
+                ot.save()
+
+            resultados = [
+                ('contenedor: OT.save()', medir(contenedor_save, repeat)),
+                ('contenedor: jsonb', medir(lambda n: jsonb_ops.agregar_contenedor(ot_id, f'CMAU{n:07d}'), repeat)),
+                ('provisión: OT.save()', medir(provision_save, repeat)),
+                ('provisión: jsonb', medir(
+                    lambda n: jsonb_ops.actualizar_provision(ot_id, [{'concepto': f'Jsonb {n}', 'monto': 10}]),
+                    repeat,
+                )),
+            ]
+
+            # Descartar los datos sintéticos
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{repeat} operaciones por modo (el JSON crece en cada una)\n")
+        self.stdout.write(f"{'operación':<28} {'mediana ms':>12}")
+        for nombre, ms in resultados:
+            self.stdout.write(f"{nombre:<28} {ms:>12.2f}")
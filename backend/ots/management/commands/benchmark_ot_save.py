@@ -0,0 +1,97 @@
+"""
+Management command para medir OT.save().
+
+Crea OTs sintéticas con bulk_create dentro de una transacción que se revierte
+al final, las carga y las guarda una por una en cada modo:
+- sin cambios (solo el UPDATE)
+- con un campo modificado (se normaliza y valida solo ese campo)
+- validate=True (normalización y full_clean() completos, como antes)
+- update_fields (escritura directa)
+
+Uso:
+    python manage.py benchmark_ot_save --ots 10000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from client_aliases.models import ClientAlias
+from ots.models import OT
+
+PREFIX = 'BENCHSAVE'
+
+
+class QueryCounter:
+    """execute_wrapper que cuenta las consultas ejecutadas."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Mide OT.save() con y sin validación completa sobre OTs sintéticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ots', type=int, default=10000, help='OTs a guardar por modo (default: 10000)')
+
+    def handle(self, *args, **options):
+        total = options['ots']
+        resultados = []
+
+        with transaction.atomic():
+            cliente = ClientAlias.objects.create(
+                original_name=f'{PREFIX} Cliente',
+                normalized_name=f'{PREFIX} CLIENTE',
+                short_name=PREFIX,
+            )
+            OT.objects.bulk_create([
+                OT(
+                    numero_ot=f'{PREFIX}-{n:06d}',
+                    cliente=cliente,
+                    master_bl=f'MBL{n:07d}',
+                    contenedores=[f'MSCU{n:07d}', f'CMAU{n:07d}'],
+                )
+                for n in range(total)
+            ], batch_size=2000)
+
+            modos = [
+                ('sin cambios', lambda ot: ot.save()),
+                ('1 campo modificado', self._modificar_barco),
+                ('validate=True', lambda ot: ot.save(validate=True)),
+                ('update_fields', lambda ot: ot.save(update_fields=['comentarios', 'updated_at'])),
+            ]
+            for nombre, guardar in modos:
+                ots = list(OT.objects.filter(numero_ot__startswith=PREFIX).select_related('cliente'))
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    for ot in ots:
+                        guardar(ot)
+                    elapsed = time.perf_counter() - start
+                resultados.append((nombre, elapsed, counter.count))
+
+            # Descartar los datos sintéticos
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{total} OTs por modo\n")
+        self.stdout.write(f"{'modo':<24} {'s':>8} {'µs/save':>10} {'consultas':>10}")
+        for nombre, elapsed, queries in resultados:
+            self.stdout.write(f"{nombre:<24} {elapsed:>8.2f} {elapsed / total * 1e6:>10.0f} {queries:>10}")
+
+        tiempos = {nombre: elapsed for nombre, elapsed, _ in resultados}
+        if tiempos['1 campo modificado']:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n1 campo modificado: {tiempos['validate=True'] / tiempos['1 campo modificado']:.1f}x "
+                f"más rápido que validate=True"
+            ))
+
+    @staticmethod
+    def _modificar_barco(ot):
+        ot.barco = 'MAERSK BENCH'
+        ot.save()
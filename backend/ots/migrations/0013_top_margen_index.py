@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ots', '0012_ot_estado_facturacion_venta_ot_margen_bruto_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ot',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('monto_total_vendido__gt', 0)), fields=['-margen_bruto', 'id'], name='ots_top_margen_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:44
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ots', '0013_top_margen_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OTImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Leyendo archivos'), ('conflictos', 'Conflictos por resolver'), ('aplicando', 'Aplicando cambios'), ('completado', 'Completado'), ('error', 'Error')], db_index=True, default='pendiente', max_length=16)),
+                ('archivos', models.JSONField(default=list, help_text="[{'path', 'filename', 'tipo_operacion', 'file_hash'}] en default_storage")),
+                ('delta', models.BooleanField(default=False, help_text='Omitir filas cuyo row_hash no cambió (ExcelProcessor delta)')),
+                ('filas_leidas', models.PositiveIntegerField(default=0)),
+                ('filas_a_aplicar', models.PositiveIntegerField(default=0)),
+                ('filas_aplicadas', models.PositiveIntegerField(default=0)),
+                ('stats', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Estadísticas del ExcelProcessor (sin la lista de conflictos)')),
+                ('mensaje_error', models.TextField(blank=True, default='')),
+                ('task_id', models.CharField(blank=True, default='', max_length=255)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ot_import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Importación de OTs',
+                'verbose_name_plural': 'Importaciones de OTs',
+                'db_table': 'ot_import_jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OTImportConflict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_ot', models.CharField(max_length=50)),
+                ('campo', models.CharField(max_length=20)),
+                ('detalle', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Conflicto tal como lo reporta ExcelProcessor.detected_conflicts')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflictos', to='ots.otimportjob')),
+            ],
+            options={
+                'db_table': 'ot_import_conflicts',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['job', 'numero_ot', 'campo'], name='ot_import_c_job_id_05908c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OTImportStagedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_ot', models.CharField(max_length=50)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='ot_data de ExcelProcessor.pending_data')),
+                ('filename', models.CharField(blank=True, default='', max_length=500)),
+                ('row', models.PositiveIntegerField(blank=True, null=True)),
+                ('aplicada', models.BooleanField(default=False)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filas', to='ots.otimportjob')),
+            ],
+            options={
+                'db_table': 'ot_import_staged_rows',
+                'indexes': [models.Index(fields=['job', 'aplicada', 'id'], name='ot_import_s_job_id_0d3c2a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('job', 'numero_ot'), name='uniq_import_row_por_job')],
+            },
+        ),
+    ]
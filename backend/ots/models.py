@@ -8,6 +8,7 @@ El sistema maneja:
 - Tracking de costos y provisiones
 """
 
+import copy
 import re
 from decimal import Decimal
 
@@ -25,6 +26,18 @@ logger = logging.getLogger(__name__)
 
 
 CONTAINER_NUMBER_PATTERN = re.compile(r"^[A-Z]{4}\d{7}$")
+NON_ALNUM_PATTERN = re.compile(r"[^A-Z0-9]")
+
+# Estados de provisión que el usuario fija a mano y save() no recalcula
+ESTADOS_PROVISION_MANUALES = frozenset(['rechazada', 'disputada', 'revision', 'anulada', 'anulada_parcialmente'])
+
+# Campos de texto que se guardan como '-' cuando vienen vacíos
+CAMPOS_GUION_SI_VACIO = ('operativo', 'tipo_embarque', 'barco', 'express_release_tipo', 'contra_entrega_tipo')
+
+
+def normalizar_numero_contenedor(numero):
+    """'mscu-123 4567 ' -> 'MSCU1234567' (sin validar el formato)."""
+    return NON_ALNUM_PATTERN.sub("", numero.upper())
 
 
 class OT(TimeStampedModel, SoftDeleteModel):
@@ -427,6 +440,12 @@ class OT(TimeStampedModel, SoftDeleteModel):
             models.Index(fields=['cliente']),
             models.Index(fields=['-created_at']),
             models.Index(fields=['row_hash']),
+            # Top de OTs por margen del dashboard de finanzas
+            models.Index(
+                fields=['-margen_bruto', 'id'],
+                condition=models.Q(monto_total_vendido__gt=0, deleted_at__isnull=True),
+                name='ots_top_margen_idx',
+            ),
         ]
     
     def __str__(self):
@@ -458,29 +477,98 @@ class OT(TimeStampedModel, SoftDeleteModel):
                     'provision_hierarchy': 'La jerarquía de provisiones debe ser un objeto/dict'
                 })
     
-    def save(self, *args, **kwargs):
-        # Tracking de cliente para incrementar usage_count
-        is_new = self.pk is None
+    # ==================== TRACKING DE CAMBIOS ====================
+
+    # JSONFields: se copian al cargar porque se modifican en sitio (add_contenedor, set_provision...)
+    _CAMPOS_MUTABLES = frozenset(['house_bls', 'contenedores', 'provision_hierarchy'])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._guardar_valores_cargados()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            self._guardar_valores_cargados()
+        else:
+            self._guardar_valores_cargados([self._meta.get_field(name).attname for name in fields])
+
+    def _guardar_valores_cargados(self, campos=None):
+        """Guarda los valores actuales como referencia para get_dirty_fields()."""
+        if campos is None:
+            self._loaded_values = {}
+            campos = [f.attname for f in self._meta.concrete_fields]
+        elif getattr(self, '_loaded_values', None) is None:
+            # Instancia que nunca se cargó ni se guardó completa: sigue "todo modificado"
+            return
+        for attname in campos:
+            if attname in self.__dict__:
+                value = self.__dict__[attname]
+                if attname in self._CAMPOS_MUTABLES:
+                    value = copy.deepcopy(value)
+                self._loaded_values[attname] = value
+
+    def get_dirty_fields(self):
+        """
+        Campos (attname) modificados desde que la OT se cargó o se guardó.
+
+        Retorna None si la instancia no viene de la base de datos (OT nueva
+        o construida a mano), es decir, "todos los campos".
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        return {
+            attname for attname, value in loaded.items()
+            if self.__dict__.get(attname, value) != value
+        }
+
+    def save(self, *args, validate=False, **kwargs):
+        """
+        Normaliza, valida y guarda la OT.
+
+        Solo se normalizan y validan los campos modificados desde la carga
+        (get_dirty_fields); una OT nueva se valida completa. Los guardados
+        con update_fields escriben tal cual, sin normalizar ni validar.
+        validate=True fuerza la normalización y el full_clean() completos.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not validate:
+            super().save(*args, **kwargs)
+            self._guardar_valores_cargados(
+                [self._meta.get_field(name).attname for name in update_fields] + ['updated_at']
+            )
+            return
+
+        dirty = None if validate else self.get_dirty_fields()
 
-        # Debug: Ver qué valor llega ANTES de cualquier procesamiento
-        logger.debug(f"🔵 [SAVE] Valores ANTES del procesamiento:")
-        logger.debug(f"  - estado_provision: {self.estado_provision}")
-        logger.debug(f"  - fecha_provision: {self.fecha_provision}")
+        def cambio(attname):
+            return dirty is None or attname in dirty
+
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(
+                "🔵 [SAVE] OT %s campos modificados: %s",
+                self.numero_ot, 'todos' if dirty is None else sorted(dirty)
+            )
 
         # Normalizar número de OT a mayúsculas
-        if self.numero_ot:
+        if self.numero_ot and cambio('numero_ot'):
             self.numero_ot = self.numero_ot.upper().strip()
         
         # Normalizar Master BL a mayúsculas
-        if self.master_bl:
+        if self.master_bl and cambio('master_bl'):
             self.master_bl = self.master_bl.upper().strip()
         
         # Normalizar House BLs a mayúsculas
-        if self.house_bls and isinstance(self.house_bls, list):
+        if self.house_bls and isinstance(self.house_bls, list) and cambio('house_bls'):
             self.house_bls = [hbl.upper().strip() if isinstance(hbl, str) else hbl for hbl in self.house_bls]
         
         # Normalizar números de contenedores
-        self._normalize_contenedores()
+        if cambio('contenedores'):
+            self._normalize_contenedores()
         
         # Actualizar estado de facturación automáticamente solo si está en pendiente
         # y hay cambio en la fecha (no sobreescribir cambios manuales)
@@ -490,43 +578,36 @@ class OT(TimeStampedModel, SoftDeleteModel):
             # Si quitan la fecha pero el estado es facturado, volver a pendiente
             self.estado_facturado = 'pendiente'
         
-        logger.debug(f"🟡 [SAVE] ANTES de lógica de provisión:")
-        logger.debug(f"  - estado_provision: {self.estado_provision}")
-        logger.debug(f"  - fecha_provision: {self.fecha_provision}")
-        
         # LÓGICA ROBUSTA de auto-marcado de estado de provisión:
         # 1. Si hay fecha_provision -> estado debe ser 'provisionada'
         # 2. Si NO hay fecha_provision -> estado debe ser 'pendiente'
         # EXCEPTO si el estado es 'rechazada', 'disputada', 'revision', 'anulada' o 'anulada_parcialmente' (estos se mantienen)
-        if self.estado_provision not in ['rechazada', 'disputada', 'revision', 'anulada', 'anulada_parcialmente']:
-            if self.fecha_provision:
-                if self.estado_provision != 'provisionada':
-                    self.estado_provision = 'provisionada'
-                    logger.debug(f"  ✅ Cambiado a 'provisionada' (hay fecha)")
-            else:
-                if self.estado_provision != 'pendiente':
-                    self.estado_provision = 'pendiente'
-                    logger.debug(f"  ✅ Cambiado a 'pendiente' (sin fecha)")
-        else:
-            logger.debug(f"  ⚪ Estado manual '{self.estado_provision}' mantenido")
-        
-        logger.debug(f"🟢 [SAVE] DESPUÉS de lógica de provisión:")
-        logger.debug(f"  - estado_provision: {self.estado_provision}")
+        estado_anterior = self.estado_provision
+        if self.estado_provision not in ESTADOS_PROVISION_MANUALES:
+            self.estado_provision = 'provisionada' if self.fecha_provision else 'pendiente'
+
+        if debug:
+            logger.debug(
+                "🟢 [SAVE] estado_provision: %s -> %s (fecha_provision: %s)",
+                estado_anterior, self.estado_provision, self.fecha_provision
+            )
         
         # Convertir campos vacíos a '-' (excepto los que pueden ser null)
-        if not self.operativo or not self.operativo.strip():
-            self.operativo = '-'
-        if not self.tipo_embarque or not self.tipo_embarque.strip():
-            self.tipo_embarque = '-'
-        if not self.barco or not self.barco.strip():
-            self.barco = '-'
-        if not self.express_release_tipo or not self.express_release_tipo.strip():
-            self.express_release_tipo = '-'
-        if not self.contra_entrega_tipo or not self.contra_entrega_tipo.strip():
-            self.contra_entrega_tipo = '-'
+        for campo in CAMPOS_GUION_SI_VACIO:
+            value = getattr(self, campo)
+            if not value or not value.strip():
+                setattr(self, campo, '-')
         
-        self.full_clean()
+        if dirty is None:
+            self.full_clean()
+        elif dirty:
+            # Solo los campos modificados: evita, p. ej., la consulta de unicidad
+            # de numero_ot y la de existencia del cliente si no cambiaron
+            self.full_clean(exclude=[
+                f.name for f in self._meta.concrete_fields if f.attname not in dirty
+            ])
         super().save(*args, **kwargs)
+        self._guardar_valores_cargados()
 
 
     
@@ -554,8 +635,7 @@ class OT(TimeStampedModel, SoftDeleteModel):
             if not isinstance(numero, str):
                 numero = str(numero)
 
-            cleaned = numero.upper().strip()
-            cleaned = re.sub(r"[^A-Z0-9]", "", cleaned)
+            cleaned = normalizar_numero_contenedor(numero)
 
             if not cleaned:
                 continue
@@ -595,8 +675,7 @@ class OT(TimeStampedModel, SoftDeleteModel):
         if not numero:
             raise ValidationError("El número de contenedor es obligatorio")
 
-        cleaned = numero.upper().strip()
-        cleaned = re.sub(r"[^A-Z0-9]", "", cleaned)
+        cleaned = normalizar_numero_contenedor(numero)
 
         if not cleaned:
             raise ValidationError("El número de contenedor no puede estar vacío")
@@ -618,8 +697,7 @@ class OT(TimeStampedModel, SoftDeleteModel):
 
         self._normalize_contenedores()
 
-        objetivo = numero.upper().strip()
-        objetivo = re.sub(r"[^A-Z0-9]", "", objetivo)
+        objetivo = normalizar_numero_contenedor(numero)
         original_length = len(self.contenedores)
 
         self.contenedores = [
@@ -749,48 +827,17 @@ class OT(TimeStampedModel, SoftDeleteModel):
     def calcular_metricas_venta(self):
         """
         Calcula y actualiza las métricas financieras de la OT.
-        Este método se llama automáticamente cuando cambian las facturas de venta.
-        """
-        from django.db.models import Sum
-
-        # Suma de facturas de venta
-        total_venta = self.sales_invoices.aggregate(
-            total=Sum('monto_total')
-        )['total'] or Decimal('0.00')
-
-        # Suma de costos (usando monto_aplicable que ya considera disputas)
-        # CORREGIDO: 'invoices' → 'facturas' (related_name correcto)
-        total_costo = self.facturas.aggregate(
-            total=Sum('monto_aplicable')
-        )['total'] or Decimal('0.00')
-
-        # Calcular margen
-        self.monto_total_vendido = total_venta
-        self.monto_total_costos = total_costo
-        self.margen_bruto = total_venta - total_costo
-
-        if total_venta > 0:
-            self.porcentaje_margen = (self.margen_bruto / total_venta * 100).quantize(Decimal('0.01'))
-        else:
-            self.porcentaje_margen = Decimal('0.00')
 
-        # Actualizar estado de facturación de venta
-        if total_venta == 0:
-            self.estado_facturacion_venta = 'sin_facturar'
-        elif total_venta >= total_costo:
-            self.estado_facturacion_venta = 'facturado_total'
-        else:
-            self.estado_facturacion_venta = 'facturado_parcial'
+        Recalcula sus filas del store de rentabilidad (MonthlyProfitability),
+        que es quien escribe los campos denormalizados, y los recarga en la
+        instancia. Los signals de ventas/costos ya lo hacen automáticamente
+        (coalescido por transacción); llamar directo solo cuando se necesita
+        el valor actualizado de inmediato.
+        """
+        from sales.services.profitability import OT_METRIC_FIELDS, ProfitabilityStore
 
-        # Guardar sin triggear recursión (update_fields evita signals)
-        self.save(update_fields=[
-            'monto_total_vendido',
-            'monto_total_costos',
-            'margen_bruto',
-            'porcentaje_margen',
-            'estado_facturacion_venta',
-            'updated_at'
-        ])
+        ProfitabilityStore().refresh([self.pk])
+        self.refresh_from_db(fields=OT_METRIC_FIELDS + ['updated_at'])
 
 
 class ProcessedFile(TimeStampedModel):
@@ -915,3 +962,8 @@ class ProcessedFile(TimeStampedModel):
             }
         )
         return obj
+
+
+# === IMPORTAR MODELOS DE IMPORTACIÓN EN SEGUNDO PLANO ===
+# Se importa al final para evitar imports circulares
+from .models_import import OTImportConflict, OTImportJob, OTImportStagedRow  # noqa: E402, F401
@@ -0,0 +1,143 @@
+"""
+Staging de importaciones de OTs en segundo plano.
+
+Un OTImportJob guarda los archivos subidos (en default_storage), el estado y
+el progreso de la importación. La tarea Celery (ots/tasks.py) lee los
+archivos, deja cada OT a crear/actualizar como OTImportStagedRow y cada
+conflicto detectado como OTImportConflict. Al resolver los conflictos se
+aplican las filas del staging por bloques, sin volver a leer los archivos.
+
+Todo vive en la BD: el frontend consulta el estado del job y los conflictos
+sobreviven a reinicios de los workers.
+"""
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from common.models import TimeStampedModel
+
+
+class OTImportJob(TimeStampedModel):
+    """Importación de Excel de OTs procesada por un worker."""
+
+    STATUS_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Leyendo archivos'),
+        ('conflictos', 'Conflictos por resolver'),
+        ('aplicando', 'Aplicando cambios'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default='pendiente',
+        db_index=True
+    )
+
+    archivos = models.JSONField(
+        default=list,
+        help_text="[{'path', 'filename', 'tipo_operacion', 'file_hash'}] en default_storage"
+    )
+
+    delta = models.BooleanField(
+        default=False,
+        help_text="Omitir filas cuyo row_hash no cambió (ExcelProcessor delta)"
+    )
+
+    # Progreso
+    filas_leidas = models.PositiveIntegerField(default=0)
+    filas_a_aplicar = models.PositiveIntegerField(default=0)
+    filas_aplicadas = models.PositiveIntegerField(default=0)
+
+    stats = models.JSONField(
+        default=dict,
+        encoder=DjangoJSONEncoder,
+        blank=True,
+        help_text="Estadísticas del ExcelProcessor (sin la lista de conflictos)"
+    )
+
+    mensaje_error = models.TextField(blank=True, default='')
+
+    task_id = models.CharField(max_length=255, blank=True, default='')
+
+    created_by = models.ForeignKey(
+        'accounts.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ot_import_jobs'
+    )
+
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'ot_import_jobs'
+        verbose_name = 'Importación de OTs'
+        verbose_name_plural = 'Importaciones de OTs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Importación #{self.pk} ({self.status})"
+
+    @property
+    def terminado(self) -> bool:
+        return self.status in ('completado', 'error')
+
+
+class OTImportStagedRow(models.Model):
+    """Datos de una OT leídos del Excel, pendientes de aplicar."""
+
+    job = models.ForeignKey(
+        OTImportJob,
+        on_delete=models.CASCADE,
+        related_name='filas'
+    )
+
+    numero_ot = models.CharField(max_length=50)
+
+    data = models.JSONField(encoder=DjangoJSONEncoder, help_text="ot_data de ExcelProcessor.pending_data")
+
+    filename = models.CharField(max_length=500, blank=True, default='')
+    row = models.PositiveIntegerField(null=True, blank=True)
+
+    aplicada = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'ot_import_staged_rows'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'numero_ot'], name='uniq_import_row_por_job'),
+        ]
+        indexes = [
+            models.Index(fields=['job', 'aplicada', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_ot} (job #{self.job_id})"
+
+
+class OTImportConflict(models.Model):
+    """Conflicto de cliente/operativo detectado al leer los archivos del job."""
+
+    job = models.ForeignKey(
+        OTImportJob,
+        on_delete=models.CASCADE,
+        related_name='conflictos'
+    )
+
+    numero_ot = models.CharField(max_length=50)
+    campo = models.CharField(max_length=20)
+
+    detalle = models.JSONField(encoder=DjangoJSONEncoder, help_text="Conflicto tal como lo reporta ExcelProcessor.detected_conflicts")
+
+    class Meta:
+        db_table = 'ot_import_conflicts'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['job', 'numero_ot', 'campo']),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_ot} {self.campo} (job #{self.job_id})"
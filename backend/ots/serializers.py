@@ -3,15 +3,54 @@ Serializers para gestión de Órdenes de Trabajo (OTs).
 """
 
 import re
+from decimal import Decimal
 
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from .models import OT, CONTAINER_NUMBER_PATTERN
+from .models import OT, CONTAINER_NUMBER_PATTERN, OTImportJob
 from catalogs.models import Provider
 from catalogs.serializers import ProviderSerializer
 from client_aliases.models import ClientAlias
 from client_aliases.serializers import ClientAliasListSerializer
 
 
+# Tipos de costo cuyas disputas se muestran en el listado de OTs
+DISPUTE_COST_TYPES = ['FLETE', 'CARGOS_NAVIERA']
+
+
+def _disputed_invoices(ot_ref):
+    from invoices.models import Invoice
+
+    return Invoice.objects.filter(
+        ot=ot_ref,
+        tipo_costo__in=DISPUTE_COST_TYPES,
+        estado_provision='disputada',
+        is_deleted=False
+    )
+
+
+def annotate_dispute_counters(queryset):
+    """
+    Agrega a cada OT la cantidad y el monto de sus facturas disputadas
+    (subconsultas correlacionadas agrupadas por OT), para que
+    OTListSerializer no haga consultas por fila.
+    """
+    disputadas = _disputed_invoices(OuterRef('pk')).order_by().values('ot')
+    return queryset.annotate(
+        disputed_count=Coalesce(
+            Subquery(disputadas.annotate(total=Count('pk')).values('total'), output_field=IntegerField()),
+            Value(0),
+        ),
+        disputed_amount=Coalesce(
+            Subquery(disputadas.annotate(total=Sum('monto')).values('total'),
+                     output_field=DecimalField(max_digits=15, decimal_places=2)),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        ),
+    )
+
+
 def _normalize_container_value(raw) -> str:
     """Normaliza y valida un valor de contenedor provisto por API o base de datos."""
     if isinstance(raw, dict):
@@ -250,31 +289,25 @@ class OTListSerializer(serializers.ModelSerializer):
     def get_tiempo_transito(self, obj):
         return obj.get_tiempo_transito_display()
 
+    def _dispute_counters(self, obj):
+        """(cantidad, monto) de facturas disputadas; usa la anotación si existe."""
+        if not hasattr(obj, 'disputed_count'):
+            totales = _disputed_invoices(obj).aggregate(total=Count('pk'), monto=Sum('monto'))
+            obj.disputed_count = totales['total']
+            obj.disputed_amount = totales['monto'] or Decimal('0.00')
+        return obj.disputed_count, obj.disputed_amount
+
     def get_has_disputed_invoices(self, obj):
         """Indica si hay facturas de FLETE/CARGOS_NAVIERA disputadas"""
-        return obj.facturas.filter(
-            tipo_costo__in=['FLETE', 'CARGOS_NAVIERA'],
-            estado_provision='disputada',
-            is_deleted=False
-        ).exists()
+        return self._dispute_counters(obj)[0] > 0
 
     def get_disputed_invoices_count(self, obj):
         """Cuenta de facturas vinculadas disputadas"""
-        return obj.facturas.filter(
-            tipo_costo__in=['FLETE', 'CARGOS_NAVIERA'],
-            estado_provision='disputada',
-            is_deleted=False
-        ).count()
+        return self._dispute_counters(obj)[0]
 
     def get_disputed_invoices_amount(self, obj):
         """Monto total de facturas vinculadas disputadas"""
-        from decimal import Decimal
-        from django.db.models import Sum
-        amount = obj.facturas.filter(
-            tipo_costo__in=['FLETE', 'CARGOS_NAVIERA'],
-            estado_provision='disputada',
-            is_deleted=False
-        ).aggregate(total=Sum('monto'))['total']
+        amount = self._dispute_counters(obj)[1]
         return float(amount) if amount else 0.0
 
 
@@ -603,6 +636,24 @@ class ExcelImportResultSerializer(serializers.Serializer):
         help_text="Filas omitidas"
     )
     
+    new = serializers.IntegerField(
+        required=False,
+        default=0,
+        help_text="Filas de OTs que no existían"
+    )
+    
+    changed = serializers.IntegerField(
+        required=False,
+        default=0,
+        help_text="Filas de OTs existentes con contenido distinto (row_hash)"
+    )
+    
+    unchanged = serializers.IntegerField(
+        required=False,
+        default=0,
+        help_text="Filas sin cambios desde la última importación"
+    )
+    
     conflicts = serializers.ListField(
         child=serializers.DictField(),
         required=False,
@@ -698,3 +749,31 @@ class ConflictResolutionSerializer(serializers.Serializer):
         return value
 
 
+class OTImportJobSerializer(serializers.ModelSerializer):
+    """Estado y progreso de una importación en segundo plano"""
+
+    archivos = serializers.SerializerMethodField()
+    conflicts = serializers.SerializerMethodField()
+    created_by = serializers.CharField(source='created_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = OTImportJob
+        fields = [
+            'id', 'status', 'delta', 'archivos',
+            'filas_leidas', 'filas_a_aplicar', 'filas_aplicadas',
+            'stats', 'conflicts', 'mensaje_error', 'task_id', 'created_by',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_archivos(self, obj):
+        return [
+            {'filename': archivo['filename'], 'tipo_operacion': archivo['tipo_operacion']}
+            for archivo in obj.archivos
+        ]
+
+    def get_conflicts(self, obj):
+        """Conflictos pendientes (solo mientras el job espera resoluciones)"""
+        if obj.status != 'conflictos':
+            return []
+        return [conflicto.detalle for conflicto in obj.conflictos.all()]
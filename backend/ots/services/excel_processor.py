@@ -13,7 +13,7 @@ import pandas as pd
 import re
 import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from decimal import Decimal
 from django.utils import timezone
 from django.db.models import Q
@@ -125,20 +125,36 @@ class ExcelProcessor:
     # Años mínimos válidos para filtrado
     MIN_YEAR = 2025
     
-    def __init__(self, filename: str = ''):
+    # Cada cuántas filas leídas se llama a progress_callback
+    PROGRESS_EVERY = 500
+
+    def __init__(self, filename: str = '', delta: bool = False,
+                 progress_callback: Optional[Callable[[int], None]] = None):
         """
         Inicializar procesador
 
         Args:
             filename: Nombre del archivo para inferir operativo
+            delta: Modo delta. Las filas cuyo row_hash coincide con el de la OT
+                guardada se omiten al cargarlas, antes de resolver cliente,
+                proveedor o buscar la OT; solo se procesan las nuevas o cambiadas.
+            progress_callback: Se llama con el total de filas leídas cada
+                PROGRESS_EVERY filas y al terminar cada archivo (importación en
+                segundo plano, ver ots/services/import_jobs.py).
         """
         self.filename = filename
+        self.delta = delta
+        self.progress_callback = progress_callback
+        self.rows_read = 0
         self.stats = {
             'total_rows': 0,
             'processed': 0,
             'created': 0,
             'updated': 0,
             'skipped': 0,
+            'new': 0,        # Filas de OTs que no existen
+            'changed': 0,    # Filas con row_hash distinto al guardado
+            'unchanged': 0,  # Filas con el mismo row_hash (omitidas en modo delta)
             'errors': [],
             'conflicts': [],
             'warnings': [],  # Mensajes informativos sobre filas omitidas
@@ -147,6 +163,9 @@ class ExcelProcessor:
         # Cache temporal para detectar conflictos entre archivos
         self.pending_data = {}  # {numero_ot: {'data': {...}, 'filename': str}}
         self.detected_conflicts = []  # Lista de conflictos detectados
+        # {numero_ot: {'row_hash', 'cliente', 'operativo'}} de las OTs del archivo
+        # (ver _preload_existing_ots); None = consultar fila por fila
+        self._existing_ots = None
     
     @staticmethod
     def calculate_file_hash(file_path: str) -> str:
@@ -224,6 +243,41 @@ class ExcelProcessor:
         Returns:
             Diccionario con estadísticas y conflictos detectados
         """
+        # Fases 0 y 1
+        files_to_process = self.load_multiple_files(file_paths, tipos_operacion)
+
+        # Si no hay archivos nuevos para procesar, retornar
+        if not files_to_process:
+            self._generate_warnings_summary()
+            return self.stats
+
+        # Fase 2: Verificar si hay conflictos
+        if self.detected_conflicts:
+            # Retornar inmediatamente con los conflictos
+            self.stats['conflicts'] = self.detected_conflicts
+            self.stats['message'] = f'Se detectaron {len(self.detected_conflicts)} conflictos que requieren resolución'
+            return self.stats
+        
+        # Fase 3: No hay conflictos, procesar normally
+        self._process_pending(self.pending_data, {})
+        
+        # Generar resumen agrupado de warnings
+        self._generate_warnings_summary()
+
+        # Marcar archivos como procesados
+        self.mark_files_processed(files_to_process)
+
+        return self.stats
+
+    def load_multiple_files(self, file_paths: List[Tuple[str, str]], tipos_operacion: List[str] = None) -> List[Tuple[str, str, str, str]]:
+        """
+        Fases 0 y 1 de process_multiple_files: omitir archivos ya procesados y
+        cargar el resto en pending_data / detected_conflicts, sin escribir OTs.
+
+        Returns:
+            Lista de tuplas (file_path, filename, file_hash, tipo_operacion) de
+            los archivos cargados
+        """
         from ots.models import ProcessedFile
 
         # Si no se proporcionan tipos, usar 'importacion' como default
@@ -252,51 +306,28 @@ class ExcelProcessor:
 
             files_to_process.append((file_path, filename, file_hash, tipos_operacion[i] if i < len(tipos_operacion) else 'importacion'))
 
-        # Si no hay archivos nuevos para procesar, retornar
-        if not files_to_process:
-            self._generate_warnings_summary()
-            return self.stats
-
         # Fase 1: Cargar todos los archivos y detectar conflictos
         for file_path, filename, file_hash, tipo_op in files_to_process:
             self.filename = filename
             self._load_file_data(file_path, filename, tipo_op)
-        
-        # Fase 2: Verificar si hay conflictos
-        if self.detected_conflicts:
-            # Retornar inmediatamente con los conflictos
-            self.stats['conflicts'] = self.detected_conflicts
-            self.stats['message'] = f'Se detectaron {len(self.detected_conflicts)} conflictos que requieren resolución'
-            return self.stats
-        
-        # Fase 3: No hay conflictos, procesar normally
-        from ots.models import OT
-        for numero_ot, pending_item in self.pending_data.items():
-            try:
-                ot_data = pending_item['data']
-                self._create_or_update_ot(numero_ot, ot_data)
-                self.stats['processed'] += 1
-            except Exception as e:
-                self.stats['errors'].append({
-                    'row': pending_item.get('row', 'N/A'),
-                    'ot': numero_ot,
-                    'error': f"Error al procesar OT {numero_ot}: {str(e)}"
-                })
-        
-        # Generar resumen agrupado de warnings
-        self._generate_warnings_summary()
 
-        # Marcar archivos como procesados
+        return files_to_process
+
+    def mark_files_processed(self, files_to_process: List[Tuple[str, str, str, str]], processed_by: str = 'system'):
+        """Registrar en ProcessedFile los archivos cargados con load_multiple_files."""
         from ots.models import ProcessedFile
         for file_path, filename, file_hash, tipo_op in files_to_process:
             ProcessedFile.mark_as_processed(
                 file_hash=file_hash,
                 filename=filename,
                 stats=self.stats,
+                processed_by=processed_by,
                 operation_type=tipo_op
             )
 
-        return self.stats
+    def _report_progress(self):
+        if self.progress_callback:
+            self.progress_callback(self.rows_read)
     
     def _load_file_data(self, file_path: str, filename: str, tipo_operacion: str = 'importacion'):
         """
@@ -328,8 +359,14 @@ class ExcelProcessor:
             # Usar tipo de operación proporcionado por el usuario (NO auto-detectar)
             # El parámetro tipo_operacion ya viene desde el frontend
             
+            rows = list(df_mapped.iterrows())
+            self._preload_existing_ots(self._extract_numero_ot(row) for _, row in rows)
+
             # Procesar cada fila y contar solo las que tienen contenido
-            for idx, row in df_mapped.iterrows():
+            for idx, row in rows:
+                self.rows_read += 1
+                if self.rows_read % self.PROGRESS_EVERY == 0:
+                    self._report_progress()
                 try:
                     # Verificar si la fila está vacía antes de contarla
                     if not self._is_empty_row(row):
@@ -347,6 +384,8 @@ class ExcelProcessor:
                         'ot': ot_num,
                         'error': f"Archivo {filename}, fila {idx + header_row + 2}: {str(e)}"
                     })
+
+            self._report_progress()
         
         except Exception as e:
             self.stats['errors'].append({
@@ -365,16 +404,7 @@ class ExcelProcessor:
             tipo_operacion: Tipo de operación (importacion/exportacion)
         """
         # 1. Extraer datos básicos en formato RAW
-        numero_ot = self._extract_numero_ot(row)
-        cliente_name_raw = self._extract_value(row, 'cliente')
-        if cliente_name_raw:
-            cliente_name_raw = cliente_name_raw.upper()
-
-        operativo_raw = self._extract_value(row, 'operativo')
-        if not operativo_raw:
-            operativo_raw = self._infer_operativo_from_filename()
-        if operativo_raw:
-            operativo_raw = operativo_raw.upper()
+        numero_ot, cliente_name_raw, operativo_raw = self._extract_row_keys(row)
 
         # 2. Validar campos obligatorios
         if not numero_ot or not cliente_name_raw:
@@ -405,7 +435,23 @@ class ExcelProcessor:
             })
             return
 
-        # 4. Aplicar resolución de alias INMEDIATAMENTE
+        # 4. Hash de la fila tal como viene en el archivo (antes de resolver alias)
+        ot_data = self._extract_complete_row_data(row, cliente_name_raw, operativo_raw, tipo_operacion)
+        row_hash = self._calculate_row_hash(ot_data)
+        existing_ot = self._get_existing_ot(numero_ot)
+
+        if existing_ot is None:
+            self.stats['new'] += 1
+        elif existing_ot['row_hash'] == row_hash:
+            self.stats['unchanged'] += 1
+            if self.delta:
+                # Sin cambios desde la última importación: no resolver ni guardar nada
+                self.stats['skipped'] += 1
+                return
+        else:
+            self.stats['changed'] += 1
+
+        # 5. Aplicar resolución de alias INMEDIATAMENTE
         from client_aliases.models import ClientResolution
         resolved_cliente_obj = ClientResolution.find_resolution(cliente_name_raw)
         if resolved_cliente_obj:
@@ -413,14 +459,11 @@ class ExcelProcessor:
         else:
             cliente_name_final = cliente_name_raw
 
-        # 5. Detectar conflictos usando el nombre normalizado/resuelto
-        from ots.models import OT
-        existing_ot = OT.objects.filter(numero_ot=numero_ot).first()
-
+        # 6. Detectar conflictos usando el nombre normalizado/resuelto
         if existing_ot:
             # Conflicto de Cliente
-            if existing_ot.cliente:
-                cliente_actual_db = existing_ot.cliente.original_name.upper()
+            if existing_ot['cliente']:
+                cliente_actual_db = existing_ot['cliente'].upper()
                 if cliente_actual_db != cliente_name_final:
                     self.detected_conflicts.append({
                         'ot': numero_ot,
@@ -432,8 +475,8 @@ class ExcelProcessor:
                     })
             
             # Conflicto de Operativo
-            if existing_ot.operativo:
-                operativo_actual_db = existing_ot.operativo.upper()
+            if existing_ot['operativo']:
+                operativo_actual_db = existing_ot['operativo'].upper()
                 if operativo_raw and operativo_actual_db != operativo_raw:
                     self.detected_conflicts.append({
                         'ot': numero_ot,
@@ -447,7 +490,7 @@ class ExcelProcessor:
         # El operativo no tiene sistema de alias, usamos el raw
         operativo = operativo_raw
 
-        # 6. Detectar conflictos entre archivos (usando nombres ya resueltos/finales)
+        # 7. Detectar conflictos entre archivos (usando nombres ya resueltos/finales)
         if numero_ot in self.pending_data:
             prev_data = self.pending_data[numero_ot]['data']
             prev_filename = self.pending_data[numero_ot]['filename']
@@ -478,14 +521,62 @@ class ExcelProcessor:
                     'row': row_number
                 })
 
-        # 7. Guardar en cache para procesamiento final
-        ot_data = self._extract_complete_row_data(row, cliente_name_final, operativo, tipo_operacion)
+        # 8. Guardar en cache para procesamiento final
+        ot_data['cliente_name'] = cliente_name_final
+        ot_data['row_hash'] = row_hash
         self.pending_data[numero_ot] = {
             'data': ot_data,
             'filename': filename,
             'row': row_number
         }
     
+    def _extract_row_keys(self, row: pd.Series) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """(numero_ot, cliente, operativo) de la fila, en mayúsculas y sin resolver alias."""
+        numero_ot = self._extract_numero_ot(row)
+        cliente_name_raw = self._extract_value(row, 'cliente')
+        if cliente_name_raw:
+            cliente_name_raw = cliente_name_raw.upper()
+
+        operativo_raw = self._extract_value(row, 'operativo')
+        if not operativo_raw:
+            operativo_raw = self._infer_operativo_from_filename()
+        if operativo_raw:
+            operativo_raw = operativo_raw.upper()
+
+        return numero_ot, cliente_name_raw, operativo_raw
+
+    def _preload_existing_ots(self, numeros_ot):
+        """
+        Carga en UNA consulta row_hash, cliente y operativo de las OTs existentes
+        del archivo, para comparar hashes y detectar conflictos sin una consulta por fila.
+        """
+        from ots.models import OT
+
+        numeros_ot = {numero for numero in numeros_ot if numero}
+        if self._existing_ots is None:
+            self._existing_ots = {}
+        # None = se consultó y la OT no existe
+        self._existing_ots.update(dict.fromkeys(numeros_ot))
+        for numero_ot, row_hash, cliente, operativo in OT.objects.filter(
+            numero_ot__in=numeros_ot
+        ).values_list('numero_ot', 'row_hash', 'cliente__original_name', 'operativo'):
+            self._existing_ots[numero_ot] = {'row_hash': row_hash, 'cliente': cliente, 'operativo': operativo}
+
+    def _get_existing_ot(self, numero_ot: str) -> Optional[Dict[str, Any]]:
+        """Datos de la OT existente (precargados si se llamó a _preload_existing_ots)."""
+        if self._existing_ots is not None and numero_ot in self._existing_ots:
+            return self._existing_ots[numero_ot]
+
+        from ots.models import OT
+        existing = OT.objects.filter(numero_ot=numero_ot).values('row_hash', 'cliente__original_name', 'operativo').first()
+        if existing is None:
+            return None
+        return {
+            'row_hash': existing['row_hash'],
+            'cliente': existing['cliente__original_name'],
+            'operativo': existing['operativo'],
+        }
+
     def _generate_warnings_summary(self):
         """
         Genera un resumen agrupado de warnings por tipo.
@@ -640,8 +731,9 @@ class ExcelProcessor:
             available_keys = ', '.join(ot_data.keys())
             raise ValueError(f"cliente_name no está presente en ot_data para OT {numero_ot}. Keys disponibles: {available_keys}")
 
-        # Calcular el hash de la fila ANTES de manipular ot_data
-        new_row_hash = self._calculate_row_hash(ot_data)
+        # Hash calculado al cargar la fila (_load_row_data); si no viene, calcularlo
+        # ANTES de manipular ot_data
+        new_row_hash = ot_data.pop('row_hash', None) or self._calculate_row_hash(ot_data)
 
         # Buscar o crear cliente
         cliente_name = ot_data.pop('cliente_name')
@@ -735,7 +827,9 @@ class ExcelProcessor:
             OT.objects.create(**ot_data_final)
             self.stats['created'] += 1
     
-    def resolve_conflicts_and_process(self, conflicts_resolutions: List[Dict[str, Any]], processed_by: str = 'system') -> Dict[str, Any]:
+    def resolve_conflicts_and_process(self, conflicts_resolutions: List[Dict[str, Any]], processed_by: str = 'system',
+                                      pending_chunks: Optional[Iterable[Dict[str, Dict[str, Any]]]] = None,
+                                      on_chunk: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
         """
         Resolver conflictos y procesar las OTs con las decisiones tomadas.
 
@@ -743,13 +837,14 @@ class ExcelProcessor:
             conflicts_resolutions: Lista de resoluciones de conflictos
                 [{'ot': '25OT221', 'campo': 'cliente', 'resolucion': 'usar_nuevo', 'valor_nuevo': 'JUGUESAL', 'valor_original': 'JUGUESAL S.A. DE C.V.'}, ...]
             processed_by: Usuario que está procesando (para audit trail)
+            pending_chunks: Bloques con la forma de pending_data a aplicar (p.ej.
+                filas del staging de un OTImportJob leídas por partes). Por
+                defecto, self.pending_data completo.
+            on_chunk: Se llama con cada bloque después de aplicarlo
 
         Returns:
             Estadísticas de procesamiento
         """
-        from ots.models import OT
-        from client_aliases.models import ClientResolution, ClientAlias
-
         # Crear un mapa de resoluciones por OT y campo
         resolutions_map = {}
         for resolution in conflicts_resolutions:
@@ -765,8 +860,28 @@ class ExcelProcessor:
                 'valor_original': resolution.get('valor_original')
             }
 
+        if pending_chunks is None:
+            pending_chunks = [self.pending_data]
+
         # Procesar las OTs aplicando las resoluciones
-        for numero_ot, pending_item in self.pending_data.items():
+        for chunk in pending_chunks:
+            self._process_pending(chunk, resolutions_map)
+            if on_chunk:
+                on_chunk(chunk)
+
+        # Generar resumen agrupado de warnings
+        self._generate_warnings_summary()
+
+        # Marcar archivos como procesados (si tenemos info del hash)
+        # Nota: Los hashes se deben pasar desde el viewset que llama a este método
+
+        return self.stats
+
+    def _process_pending(self, pending: Dict[str, Dict[str, Any]], resolutions_map: Dict[str, Dict[str, Any]]):
+        """Crear o actualizar las OTs de un bloque de pending_data aplicando las resoluciones."""
+        from ots.models import OT
+
+        for numero_ot, pending_item in pending.items():
             try:
                 ot_data = pending_item['data'].copy()
 
@@ -806,14 +921,6 @@ class ExcelProcessor:
                     'error': f"Error al procesar OT {numero_ot}: {str(e)}"
                 })
 
-        # Generar resumen agrupado de warnings
-        self._generate_warnings_summary()
-
-        # Marcar archivos como procesados (si tenemos info del hash)
-        # Nota: Los hashes se deben pasar desde el viewset que llama a este método
-
-        return self.stats
-    
     def _find_best_sheet(self, file_path: str) -> str:
         """
         Encuentra la mejor hoja para procesar buscando la que tenga más datos.
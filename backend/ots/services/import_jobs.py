@@ -0,0 +1,297 @@
+"""
+Importación de Excel de OTs en segundo plano con staging en la BD.
+
+import_excel procesa los archivos dentro del request y guarda los conflictos
+en el pending_data en memoria del ExcelProcessor; una importación grande
+agota el timeout y, al reciclarse el worker, los conflictos se pierden y hay
+que volver a subir los archivos.
+
+Flujo de un OTImportJob:
+1. crear_job(): los archivos van a default_storage y se crea el job
+   ('pendiente'); la tarea ots.tasks.process_import_job se encola.
+2. procesar_job(): lee los archivos con ExcelProcessor.load_multiple_files
+   (progreso en filas_leidas) y deja pending_data en OTImportStagedRow y los
+   conflictos en OTImportConflict. Sin conflictos, aplica de inmediato.
+3. aplicar_job(): con las resoluciones del usuario, aplica las filas del
+   staging por bloques de TAMANO_BLOQUE con
+   ExcelProcessor.resolve_conflicts_and_process. Cada bloque aplicado queda
+   marcado, así que un reintento continúa donde quedó (y una fila repetida
+   se omite por row_hash).
+
+Las tareas solo corren fuera del request con CELERY_TASK_ALWAYS_EAGER=False y
+un worker de Celery en ejecución. En modo eager (el default de settings) el
+job completo se procesa dentro del POST, igual de lento que import_excel;
+solo se conserva el staging de los conflictos en la BD.
+
+Uso:
+    job = crear_job(request.FILES.getlist('files'), ['importacion'], usuario=request.user)
+    encolar_procesamiento(job)
+    ...
+    encolar_aplicacion(job, [{'ot': '25OT221', 'campo': 'cliente', 'resolucion': 'usar_nuevo'}])
+"""
+
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ots.models import OTImportConflict, OTImportJob, OTImportStagedRow
+from ots.services.excel_processor import ExcelProcessor
+
+logger = logging.getLogger(__name__)
+
+
+TAMANO_BLOQUE = 500
+DIRECTORIO_STORAGE = 'ot_imports'
+
+# Campos de ExcelProcessor._extract_complete_row_data que son fechas (el
+# JSON del staging las guarda como texto ISO)
+CAMPOS_FECHA = (
+    'fecha_eta', 'fecha_llegada', 'etd', 'express_release_fecha', 'contra_entrega_fecha',
+    'fecha_solicitud_facturacion', 'fecha_recepcion_factura', 'envio_cierre_ot', 'fecha_provision',
+)
+
+
+class ImportJobError(Exception):
+    """El job no está en un estado que permita la operación."""
+
+
+def crear_job(archivos, tipos_operacion: List[str], delta: bool = False, usuario=None) -> OTImportJob:
+    """Guarda los archivos subidos en default_storage y crea el job."""
+    carpeta = f'{DIRECTORIO_STORAGE}/{uuid.uuid4().hex}'
+    guardados = []
+    for i, archivo in enumerate(archivos):
+        path = default_storage.save(f'{carpeta}/{os.path.basename(archivo.name)}', archivo)
+        guardados.append({
+            'path': path,
+            'filename': archivo.name,
+            'tipo_operacion': tipos_operacion[i] if i < len(tipos_operacion) else 'importacion',
+        })
+
+    return OTImportJob.objects.create(
+        archivos=guardados,
+        delta=delta,
+        created_by=usuario if getattr(usuario, 'pk', None) else None,
+    )
+
+
+def encolar_procesamiento(job: OTImportJob):
+    from ots.tasks import process_import_job
+
+    resultado = process_import_job.delay(job.pk)
+    OTImportJob.objects.filter(pk=job.pk).update(task_id=resultado.id or '')
+
+
+def encolar_aplicacion(job: OTImportJob, resoluciones: List[Dict], processed_by: str = 'system'):
+    """Pasa el job a 'aplicando' y encola la aplicación de las filas del staging."""
+    from ots.tasks import apply_import_job
+
+    actualizados = OTImportJob.objects.filter(pk=job.pk, status='conflictos').update(
+        status='aplicando', updated_at=timezone.now()
+    )
+    if not actualizados:
+        raise ImportJobError(f'La importación #{job.pk} no tiene conflictos pendientes')
+
+    resultado = apply_import_job.delay(job.pk, resoluciones, processed_by)
+    OTImportJob.objects.filter(pk=job.pk).update(task_id=resultado.id or '')
+
+
+def _processed_by(job: OTImportJob) -> str:
+    return job.created_by.username if job.created_by_id else 'system'
+
+
+def _actualizar(job: OTImportJob, **campos):
+    """UPDATE de los campos indicados (sin pisar el progreso escrito por otros UPDATE)."""
+    campos['updated_at'] = timezone.now()
+    OTImportJob.objects.filter(pk=job.pk).update(**campos)
+    for campo, valor in campos.items():
+        if not hasattr(valor, 'resolve_expression'):
+            setattr(job, campo, valor)
+
+
+def _stats_sin_conflictos(stats: Dict) -> Dict:
+    return {clave: valor for clave, valor in stats.items() if clave != 'conflicts'}
+
+
+@contextmanager
+def _archivos_locales(job: OTImportJob):
+    """Copia los archivos del storage a un directorio temporal (pandas necesita rutas)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        locales = []
+        for i, archivo in enumerate(job.archivos):
+            local = os.path.join(tmp, f'{i}.xlsx')
+            with default_storage.open(archivo['path'], 'rb') as origen, open(local, 'wb') as destino:
+                for chunk in origen.chunks():
+                    destino.write(chunk)
+            locales.append((local, archivo['filename']))
+        yield locales
+
+
+def _borrar_archivos(job: OTImportJob):
+    for archivo in job.archivos:
+        try:
+            default_storage.delete(archivo['path'])
+        except Exception as e:
+            logger.warning(f"[IMPORT JOB {job.pk}] No se pudo borrar {archivo['path']}: {e}")
+
+
+def procesar_job(job_id) -> OTImportJob:
+    """
+    Lee los archivos del job y deja las filas y conflictos en el staging.
+
+    Sin conflictos, aplica las filas de inmediato. Si el worker se reinicia
+    durante la lectura, un reintento descarta el staging parcial y vuelve a
+    leer.
+    """
+    job = OTImportJob.objects.select_related('created_by').get(pk=job_id)
+    if job.status not in ('pendiente', 'procesando'):
+        logger.info(f"[IMPORT JOB {job.pk}] Ya procesado ({job.status}), se omite")
+        return job
+
+    _actualizar(job, status='procesando', started_at=timezone.now(), filas_leidas=0)
+
+    try:
+        processor = ExcelProcessor(
+            delta=job.delta,
+            progress_callback=lambda filas: _actualizar(job, filas_leidas=filas),
+        )
+        tipos_operacion = [archivo['tipo_operacion'] for archivo in job.archivos]
+        with _archivos_locales(job) as locales:
+            cargados = processor.load_multiple_files(locales, tipos_operacion=tipos_operacion)
+
+        # Hash de cada archivo cargado, para registrarlo en ProcessedFile al terminar
+        hashes = {path: file_hash for path, _, file_hash, _ in cargados}
+        archivos = [
+            {**archivo, 'file_hash': hashes.get(local)}
+            for archivo, (local, _) in zip(job.archivos, locales)
+        ]
+
+        with transaction.atomic():
+            job.filas.all().delete()
+            job.conflictos.all().delete()
+            OTImportStagedRow.objects.bulk_create([
+                OTImportStagedRow(
+                    job=job,
+                    numero_ot=numero_ot,
+                    data=item['data'],
+                    filename=item['filename'],
+                    row=item.get('row'),
+                )
+                for numero_ot, item in processor.pending_data.items()
+            ], batch_size=TAMANO_BLOQUE)
+            OTImportConflict.objects.bulk_create([
+                OTImportConflict(job=job, numero_ot=conflicto['ot'], campo=conflicto['campo'], detalle=conflicto)
+                for conflicto in processor.detected_conflicts
+            ], batch_size=TAMANO_BLOQUE)
+            _actualizar(
+                job,
+                archivos=archivos,
+                filas_leidas=processor.rows_read,
+                filas_a_aplicar=len(processor.pending_data),
+                stats=_stats_sin_conflictos(processor.stats),
+                status='conflictos' if processor.detected_conflicts else 'aplicando',
+            )
+    except Exception as e:
+        logger.error(f"[IMPORT JOB {job.pk}] Error al leer los archivos: {e}", exc_info=True)
+        _actualizar(job, status='error', mensaje_error=str(e), finished_at=timezone.now())
+        _borrar_archivos(job)
+        return job
+
+    logger.info(
+        f"[IMPORT JOB {job.pk}] {processor.rows_read} filas leídas, {len(processor.pending_data)} OTs en staging, "
+        f"{len(processor.detected_conflicts)} conflictos"
+    )
+    if job.status == 'conflictos':
+        return job
+    return aplicar_job(job.pk, [], processed_by=_processed_by(job))
+
+
+def _cargar_data(data: Dict) -> Dict:
+    for campo in CAMPOS_FECHA:
+        if isinstance(data.get(campo), str):
+            data[campo] = parse_date(data[campo][:10])
+    return data
+
+
+def _bloques(job: OTImportJob):
+    """pending_data de las filas no aplicadas del job, de a TAMANO_BLOQUE."""
+    ultimo_id = 0
+    while True:
+        filas = list(
+            job.filas.filter(aplicada=False, id__gt=ultimo_id).order_by('id')[:TAMANO_BLOQUE]
+        )
+        if not filas:
+            return
+        ultimo_id = filas[-1].id
+        yield {
+            fila.numero_ot: {
+                'data': _cargar_data(fila.data),
+                'filename': fila.filename,
+                'row': fila.row,
+                'staged_id': fila.id,
+            }
+            for fila in filas
+        }
+
+
+def aplicar_job(job_id, resoluciones: List[Dict], processed_by: Optional[str] = None) -> OTImportJob:
+    """
+    Aplica las filas pendientes del staging con las resoluciones de conflictos
+    [{'ot', 'campo', 'resolucion'}] y cierra el job.
+    """
+    job = OTImportJob.objects.select_related('created_by').get(pk=job_id)
+    if job.status != 'aplicando':
+        logger.info(f"[IMPORT JOB {job.pk}] No está para aplicar ({job.status}), se omite")
+        return job
+    processed_by = processed_by or _processed_by(job)
+
+    # Completar valor_original / valor_nuevo desde los conflictos guardados
+    detalles = {(c.numero_ot, c.campo): c.detalle for c in job.conflictos.all()}
+    for resolucion in resoluciones:
+        detalle = detalles.get((resolucion['ot'], resolucion['campo']), {})
+        resolucion.setdefault('valor_original', detalle.get('valor_actual'))
+        resolucion.setdefault('valor_nuevo', detalle.get('valor_nuevo'))
+
+    processor = ExcelProcessor()
+    processor.stats.update(job.stats)
+    processor.stats['conflicts'] = []
+
+    def bloque_aplicado(bloque):
+        ids = [item['staged_id'] for item in bloque.values()]
+        OTImportStagedRow.objects.filter(id__in=ids).update(aplicada=True)
+        contadores = {clave: valor for clave, valor in processor.stats.items() if isinstance(valor, int)}
+        _actualizar(job, filas_aplicadas=F('filas_aplicadas') + len(ids), stats={**job.stats, **contadores})
+
+    try:
+        stats = processor.resolve_conflicts_and_process(
+            resoluciones, processed_by=processed_by, pending_chunks=_bloques(job), on_chunk=bloque_aplicado
+        )
+        archivos = [
+            (None, archivo['filename'], archivo['file_hash'], archivo['tipo_operacion'])
+            for archivo in job.archivos if archivo.get('file_hash')
+        ]
+        processor.mark_files_processed(archivos, processed_by=processed_by)
+    except Exception as e:
+        logger.error(f"[IMPORT JOB {job.pk}] Error al aplicar el staging: {e}", exc_info=True)
+        _actualizar(job, status='error', mensaje_error=str(e), finished_at=timezone.now())
+        return job
+
+    # El staging ya no se necesita: el resultado queda en stats
+    job.filas.all().delete()
+    _borrar_archivos(job)
+    _actualizar(job, status='completado', stats=_stats_sin_conflictos(stats), finished_at=timezone.now())
+    job.refresh_from_db()
+
+    logger.info(
+        f"[IMPORT JOB {job.pk}] Completado: {stats['created']} creadas, {stats['updated']} actualizadas, "
+        f"{len(stats['errors'])} errores"
+    )
+    return job
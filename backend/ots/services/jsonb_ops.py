@@ -0,0 +1,211 @@
+"""
+Mutaciones atómicas de los JSONField de la OT (contenedores y provisiones).
+
+Antes add_container / remove_container / update_provision cargaban la OT,
+modificaban la lista o el dict en Python y guardaban la fila completa con
+OT.save() y sus signals. Dos requests concurrentes sobre la misma OT leían
+el mismo JSON y el último save() pisaba el cambio del otro.
+
+Aquí cada operación es UN ``UPDATE ... RETURNING`` con operadores jsonb: la
+modificación se calcula sobre la fila bloqueada por el propio UPDATE, así
+que las escrituras concurrentes se serializan en PostgreSQL y ninguna se
+pierde. Como no pasan por OT.save(), lo único derivado que se actualiza es
+updated_at, modificado_por y la versión del modelo para los caches.
+
+Uso:
+    agregar_contenedor(ot_id, 'MSCU1234567', usuario=request.user)
+    quitar_contenedor(ot_id, 'MSCU1234567')
+    actualizar_provision(ot_id, [{'concepto': 'Flete', 'monto': 1500}], fuente='manual')
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+from ots.models import CONTAINER_NUMBER_PATTERN, OT, normalizar_numero_contenedor
+
+logger = logging.getLogger(__name__)
+
+
+TABLA = OT._meta.db_table
+
+# Fuentes cuya provisión queda bloqueada (igual que ProvisionManager.set_provision)
+FUENTES_QUE_BLOQUEAN = ('manual', 'csv')
+
+# Prioridad de provision_source en SQL (OT.HIERARCHY_PRIORITY)
+PRIORIDAD_FUENTE_SQL = 'CASE provision_source {} ELSE 0 END'.format(
+    ' '.join(f"WHEN '{fuente}' THEN {prioridad}" for fuente, prioridad in OT.HIERARCHY_PRIORITY.items() if fuente)
+)
+
+# Lista de contenedores tolerante a valores legacy (NULL o no-array)
+CONTENEDORES = "CASE WHEN jsonb_typeof(contenedores) = 'array' THEN contenedores ELSE '[]'::jsonb END"
+
+AGREGAR_CONTENEDOR_SQL = f"""
+UPDATE {TABLA}
+SET contenedores = {CONTENEDORES} || jsonb_build_array(%(numero)s::text),
+    modificado_por_id = COALESCE(%(usuario_id)s, modificado_por_id),
+    updated_at = %(ahora)s
+WHERE id = %(ot_id)s
+  AND deleted_at IS NULL
+  AND NOT ({CONTENEDORES} @> jsonb_build_array(%(numero)s::text))
+RETURNING contenedores
+"""
+
+QUITAR_CONTENEDOR_SQL = f"""
+UPDATE {TABLA}
+SET contenedores = contenedores - %(numero)s::text,
+    modificado_por_id = COALESCE(%(usuario_id)s, modificado_por_id),
+    updated_at = %(ahora)s
+WHERE id = %(ot_id)s
+  AND deleted_at IS NULL
+  AND {CONTENEDORES} @> jsonb_build_array(%(numero)s::text)
+RETURNING contenedores
+"""
+
+# Upsert de items por concepto sobre provision_hierarchy->'items' (los nuevos
+# conceptos van al final, en el orden recibido) y total recalculado.
+ACTUALIZAR_PROVISION_SQL = f"""
+UPDATE {TABLA} AS ot
+SET provision_hierarchy = (
+        SELECT jsonb_build_object(
+            'items', COALESCE(jsonb_agg(item ORDER BY orden), '[]'::jsonb),
+            'total', COALESCE(SUM((item->>'monto')::numeric), 0)
+        )
+        FROM (
+            SELECT COALESCE(nuevo.item, actual.item) AS item,
+                   COALESCE(actual.orden, 1000000 + nuevo.orden) AS orden
+            FROM jsonb_array_elements(
+                CASE WHEN jsonb_typeof(ot.provision_hierarchy->'items') = 'array'
+                     THEN ot.provision_hierarchy->'items' ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS actual(item, orden)
+            FULL OUTER JOIN jsonb_array_elements(%(items)s::jsonb) WITH ORDINALITY AS nuevo(item, orden)
+                ON actual.item->>'concepto' = nuevo.item->>'concepto'
+        ) AS combinados
+    ),
+    provision_source = %(fuente)s,
+    provision_locked = %(bloquear)s,
+    provision_updated_by = %(actualizado_por)s,
+    modificado_por_id = COALESCE(%(usuario_id)s, modificado_por_id),
+    updated_at = %(ahora)s
+WHERE ot.id = %(ot_id)s
+  AND ot.deleted_at IS NULL
+  AND (%(forzar)s OR ((NOT ot.provision_locked OR %(fuente)s = 'manual')
+                      AND {PRIORIDAD_FUENTE_SQL} <= %(prioridad)s))
+RETURNING provision_hierarchy
+"""
+
+
+class ProvisionBloqueada(Exception):
+    """La fuente no tiene prioridad para modificar la provisión de la OT."""
+
+
+def _json(valor):
+    # Django registra jsonb sin decodificar en psycopg2: RETURNING llega como texto
+    return json.loads(valor) if isinstance(valor, str) else valor
+
+
+def _ejecutar(sql: str, params: Dict):
+    params = {'ahora': timezone.now(), **params}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        fila = cursor.fetchone()
+    if fila is None:
+        return None
+    # UPDATE directo sin signals: invalidar los caches de OT al confirmar
+    transaction.on_commit(lambda: bump_model_version(OT))
+    return _json(fila[0])
+
+
+def _validar_contenedor(numero) -> str:
+    cleaned = normalizar_numero_contenedor(str(numero or ''))
+    if not cleaned:
+        raise ValidationError("El número de contenedor no puede estar vacío")
+    if not CONTAINER_NUMBER_PATTERN.match(cleaned):
+        raise ValidationError("El número de contenedor debe tener formato AAAA0000000")
+    return cleaned
+
+
+def _verificar_existe(ot_id):
+    if not OT.objects.filter(pk=ot_id, deleted_at__isnull=True).exists():
+        raise OT.DoesNotExist(f"OT {ot_id} no existe")
+
+
+def agregar_contenedor(ot_id, numero, usuario=None) -> List[str]:
+    """
+    Agrega un contenedor a la OT. Retorna la lista resultante.
+
+    Raises:
+        ValidationError: formato inválido o el contenedor ya está en la OT.
+        OT.DoesNotExist
+    """
+    cleaned = _validar_contenedor(numero)
+    contenedores = _ejecutar(AGREGAR_CONTENEDOR_SQL, {
+        'ot_id': ot_id, 'numero': cleaned, 'usuario_id': getattr(usuario, 'pk', None),
+    })
+    if contenedores is None:
+        _verificar_existe(ot_id)
+        raise ValidationError(f"El contenedor {cleaned} ya existe en esta OT")
+    return contenedores
+
+
+def quitar_contenedor(ot_id, numero, usuario=None) -> Optional[List[str]]:
+    """
+    Quita un contenedor de la OT. Retorna la lista resultante, o None si el
+    contenedor no estaba en la OT.
+
+    Raises:
+        OT.DoesNotExist
+    """
+    cleaned = normalizar_numero_contenedor(str(numero or ''))
+    contenedores = _ejecutar(QUITAR_CONTENEDOR_SQL, {
+        'ot_id': ot_id, 'numero': cleaned, 'usuario_id': getattr(usuario, 'pk', None),
+    })
+    if contenedores is None:
+        _verificar_existe(ot_id)
+    return contenedores
+
+
+def actualizar_provision(ot_id, items: List[Dict], fuente: str = 'manual', usuario=None,
+                         forzar: bool = False) -> Dict:
+    """
+    Agrega o actualiza (por concepto) items de provision_hierarchy y recalcula
+    el total, respetando la jerarquía de fuentes (MANUAL > CSV > EXCEL).
+
+    Retorna el provision_hierarchy resultante.
+
+    Raises:
+        ProvisionBloqueada: la provisión está bloqueada o tiene una fuente de
+            mayor prioridad (y no se usó forzar).
+        OT.DoesNotExist
+    """
+    items = [
+        {
+            'concepto': item['concepto'],
+            'monto': float(item['monto']),
+            'categoria': item.get('categoria', 'operacion'),
+        }
+        for item in items
+    ]
+    hierarchy = _ejecutar(ACTUALIZAR_PROVISION_SQL, {
+        'ot_id': ot_id,
+        'items': json.dumps(items),
+        'fuente': fuente,
+        'prioridad': OT.HIERARCHY_PRIORITY.get(fuente, 0),
+        'bloquear': fuente in FUENTES_QUE_BLOQUEAN,
+        'forzar': forzar,
+        'actualizado_por': getattr(usuario, 'username', '') or '',
+        'usuario_id': getattr(usuario, 'pk', None),
+    })
+    if hierarchy is None:
+        _verificar_existe(ot_id)
+        ot = OT.objects.only('provision_source', 'provision_locked').get(pk=ot_id)
+        _, razon = ot.can_update_provision(fuente)
+        raise ProvisionBloqueada(razon or f'Prioridad insuficiente: {fuente} < {ot.provision_source}')
+
+    logger.info(f"[PROVISION] OT {ot_id}: {len(items)} items ({fuente}), total {hierarchy.get('total')}")
+    return hierarchy
@@ -0,0 +1,203 @@
+"""
+Importación masiva del CSV de Provisión Acajutla.
+
+Antes import_provision_acajutla hacía, por fila, un OT.objects.get y un
+OT.save() completo con su validación y la señal OT -> facturas; un archivo
+mensual de miles de filas tardaba minutos.
+
+AcajutlaProvisionImporter:
+1. Lee el CSV en streaming (sin decodificar el archivo completo en memoria)
+   y guarda solo las columnas que usa.
+2. Busca todas las OTs del archivo con UNA consulta numero_ot__in.
+3. Valida la jerarquía de fuentes en memoria con OT.can_update_field y
+   aplica a cada OT lo que hacía OT.save() para estos campos
+   (estado_provision sigue a fecha_provision).
+4. Guarda los cambios con bulk_update y sincroniza las facturas vinculadas
+   de las OTs cuya provisión cambió una sola vez
+   (sincronizar_facturas_desde_ots), en vez de una vez por fila.
+
+Retorna estadísticas y un reporte por fila.
+
+Uso:
+    resultado = AcajutlaProvisionImporter().importar(request.FILES['file'])
+"""
+
+import codecs
+import csv
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+from ots.models import ESTADOS_PROVISION_MANUALES, OT
+
+logger = logging.getLogger(__name__)
+
+
+# Columnas del CSV (índices)
+COLUMNA_OT = 6
+COLUMNA_BARCO = 13
+COLUMNA_FECHA_PROVISION = 16
+FILAS_ENCABEZADO = 2
+
+VALORES_OT_IGNORADOS = {'', 'PLG SV'}
+VALORES_BARCO_IGNORADOS = {'', '-', 'N/A'}
+VALORES_FECHA_IGNORADOS = {'', '-', 'N/A', 'SOLICITUD DE PAGO'}
+FORMATOS_FECHA = ('%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d')
+
+FUENTE = 'csv'
+
+CAMPOS_OT = [
+    'id', 'numero_ot', 'barco', 'barco_source', 'fecha_provision', 'provision_source',
+    'provision_locked', 'estado_provision', 'fecha_recepcion_factura',
+]
+CAMPOS_ACTUALIZADOS = [
+    'barco', 'barco_source', 'fecha_provision', 'provision_source', 'estado_provision', 'updated_at',
+]
+
+
+def parse_fecha(valor: str) -> Optional[date]:
+    """Fecha del CSV (D/M/YYYY, M/D/YYYY o YYYY-MM-DD); None si no es una fecha."""
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+class AcajutlaProvisionImporter:
+    """Actualiza barco y fecha_provision de las OTs desde el CSV de Acajutla."""
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.stats = {
+            'processed': 0,
+            'updated': 0,
+            'skipped': 0,
+            'errors': [],
+        }
+        self.rows: List[Dict] = []
+
+    def leer_filas(self, archivo) -> List[Tuple[int, str, str, str]]:
+        """(row_num, numero_ot, barco, fecha_provision) de las filas con número de OT."""
+        lector = csv.reader(codecs.iterdecode(archivo, 'utf-8-sig'))
+        filas = []
+        for row_num, row in enumerate(lector, start=1):
+            if row_num <= FILAS_ENCABEZADO or len(row) <= COLUMNA_FECHA_PROVISION:
+                continue  # Encabezado o fila incompleta
+            numero_ot = row[COLUMNA_OT].strip()
+            if numero_ot in VALORES_OT_IGNORADOS:
+                continue
+            filas.append((row_num, numero_ot, row[COLUMNA_BARCO].strip(), row[COLUMNA_FECHA_PROVISION].strip()))
+        return filas
+
+    def importar(self, archivo) -> Dict:
+        filas = self.leer_filas(archivo)
+
+        # numero_ot es único y en mayúsculas (RegexValidator): equivale a iexact
+        ots = {
+            ot.numero_ot: ot
+            for ot in OT.objects.filter(
+                numero_ot__in={numero.upper() for _, numero, _, _ in filas},
+                deleted_at__isnull=True,
+            ).only(*CAMPOS_OT)
+        }
+
+        modificadas: Dict[int, OT] = {}
+        provision_modificada = set()
+        for row_num, numero, barco, fecha in filas:
+            ot = ots.get(numero.upper())
+            if ot is None:
+                self.stats['skipped'] += 1
+                self._reportar(row_num, numero, 'no_encontrada')
+                continue
+
+            try:
+                campos, motivos = self._aplicar_fila(ot, barco, fecha)
+            except ValidationError as e:
+                error = '; '.join(e.messages)
+                self.stats['errors'].append({'row': row_num, 'ot': numero, 'error': error})
+                self._reportar(row_num, numero, 'error', motivo=error)
+                continue
+
+            self.stats['processed'] += 1
+            if campos:
+                self.stats['updated'] += 1
+                modificadas[ot.pk] = ot
+                if 'fecha_provision' in campos:
+                    provision_modificada.add(ot.pk)
+                self._reportar(row_num, numero, 'actualizada', campos=campos, motivo='; '.join(motivos))
+            else:
+                self._reportar(row_num, numero, 'sin_cambios', motivo='; '.join(motivos))
+
+        facturas = self._guardar(list(modificadas.values()), [modificadas[pk] for pk in provision_modificada])
+
+        logger.info(
+            f"[PROVISION CSV] {len(filas)} filas: {len(modificadas)} OTs actualizadas, "
+            f"{self.stats['skipped']} no encontradas, {len(self.stats['errors'])} errores, "
+            f"{facturas} facturas sincronizadas"
+        )
+        return {**self.stats, 'ots_updated': len(modificadas), 'invoices_synced': facturas, 'rows': self.rows}
+
+    def _aplicar_fila(self, ot: OT, barco: str, fecha: str) -> Tuple[List[str], List[str]]:
+        """Aplica la fila sobre la OT en memoria. Retorna (campos modificados, motivos de omisión)."""
+        campos, motivos = [], []
+
+        if barco not in VALORES_BARCO_IGNORADOS:
+            if not ot.can_update_field('barco', FUENTE):
+                motivos.append(f'barco con prioridad {ot.barco_source}')
+            elif (ot.barco, ot.barco_source) != (barco, FUENTE):
+                OT._meta.get_field('barco').clean(barco, ot)
+                ot.barco, ot.barco_source = barco, FUENTE
+                campos.append('barco')
+
+        if fecha not in VALORES_FECHA_IGNORADOS:
+            fecha_provision = parse_fecha(fecha)
+            if fecha_provision is None:
+                motivos.append(f'fecha no reconocida: {fecha}')
+            elif not ot.can_update_field('fecha_provision', FUENTE):
+                motivos.append(
+                    'provisión bloqueada' if ot.provision_locked else f'provisión con prioridad {ot.provision_source}'
+                )
+            elif (ot.fecha_provision, ot.provision_source) != (fecha_provision, FUENTE):
+                ot.fecha_provision, ot.provision_source = fecha_provision, FUENTE
+                # Lo que hace OT.save() con una fecha de provisión
+                if ot.estado_provision not in ESTADOS_PROVISION_MANUALES:
+                    ot.estado_provision = 'provisionada'
+                campos.append('fecha_provision')
+
+        return campos, motivos
+
+    def _guardar(self, ots: List[OT], ots_provision: List[OT]) -> int:
+        """bulk_update de las OTs modificadas y una sincronización de facturas. Retorna facturas actualizadas."""
+        if not ots:
+            return 0
+
+        from invoices.services.ot_reconciliation import sincronizar_facturas_desde_ots
+
+        now = timezone.now()
+        for ot in ots:
+            ot.updated_at = now
+
+        with transaction.atomic():
+            OT.objects.bulk_update(ots, CAMPOS_ACTUALIZADOS, batch_size=self.batch_size)
+            # Lo que hacía la señal OT -> facturas, una vez por OT
+            facturas = sincronizar_facturas_desde_ots(ots_provision)
+            # bulk_update no dispara señales: invalidar caches de OT
+            transaction.on_commit(lambda: bump_model_version(OT))
+        return facturas
+
+    def _reportar(self, row_num: int, numero_ot: str, resultado: str, campos: Optional[List[str]] = None,
+                  motivo: str = ''):
+        self.rows.append({
+            'row': row_num,
+            'ot': numero_ot,
+            'result': resultado,
+            'fields': campos or [],
+            'reason': motivo,
+        })
@@ -4,6 +4,7 @@ Signals for the OTs module.
 
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from .models import OT
 from client_aliases.models import ClientAlias
 
@@ -17,19 +18,17 @@ def update_client_usage_count_on_save(sender, instance, created, **kwargs):
             instance.cliente.usage_count = OT.objects.filter(cliente=instance.cliente, deleted_at__isnull=True).count()
             instance.cliente.save(update_fields=['usage_count', 'updated_at'])
     else:
-        # If the client has changed, update both the old and the new client
-        try:
-            old_instance = OT.objects.get(pk=instance.pk)
-            if old_instance.cliente != instance.cliente:
-                if old_instance.cliente:
-                    old_instance.cliente.usage_count = OT.objects.filter(cliente=old_instance.cliente, deleted_at__isnull=True).count()
-                    old_instance.cliente.save(update_fields=['usage_count', 'updated_at'])
-                if instance.cliente:
-                    instance.cliente.usage_count = OT.objects.filter(cliente=instance.cliente, deleted_at__isnull=True).count()
-                    instance.cliente.save(update_fields=['usage_count', 'updated_at'])
-        except OT.DoesNotExist:
-            # This can happen if the instance is being created
-            pass
+        # Cambios desde la carga (OT.get_dirty_fields): el snapshot todavía tiene
+        # el cliente anterior; antes se releía la OT de la base en cada save.
+        dirty = instance.get_dirty_fields()
+        if dirty is not None and not dirty & {'cliente_id', 'deleted_at'}:
+            return
+        anterior = instance._loaded_values.get('cliente_id') if dirty is not None else None
+        for cliente_id in {anterior, instance.cliente_id} - {None}:
+            ClientAlias.objects.filter(pk=cliente_id).update(
+                usage_count=OT.objects.filter(cliente_id=cliente_id, deleted_at__isnull=True).count(),
+                updated_at=timezone.now(),
+            )
 
 @receiver(post_delete, sender=OT)
 def update_client_usage_count_on_delete(sender, instance, **kwargs):
@@ -0,0 +1,42 @@
+"""
+Celery tasks para el módulo de OTs.
+
+Importación de Excel en segundo plano: el estado, el progreso y los
+conflictos quedan en OTImportJob y su staging (ver
+ots/services/import_jobs.py), así que las tareas solo reciben el id del job
+y un reintento continúa donde quedó.
+"""
+
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(
+    name='ots.tasks.process_import_job',
+    acks_late=True,
+    time_limit=3600,
+    soft_time_limit=3540
+)
+def process_import_job(job_id):
+    """Lee los archivos del job, llena el staging y, sin conflictos, aplica las filas."""
+    from ots.services.import_jobs import procesar_job
+
+    job = procesar_job(job_id)
+    return {'job_id': job.pk, 'status': job.status}
+
+
+@shared_task(
+    name='ots.tasks.apply_import_job',
+    acks_late=True,
+    time_limit=3600,
+    soft_time_limit=3540
+)
+def apply_import_job(job_id, resoluciones, processed_by='system'):
+    """Aplica por bloques las filas del staging con las resoluciones de conflictos."""
+    from ots.services.import_jobs import aplicar_job
+
+    job = aplicar_job(job_id, resoluciones, processed_by=processed_by)
+    return {'job_id': job.pk, 'status': job.status}
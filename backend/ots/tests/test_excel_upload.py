@@ -1,6 +1,7 @@
 import io
 import pandas as pd
 from datetime import date, timedelta
+from unittest.mock import patch
 
 from django.urls import reverse
 from rest_framework import status
@@ -311,4 +312,36 @@ class ExcelUploadAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         ot.refresh_from_db()
         self.assertEqual(ot.estado, "en_rada")
-        self.assertEqual(ot.estado_source, "manual")
\ No newline at end of file
+        self.assertEqual(ot.estado_source, "manual")
+
+    def test_delta_reimport_only_processes_new_or_changed_rows(self):
+        """
+        Verifica que en modo delta las filas sin cambios (mismo row_hash) se
+        omitan antes de resolver el cliente y que se reporten los conteos.
+        """
+        excel_data = [
+            {'OT': '25OT-DELTA-1', 'Cliente': 'CLIENTE DELTA', 'MBL': 'MBL-D1', 'Barco': 'MSC ANA'},
+            {'OT': '25OT-DELTA-2', 'Cliente': 'CLIENTE DELTA', 'MBL': 'MBL-D2', 'Barco': 'MSC ANA'},
+            {'OT': '25OT-DELTA-3', 'Cliente': 'CLIENTE DELTA', 'MBL': 'MBL-D3', 'Barco': 'MSC ANA'},
+        ]
+        self.client.post(self.upload_url, {'files': [create_mock_excel(excel_data)]}, format='multipart')
+        self.assertEqual(OT.objects.count(), 3)
+
+        excel_data[1]['Barco'] = 'MAERSK BEA'
+        excel_data.append({'OT': '25OT-DELTA-4', 'Cliente': 'CLIENTE DELTA', 'MBL': 'MBL-D4', 'Barco': 'MSC ANA'})
+
+        with patch('client_aliases.models.ClientResolution.find_resolution', return_value=None) as find_resolution:
+            response = self.client.post(
+                self.upload_url,
+                {'files': [create_mock_excel(excel_data)], 'delta': 'true'},
+                format='multipart'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {key: response.data[key] for key in ('new', 'changed', 'unchanged', 'created', 'updated', 'skipped')},
+            {'new': 1, 'changed': 1, 'unchanged': 2, 'created': 1, 'updated': 1, 'skipped': 2}
+        )
+        # Solo las filas nueva y cambiada llegan a la resolución de alias
+        self.assertEqual(find_resolution.call_count, 2)
+        self.assertEqual(OT.objects.get(numero_ot='25OT-DELTA-2').barco, 'MAERSK BEA')
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from catalogs.models import Provider
+from client_aliases.models import ClientAlias
+from ots.models import OT
+from ots.views import OT_FILTER_FACETS
+
+
+class OTFilterValuesTestCase(APITestCase):
+    """
+    Pruebas del endpoint filter-values de OTs (facetas cacheadas con ETag).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='operativo',
+            email='operativo@example.com',
+            password='password123',
+            role='operativo'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('ot-filter-values')
+
+        self.proveedor = Provider.objects.create(
+            nombre='MAERSK', tipo='naviera', categoria='internacional'
+        )
+        self.cliente_a = ClientAlias.objects.create(original_name='Cliente A', normalized_name='CLIENTE A')
+        self.cliente_b = ClientAlias.objects.create(original_name='Cliente B', normalized_name='CLIENTE B')
+
+        OT.objects.create(numero_ot='25OT001', cliente=self.cliente_a, proveedor=self.proveedor,
+                          operativo='ANA', estado='transito')
+        OT.objects.create(numero_ot='25OT002', cliente=self.cliente_a, operativo='LUIS', estado='puerto')
+        OT.objects.create(numero_ot='25OT003', cliente=self.cliente_b, operativo='ANA', estado='transito')
+
+    def test_returns_distinct_values_in_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = OT_FILTER_FACETS.compute(OT.objects.filter(deleted_at__isnull=True))
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(list(data['clientes']), ['Cliente A', 'Cliente B'])
+        self.assertEqual(list(data['operativos']), ['ANA', 'LUIS'])
+        self.assertEqual(list(data['proveedores']), ['MAERSK'])
+        self.assertEqual(data['estados'], {'puerto': 1, 'transito': 2})
+
+    def test_response_shape_and_filters(self):
+        response = self.client.get(self.url, {'cliente': 'Cliente B'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['clientes'], ['Cliente B'])
+        self.assertEqual(response.data['operativos'], ['ANA'])
+        self.assertEqual(response.data['proveedores'], [])
+        self.assertEqual(response.data['estados_provision'], ['pendiente'])
+        self.assertNotIn('counts', response.data)
+
+    def test_counts_are_optional(self):
+        response = self.client.get(self.url, {'counts': 'true'})
+
+        self.assertEqual(response.data['counts']['clientes'], {'Cliente A': 2, 'Cliente B': 1})
+        self.assertEqual(response.data['counts']['operativos'], {'ANA': 2, 'LUIS': 1})
+
+    def test_etag_allows_not_modified(self):
+        first = self.client.get(self.url)
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], etag)
+        # Solo la autenticación/permisos; ninguna consulta sobre OTs
+        self.assertFalse(any('"ots"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_cached_until_model_version_bump(self):
+        first = self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.data, first.data)
+        self.assertFalse(any('"ots"' in q['sql'] for q in ctx.captured_queries))
+
+        OT.objects.create(numero_ot='25OT004', cliente=self.cliente_b, operativo='MARIA', estado='bodega')
+
+        refreshed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(refreshed['ETag'], first['ETag'])
+        self.assertIn('MARIA', refreshed.data['operativos'])
+        self.assertIn('bodega', refreshed.data['estados'])
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from client_aliases.models import ClientAlias
+from ots.models import OT, OTImportConflict, OTImportJob, OTImportStagedRow, ProcessedFile
+from ots.services.excel_processor import ExcelProcessor
+from ots.tests.test_excel_upload import create_mock_excel
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+class OTImportJobAPITestCase(APITestCase):
+    """Importación en segundo plano (Celery en modo eager) con staging en BD"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_media = override_settings(MEDIA_ROOT=media)
+        settings_media.enable()
+        self.addCleanup(settings_media.disable)
+        self.media = media
+
+        self.user = User.objects.create_user(
+            username='jefeops_jobs', email='jobs@example.com', password='password123', role='jefe_operaciones'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('ot-import-jobs')
+
+    def _detail(self, job_id):
+        return self.client.get(reverse('ot-import-job-detail', kwargs={'job_id': job_id}))
+
+    def test_job_without_conflicts_runs_to_completion(self):
+        archivo = create_mock_excel([
+            {'OT': '25OT-JOB-001', 'Cliente': 'CLIENTE JOB', 'MBL': 'MBL001', 'ETA': '2025-03-01'},
+            {'OT': '25OT-JOB-002', 'Cliente': 'CLIENTE JOB', 'MBL': 'MBL002'},
+        ])
+
+        response = self.client.post(self.url, {'files': [archivo]}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'completado')
+
+        detalle = self._detail(response.data['id']).data
+        self.assertEqual(detalle['filas_leidas'], 2)
+        self.assertEqual(detalle['filas_aplicadas'], 2)
+        self.assertEqual(detalle['stats']['created'], 2)
+        self.assertEqual(detalle['created_by'], 'jefeops_jobs')
+
+        self.assertEqual(str(OT.objects.get(numero_ot='25OT-JOB-001').fecha_eta), '2025-03-01')
+        self.assertEqual(ProcessedFile.objects.count(), 1)
+        # Staging y archivos se limpian al terminar
+        self.assertFalse(OTImportStagedRow.objects.exists())
+        self.assertEqual(sum(len(archivos) for _, _, archivos in os.walk(self.media)), 0)
+
+    def test_conflicts_are_staged_and_resolved_in_chunks(self):
+        cliente = ClientAlias.objects.create(original_name='CLIENTE ANTIGUO')
+        OT.objects.create(numero_ot='25OT-JOB-CONFLICTO', cliente=cliente)
+        archivo = create_mock_excel([
+            {'OT': '25OT-JOB-CONFLICTO', 'Cliente': 'CLIENTE NUEVO'},
+            {'OT': '25OT-JOB-OTRA', 'Cliente': 'CLIENTE NUEVO'},
+            {'OT': '25OT-JOB-TERCERA', 'Cliente': 'CLIENTE NUEVO'},
+        ])
+
+        response = self.client.post(self.url, {'files': [archivo]}, format='multipart')
+        self.assertEqual(response.data['status'], 'conflictos')
+        job_id = response.data['id']
+        self.assertIn('cliente', [c['campo'] for c in response.data['conflicts']])
+        self.assertEqual(OTImportStagedRow.objects.filter(job_id=job_id).count(), 3)
+        self.assertTrue(OTImportConflict.objects.filter(job_id=job_id, numero_ot='25OT-JOB-CONFLICTO').exists())
+        self.assertFalse(OT.objects.filter(numero_ot='25OT-JOB-OTRA').exists())
+
+        # Los conflictos salen de la BD: no se vuelven a subir los archivos
+        resolve_url = reverse('ot-resolve-import-job', kwargs={'job_id': job_id})
+        resoluciones = [
+            {'ot': c['ot'], 'campo': c['campo'], 'resolucion': 'usar_nuevo'}
+            for c in response.data['conflicts']
+        ]
+        with patch('ots.services.import_jobs.TAMANO_BLOQUE', 2), \
+                patch.object(ExcelProcessor, '_process_pending', autospec=True,
+                             side_effect=ExcelProcessor._process_pending) as process_pending:
+            response = self.client.post(resolve_url, {'conflicts': resoluciones}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'completado')
+        self.assertEqual([len(args[1]) for args, _ in process_pending.call_args_list], [2, 1])
+
+        self.assertEqual(response.data['filas_aplicadas'], 3)
+        self.assertEqual(response.data['stats']['created'], 2)
+        self.assertEqual(response.data['stats']['updated'], 1)
+        self.assertEqual(OT.objects.get(numero_ot='25OT-JOB-CONFLICTO').cliente.original_name, 'CLIENTE NUEVO')
+
+        # Un job ya aplicado no se vuelve a resolver
+        again = self.client.post(resolve_url, {'conflicts': resoluciones}, format='json')
+        self.assertEqual(again.status_code, status.HTTP_409_CONFLICT)
+
+    def test_unknown_job_returns_404(self):
+        self.assertEqual(self._detail(999999).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(OTImportJob.objects.exists())
+
@@ -0,0 +1,113 @@
+import threading
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from client_aliases.models import ClientAlias
+from ots.models import OT
+from ots.services import jsonb_ops
+
+
+class OTJsonMutationsAPITestCase(APITestCase):
+    """add_container / remove_container / update_provision como UPDATE jsonb"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='admin_jsonb', email='jsonb@example.com', password='password123', role='admin'
+        )
+        self.client.force_authenticate(user=self.user)
+        cliente = ClientAlias.objects.create(original_name='Cliente JSONB', normalized_name='CLIENTE JSONB')
+        self.ot = OT.objects.create(
+            numero_ot='OT-JSONB-001',
+            cliente=cliente,
+            contenedores=['MSCU1234567'],
+            provision_hierarchy={'items': [{'concepto': 'Flete', 'monto': 100.0, 'categoria': 'transporte'}], 'total': 100.0},
+        )
+
+    def _url(self, name):
+        return reverse(f'ot-{name}', kwargs={'pk': self.ot.pk})
+
+    def test_add_and_remove_container_in_one_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self._url('add-container'), {'numero': 'cmau-765 4321'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['contenedores'], ['MSCU1234567', 'CMAU7654321'])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'UPDATE ots' in q['sql']]), 1)
+
+        duplicado = self.client.post(self._url('add-container'), {'numero': 'MSCU1234567'})
+        self.assertEqual(duplicado.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self._url('remove-container'), {'numero': 'MSCU1234567'})
+        self.assertEqual(response.data['contenedores'], ['CMAU7654321'])
+        no_existe = self.client.post(self._url('remove-container'), {'numero': 'MSCU1234567'})
+        self.assertEqual(no_existe.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.ot.refresh_from_db()
+        self.assertEqual(self.ot.contenedores, ['CMAU7654321'])
+        self.assertEqual(self.ot.modificado_por, self.user)
+
+    def test_update_provision_upserts_by_concepto(self):
+        response = self.client.post(self._url('update-provision'), {'items': [
+            {'concepto': 'Almacenaje', 'monto': '50.25', 'categoria': 'puerto'},
+            {'concepto': 'Flete', 'monto': '150.00', 'categoria': 'transporte'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(i['concepto'], i['monto']) for i in response.data['provision_hierarchy']['items']],
+            [('Flete', 150.0), ('Almacenaje', 50.25)]
+        )
+        self.assertEqual(response.data['provision_total'], 200.25)
+
+        self.ot.refresh_from_db()
+        self.assertEqual(self.ot.provision_source, 'manual')
+        self.assertTrue(self.ot.provision_locked)
+        self.assertEqual(self.ot.provision_updated_by, 'admin_jsonb')
+
+    def test_provision_respects_source_priority(self):
+        OT.objects.filter(pk=self.ot.pk).update(provision_source='csv', provision_locked=True)
+
+        with self.assertRaises(jsonb_ops.ProvisionBloqueada):
+            jsonb_ops.actualizar_provision(self.ot.pk, [{'concepto': 'Flete', 'monto': 1}], fuente='excel')
+
+        hierarchy = jsonb_ops.actualizar_provision(self.ot.pk, [{'concepto': 'Flete', 'monto': 1}], fuente='excel', forzar=True)
+        self.assertEqual(hierarchy['total'], 1)
+
+
+class OTJsonMutationsConcurrencyTestCase(TransactionTestCase):
+    """Escrituras concurrentes sobre la misma OT: ninguna se pierde"""
+
+    available_apps = ['accounts', 'catalogs', 'client_aliases', 'ots']
+
+    def test_concurrent_mutations_keep_every_update(self):
+        cliente = ClientAlias.objects.create(original_name='Cliente Hilos', normalized_name='CLIENTE HILOS')
+        ot = OT.objects.create(numero_ot='OT-JSONB-HILOS', cliente=cliente)
+        hilos = 8
+        barrera = threading.Barrier(hilos)
+        errores = []
+
+        def trabajar(n):
+            try:
+                barrera.wait()
+                jsonb_ops.agregar_contenedor(ot.pk, f'MSCU{n:07d}')
+                jsonb_ops.actualizar_provision(ot.pk, [{'concepto': f'Concepto {n}', 'monto': 10}])
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errores, [])
+        ot.refresh_from_db()
+        self.assertEqual(sorted(ot.contenedores), [f'MSCU{n:07d}' for n in range(hilos)])
+        self.assertEqual(len(ot.provision_hierarchy['items']), hilos)
+        self.assertEqual(ot.provision_hierarchy['total'], 10 * hilos)
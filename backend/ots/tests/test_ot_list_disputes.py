@@ -0,0 +1,91 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from client_aliases.models import ClientAlias
+from invoices.models import Invoice, UploadedFile
+from ots.models import OT
+
+
+class OTListDisputeCountersTestCase(APITestCase):
+    """
+    Contadores de facturas disputadas en el listado de OTs (anotados en el queryset).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='operativo',
+            email='operativo@example.com',
+            password='password123',
+            role='operativo'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('ot-list')
+        self.cliente = ClientAlias.objects.create(original_name='Cliente Disputas', normalized_name='CLIENTE DISPUTAS')
+        self.invoice_count = 0
+
+    def _invoice(self, ot, monto, estado, tipo_costo='FLETE'):
+        self.invoice_count += 1
+        numero = f'DISP-{self.invoice_count:04d}'
+        content = numero.encode()
+        uploaded_file = UploadedFile.objects.create(
+            filename=f'{numero}.pdf',
+            path=f'invoices/test/{numero}.pdf',
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type='application/pdf'
+        )
+        invoice = Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=date(2025, 1, 1),
+            monto=Decimal(monto),
+            tipo_costo=tipo_costo,
+            ot=ot,
+            uploaded_file=uploaded_file,
+        )
+        Invoice.objects.filter(pk=invoice.pk).update(estado_provision=estado)
+
+    def _create_ots(self, count, start=0):
+        for n in range(start, start + count):
+            ot = OT.objects.create(numero_ot=f'25DISP{n:03d}', cliente=self.cliente)
+            self._invoice(ot, '100.00', 'disputada')
+            self._invoice(ot, '50.00', 'disputada', tipo_costo='CARGOS_NAVIERA')
+            self._invoice(ot, '70.00', 'disputada', tipo_costo='OTRO')
+            self._invoice(ot, '30.00', 'pendiente')
+
+    def _list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(ctx.captured_queries)
+
+    def test_list_returns_dispute_counters(self):
+        self._create_ots(1)
+        sin_disputas = OT.objects.create(numero_ot='25DISP999', cliente=self.cliente)
+        self._invoice(sin_disputas, '10.00', 'pendiente')
+
+        response, _ = self._list_queries()
+
+        rows = {row['numero_ot']: row for row in response.data['results']}
+        self.assertTrue(rows['25DISP000']['has_disputed_invoices'])
+        self.assertEqual(rows['25DISP000']['disputed_invoices_count'], 2)
+        self.assertEqual(rows['25DISP000']['disputed_invoices_amount'], 150.0)
+        self.assertFalse(rows['25DISP999']['has_disputed_invoices'])
+        self.assertEqual(rows['25DISP999']['disputed_invoices_count'], 0)
+        self.assertEqual(rows['25DISP999']['disputed_invoices_amount'], 0.0)
+
+    def test_list_query_count_is_constant(self):
+        self._create_ots(2)
+        _, few = self._list_queries()
+
+        self._create_ots(10, start=2)
+        response, many = self._list_queries()
+
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(many, few)
@@ -0,0 +1,86 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from client_aliases.models import ClientAlias
+from ots.models import OT
+
+
+@pytest.fixture
+def cliente():
+    return ClientAlias.objects.create(original_name="Cliente Save", normalized_name="CLIENTE SAVE")
+
+
+@pytest.fixture
+def ot(cliente):
+    OT.objects.create(numero_ot="OT-SAVE-001", cliente=cliente, contenedores=["MSCU1234567"])
+    return OT.objects.get(numero_ot="OT-SAVE-001")
+
+
+@pytest.mark.django_db
+def test_dirty_fields_since_load(ot):
+    assert ot.get_dirty_fields() == set()
+
+    ot.barco = "MAERSK"
+    ot.contenedores.append("cmau7654321")  # mutación en sitio del JSONField
+    assert ot.get_dirty_fields() == {"barco", "contenedores"}
+
+    ot.save()
+    assert ot.get_dirty_fields() == set()
+    assert ot.contenedores == ["MSCU1234567", "CMAU7654321"]
+    assert OT(numero_ot="OT-NUEVA").get_dirty_fields() is None
+
+
+@pytest.mark.django_db
+def test_unchanged_save_skips_validation_queries(ot):
+    with CaptureQueriesContext(connection) as ctx:
+        ot.save()
+    # Solo el UPDATE: sin consulta de unicidad, del cliente ni relectura en la señal
+    assert len(ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_dirty_fields_are_normalized_and_validated(ot, cliente):
+    OT.objects.create(numero_ot="OT-SAVE-002", cliente=cliente)
+
+    ot.master_bl = " mbl-001 "
+    ot.save()
+    assert ot.master_bl == "MBL-001"
+
+    ot.numero_ot = "ot-save-002"
+    with pytest.raises(ValidationError) as exc:
+        ot.save()
+    assert "numero_ot" in exc.value.message_dict
+
+
+@pytest.mark.django_db
+def test_validate_true_checks_untouched_fields(ot):
+    OT.objects.filter(pk=ot.pk).update(contenedores=["NO-VALIDO"])
+    ot.refresh_from_db()
+
+    ot.save()  # contenedores no cambió desde la carga
+
+    with pytest.raises(ValidationError):
+        ot.save(validate=True)
+
+
+@pytest.mark.django_db
+def test_update_fields_save_writes_as_is(ot):
+    ot.master_bl = "mbl-raw"
+    ot.save(update_fields=["master_bl", "updated_at"])
+
+    assert OT.objects.get(pk=ot.pk).master_bl == "mbl-raw"
+    assert ot.get_dirty_fields() == set()
+
+
+@pytest.mark.django_db
+def test_client_change_updates_usage_counts(ot, cliente):
+    otro = ClientAlias.objects.create(original_name="Otro Cliente", normalized_name="OTRO CLIENTE")
+    assert ClientAlias.objects.get(pk=cliente.pk).usage_count == 1
+
+    ot.cliente = otro
+    ot.save()
+
+    assert ClientAlias.objects.get(pk=cliente.pk).usage_count == 0
+    assert ClientAlias.objects.get(pk=otro.pk).usage_count == 1
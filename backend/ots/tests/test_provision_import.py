@@ -0,0 +1,106 @@
+import csv
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from client_aliases.models import ClientAlias
+from invoices.models import Invoice, UploadedFile
+from ots.models import OT
+
+
+def create_acajutla_csv(filas, filename='provision_acajutla.csv'):
+    """CSV con el formato del reporte: 2 líneas de encabezado, OT en la col. 6, barco en la 13 y fecha en la 16."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['PROVISION ACAJUTLA'])
+    writer.writerow([f'COL{i}' for i in range(17)])
+    for numero_ot, barco, fecha in filas:
+        row = [''] * 17
+        row[6], row[13], row[16] = numero_ot, barco, fecha
+        writer.writerow(row)
+    return SimpleUploadedFile(filename, buffer.getvalue().encode('utf-8-sig'), content_type='text/csv')
+
+
+class AcajutlaProvisionImportAPITestCase(APITestCase):
+    """import_provision_acajutla: una consulta de OTs, bulk_update y sync de facturas por OT"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jefeops_csv', email='csv@example.com', password='password123', role='jefe_operaciones'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('ot-import-provision-acajutla')
+        self.cliente = ClientAlias.objects.create(original_name='CLIENTE CSV', normalized_name='CLIENTE CSV')
+
+    def _ot(self, numero, **extra):
+        return OT.objects.create(numero_ot=numero, cliente=self.cliente, **extra)
+
+    def _flete(self, numero, ot):
+        content = numero.encode()
+        uploaded_file = UploadedFile.objects.create(
+            filename=f"{numero}.pdf",
+            path=f"invoices/test/{numero}.pdf",
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type="application/pdf"
+        )
+        return Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=date(2025, 1, 5),
+            monto=Decimal('100.00'),
+            tipo_costo='FLETE',
+            ot=ot,
+            uploaded_file=uploaded_file,
+        )
+
+    def test_import_updates_in_bulk_and_reports_each_row(self):
+        libre = self._ot('25OT-CSV-001', barco='MSC VIEJO', barco_source='excel')
+        bloqueada = self._ot('25OT-CSV-002', fecha_provision=date(2025, 1, 1),
+                             provision_source='manual', provision_locked=True)
+        factura = self._flete('F-CSV-001', libre)
+
+        archivo = create_acajutla_csv([
+            ('25ot-csv-001', 'MSC NUEVO', '15/02/2025'),
+            ('25OT-CSV-002', 'N/A', '20/02/2025'),
+            ('25OT-CSV-404', 'MSC X', '20/02/2025'),
+            ('25OT-CSV-001', '-', 'SOLICITUD DE PAGO'),
+            ('PLG SV', 'MSC X', '20/02/2025'),
+        ])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'file': archivo}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stats = response.data['stats']
+        self.assertEqual((stats['processed'], stats['updated'], stats['skipped']), (3, 1, 1))
+        self.assertEqual(
+            [(r['row'], r['result']) for r in stats['rows']],
+            [(3, 'actualizada'), (4, 'sin_cambios'), (5, 'no_encontrada'), (6, 'sin_cambios')]
+        )
+        self.assertEqual(stats['rows'][0]['fields'], ['barco', 'fecha_provision'])
+        self.assertEqual(stats['rows'][1]['reason'], 'provisión bloqueada')
+
+        # Una consulta para las OTs, ningún SELECT por fila
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('SELECT "ots"')]), 1)
+
+        libre.refresh_from_db()
+        self.assertEqual((libre.barco, libre.barco_source), ('MSC NUEVO', 'csv'))
+        self.assertEqual((libre.fecha_provision, libre.provision_source), (date(2025, 2, 15), 'csv'))
+        self.assertEqual(libre.estado_provision, 'provisionada')
+
+        bloqueada.refresh_from_db()
+        self.assertEqual(bloqueada.fecha_provision, date(2025, 1, 1))
+
+        # Sincronización OT -> facturas vinculadas
+        factura.refresh_from_db()
+        self.assertEqual(factura.estado_provision, 'provisionada')
+        self.assertEqual(factura.fecha_provision, date(2025, 2, 15))
+        self.assertEqual(stats['invoices_synced'], 1)
@@ -10,9 +10,12 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models import Q, Count, Sum
+from django.http import Http404
 
-from .models import OT
+from .models import OT, normalizar_numero_contenedor
+from .services import jsonb_ops
 from .serializers import (
     OTListSerializer,
     OTDetailSerializer,
@@ -20,13 +23,31 @@ from .serializers import (
     ContenedorSerializer,
     ProvisionHierarchySerializer,
     ExcelUploadSerializer,
-    ExcelImportResultSerializer
+    ExcelImportResultSerializer,
+    OTImportJobSerializer,
+    annotate_dispute_counters,
 )
 from common.permissions import IsAdminOrJefeOps, IsAdminOrFinanzas, CanImportData
-from common.mixins import RoleBasedFieldValidationMixin
+from common.mixins import RoleBasedFieldValidationMixin, ReplicaReadMixin
+from common.facets import FacetService
+from common.http_cache import cache_response
+
+
+OT_FILTER_FACETS = FacetService(
+    namespace='ots',
+    facets={
+        'clientes': 'cliente__original_name',
+        'operativos': 'operativo',
+        'proveedores': 'proveedor__nombre',
+        'estados': 'estado',
+        'estados_provision': 'estado_provision',
+        'estados_facturado': 'estado_facturado',
+    },
+    depends_on=['ots.OT', 'client_aliases.ClientAlias', 'catalogs.Provider'],
+)
 
 
-class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
+class OTViewSet(ReplicaReadMixin, RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Órdenes de Trabajo.
     
@@ -50,6 +71,10 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
     """
     
     permission_classes = [IsAuthenticated]
+    replica_actions = {
+        'list', 'retrieve', 'search', 'search_by_container', 'search_by_bl',
+        'statistics', 'cards_stats', 'filter_values', 'export_excel',
+    }
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['puerto_destino']
     ordering_fields = ['numero_ot', 'fecha_eta', 'fecha_llegada', 'estado', 'created_at']
@@ -66,11 +91,14 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
         'operativo': set()  # No puede editar nada
     }
 
+    # Acciones que serializan con OTListSerializer (reciben contadores de disputas anotados)
+    LIST_SERIALIZER_ACTIONS = {'list', 'search', 'search_by_container', 'search_by_bl'}
+
     def get_permissions(self):
         """
         Permissions by action:
         - Read-only actions (list, retrieve, search, stats, export): All authenticated users
-        - Import actions (import_excel, import_provision_acajutla, resolve_conflicts): Admin or Jefe Ops
+        - Import actions (import_excel, import_provision_acajutla, resolve_conflicts, import jobs): Admin or Jefe Ops
         - Create/Delete: Admin or Jefe Ops
         - Update provision: Admin or Finanzas
         - Update OT: Admin, Jefe Ops (full), or Finanzas (limited fields)
@@ -84,7 +112,10 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             return [IsAuthenticated()]
 
         # Import actions - Admin or Jefe de Operaciones only
-        import_actions = ['import_excel', 'import_provision_acajutla', 'resolve_conflicts']
+        import_actions = [
+            'import_excel', 'import_provision_acajutla', 'resolve_conflicts',
+            'import_jobs', 'import_job_detail', 'resolve_import_job',
+        ]
         if self.action in import_actions:
             return [CanImportData()]
 
@@ -110,6 +141,10 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             'cliente',
             'modificado_por'
         )
+
+        # Contadores de disputas en la misma consulta (acciones que usan OTListSerializer)
+        if self.action in self.LIST_SERIALIZER_ACTIONS:
+            queryset = annotate_dispute_counters(queryset)
         
         # Filtros adicionales por query params
         proveedor_id = self.request.query_params.get('proveedor_id')
@@ -427,28 +462,32 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             'results': serializer.data
         })
     
+    def _ot_id(self):
+        """pk de la URL sin cargar la OT (las mutaciones JSON son un UPDATE directo)."""
+        try:
+            return int(self.kwargs['pk'])
+        except (TypeError, ValueError):
+            raise Http404
+
     @action(detail=True, methods=['post'])
     def add_container(self, request, pk=None):
         """Agregar un contenedor a la OT (solo se requiere el número)."""
-        ot = self.get_object()
-
         serializer = ContenedorSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        contenedor_data = serializer.validated_data
-
-        # Usar método del modelo
-        ot.add_contenedor(contenedor_data['numero'])
+        numero = serializer.validated_data['numero']
 
-        # Registrar usuario modificador
-        if request.user:
-            ot.modificado_por = request.user
-            ot.save()
+        try:
+            contenedores = jsonb_ops.agregar_contenedor(self._ot_id(), numero, usuario=request.user)
+        except OT.DoesNotExist:
+            raise Http404
+        except DjangoValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
-            'message': f'Contenedor {contenedor_data["numero"]} agregado exitosamente',
-            'total_contenedores': ot.get_total_contenedores(),
-            'contenedores': ot.contenedores
+            'message': f'Contenedor {numero} agregado exitosamente',
+            'total_contenedores': len(contenedores),
+            'contenedores': contenedores
         })
     
     @action(detail=True, methods=['post'])
@@ -461,29 +500,24 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             "numero": "MSCU1234567"
         }
         """
-        ot = self.get_object()
-        
         raw_numero = request.data.get('numero', '')
-        numero = re.sub(r"[^A-Z0-9]", "", str(raw_numero).upper())
+        numero = normalizar_numero_contenedor(str(raw_numero))
         if not numero:
             return Response(
                 {'error': 'Debe proporcionar el número de contenedor'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Usar método del modelo
-        removed = ot.remove_contenedor(numero)
+        try:
+            contenedores = jsonb_ops.quitar_contenedor(self._ot_id(), numero, usuario=request.user)
+        except OT.DoesNotExist:
+            raise Http404
         
-        if removed:
-            # Registrar usuario modificador
-            if request.user:
-                ot.modificado_por = request.user
-                ot.save()
-            
+        if contenedores is not None:
             return Response({
                 'message': f'Contenedor {numero} removido exitosamente',
-                'total_contenedores': ot.get_total_contenedores(),
-                'contenedores': ot.contenedores
+                'total_contenedores': len(contenedores),
+                'contenedores': contenedores
             })
         else:
             return Response(
@@ -495,6 +529,9 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
     def update_provision(self, request, pk=None):
         """
         Actualizar provisiones de una OT.
+
+        Los items se agregan o reemplazan por concepto y el total se recalcula.
+        La edición desde la API es fuente MANUAL (bloquea la provisión).
         
         Body:
         {
@@ -512,25 +549,24 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             ]
         }
         """
-        ot = self.get_object()
-        
         serializer = ProvisionHierarchySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         items = serializer.validated_data.get('items', [])
         
-        # Usar método del modelo para recalcular total
-        ot.set_provision(items)
-        
-        # Registrar usuario modificador
-        if request.user:
-            ot.modificado_por = request.user
-            ot.save()
+        try:
+            provision_hierarchy = jsonb_ops.actualizar_provision(
+                self._ot_id(), items, fuente='manual', usuario=request.user
+            )
+        except OT.DoesNotExist:
+            raise Http404
+        except jsonb_ops.ProvisionBloqueada as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Provisiones actualizadas exitosamente',
-            'provision_hierarchy': ot.provision_hierarchy,
-            'provision_total': ot.get_provision_total()
+            'provision_hierarchy': provision_hierarchy,
+            'provision_total': float(provision_hierarchy.get('total', 0.0))
         })
     
     @action(detail=False, methods=['post'])
@@ -540,8 +576,10 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
         
         Body (multipart/form-data):
         - files: Array de archivos Excel (.xlsx, .xls)
+        - delta: "true" para omitir, sin procesarlas, las filas cuyo contenido
+          no cambió desde la última importación (mismo row_hash)
         
-        Respuesta:
+        Respuesta (new/changed/unchanged: filas nuevas, cambiadas y sin cambios):
         {
             "success": true,
             "total_rows": 15,
@@ -594,7 +632,8 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             # Procesar archivos con ExcelProcessor
             from .services.excel_processor import ExcelProcessor
             
-            processor = ExcelProcessor()
+            delta = str(request.data.get('delta', '')).lower() == 'true'
+            processor = ExcelProcessor(delta=delta)
             stats = processor.process_multiple_files(temp_files, tipos_operacion=tipos_operacion)
             
             # Si hay conflictos, retornarlos inmediatamente
@@ -650,6 +689,9 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
                 'created': stats['created'],
                 'updated': stats['updated'],
                 'skipped': stats['skipped'],
+                'new': stats['new'],
+                'changed': stats['changed'],
+                'unchanged': stats['unchanged'],
                 'conflicts': [],
                 'errors': stats['errors'],
                 'warnings': stats.get('warnings', []),
@@ -815,6 +857,9 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
                 'created': stats['created'],
                 'updated': stats['updated'],
                 'skipped': stats['skipped'],
+                'new': stats['new'],
+                'changed': stats['changed'],
+                'unchanged': stats['unchanged'],
                 'conflicts': [],
                 'errors': stats['errors'],
                 'warnings': stats.get('warnings', []),
@@ -852,6 +897,89 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
                     os.unlink(tmp_file_path)
                 except:
                     pass
+
+    @action(detail=False, methods=['post'], url_path='import-jobs')
+    def import_jobs(self, request):
+        """
+        Importar OTs desde Excel en segundo plano.
+
+        Mismo body que import_excel (files, tipos_operacion, delta). Los
+        archivos quedan en el storage y un worker los procesa; responde 202 con
+        el job. Consultar el avance en GET import-jobs/{id}/ y, si el job queda
+        en 'conflictos', resolverlos en POST import-jobs/{id}/resolve/.
+
+        Requiere CELERY_TASK_ALWAYS_EAGER=False y un worker de Celery: en modo
+        eager el procesamiento ocurre dentro de este request.
+        """
+        from .services.import_jobs import crear_job, encolar_procesamiento
+
+        uploaded_files = request.FILES.getlist('files')
+        if not uploaded_files:
+            return Response(
+                {'file': ['No se envió ningún archivo.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tipos_json = request.data.get('tipos_operacion', '[]')
+        try:
+            import json as json_lib
+            tipos_operacion = json_lib.loads(tipos_json) if isinstance(tipos_json, str) else tipos_json
+        except ValueError:
+            tipos_operacion = ['importacion'] * len(uploaded_files)
+
+        serializer = ExcelUploadSerializer(data={'files': uploaded_files, 'tipos_operacion': tipos_operacion})
+        serializer.is_valid(raise_exception=True)
+
+        uploaded_files = serializer.validated_data['files']
+        job = crear_job(
+            uploaded_files,
+            serializer.validated_data.get('tipos_operacion') or ['importacion'] * len(uploaded_files),
+            delta=str(request.data.get('delta', '')).lower() == 'true',
+            usuario=request.user,
+        )
+        encolar_procesamiento(job)
+
+        job.refresh_from_db()
+        return Response(OTImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'import-jobs/(?P<job_id>\d+)')
+    def import_job_detail(self, request, job_id=None):
+        """Estado, progreso, estadísticas y conflictos pendientes de un job de importación."""
+        from .models import OTImportJob
+
+        try:
+            job = OTImportJob.objects.select_related('created_by').get(pk=job_id)
+        except OTImportJob.DoesNotExist:
+            raise Http404
+        return Response(OTImportJobSerializer(job).data)
+
+    @action(detail=False, methods=['post'], url_path=r'import-jobs/(?P<job_id>\d+)/resolve')
+    def resolve_import_job(self, request, job_id=None):
+        """
+        Resolver los conflictos de un job y aplicar sus filas en segundo plano.
+
+        Body: {"conflicts": [{"ot": "25OT221", "campo": "cliente", "resolucion": "usar_nuevo"}]}
+        """
+        from .models import OTImportJob
+        from .serializers import ConflictResolutionSerializer
+        from .services.import_jobs import ImportJobError, encolar_aplicacion
+
+        try:
+            job = OTImportJob.objects.get(pk=job_id)
+        except OTImportJob.DoesNotExist:
+            raise Http404
+
+        serializer = ConflictResolutionSerializer(data={'conflicts': request.data.get('conflicts', [])})
+        serializer.is_valid(raise_exception=True)
+        resoluciones = [dict(resolucion) for resolucion in serializer.validated_data['conflicts']]
+
+        try:
+            encolar_aplicacion(job, resoluciones, processed_by=request.user.username)
+        except ImportJobError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        job.refresh_from_db()
+        return Response(OTImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
@@ -915,6 +1043,7 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='cards-stats')
+    @cache_response(depends_on=['ots.OT', 'catalogs.Provider', 'client_aliases.ClientAlias'])
     def cards_stats(self, request):
         """
         Estadísticas específicas para las cards del dashboard.
@@ -964,11 +1093,14 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
         - "N/A"
         - "SOLICITUD DE PAGO"
         - Cualquier texto que no sea fecha
+
+        Las OTs se buscan con una sola consulta y se guardan con bulk_update
+        (ver ots/services/provision_import.py). La respuesta incluye en
+        stats.rows el resultado de cada fila (actualizada, sin_cambios,
+        no_encontrada, error).
         """
-        import csv
-        import io
-        from datetime import datetime
-        
+        from .services.provision_import import AcajutlaProvisionImporter
+
         if 'file' not in request.FILES:
             return Response(
                 {'error': 'No se proporcionó ningún archivo'},
@@ -985,127 +1117,28 @@ class OTViewSet(RoleBasedFieldValidationMixin, viewsets.ModelViewSet):
             )
         
         try:
-            # Leer CSV
-            decoded_file = csv_file.read().decode('utf-8-sig')  # utf-8-sig para manejar BOM
-            csv_reader = csv.reader(io.StringIO(decoded_file))
-            
-            stats = {
-                'processed': 0,
-                'updated': 0,
-                'skipped': 0,
-                'errors': []
-            }
-            
-            # Saltar header (primeras 2 líneas)
-            next(csv_reader, None)
-            next(csv_reader, None)
-            
-            for row_num, row in enumerate(csv_reader, start=3):
-                if len(row) < 17:
-                    continue  # Fila incompleta
-                
-                try:
-                    ot_numero = row[6].strip() if len(row) > 6 else None
-                    barco_csv = row[13].strip() if len(row) > 13 else None
-                    fecha_provision_str = row[16].strip() if len(row) > 16 else None
-                    
-                    # Validar que tengamos al menos el número de OT
-                    if not ot_numero or ot_numero == 'PLG SV':
-                        continue
-                    
-                    # Buscar la OT
-                    try:
-                        ot = OT.objects.get(numero_ot__iexact=ot_numero, deleted_at__isnull=True)
-                    except OT.DoesNotExist:
-                        stats['skipped'] += 1
-                        continue
-                    except OT.MultipleObjectsReturned:
-                        stats['errors'].append({
-                            'row': row_num,
-                            'ot': ot_numero,
-                            'error': 'Múltiples OTs con el mismo número'
-                        })
-                        continue
-                    
-                    updated = False
-                    
-                    # Procesar BARCO
-                    if barco_csv and barco_csv != '-' and barco_csv != 'N/A':
-                        if ot.can_update_field('barco', 'csv'):
-                            ot.barco = barco_csv
-                            ot.barco_source = 'csv'
-                            updated = True
-                    
-                    # Procesar FECHA DE PROVISION
-                    if fecha_provision_str and fecha_provision_str not in ['N/A', 'SOLICITUD DE PAGO', '-', '']:
-                        # Intentar parsear la fecha
-                        try:
-                            # Formatos comunes: D/M/YYYY, DD/MM/YYYY
-                            for date_format in ['%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d']:
-                                try:
-                                    fecha_obj = datetime.strptime(fecha_provision_str, date_format).date()
-                                    break
-                                except ValueError:
-                                    continue
-                            else:
-                                # No se pudo parsear
-                                raise ValueError(f"Formato de fecha no reconocido: {fecha_provision_str}")
-                            
-                            if ot.can_update_field('fecha_provision', 'csv'):
-                                ot.fecha_provision = fecha_obj
-                                ot.provision_source = 'csv'
-                                updated = True
-                        
-                        except ValueError as e:
-                            # No es una fecha válida, ignorar
-                            pass
-                    
-                    if updated:
-                        ot.save()
-                        stats['updated'] += 1
-                    
-                    stats['processed'] += 1
-                
-                except Exception as e:
-                    stats['errors'].append({
-                        'row': row_num,
-                        'ot': ot_numero if 'ot_numero' in locals() else 'N/A',
-                        'error': str(e)
-                    })
-            
-            return Response({
-                'message': f'Provisión Acajutla importada: {stats["updated"]} OTs actualizadas de {stats["processed"]} procesadas',
-                'stats': stats
-            }, status=status.HTTP_200_OK)
-        
+            stats = AcajutlaProvisionImporter().importar(csv_file)
         except Exception as e:
             return Response(
                 {'error': f'Error procesando CSV: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        return Response({
+            'message': f'Provisión Acajutla importada: {stats["updated"]} OTs actualizadas de {stats["processed"]} procesadas',
+            'stats': stats
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='filter-values')
     def filter_values(self, request):
         """
         Returns unique values for the filterable fields.
-        """
-        qs = self.get_queryset()
-        
-        clientes = qs.values_list('cliente__original_name', flat=True).distinct().order_by('cliente__original_name')
-        operativos = qs.values_list('operativo', flat=True).distinct().order_by('operativo')
-        proveedores = qs.values_list('proveedor__nombre', flat=True).distinct().order_by('proveedor__nombre')
-        estados = qs.values_list('estado', flat=True).distinct().order_by('estado')
-        estados_provision = qs.values_list('estado_provision', flat=True).distinct().order_by('estado_provision')
-        estados_facturado = qs.values_list('estado_facturado', flat=True).distinct().order_by('estado_facturado')
 
-        return Response({
-            'clientes': [c for c in clientes if c],
-            'operativos': [o for o in operativos if o],
-            'proveedores': [p for p in proveedores if p],
-            'estados': [e for e in estados if e],
-            'estados_provision': [ep for ep in estados_provision if ep],
-            'estados_facturado': [ef for ef in estados_facturado if ef],
-        })
+        Los valores respetan los filtros activos, se calculan en una sola
+        consulta y se cachean por firma de filtros (ver common/facets.py).
+        Con ?counts=true incluye el número de OTs por valor.
+        """
+        return OT_FILTER_FACETS.respond(request, self.get_queryset())
 
     @action(detail=False, methods=['get'], url_path='export-excel')
     def export_excel(self, request):
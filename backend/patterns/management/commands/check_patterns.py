@@ -6,6 +6,7 @@ Uso: python manage.py check_patterns [--provider "NOMBRE"]
 from django.core.management.base import BaseCommand
 from catalogs.models import Provider
 from patterns.models import ProviderPattern, TargetField
+from common.db_router import use_replica
 
 
 class Command(BaseCommand):
@@ -18,6 +19,7 @@ class Command(BaseCommand):
             help='Nombre del proveedor (ej: "CMA CGM")',
         )
 
+    @use_replica()
     def handle(self, *args, **options):
         provider_name = options.get('provider')
 
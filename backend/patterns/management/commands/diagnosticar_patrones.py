@@ -6,6 +6,7 @@ Uso: python manage.py diagnosticar_patrones [--proveedor NOMBRE]
 from django.core.management.base import BaseCommand
 from catalogs.models import Provider
 from patterns.models import ProviderPattern, TargetField
+from common.db_router import use_replica
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,7 @@ class Command(BaseCommand):
             help='Nombre del proveedor a diagnosticar (ej: CMA CGM)',
         )
 
+    @use_replica()
     def handle(self, *args, **options):
         proveedor_nombre = options.get('proveedor')
 
@@ -1,10 +1,12 @@
 from django.core.management.base import BaseCommand
 from patterns.models import TargetField
+from common.db_router import use_replica
 import json
 
 class Command(BaseCommand):
     help = 'Exports TargetField data to a JSON file'
 
+    @use_replica()
     def handle(self, *args, **options):
         target_fields = TargetField.objects.all()
         data = []
@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 from decouple import config, Csv
 from datetime import timedelta
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'common.middleware.compression.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'common.middleware.replica_stickiness.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'proyecto.urls'
@@ -93,6 +96,55 @@ DATABASES = {
     )
 }
 
+# Réplica de solo lectura (opcional). Solo reciben lecturas las acciones
+# marcadas con ReplicaReadMixin y los comandos de reportes (common/db_router.py)
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default='')
+if DATABASE_REPLICA_URL:
+    DATABASES[DATABASE_REPLICA_ALIAS] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    # En tests la réplica apunta a la misma base de test que 'default'
+    DATABASES[DATABASE_REPLICA_ALIAS]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['common.db_router.ReadReplicaRouter']
+# Segundos que un usuario lee del primario después de escribir (read-your-writes)
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+# Manejo de conexiones a PostgreSQL:
+# - persistent: una conexión persistente por hilo (CONN_MAX_AGE)
+# - pool: pool acotado por worker (common/backends/pooled_postgresql)
+# - pgbouncer: conexiones cortas contra un pgbouncer en modo transaction
+DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10.0, cast=float)
+DB_POOL_MAX_IDLE = config('DB_POOL_MAX_IDLE', default=300.0, cast=float)
+
+
+def apply_db_pool_mode(databases, mode):
+    """Ajusta los alias de PostgreSQL según DB_POOL_MODE."""
+    for db in databases.values():
+        if 'postgresql' not in db.get('ENGINE', ''):
+            continue
+        if mode == 'pool':
+            db['ENGINE'] = 'common.backends.pooled_postgresql'
+            db['CONN_MAX_AGE'] = 0
+            db['POOL'] = {
+                'max_size': DB_POOL_MAX_SIZE,
+                'timeout': DB_POOL_TIMEOUT,
+                'max_idle': DB_POOL_MAX_IDLE,
+            }
+        elif mode == 'pgbouncer':
+            # pgbouncer reparte las conexiones; los cursores de servidor no
+            # sobreviven entre transacciones en modo transaction
+            db['CONN_MAX_AGE'] = 0
+            db['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+
+apply_db_pool_mode(DATABASES, DB_POOL_MODE)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -167,6 +219,23 @@ STORAGES = {
     },
 }
 
+# Entrega de archivos (ver common/file_delivery.py)
+# 'proxy': el backend sirve el archivo desde un cache LRU en disco (Range, ETag)
+# 'redirect': 302 a una URL firmada de Cloudinary de corta duración
+FILE_DELIVERY_MODE = config('FILE_DELIVERY_MODE', default='proxy')
+FILE_DELIVERY_SIGNED_URL_TTL = config('FILE_DELIVERY_SIGNED_URL_TTL', default=300, cast=int)
+FILE_DELIVERY_CACHE_DIR = config('FILE_DELIVERY_CACHE_DIR', default='')  # vacío = tmp del sistema
+FILE_DELIVERY_CACHE_MAX_MB = config('FILE_DELIVERY_CACHE_MAX_MB', default=200, cast=int)
+
+# Telemetría de uso de patrones (ver catalogs/services/pattern_usage.py)
+# 'auto': Redis si el cache es django-redis, si no memoria del proceso
+PATTERN_USAGE_BUFFER = config('PATTERN_USAGE_BUFFER', default='auto')
+PATTERN_USAGE_FLUSH_SECONDS = config('PATTERN_USAGE_FLUSH_SECONDS', default=60, cast=int)
+
+# GET condicional y cache de respuestas de la API (ver common/http_cache.py)
+HTTP_CACHE_ENABLED = config('HTTP_CACHE_ENABLED', default=True, cast=bool)
+HTTP_CACHE_TIMEOUT = config('HTTP_CACHE_TIMEOUT', default=300, cast=int)
+
 # Legacy support for older Django code
 DEFAULT_FILE_STORAGE = 'common.storage_backends.CloudinaryMediaStorage'
 
@@ -178,6 +247,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'accounts.User'
 
 # REST Framework Configuration
+# Serialización JSON con orjson (misma salida que el JSONRenderer de DRF)
+FAST_JSON = config('FAST_JSON', default=False, cast=bool)
+
+# Compresión de respuestas (common/middleware/compression.py): brotli si el
+# paquete está instalado y el cliente lo acepta, si no gzip
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=4, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -194,7 +271,12 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'common.renderers.ORJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'common.parsers.ORJSONParser' if FAST_JSON else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'EXCEPTION_HANDLER': 'common.exceptions.custom_exception_handler',
 }
@@ -227,7 +309,11 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_EXPOSE_HEADERS = [
     'Content-Disposition',
     'Content-Length',
+    'Content-Range',
+    'Accept-Ranges',
     'Content-Type',
+    'ETag',
+    'Last-Modified',
 ]
 
 # Allow all common HTTP methods
@@ -247,7 +333,10 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-none-match',
+    'if-range',
     'origin',
+    'range',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
@@ -269,9 +358,12 @@ SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
 
-# Celery Configuration (DISABLED - Not used in production)
-# MEMORY OPTIMIZATION: Celery disabled to save ~3GB RAM
-CELERY_TASK_ALWAYS_EAGER = True  # Run tasks synchronously (no workers needed)
+# Celery Configuration
+# MEMORY OPTIMIZATION: por defecto las tareas corren en modo eager (dentro del
+# request, sin workers) para ahorrar ~3GB RAM. Con CELERY_TASK_ALWAYS_EAGER=False
+# se encolan en REDIS_URL y requieren un `celery -A workers.celery worker`
+# (p. ej. las importaciones de OTs en segundo plano, ver ots/services/import_jobs.py)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=True, cast=bool)
 CELERY_TASK_EAGER_PROPAGATES = True
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
@@ -280,8 +372,18 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
-# Celery Beat Schedule (DISABLED)
-CELERY_BEAT_SCHEDULE = {}  # Empty - no periodic tasks
+# Celery Beat Schedule
+# Requiere un proceso `celery beat` en ejecución para disparar las tareas
+CELERY_BEAT_SCHEDULE = {
+    # Alertas de vencimiento de facturas, diario a las 7:00 AM
+    'check-invoice-due-dates': {
+        'task': 'invoices.tasks.check_invoice_due_dates',
+        'schedule': crontab(hour=7, minute=0),
+        'options': {
+            'expires': 3600,  # Expira si no se ejecuta en 1 hora
+        }
+    },
+}
 
 # Microsoft Graph API Configuration
 GRAPH_TENANT_ID = config('GRAPH_TENANT_ID', default='')
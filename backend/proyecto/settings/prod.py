@@ -128,12 +128,16 @@ LOGGING = {
 
 # Database connection pooling optimization for Railway
 # Reduce connection lifetime to release DB connections faster
-DATABASES['default']['CONN_MAX_AGE'] = 60  # 1 minute instead of 10
+# (solo en modo persistent; pool/pgbouncer ya usan CONN_MAX_AGE=0)
+if DB_POOL_MODE == 'persistent':
+    for db in DATABASES.values():
+        db['CONN_MAX_AGE'] = 60  # 1 minute instead of 10
 
 # MEMORY MONITORING: Add middleware to track memory usage
 # Only active in production (sampling 1% of requests)
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'common.middleware.compression.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -142,6 +146,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'common.middleware.replica_stickiness.ReplicaStickinessMiddleware',
     # Memory monitoring (production only)
     'common.middleware.memory_monitor.MemoryMonitorMiddleware',
     'common.middleware.memory_monitor.RequestSizeMonitorMiddleware',
@@ -21,11 +21,16 @@ from rest_framework_simplejwt.views import (
 @permission_classes([AllowAny])
 def health_check(request):
     """Health check endpoint for monitoring."""
-    return Response({
+    data = {
         'status': 'healthy',
         'service': 'NextOps API',
         'version': '1.0.0'
-    }, status=status.HTTP_200_OK)
+    }
+    if getattr(settings, 'DB_POOL_MODE', 'persistent') == 'pool':
+        from common.db_pool import pool_stats
+        # Métricas del pool de este worker (espera, timeouts, en uso)
+        data['db_pool'] = pool_stats()
+    return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -0,0 +1,172 @@
+"""
+Management command para medir el store materializado de rentabilidad.
+
+Genera datos sintéticos (clientes, OTs, facturas de venta y de costo) con
+bulk_create dentro de una transacción que se revierte al final, y mide:
+- Tiempo de rebuild() completo y de refresh() de una OT
+- Latencia de las métricas del dashboard de finanzas: en vivo (agregados
+  sobre las facturas) vs. desde MonthlyProfitability
+- Latencia de stats de facturas de venta desde la tabla
+
+Uso:
+    python manage.py benchmark_profitability --ots 2000 --ventas 20000 --costos 40000
+"""
+
+import random
+import statistics
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from client_aliases.models import ClientAlias
+from invoices.models import Invoice, UploadedFile
+from ots.models import OT
+from sales.models import SalesInvoice
+from sales.models_profitability import MonthlyProfitability
+from sales.services.profitability import ProfitabilityStore
+from sales.views import FinanceDashboardView
+
+PREFIX = 'BENCHPROF'
+
+
+def measure(func, repeat=1):
+    """Ejecuta func `repeat` veces; retorna (resultado, mediana_ms)."""
+    tiempos = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        tiempos.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(tiempos)
+
+
+class Command(BaseCommand):
+    help = 'Mide rebuild y latencia de consultas del store de rentabilidad con datos sintéticos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=100, help='Clientes sintéticos (default: 100)')
+        parser.add_argument('--ots', type=int, default=2000, help='OTs sintéticas (default: 2000)')
+        parser.add_argument('--ventas', type=int, default=10000, help='Facturas de venta (default: 10000)')
+        parser.add_argument('--costos', type=int, default=20000, help='Facturas de costo (default: 20000)')
+        parser.add_argument('--meses', type=int, default=24, help='Meses cubiertos por las fechas (default: 24)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por consulta (default: 5)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        repeat = options['repeticiones']
+
+        with transaction.atomic():
+            self._generate(rng, options)
+            self.stdout.write(
+                f"Datos: {options['ots']} OTs, {options['ventas']} ventas, {options['costos']} costos, "
+                f"{options['meses']} meses\n"
+            )
+
+            store = ProfitabilityStore()
+            result, rebuild_ms = measure(store.rebuild)
+            filas = result['rows']
+
+            ot_id = OT.objects.filter(numero_ot__startswith=PREFIX).values_list('pk', flat=True).first()
+            _, refresh_ms = measure(lambda: store.refresh([ot_id]), repeat)
+
+            view = FinanceDashboardView()
+            _, live_ms = measure(
+                lambda: view._metricas_en_vivo(
+                    SalesInvoice.objects.filter(deleted_at__isnull=True),
+                    Invoice.objects.filter(deleted_at__isnull=True),
+                ),
+                repeat,
+            )
+            _, table_ms = measure(lambda: view._metricas_materializadas(None, None), repeat)
+
+            _, stats_ms = measure(
+                lambda: MonthlyProfitability.objects.aggregate(Sum('ventas_total'), Sum('ventas_count')),
+                repeat,
+            )
+
+            # Descartar los datos sintéticos
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'operación':<32} {'ms':>10}")
+        for name, ms in [
+            (f'rebuild ({filas} filas)', rebuild_ms),
+            ('refresh de 1 OT', refresh_ms),
+            ('dashboard en vivo', live_ms),
+            ('dashboard desde tabla', table_ms),
+            ('stats desde tabla', stats_ms),
+        ]:
+            self.stdout.write(f"{name:<32} {ms:>10.1f}")
+
+        if table_ms:
+            self.stdout.write(self.style.SUCCESS(f"\nDashboard: {live_ms / table_ms:.1f}x más rápido desde la tabla"))
+
+    def _generate(self, rng, options):
+        meses = options['meses']
+
+        def fecha():
+            mes = rng.randrange(meses)
+            return date(2023 + mes // 12, mes % 12 + 1, rng.randint(1, 28))
+
+        clientes = ClientAlias.objects.bulk_create([
+            ClientAlias(
+                original_name=f'{PREFIX} Cliente {n}',
+                normalized_name=f'{PREFIX} CLIENTE {n}',
+                short_name=f'{PREFIX}{n}',
+            )
+            for n in range(options['clientes'])
+        ])
+
+        ots = OT.objects.bulk_create([
+            OT(numero_ot=f'{PREFIX}-{n:06d}', cliente=rng.choice(clientes))
+            for n in range(options['ots'])
+        ], batch_size=2000)
+
+        ventas = []
+        for n in range(options['ventas']):
+            ot = rng.choice(ots)
+            monto = Decimal(rng.randint(100, 50000))
+            pagado = rng.choice([Decimal('0'), monto / 2, monto])
+            emision = fecha()
+            ventas.append(SalesInvoice(
+                numero_factura=f'{PREFIX}-V{n:07d}',
+                ot=ot,
+                cliente_id=ot.cliente_id,
+                fecha_emision=emision,
+                fecha_vencimiento=emision,
+                monto_total=monto,
+                monto_pagado=pagado,
+                monto_pendiente=monto - pagado,
+                estado_pago='pendiente' if not pagado else ('pagado_total' if pagado == monto else 'pagado_parcial'),
+                estado_facturacion=rng.choice(['facturada', 'pendiente_cobro', 'pagada']),
+            ))
+        SalesInvoice.objects.bulk_create(ventas, batch_size=2000)
+
+        archivos = UploadedFile.objects.bulk_create([
+            UploadedFile(
+                filename=f'{PREFIX}-{n}.pdf',
+                path=f'benchmark/{PREFIX}-{n}.pdf',
+                sha256=f'{PREFIX.lower()}{n:055d}',
+                size=1,
+                content_type='application/pdf',
+            )
+            for n in range(options['costos'])
+        ], batch_size=2000)
+
+        costos = []
+        for n, archivo in enumerate(archivos):
+            monto = Decimal(rng.randint(50, 30000))
+            costos.append(Invoice(
+                numero_factura=f'{PREFIX}-C{n:07d}',
+                fecha_emision=fecha(),
+                monto=monto,
+                monto_aplicable=monto,
+                tipo_costo='FLETE',
+                estado_provision=rng.choice(['pendiente', 'provisionada', 'provisionada']),
+                ot=rng.choice(ots) if rng.random() < 0.95 else None,
+                uploaded_file=archivo,
+            ))
+        Invoice.objects.bulk_create(costos, batch_size=2000)
@@ -0,0 +1,58 @@
+"""
+Reconstruye la tabla materializada de rentabilidad (MonthlyProfitability).
+
+Uso:
+    python manage.py rebuild_profitability            # Toda la tabla
+    python manage.py rebuild_profitability --ot 12 57 # Solo estas OTs
+
+Recalcula las filas con dos consultas agrupadas (ventas y costos por
+OT/cliente/mes) y sincroniza los campos de métricas de las OTs
+(monto_total_vendido, margen_bruto, ...). Ver sales/services/profitability.py.
+
+Útil para:
+- Carga inicial después de migrar
+- Corregir la tabla después de updates masivos que no pasan por signals
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from sales.services.profitability import ProfitabilityStore
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla materializada de rentabilidad por OT/cliente/mes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ot',
+            nargs='+',
+            type=int,
+            help='Recalcular solo estas OTs (IDs)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Tamaño de lote de bulk_create/bulk_update (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        store = ProfitabilityStore(batch_size=options['batch_size'])
+        start = time.monotonic()
+
+        if options['ot']:
+            self.stdout.write(f"🔄 Recalculando rentabilidad de {len(options['ot'])} OTs...")
+            rows = store.refresh(options['ot'])
+            elapsed = time.monotonic() - start
+            self.stdout.write(self.style.SUCCESS(f'✅ {rows} filas recalculadas en {elapsed:.2f}s'))
+            return
+
+        self.stdout.write('🔄 Reconstruyendo tabla de rentabilidad...')
+        result = store.rebuild()
+        elapsed = time.monotonic() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {result['rows']} filas, {result['ots_updated']} OTs actualizadas en {elapsed:.2f}s"
+        ))
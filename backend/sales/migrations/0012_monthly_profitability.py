@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:46
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_aliases', '0008_clientalias_acepta_credito_fiscal_and_more'),
+        ('ots', '0012_ot_estado_facturacion_venta_ot_margen_bruto_and_more'),
+        ('sales', '0011_update_states_and_add_credit_notes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyProfitability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(db_index=True, help_text='Primer día del mes de emisión')),
+                ('ventas_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('ventas_cobrado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('ventas_pendiente', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('ventas_count', models.IntegerField(default=0)),
+                ('cobradas_count', models.IntegerField(default=0)),
+                ('pendientes_pago_count', models.IntegerField(default=0)),
+                ('facturadas_count', models.IntegerField(default=0)),
+                ('pendientes_cobro_count', models.IntegerField(default=0)),
+                ('pagadas_count', models.IntegerField(default=0)),
+                ('anuladas_count', models.IntegerField(default=0)),
+                ('costos_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Suma de monto_aplicable (considera disputas)', max_digits=18)),
+                ('costos_count', models.IntegerField(default=0)),
+                ('costos_provisionados', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Suma de monto de facturas provisionadas', max_digits=18)),
+                ('provisionadas_count', models.IntegerField(default=0)),
+                ('provisionadas_sin_asociar_count', models.IntegerField(default=0)),
+                ('margen_bruto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='ventas_total - costos_total', max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profitability_rows', to='client_aliases.clientalias')),
+                ('ot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='profitability_rows', to='ots.ot')),
+            ],
+            options={
+                'verbose_name': 'Rentabilidad mensual',
+                'verbose_name_plural': 'Rentabilidad mensual',
+                'db_table': 'sales_monthly_profitability',
+                'indexes': [models.Index(fields=['ot', 'periodo'], name='sales_month_ot_id_3a47e8_idx'), models.Index(fields=['cliente', 'periodo'], name='sales_month_cliente_3e7fcb_idx')],
+            },
+        ),
+    ]
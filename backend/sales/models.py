@@ -370,13 +370,8 @@ class SalesInvoice(TimeStampedModel, SoftDeleteModel):
         if self.pk and self.cliente:
             self.calcular_retenciones()
 
-        # Actualizar métricas de la OT si existe (con manejo de errores)
-        if self.ot:
-            try:
-                if hasattr(self.ot, 'calcular_metricas_venta'):
-                    self.ot.calcular_metricas_venta()
-            except Exception as e:
-                logger.error(f"Error calculando métricas de OT {self.ot.id}: {e}")
+        # Las métricas de la OT se recalculan desde el signal post_save
+        # (sales/signals.py → store de rentabilidad, coalescido por transacción)
 
     @property
     def esta_vencida(self):
@@ -1034,3 +1029,6 @@ class CreditNote(TimeStampedModel, SoftDeleteModel):
 # === IMPORTAR MODELOS DE LÍNEAS DE FACTURA ===
 # Se importa al final para evitar imports circulares
 from .models_items import SalesInvoiceItem  # noqa: E402, F401
+
+# === IMPORTAR TABLA MATERIALIZADA DE RENTABILIDAD ===
+from .models_profitability import MonthlyProfitability  # noqa: E402, F401
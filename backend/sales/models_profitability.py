@@ -0,0 +1,86 @@
+"""
+Tabla materializada de rentabilidad por OT / cliente / mes.
+
+Cada fila resume las facturas de venta y de costo (no eliminadas) de una OT
+y un cliente en un mes de emisión. Se mantiene incrementalmente desde los
+signals de ventas/costos (ver sales/services/profitability.py) y se
+reconstruye por completo con `python manage.py rebuild_profitability`.
+
+Las facturas sin OT se agrupan en filas con ot=NULL (por cliente para ventas,
+sin cliente para costos).
+"""
+
+from decimal import Decimal
+
+from django.db import models
+
+
+class MonthlyProfitability(models.Model):
+    """Ventas, costos y margen de una OT/cliente en un mes."""
+
+    ot = models.ForeignKey(
+        'ots.OT',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='profitability_rows',
+    )
+
+    cliente = models.ForeignKey(
+        'client_aliases.ClientAlias',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='profitability_rows',
+    )
+
+    periodo = models.DateField(
+        db_index=True,
+        help_text="Primer día del mes de emisión"
+    )
+
+    # === VENTAS ===
+    ventas_total = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    ventas_cobrado = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    ventas_pendiente = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    ventas_count = models.IntegerField(default=0)
+    # Por estado de pago
+    cobradas_count = models.IntegerField(default=0)
+    pendientes_pago_count = models.IntegerField(default=0)
+    # Por estado de facturación
+    facturadas_count = models.IntegerField(default=0)
+    pendientes_cobro_count = models.IntegerField(default=0)
+    pagadas_count = models.IntegerField(default=0)
+    anuladas_count = models.IntegerField(default=0)
+
+    # === COSTOS ===
+    costos_total = models.DecimalField(
+        max_digits=18, decimal_places=2, default=Decimal('0.00'),
+        help_text="Suma de monto_aplicable (considera disputas)"
+    )
+    costos_count = models.IntegerField(default=0)
+    costos_provisionados = models.DecimalField(
+        max_digits=18, decimal_places=2, default=Decimal('0.00'),
+        help_text="Suma de monto de facturas provisionadas"
+    )
+    provisionadas_count = models.IntegerField(default=0)
+    provisionadas_sin_asociar_count = models.IntegerField(default=0)
+
+    margen_bruto = models.DecimalField(
+        max_digits=18, decimal_places=2, default=Decimal('0.00'),
+        help_text="ventas_total - costos_total"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'sales_monthly_profitability'
+        verbose_name = 'Rentabilidad mensual'
+        verbose_name_plural = 'Rentabilidad mensual'
+        indexes = [
+            models.Index(fields=['ot', 'periodo']),
+            models.Index(fields=['cliente', 'periodo']),
+        ]
+
+    def __str__(self):
+        return f"{self.ot_id or '-'} / {self.cliente_id or '-'} / {self.periodo:%Y-%m}"
@@ -9,6 +9,7 @@ from django.db import transaction
 from .models import SalesInvoice, InvoiceSalesMapping, Payment
 from .models_items import SalesInvoiceItem
 from invoices.models import Invoice
+from catalogs.models import CostType
 from invoices.utils import get_absolute_media_url
 
 logger = logging.getLogger(__name__)
@@ -30,46 +31,10 @@ def actualizar_fechas_facturas_costo_asociadas(sales_invoice, cost_invoice_ids):
         sales_invoice: Instancia de SalesInvoice
         cost_invoice_ids: Lista de IDs de facturas de costo asociadas
     """
-    if not cost_invoice_ids or not sales_invoice.fecha_emision:
-        return
+    from .services.cost_mapping import actualizar_fechas_costos
 
-    fecha_emision_venta = sales_invoice.fecha_emision
-
-    # Obtener facturas de costo asociadas
-    # FIX 1: Excluir facturas anuladas, rechazadas y eliminadas
-    facturas_costo = Invoice.objects.filter(
-        id__in=cost_invoice_ids,
-        is_deleted=False
-    ).exclude(
-        estado_provision__in=['anulada', 'anulada_parcialmente', 'rechazada']
-    ).select_related('ot')
-
-    for factura_costo in facturas_costo:
-        # REGLA 1: Actualizar fecha_facturacion de la factura de costo
-        factura_costo.fecha_facturacion = fecha_emision_venta
-        factura_costo.save(update_fields=['fecha_facturacion', 'updated_at'])
-
-        logger.info(
-            f"Factura de costo {factura_costo.numero_factura}: "
-            f"fecha_facturacion actualizada a {fecha_emision_venta}"
-        )
-
-        # REGLA 2: Si es costo vinculado a OT, actualizar fechas de la OT
-        if factura_costo.es_costo_vinculado_ot() and factura_costo.ot:
-            ot = factura_costo.ot
-            ot.fecha_solicitud_facturacion = fecha_emision_venta
-            ot.fecha_recepcion_factura = fecha_emision_venta
-
-            # Actualizar estado_facturado si está pendiente
-            if ot.estado_facturado == 'pendiente':
-                ot.estado_facturado = 'facturado'
-
-            ot.save(update_fields=['fecha_solicitud_facturacion', 'fecha_recepcion_factura', 'estado_facturado', 'updated_at'])
-
-            logger.info(
-                f"OT {ot.numero_ot}: fechas de facturación y estado actualizados a {fecha_emision_venta} / facturado "
-                f"(por factura de costo vinculada {factura_costo.numero_factura})"
-            )
+    # Un UPDATE por tabla en vez de guardar cada factura y cada OT
+    actualizar_fechas_costos(sales_invoice, cost_invoice_ids)
 
 
 class SafeFileField(serializers.FileField):
@@ -99,7 +64,7 @@ class CostInvoiceBasicSerializer(serializers.ModelSerializer):
     """Serializer básico para facturas de costo."""
     proveedor_nombre = serializers.CharField(source='proveedor.nombre', read_only=True)
     monto_aplicable = serializers.DecimalField(source='get_monto_aplicable', max_digits=15, decimal_places=2, read_only=True)
-    tipo_costo_display = serializers.CharField(source='get_tipo_costo_display', read_only=True)
+    tipo_costo_display = serializers.SerializerMethodField()
     monto_disponible = serializers.SerializerMethodField()
 
     class Meta:
@@ -108,7 +73,16 @@ class CostInvoiceBasicSerializer(serializers.ModelSerializer):
                   'monto_aplicable', 'estado_provision', 'fecha_provision', 'tipo_costo_display', 'monto_disponible']
         read_only_fields = fields
 
+    def get_tipo_costo_display(self, obj):
+        # Nombres de CostType cargados una vez por listado (no una consulta por fila)
+        if not hasattr(self, '_cost_type_names'):
+            self._cost_type_names = CostType.names_by_code()
+        return obj.get_tipo_costo_display(self._cost_type_names)
+
     def get_monto_disponible(self, obj):
+        # Anotado por services.provisionadas.anotar_disponible en los listados
+        if hasattr(obj, 'monto_disponible'):
+            return obj.monto_disponible
         total_asignado = obj.sales_mappings.aggregate(
             total=Sum('monto_asignado')
         )['total'] or Decimal('0.00')
@@ -0,0 +1,158 @@
+"""
+Asociación masiva de facturas de costo a una factura de venta.
+
+Antes associate_costs recorría las facturas seleccionadas: get_monto_aplicable(),
+get_or_create del mapping (y a veces un segundo save()), y cada save del
+mapping disparaba sales_invoice.save() y el refresco de la OT; después
+actualizar_fechas_facturas_costo_asociadas guardaba cada factura de costo y
+cada OT vinculada, con sus señales de sincronización.
+
+Ahora, con un número fijo de consultas sin importar cuántas facturas:
+1. Los montos aplicables salen de una consulta anotada
+   (COALESCE(monto_aplicable, monto)).
+2. Los mappings se insertan o actualizan con un solo
+   bulk_create(update_conflicts=True) sobre (sales_invoice, cost_invoice).
+3. Las fechas de facturación de los costos y de sus OTs vinculadas se
+   actualizan con un UPDATE por tabla (ver actualizar_fechas_costos).
+4. La factura de venta se guarda una vez y las OTs afectadas se agendan en el
+   store de rentabilidad una vez.
+
+bulk_create y update() no disparan señales: este módulo hace explícitamente
+lo que hacían los signals de mapping, factura y OT.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Dict, Iterable
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+from invoices.models import Invoice
+from invoices.services.ot_reconciliation import ESTADOS_EXCLUIDOS, LINKED_COST_TYPES, linked_cost_types
+from ots.models import OT
+from sales.models import InvoiceSalesMapping
+from sales.services.profitability import schedule_refresh
+
+logger = logging.getLogger(__name__)
+
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+# InvoiceSalesMapping.monto_asignado tiene MinValueValidator(0.01)
+MONTO_MINIMO = Decimal('0.01')
+# Estados de factura que la sincronización OT -> facturas nunca toca
+ESTADOS_ANULADOS = ['anulada', 'anulada_parcialmente']
+
+
+def _q_vinculado(codigos) -> Q:
+    """Mismo criterio que Invoice._es_tipo_vinculado() (códigos, prefijos y catálogo)."""
+    condicion = Q(tipo_costo__in=codigos)
+    for prefijo in LINKED_COST_TYPES:
+        condicion |= Q(tipo_costo__startswith=prefijo)
+    return condicion
+
+
+def actualizar_fechas_costos(sales_invoice, cost_invoice_ids: Iterable[int]) -> Dict:
+    """
+    Aplica las reglas de actualizar_fechas_facturas_costo_asociadas por conjuntos:
+
+    1. fecha_facturacion = fecha de emisión de la venta en las facturas de
+       costo (no eliminadas, no anuladas/rechazadas).
+    2. OTs de los costos vinculados: fecha_solicitud_facturacion y
+       fecha_recepcion_factura = esa fecha, estado_facturado pendiente ->
+       facturado.
+    3. Lo que hacía la señal OT -> facturas al guardar esas OTs: las facturas
+       vinculadas de las OTs (no anuladas) quedan facturadas en esa fecha.
+
+    Retorna {'facturas': n, 'ots': n}.
+    """
+    cost_invoice_ids = list(cost_invoice_ids)
+    fecha = sales_invoice.fecha_emision
+    if not cost_invoice_ids or not fecha:
+        return {'facturas': 0, 'ots': 0}
+
+    now = timezone.now()
+    codigos = linked_cost_types()
+    facturas = Invoice.objects.filter(
+        id__in=cost_invoice_ids,
+        is_deleted=False,
+    ).exclude(estado_provision__in=ESTADOS_EXCLUIDOS)
+
+    with transaction.atomic():
+        ot_ids = list(
+            facturas.filter(_q_vinculado(codigos), ot__isnull=False).values_list('ot_id', flat=True).distinct()
+        )
+        actualizadas = facturas.update(fecha_facturacion=fecha, updated_at=now)
+
+        ots = 0
+        if ot_ids:
+            ots = OT.objects.filter(id__in=ot_ids).update(
+                fecha_solicitud_facturacion=fecha,
+                fecha_recepcion_factura=fecha,
+                estado_facturado=Case(
+                    When(estado_facturado='pendiente', then=Value('facturado')),
+                    default=F('estado_facturado'),
+                ),
+                updated_at=now,
+            )
+            Invoice.objects.filter(
+                ot_id__in=ot_ids,
+                is_deleted=False,
+                tipo_costo__in=codigos,
+            ).exclude(
+                estado_provision__in=ESTADOS_ANULADOS
+            ).update(fecha_facturacion=fecha, estado_facturacion='facturada', updated_at=now)
+            bump_model_version(OT)
+        bump_model_version(Invoice)
+
+    logger.info(
+        f"Factura de venta {sales_invoice.numero_factura}: fecha_facturacion {fecha} en "
+        f"{actualizadas} facturas de costo y {ots} OTs vinculadas"
+    )
+    return {'facturas': actualizadas, 'ots': ots}
+
+
+def asociar_costos(sales_invoice, cost_invoice_ids: Iterable[int]) -> Dict:
+    """
+    Asocia (o re-asocia) facturas de costo a la venta por su monto aplicable
+    completo.
+
+    Retorna {'asociadas': n, 'omitidas': [ids sin monto aplicable]}.
+    """
+    cost_invoice_ids = list(cost_invoice_ids)
+
+    with transaction.atomic():
+        filas = list(
+            Invoice.objects.filter(id__in=cost_invoice_ids).annotate(
+                monto_a_asignar=Coalesce('monto_aplicable', 'monto', output_field=MONEY)
+            ).values_list('id', 'ot_id', 'monto_a_asignar')
+        )
+        validas = [fila for fila in filas if fila[2] is not None and fila[2] >= MONTO_MINIMO]
+        omitidas = [fila[0] for fila in filas if fila not in validas]
+        if omitidas:
+            logger.warning(
+                f"Factura de venta {sales_invoice.numero_factura}: {len(omitidas)} facturas de costo "
+                f"sin monto aplicable no se asociaron: {omitidas}"
+            )
+
+        InvoiceSalesMapping.objects.bulk_create(
+            [
+                InvoiceSalesMapping(sales_invoice=sales_invoice, cost_invoice_id=pk, monto_asignado=monto)
+                for pk, _, monto in validas
+            ],
+            update_conflicts=True,
+            unique_fields=['sales_invoice', 'cost_invoice'],
+            update_fields=['monto_asignado', 'updated_at'],
+            batch_size=500,
+        )
+
+        actualizar_fechas_costos(sales_invoice, [pk for pk, _, _ in validas])
+
+        # Lo que hacía la señal del mapping, una sola vez
+        sales_invoice.save()
+        schedule_refresh([sales_invoice.ot_id] + [ot_id for _, ot_id, _ in validas])
+
+    return {'asociadas': len(validas), 'omitidas': omitidas}
@@ -0,0 +1,356 @@
+"""
+Store materializado de rentabilidad (MonthlyProfitability).
+
+Antes, cada cambio de una factura de venta o de un mapping costo-venta
+llamaba OT.calcular_metricas_venta() (dos agregados + save), y el dashboard
+de finanzas y el endpoint de stats recorrían todas las facturas en cada
+request.
+
+Ahora:
+- Los signals de ventas/costos solo detectan si cambió algo relevante y
+  agendan la OT afectada (schedule_refresh). Los eventos de una misma
+  transacción se acumulan y se procesan una sola vez en on_commit.
+- ProfitabilityStore.refresh() recalcula las filas de esas OTs con dos
+  consultas agrupadas (ventas y costos por OT/cliente/mes), las reemplaza y
+  actualiza con un bulk_update los campos denormalizados de la OT
+  (monto_total_vendido, margen_bruto, ...).
+- ProfitabilityStore.rebuild() reconstruye toda la tabla
+  (`python manage.py rebuild_profitability`).
+
+Los updates masivos (QuerySet.update) no pasan por los signals: después de
+uno que toque montos o estados hay que llamar refresh() o rebuild().
+"""
+
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from common.model_versions import bump_model_version
+
+logger = logging.getLogger(__name__)
+
+
+ZERO = Decimal('0.00')
+PORCENTAJE_MAXIMO = Decimal('9999.99')
+
+OT_METRIC_FIELDS = [
+    'monto_total_vendido',
+    'monto_total_costos',
+    'margen_bruto',
+    'porcentaje_margen',
+    'estado_facturacion_venta',
+]
+
+# Campos que afectan la tabla; los signals comparan contra estos
+SALES_TRACKED_FIELDS = (
+    'ot_id', 'cliente_id', 'fecha_emision', 'monto_total', 'monto_pagado',
+    'monto_pendiente', 'estado_pago', 'estado_facturacion', 'is_deleted', 'deleted_at',
+)
+COST_TRACKED_FIELDS = (
+    'ot_id', 'fecha_emision', 'monto', 'monto_aplicable', 'estado_provision',
+    'is_deleted', 'deleted_at',
+)
+
+SALES_ESTADOS_PENDIENTES = ['pendiente', 'pagado_parcial']
+SALES_ESTADOS_ANULADAS = ['anulada', 'anulada_parcial']
+
+# Clave de fila: (ot_id, cliente_id, periodo)
+RowKey = Tuple[Optional[int], Optional[int], object]
+
+
+def ot_metrics(total_venta: Decimal, total_costo: Decimal) -> Dict:
+    """Métricas denormalizadas de la OT (mismas reglas que antes tenía calcular_metricas_venta)."""
+    margen = total_venta - total_costo
+    if total_venta > 0:
+        porcentaje = (margen / total_venta * 100).quantize(Decimal('0.01'))
+        # OT.porcentaje_margen es DECIMAL(6,2): costos muy superiores a la venta lo desbordan
+        porcentaje = max(min(porcentaje, PORCENTAJE_MAXIMO), -PORCENTAJE_MAXIMO)
+    else:
+        porcentaje = ZERO
+
+    if total_venta == 0:
+        estado = 'sin_facturar'
+    elif total_venta >= total_costo:
+        estado = 'facturado_total'
+    else:
+        estado = 'facturado_parcial'
+
+    return {
+        'monto_total_vendido': total_venta,
+        'monto_total_costos': total_costo,
+        'margen_bruto': margen,
+        'porcentaje_margen': porcentaje,
+        'estado_facturacion_venta': estado,
+    }
+
+
+class ProfitabilityStore:
+    """
+    Args:
+        batch_size: Tamaño de lote de bulk_create / bulk_update
+    """
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+
+    # ------------------------------------------------------------------
+    # Cálculo
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _scope(ot_ids: List[int], unlinked: bool) -> Q:
+        conditions = []
+        if ot_ids:
+            conditions.append(Q(ot_id__in=ot_ids))
+        if unlinked:
+            conditions.append(Q(ot__isnull=True))
+        return reduce(or_, conditions)
+
+    def _sales_rows(self, scope: Optional[Q]):
+        from sales.models import SalesInvoice
+
+        qs = SalesInvoice.all_objects.filter(is_deleted=False, deleted_at__isnull=True)
+        if scope is not None:
+            qs = qs.filter(scope)
+
+        return (
+            qs.annotate(periodo=TruncMonth('fecha_emision'))
+            .values('ot_id', 'cliente_id', 'periodo')
+            .annotate(
+                ventas_total=Sum('monto_total'),
+                ventas_cobrado=Sum('monto_pagado'),
+                ventas_pendiente=Sum('monto_pendiente'),
+                ventas_count=Count('id'),
+                cobradas_count=Count('id', filter=Q(estado_pago='pagado_total')),
+                pendientes_pago_count=Count('id', filter=Q(estado_pago__in=SALES_ESTADOS_PENDIENTES)),
+                facturadas_count=Count('id', filter=Q(estado_facturacion='facturada')),
+                pendientes_cobro_count=Count('id', filter=Q(estado_facturacion='pendiente_cobro')),
+                pagadas_count=Count('id', filter=Q(estado_facturacion='pagada')),
+                anuladas_count=Count('id', filter=Q(estado_facturacion__in=SALES_ESTADOS_ANULADAS)),
+            )
+            .order_by()
+        )
+
+    def _cost_rows(self, scope: Optional[Q]):
+        from invoices.models import Invoice
+        from sales.models import InvoiceSalesMapping
+
+        qs = Invoice.all_objects.filter(is_deleted=False, deleted_at__isnull=True)
+        if scope is not None:
+            qs = qs.filter(scope)
+
+        provisionada = Q(estado_provision='provisionada')
+        asociada = Exists(InvoiceSalesMapping.objects.filter(cost_invoice_id=OuterRef('pk')))
+
+        return (
+            qs.annotate(periodo=TruncMonth('fecha_emision'))
+            .values('ot_id', 'ot__cliente_id', 'periodo')
+            .annotate(
+                costos_count=Count('id'),
+                costos_total=Sum('monto_aplicable'),
+                provisionadas_count=Count('id', filter=provisionada),
+                costos_provisionados=Sum('monto', filter=provisionada),
+                provisionadas_sin_asociar_count=Count('id', filter=Q(provisionada, ~asociada)),
+            )
+            .order_by()
+        )
+
+    def compute(self, scope: Optional[Q] = None) -> Dict[RowKey, 'MonthlyProfitability']:
+        """
+        Filas (sin guardar) para las facturas del scope. Dos consultas agrupadas.
+        """
+        from sales.models_profitability import MonthlyProfitability
+
+        rows: Dict[RowKey, MonthlyProfitability] = {}
+
+        def row_for(key: RowKey) -> MonthlyProfitability:
+            if key not in rows:
+                rows[key] = MonthlyProfitability(ot_id=key[0], cliente_id=key[1], periodo=key[2])
+            return rows[key]
+
+        for data in self._sales_rows(scope):
+            row = row_for((data.pop('ot_id'), data.pop('cliente_id'), data.pop('periodo')))
+            for name, value in data.items():
+                setattr(row, name, value if value is not None else ZERO)
+
+        for data in self._cost_rows(scope):
+            row = row_for((data.pop('ot_id'), data.pop('ot__cliente_id'), data.pop('periodo')))
+            for name, value in data.items():
+                setattr(row, name, value if value is not None else ZERO)
+
+        for row in rows.values():
+            row.margen_bruto = row.ventas_total - row.costos_total
+
+        return rows
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def refresh(self, ot_ids: Iterable[int] = (), unlinked: bool = False) -> int:
+        """
+        Recalcula las filas de las OTs indicadas (y las de facturas sin OT si
+        unlinked=True) y sincroniza las métricas de esas OTs.
+
+        Returns:
+            Cantidad de filas escritas
+        """
+        from sales.models_profitability import MonthlyProfitability
+
+        ot_ids = sorted({pk for pk in ot_ids if pk})
+        if not ot_ids and not unlinked:
+            return 0
+
+        scope = self._scope(ot_ids, unlinked)
+        rows = self.compute(scope)
+
+        with transaction.atomic():
+            MonthlyProfitability.objects.filter(scope).delete()
+            MonthlyProfitability.objects.bulk_create(rows.values(), batch_size=self.batch_size)
+            if ot_ids:
+                self._sync_ots(rows.values(), ot_ids)
+
+        logger.debug(f"[PROFITABILITY] {len(rows)} filas recalculadas ({len(ot_ids)} OTs, sin OT: {unlinked})")
+        return len(rows)
+
+    def rebuild(self) -> Dict:
+        """Reconstruye toda la tabla y las métricas de todas las OTs."""
+        from sales.models_profitability import MonthlyProfitability
+
+        rows = self.compute()
+
+        with transaction.atomic():
+            MonthlyProfitability.objects.all().delete()
+            MonthlyProfitability.objects.bulk_create(rows.values(), batch_size=self.batch_size)
+            ots_updated = self._sync_ots(rows.values())
+
+        logger.info(f"[PROFITABILITY] Reconstrucción: {len(rows)} filas, {ots_updated} OTs actualizadas")
+        return {'rows': len(rows), 'ots_updated': ots_updated}
+
+    def _sync_ots(self, rows, ot_ids: Optional[List[int]] = None) -> int:
+        """
+        Actualiza los campos denormalizados de las OTs (solo las que cambian).
+        Sin ot_ids se revisan todas las OTs.
+        """
+        from ots.models import OT
+
+        totales: Dict[int, List[Decimal]] = {}
+        for row in rows:
+            if row.ot_id is None:
+                continue
+            acumulado = totales.setdefault(row.ot_id, [ZERO, ZERO])
+            acumulado[0] += row.ventas_total
+            acumulado[1] += row.costos_total
+
+        actuales = OT.all_objects.values_list('pk', *OT_METRIC_FIELDS)
+        if ot_ids is not None:
+            actuales = actuales.filter(pk__in=ot_ids)
+
+        now = timezone.now()
+        cambios = []
+        for pk, *valores in actuales.iterator(chunk_size=2000):
+            venta, costo = totales.get(pk, (ZERO, ZERO))
+            target = ot_metrics(venta, costo)
+            if [target[name] for name in OT_METRIC_FIELDS] != valores:
+                cambios.append(OT(pk=pk, updated_at=now, **target))
+
+        if cambios:
+            OT.all_objects.bulk_update(cambios, OT_METRIC_FIELDS + ['updated_at'], batch_size=self.batch_size)
+            # bulk_update no dispara señales: invalidar caches de OT
+            transaction.on_commit(lambda: bump_model_version(OT))
+
+        return len(cambios)
+
+
+# ----------------------------------------------------------------------
+# Refresco incremental coalescido
+# ----------------------------------------------------------------------
+
+_state = threading.local()
+
+
+def _pending() -> Dict:
+    if not hasattr(_state, 'pending'):
+        _state.pending = {'ot_ids': set(), 'unlinked': False}
+        _state.defer_depth = 0
+        _state.scheduled = None
+    return _state.pending
+
+
+def _flush_pending() -> None:
+    pending = _pending()
+    ot_ids, unlinked = pending['ot_ids'], pending['unlinked']
+    _state.pending = {'ot_ids': set(), 'unlinked': False}
+    _state.scheduled = None
+    if not ot_ids and not unlinked:
+        return
+    try:
+        ProfitabilityStore().refresh(ot_ids, unlinked=unlinked)
+    except Exception:
+        # La tabla se puede reconstruir; un error aquí no debe romper la operación ya confirmada
+        logger.exception(f"[PROFITABILITY] Error refrescando OTs {sorted(ot_ids)[:20]}")
+
+
+class _FlushCallback:
+    """Callback agendado con transaction.on_commit para la transacción actual."""
+
+    def __call__(self):
+        _flush_pending()
+
+
+def _flush_scheduled() -> bool:
+    # _state.scheduled es un weakref al callback: en un rollback (también de un
+    # savepoint) Django descarta el callback, el weakref muere y se vuelve a agendar
+    return _state.scheduled is not None and _state.scheduled() is not None
+
+
+def _schedule_flush() -> None:
+    if _flush_scheduled():
+        return
+    callback = _FlushCallback()
+    _state.scheduled = weakref.ref(callback)
+    transaction.on_commit(callback)
+
+
+def schedule_refresh(ot_ids: Iterable[Optional[int]] = (), unlinked: bool = False) -> None:
+    """
+    Agenda el refresco de las OTs indicadas para cuando confirme la
+    transacción actual. Todas las llamadas de una misma transacción se
+    procesan juntas; fuera de una transacción se procesa de inmediato.
+    """
+    pending = _pending()
+    for pk in ot_ids:
+        if pk:
+            pending['ot_ids'].add(pk)
+        else:
+            unlinked = True
+    pending['unlinked'] = pending['unlinked'] or unlinked
+
+    if not _state.defer_depth:
+        _schedule_flush()
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Acumula los refrescos de un proceso masivo (importaciones en autocommit)
+    y los ejecuta una sola vez al salir del bloque.
+    """
+    _pending()
+    _state.defer_depth += 1
+    try:
+        yield
+    finally:
+        _state.defer_depth -= 1
+        if not _state.defer_depth:
+            _schedule_flush()
@@ -0,0 +1,134 @@
+"""
+Feed de facturas de costo disponibles para asociar a facturas de venta
+(SalesInvoiceViewSet.provisionadas).
+
+Antes el endpoint devolvía todas las facturas de costo sin paginar y el
+serializer hacía, por cada fila, un agregado sobre sales_mappings (monto
+disponible) y una consulta a CostType (nombre del tipo de costo); el
+frontend sumaba los totales.
+
+Ahora:
+- feed_queryset() filtra y anota en SQL monto_aplicable_efectivo,
+  total_asignado (subconsulta sobre InvoiceSalesMapping) y monto_disponible.
+- resumen() calcula los totales del feed filtrado en un solo aggregate.
+- PROYECCION_LIGERA son las columnas que usan las tablas; con values() se
+  evita instanciar modelos y enviar campos que no se muestran.
+"""
+
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db.models import Count, DecimalField, F, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from catalogs.models import CostType
+from invoices.models import Invoice
+from sales.models import InvoiceSalesMapping
+
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+# Columnas que usan las tablas del frontend (?vista=ligera)
+PROYECCION_LIGERA = [
+    'id',
+    'numero_factura',
+    'proveedor__nombre',
+    'tipo_costo',
+    'estado_provision',
+    'monto_aplicable_efectivo',
+    'monto_disponible',
+]
+
+
+def asignado_subquery() -> Subquery:
+    """SUM(monto_asignado) de los mappings de venta de la factura externa."""
+    mappings = InvoiceSalesMapping.objects.filter(
+        cost_invoice=OuterRef('pk')
+    ).order_by().values('cost_invoice').annotate(
+        total=Sum('monto_asignado')
+    ).values('total')
+    return Subquery(mappings, output_field=MONEY)
+
+
+def anotar_disponible(queryset: QuerySet) -> QuerySet:
+    """Agrega monto_aplicable_efectivo, total_asignado y monto_disponible."""
+    aplicable = Coalesce('monto_aplicable', 'monto', output_field=MONEY)
+    asignado = Coalesce(asignado_subquery(), ZERO, output_field=MONEY)
+    return queryset.annotate(
+        monto_aplicable_efectivo=aplicable,
+        total_asignado=asignado,
+        monto_disponible=aplicable - asignado,
+    )
+
+
+def feed_queryset(params) -> QuerySet:
+    """
+    Facturas de costo del feed, filtradas y anotadas.
+
+    Filtros (query params):
+        ot_id, proveedor_id, estado_provision, tipo_costo,
+        provision_desde / provision_hasta (YYYY-MM-DD),
+        search (número de factura), solo_disponibles=true
+    """
+    queryset = Invoice.objects.filter(deleted_at__isnull=True)
+
+    for param, lookup in (
+        ('ot_id', 'ot_id'),
+        ('proveedor_id', 'proveedor_id'),
+        ('estado_provision', 'estado_provision'),
+        ('tipo_costo', 'tipo_costo'),
+        ('provision_desde', 'fecha_provision__gte'),
+        ('provision_hasta', 'fecha_provision__lte'),
+        ('search', 'numero_factura__icontains'),
+    ):
+        value = params.get(param)
+        if value:
+            queryset = queryset.filter(**{lookup: value})
+
+    queryset = anotar_disponible(queryset)
+
+    if str(params.get('solo_disponibles', '')).lower() == 'true':
+        queryset = queryset.filter(monto_disponible__gt=0)
+
+    return queryset.order_by(F('fecha_provision').desc(nulls_last=True), '-id')
+
+
+def resumen(queryset: QuerySet) -> Dict:
+    """Totales del feed filtrado (un solo aggregate)."""
+    data = queryset.order_by().aggregate(
+        cantidad=Count('id'),
+        provisionadas=Count('id', filter=Q(estado_provision='provisionada')),
+        monto_aplicable=Sum('monto_aplicable_efectivo'),
+        monto_asignado=Sum('total_asignado'),
+    )
+    aplicable = data['monto_aplicable'] or Decimal('0.00')
+    asignado = data['monto_asignado'] or Decimal('0.00')
+    return {
+        'cantidad': data['cantidad'],
+        'provisionadas': data['provisionadas'],
+        'monto_aplicable': str(aplicable),
+        'monto_asignado': str(asignado),
+        'monto_disponible': str(aplicable - asignado),
+    }
+
+
+def proyeccion_ligera(rows) -> List[Dict]:
+    """
+    Filas de values(*PROYECCION_LIGERA) con los mismos nombres y tipos que
+    CostInvoiceBasicSerializer (solo las columnas de la tabla).
+    """
+    nombres = CostType.names_by_code()
+    legacy = dict(Invoice.TIPO_COSTO_CHOICES)
+    return [
+        {
+            'id': row['id'],
+            'numero_factura': row['numero_factura'],
+            'proveedor_nombre': row['proveedor__nombre'],
+            'tipo_costo_display': nombres.get(row['tipo_costo']) or legacy.get(row['tipo_costo'], row['tipo_costo']),
+            'estado_provision': row['estado_provision'],
+            'monto_aplicable': str(row['monto_aplicable_efectivo']),
+            'monto_disponible': row['monto_disponible'],
+        }
+        for row in rows
+    ]
@@ -3,9 +3,11 @@ Signals para el módulo de ventas.
 Maneja actualizaciones automáticas de estados y métricas.
 """
 
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
 from django.dispatch import receiver
+from invoices.models import Invoice
 from .models import SalesInvoice, InvoiceSalesMapping, Payment
+from .services.profitability import COST_TRACKED_FIELDS, SALES_TRACKED_FIELDS, schedule_refresh
 
 
 @receiver(pre_save, sender=SalesInvoice)
@@ -36,23 +38,75 @@ def actualizar_metricas_al_cambiar_mapping(sender, instance, **kwargs):
     if instance.sales_invoice:
         # Forzar save para recalcular propiedades
         instance.sales_invoice.save()
-        
-        # Actualizar métricas de la OT si existe
-        if instance.sales_invoice.ot:
-            instance.sales_invoice.ot.calcular_metricas_venta()
+
+    # Cambia "provisionadas sin asociar" de la factura de costo
+    # y las métricas de las OTs involucradas
+    schedule_refresh([
+        instance.sales_invoice.ot_id if instance.sales_invoice else None,
+        instance.cost_invoice.ot_id if instance.cost_invoice else None,
+    ])
+
+
+# Campo no cargado en la instancia (.only() / .defer())
+_NO_CARGADO = object()
+
+
+def _snapshot(instance, fields):
+    """
+    Valores de los campos de los que depende la rentabilidad (SALES/COST_TRACKED_FIELDS).
+    Se leen de __dict__ para no disparar la carga de campos diferidos.
+    """
+    values = instance.__dict__
+    return tuple(values.get(name, _NO_CARGADO) for name in fields)
+
+
+@receiver(post_init, sender=SalesInvoice)
+def guardar_estado_original_factura_venta(sender, instance, **kwargs):
+    """Guarda los valores que afectan la rentabilidad para detectar cambios en post_save."""
+    instance._profitability_snapshot = _snapshot(instance, SALES_TRACKED_FIELDS)
+
+
+@receiver(post_init, sender=Invoice)
+def guardar_estado_original_factura_costo(sender, instance, **kwargs):
+    instance._profitability_snapshot = _snapshot(instance, COST_TRACKED_FIELDS)
+
+
+def _agendar_si_cambio(instance, fields, created=False, deleted=False):
+    """
+    Agenda el refresco de rentabilidad de la OT anterior y la actual
+    si cambió algún campo relevante (o si la factura se creó/eliminó).
+    """
+    original = instance._profitability_snapshot
+    actual = _snapshot(instance, fields)
+    if not (created or deleted or original != actual):
+        return
+
+    ot_anterior = original[fields.index('ot_id')]
+    if created or ot_anterior is _NO_CARGADO:
+        schedule_refresh({instance.ot_id})
+    else:
+        schedule_refresh({ot_anterior, instance.ot_id})
+    instance._profitability_snapshot = actual
 
 
 @receiver(post_save, sender=SalesInvoice)
 @receiver(post_delete, sender=SalesInvoice)
-def actualizar_ot_al_cambiar_factura_venta(sender, instance, **kwargs):
+def actualizar_ot_al_cambiar_factura_venta(sender, instance, created=False, **kwargs):
     """
     Cuando se crea/actualiza/elimina una factura de venta,
-    actualizar las métricas de la OT.
+    actualizar la rentabilidad y las métricas de la OT.
+    """
+    _agendar_si_cambio(instance, SALES_TRACKED_FIELDS, created=created, deleted=kwargs.get('signal') is post_delete)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def actualizar_ot_al_cambiar_factura_costo(sender, instance, created=False, **kwargs):
+    """
+    Cuando se crea/actualiza/elimina una factura de costo,
+    actualizar la rentabilidad y las métricas de la OT.
     """
-    if instance.ot and not kwargs.get('update_fields'):
-        # Solo actualizar si no es un save() con update_fields
-        # (para evitar recursión con el save() interno)
-        instance.ot.calcular_metricas_venta()
+    _agendar_si_cambio(instance, COST_TRACKED_FIELDS, created=created, deleted=kwargs.get('signal') is post_delete)
 
 
 @receiver(post_save, sender=Payment)
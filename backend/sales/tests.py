@@ -1,3 +1,432 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+
+from catalogs.models import InvoicePatternCatalog, Provider
+from catalogs.services import pattern_usage
+from catalogs.services.pattern_usage import MemoryUsageStore, PatternUsageBuffer
+from client_aliases.models import ClientAlias
+from invoices.models import Invoice, UploadedFile
+from ots.models import OT
+from sales.models import InvoiceSalesMapping, MonthlyProfitability, SalesInvoice
+from sales.services import cost_mapping, profitability
+from sales.services.profitability import ProfitabilityStore
+from sales.utils.pdf_extractor import SalesInvoicePDFExtractor
+from sales.views import FinanceDashboardView
+
+
+class PatternUsageTelemetryTestCase(TestCase):
+    """La extracción registra usos de patrones en el buffer, no en la fila"""
+
+    def setUp(self):
+        self.buffer = PatternUsageBuffer(MemoryUsageStore(), flush_interval=0)
+        original = pattern_usage._buffer
+        pattern_usage._buffer = self.buffer
+        self.addCleanup(setattr, pattern_usage, '_buffer', original)
+
+        common = dict(tipo_patron='venta', tipo_factura='nacional', es_grupo_principal=False, activo=True)
+        # Candidato de mayor prioridad para numero_factura que nunca hace match
+        self.numero_ccf = InvoicePatternCatalog.objects.create(
+            nombre='Número CCF', campo_objetivo='numero_factura', prioridad=1,
+            patron_regex=r'CCF\s+No\.\s*(\S+)', **common
+        )
+        self.numero = InvoicePatternCatalog.objects.create(
+            nombre='Número DTE', campo_objetivo='numero_factura',
+            patron_regex=r'Factura\s+No\.\s*(\S+)', **common
+        )
+        self.total = InvoicePatternCatalog.objects.create(
+            nombre='Total a pagar', campo_objetivo='monto_total',
+            patron_regex=r'Total a Pagar:\s*\$?([\d,]+\.\d{2})', **common
+        )
+        self.ot = InvoicePatternCatalog.objects.create(
+            nombre='OT', campo_objetivo='numero_ot',
+            patron_regex=r'OT:\s*(\S+)', **common
+        )
+
+    def test_ingest_does_not_write_pattern_rows(self):
+        extractor = SalesInvoicePDFExtractor()
+        patterns = extractor._get_active_patterns('nacional')
+
+        with CaptureQueriesContext(connection) as ctx:
+            for n in range(100):
+                extractor.text = f"Factura No. F-{n:04d}\nTotal a Pagar: $1,250.00"
+                result = extractor._extract_all_fields(patterns)
+
+        self.assertEqual(result['numero_factura'], 'F-0099')
+        writes = [
+            q['sql'] for q in ctx.captured_queries
+            if 'catalogs_invoice_pattern' in q['sql'] and not q['sql'].lstrip().upper().startswith('SELECT')
+        ]
+        self.assertEqual(writes, [])
+
+        # Solo cuentan los patrones cuyo valor se aplicó; los candidatos probados sin match no
+        numero = InvoicePatternCatalog.objects.get(pk=self.numero.pk)
+        self.assertEqual((numero.uso_count, numero.uso_total), (0, 100))
+        self.assertEqual(numero.tasa_exito, 100.0)
+        for pattern in (self.numero_ccf, self.ot):
+            pattern = InvoicePatternCatalog.objects.get(pk=pattern.pk)
+            self.assertEqual((pattern.uso_total, pattern.exito_total, pattern.tasa_exito), (0, 0, 0))
+        self.assertEqual(set(self.buffer.pending([self.numero_ccf.pk, self.numero.pk, self.total.pk, self.ot.pk])),
+                         {self.numero.pk, self.total.pk})
+
+        # Volcado: un UPDATE por patrón aplicado
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.buffer.flush(), 2)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+
+        # refresh_from_db descarta los pendientes leídos antes del volcado
+        numero.refresh_from_db()
+        self.assertEqual((numero.uso_count, numero.exito_count, numero.uso_total), (100, 100, 100))
+        self.assertIsNotNone(numero.ultima_uso)
+        self.assertEqual(self.buffer.pending([self.numero.pk]), {})
+        self.numero_ccf.refresh_from_db()
+        self.assertEqual((self.numero_ccf.uso_count, self.numero_ccf.ultima_uso), (0, None))
+
+
+class ProfitabilityStoreTestCase(TestCase):
+    """Tabla materializada de rentabilidad: refresco incremental, rebuild y lecturas"""
+
+    def setUp(self):
+        self.cliente = ClientAlias.objects.create(
+            original_name="Cliente Rentabilidad",
+            normalized_name="CLIENTE RENTABILIDAD"
+        )
+        self.ot = OT.objects.create(numero_ot="OT-RENT-001", cliente=self.cliente)
+        self.otra_ot = OT.objects.create(numero_ot="OT-RENT-002", cliente=self.cliente)
+
+    def _venta(self, numero, ot, monto, emision, **extra):
+        return SalesInvoice.objects.create(
+            numero_factura=numero,
+            ot=ot,
+            cliente=self.cliente,
+            fecha_emision=emision,
+            fecha_vencimiento=emision,
+            monto_total=Decimal(monto),
+            **extra
+        )
+
+    def _costo(self, numero, ot, monto, emision, **extra):
+        content = numero.encode()
+        uploaded_file = UploadedFile.objects.create(
+            filename=f"{numero}.pdf",
+            path=f"invoices/test/{numero}.pdf",
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type="application/pdf"
+        )
+        return Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=emision,
+            monto=Decimal(monto),
+            tipo_costo="OTRO",
+            ot=ot,
+            uploaded_file=uploaded_file,
+            **extra
+        )
+
+    def _crear_facturas(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self._venta("V-RENT-1", self.ot, "1000.00", date(2025, 1, 10))
+            self._venta("V-RENT-2", self.ot, "500.00", date(2025, 2, 3), monto_pagado=Decimal("500.00"))
+            self._venta("V-RENT-3", None, "80.00", date(2025, 1, 20))
+            self.costo = self._costo("C-RENT-1", self.ot, "300.00", date(2025, 1, 15))
+            self._costo("C-RENT-2", self.otra_ot, "200.00", date(2025, 2, 1), fecha_provision=date(2025, 2, 2))
+        return callbacks
+
+    def test_events_in_transaction_refresh_once(self):
+        callbacks = self._crear_facturas()
+
+        # Todos los eventos de la transacción se procesan en un solo on_commit
+        self.assertEqual(sum(isinstance(cb, profitability._FlushCallback) for cb in callbacks), 1)
+
+        rows = {
+            (row.ot_id, row.periodo): row
+            for row in MonthlyProfitability.objects.all()
+        }
+        self.assertEqual(set(rows), {
+            (self.ot.pk, date(2025, 1, 1)), (self.ot.pk, date(2025, 2, 1)),
+            (None, date(2025, 1, 1)), (self.otra_ot.pk, date(2025, 2, 1)),
+        })
+        enero = rows[(self.ot.pk, date(2025, 1, 1))]
+        self.assertEqual((enero.ventas_total, enero.costos_total, enero.margen_bruto),
+                         (Decimal("1000.00"), Decimal("300.00"), Decimal("700.00")))
+        self.assertEqual(rows[(self.ot.pk, date(2025, 2, 1))].cobradas_count, 1)
+        self.assertEqual(rows[(self.otra_ot.pk, date(2025, 2, 1))].provisionadas_sin_asociar_count, 1)
+
+        self.ot.refresh_from_db()
+        self.assertEqual(self.ot.monto_total_vendido, Decimal("1500.00"))
+        self.assertEqual(self.ot.monto_total_costos, Decimal("300.00"))
+        self.assertEqual(self.ot.porcentaje_margen, Decimal("80.00"))
+        self.assertEqual(self.ot.estado_facturacion_venta, 'facturado_total')
+
+    def test_moving_cost_between_ots_refreshes_both(self):
+        self._crear_facturas()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.costo.ot = self.otra_ot
+            self.costo.save()
+
+        self.ot.refresh_from_db()
+        self.otra_ot.refresh_from_db()
+        self.assertEqual(self.ot.monto_total_costos, Decimal("0.00"))
+        self.assertEqual(self.otra_ot.monto_total_costos, Decimal("500.00"))
+        self.assertFalse(MonthlyProfitability.objects.filter(
+            ot=self.ot, periodo=date(2025, 1, 1), costos_count__gt=0
+        ).exists())
+
+        # Guardar sin cambios relevantes no agenda nada
+        with self.captureOnCommitCallbacks() as callbacks:
+            Invoice.objects.get(pk=self.costo.pk).save(update_fields=['updated_at'])
+        self.assertFalse(any(isinstance(cb, profitability._FlushCallback) for cb in callbacks))
+
+        # post_init no carga los campos diferidos; al no conocer su valor original se refresca la OT
+        with self.assertNumQueries(1):
+            costo = Invoice.objects.only('id', 'numero_factura').get(pk=self.costo.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            costo.save(update_fields=['numero_factura'])
+        self.assertEqual(sum(isinstance(cb, profitability._FlushCallback) for cb in callbacks), 1)
+
+    def test_refresh_rescheduled_after_savepoint_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self._venta("V-RENT-RB", self.ot, "100.00", date(2025, 1, 10))
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            # El callback del savepoint se descartó: el siguiente evento agenda uno nuevo
+            self._venta("V-RENT-OK", self.otra_ot, "250.00", date(2025, 1, 12))
+
+        self.assertEqual(sum(isinstance(cb, profitability._FlushCallback) for cb in callbacks), 1)
+        self.otra_ot.refresh_from_db()
+        self.assertEqual(self.otra_ot.monto_total_vendido, Decimal("250.00"))
+
+    def test_refresh_error_is_logged(self):
+        with mock.patch.object(ProfitabilityStore, 'refresh', side_effect=RuntimeError('boom')), \
+                self.assertLogs('sales.services.profitability', level='ERROR') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._venta("V-RENT-ERR", self.ot, "100.00", date(2025, 1, 10))
+
+        self.assertIn('Error refrescando OTs', logs.output[0])
+        self.assertIn('RuntimeError: boom', logs.output[0])
+
+    def test_rebuild_matches_incremental(self):
+        self._crear_facturas()
+        incremental = sorted(
+            MonthlyProfitability.objects.values_list('ot_id', 'periodo', 'ventas_total', 'costos_total', 'ventas_count')
+        , key=str)
+
+        result = ProfitabilityStore().rebuild()
+
+        rebuilt = sorted(
+            MonthlyProfitability.objects.values_list('ot_id', 'periodo', 'ventas_total', 'costos_total', 'ventas_count')
+        , key=str)
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(result['ots_updated'], 0)
+
+    def test_dashboard_table_matches_live(self):
+        self._crear_facturas()
+        with self.captureOnCommitCallbacks(execute=True):
+            venta = SalesInvoice.objects.get(numero_factura="V-RENT-1")
+            InvoiceSalesMapping.objects.create(
+                sales_invoice=venta, cost_invoice=self.costo, monto_asignado=Decimal("300.00")
+            )
+
+        view = FinanceDashboardView()
+        live = view._metricas_en_vivo(
+            SalesInvoice.objects.filter(deleted_at__isnull=True),
+            Invoice.objects.filter(deleted_at__isnull=True),
+        )
+        with self.assertNumQueries(2):
+            table = view._metricas_materializadas(None, None)
+        self.assertEqual(table, live)
+        self.assertEqual(table['top_ots_margen'][0]['numero_ot'], "OT-RENT-001")
+
+        # Meses completos se responden desde la tabla; fechas a mitad de mes, en vivo
+        self.assertEqual(view._periodo_mensual('2025-01-01', '2025-01-31'), (date(2025, 1, 1), date(2025, 1, 31)))
+        self.assertIsNone(view._periodo_mensual('2025-01-15', None))
+        enero = view._metricas_materializadas(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(enero['total_vendido'], Decimal("1080.00"))
+        self.assertEqual(enero['total_facturas'], 2)
+
+
+class ProvisionadasFeedTestCase(TestCase):
+    """Feed paginado de facturas de costo: totales en un aggregate, consultas fijas y vista ligera"""
+
+    URL = '/api/sales/invoices/provisionadas/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='finanzas_feed', email='feed@example.com', password='password123', role='finanzas'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.cliente = ClientAlias.objects.create(original_name="Cliente Feed", normalized_name="CLIENTE FEED")
+        self.ot = OT.objects.create(numero_ot="OT-FEED-001", cliente=self.cliente)
+        self.proveedor = Provider.objects.create(nombre='Proveedor Feed')
+        self.venta = SalesInvoice.objects.create(
+            numero_factura="V-FEED-1", ot=self.ot, cliente=self.cliente,
+            fecha_emision=date(2025, 3, 1), fecha_vencimiento=date(2025, 3, 31), monto_total=Decimal("5000.00"),
+        )
+
+    def _costos(self, cantidad, inicio=0):
+        costos = []
+        for n in range(inicio, inicio + cantidad):
+            numero = f"C-FEED-{n:03d}"
+            content = numero.encode()
+            uploaded_file = UploadedFile.objects.create(
+                filename=f"{numero}.pdf", path=f"invoices/test/{numero}.pdf",
+                sha256=UploadedFile.calculate_hash(content), size=len(content), content_type="application/pdf"
+            )
+            costos.append(Invoice.objects.create(
+                numero_factura=numero, fecha_emision=date(2025, 2, 1), monto=Decimal("100.00"),
+                tipo_costo="OTRO", ot=self.ot, proveedor=self.proveedor, proveedor_nombre=self.proveedor.nombre,
+                uploaded_file=uploaded_file, fecha_provision=date(2025, 2, 1 + n % 20),
+            ))
+        return costos
+
+    def test_totals_and_available_amount(self):
+        costos = self._costos(4)
+        InvoiceSalesMapping.objects.create(sales_invoice=self.venta, cost_invoice=costos[0], monto_asignado=Decimal("40.00"))
+        InvoiceSalesMapping.objects.create(sales_invoice=self.venta, cost_invoice=costos[1], monto_asignado=Decimal("100.00"))
+
+        response = self.client.get(self.URL, {'page_size': 2, 'ot_id': self.ot.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['totales'], {
+            'cantidad': 4, 'provisionadas': 4, 'monto_aplicable': '400.00',
+            'monto_asignado': '140.00', 'monto_disponible': '260.00',
+        })
+
+        disponibles = self.client.get(self.URL, {'solo_disponibles': 'true'})
+        self.assertEqual(
+            {row['id']: row['monto_disponible'] for row in disponibles.data},
+            {costos[0].pk: Decimal('60.00'), costos[2].pk: Decimal('100.00'), costos[3].pk: Decimal('100.00')}
+        )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self._costos(5)
+        # count + página + nombres de tipo de costo + totales
+        with self.assertNumQueries(4):
+            self.client.get(self.URL, {'page_size': 50})
+        self._costos(20, inicio=5)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.URL, {'page_size': 50})
+        self.assertEqual(len(response.data['results']), 25)
+
+        with self.assertNumQueries(4):
+            self.client.get(self.URL, {'page_size': 50, 'vista': 'ligera'})
+
+    def test_light_projection_payload(self):
+        self._costos(25)
+        completa = self.client.get(self.URL, {'page_size': 25})
+        ligera = self.client.get(self.URL, {'page_size': 25, 'vista': 'ligera'})
+
+        self.assertEqual(set(ligera.data['results'][0]), {
+            'id', 'numero_factura', 'proveedor_nombre', 'tipo_costo_display',
+            'estado_provision', 'monto_aplicable', 'monto_disponible',
+        })
+        campos = set(ligera.data['results'][0])
+        self.assertEqual(
+            ligera.data['results'],
+            [{k: v for k, v in row.items() if k in campos} for row in completa.data['results']]
+        )
+        self.assertEqual(ligera.data['totales'], completa.data['totales'])
+        self.assertLess(len(ligera.content), len(completa.content))
+        self.assertLess(len(ligera.content), 25 * 240)
+
+
+class BulkCostAssociationTestCase(TestCase):
+    """associate_costs: montos en una consulta, upsert masivo y fechas por conjuntos"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='finanzas_asoc', email='asoc@example.com', password='password123', role='finanzas'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.cliente = ClientAlias.objects.create(original_name="Cliente Asoc", normalized_name="CLIENTE ASOC")
+        self.ot = OT.objects.create(numero_ot="OT-ASOC-001", cliente=self.cliente)
+        self.venta = SalesInvoice.objects.create(
+            numero_factura="V-ASOC-1", ot=self.ot, cliente=self.cliente,
+            fecha_emision=date(2025, 4, 10), fecha_vencimiento=date(2025, 5, 10), monto_total=Decimal("90000.00"),
+        )
+
+    def _costos(self, cantidad, prefijo, tipo_costo="OTRO"):
+        archivos = UploadedFile.objects.bulk_create([
+            UploadedFile(
+                filename=f"{prefijo}-{n}.pdf", path=f"invoices/test/{prefijo}-{n}.pdf",
+                sha256=UploadedFile.calculate_hash(f"{prefijo}-{n}".encode()), size=1, content_type="application/pdf"
+            )
+            for n in range(cantidad)
+        ])
+        return Invoice.objects.bulk_create([
+            Invoice(
+                numero_factura=f"{prefijo}-{n:04d}", fecha_emision=date(2025, 4, 1), monto=Decimal("100.00"),
+                monto_aplicable=Decimal("80.00") if n % 2 else None, tipo_costo=tipo_costo,
+                ot=self.ot, ot_number=self.ot.numero_ot, uploaded_file=archivo,
+            )
+            for n, archivo in enumerate(archivos)
+        ])
+
+    def _asociar(self, costos):
+        with CaptureQueriesContext(connection) as ctx:
+            cost_mapping.asociar_costos(self.venta, [c.pk for c in costos])
+        return len(ctx.captured_queries)
+
+    def test_round_trips_do_not_grow_with_selection(self):
+        pocas = self._asociar(self._costos(5, 'C-POCAS'))
+        muchas = self._asociar(self._costos(200, 'C-MUCHAS'))
+        self.assertEqual(pocas, muchas)
+
+        self.assertEqual(InvoiceSalesMapping.objects.filter(sales_invoice=self.venta).count(), 205)
+        # Montos aplicables: 80.00 cuando hay monto_aplicable, si no el monto (100.00)
+        total = InvoiceSalesMapping.objects.filter(sales_invoice=self.venta).aggregate(t=Sum('monto_asignado'))['t']
+        self.assertEqual(total, Decimal("18460.00"))
+        self.venta.refresh_from_db()
+        self.assertEqual(self.venta.margen_bruto, Decimal("71540.00"))
+
+    def test_reassociation_updates_amounts(self):
+        costos = self._costos(3, 'C-RE')
+        cost_mapping.asociar_costos(self.venta, [c.pk for c in costos])
+        Invoice.objects.filter(pk=costos[0].pk).update(monto_aplicable=Decimal("55.00"))
+
+        response = self.client.post(
+            f'/api/sales/invoices/{self.venta.pk}/associate_costs/', {'invoice_ids': [costos[0].pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        mappings = InvoiceSalesMapping.objects.filter(sales_invoice=self.venta)
+        self.assertEqual(mappings.count(), 3)
+        self.assertEqual(mappings.get(cost_invoice=costos[0]).monto_asignado, Decimal("55.00"))
+
+    def test_dates_updated_for_costs_and_linked_ots(self):
+        flete = self._costos(2, 'C-FLETE', tipo_costo='FLETE')
+        otros = self._costos(1, 'C-OTRO')
+        anulada = self._costos(1, 'C-ANUL', tipo_costo='FLETE')[0]
+        Invoice.objects.filter(pk=anulada.pk).update(estado_provision='anulada')
+
+        cost_mapping.asociar_costos(self.venta, [flete[0].pk, otros[0].pk, anulada.pk])
+
+        fechas = dict(Invoice.objects.filter(ot=self.ot).values_list('numero_factura', 'fecha_facturacion'))
+        self.assertEqual(fechas['C-FLETE-0000'], date(2025, 4, 10))
+        self.assertEqual(fechas['C-OTRO-0000'], date(2025, 4, 10))
+        # La OT vinculada propaga la fecha a sus otras facturas vinculadas (no anuladas)
+        self.assertEqual(fechas['C-FLETE-0001'], date(2025, 4, 10))
+        self.assertIsNone(fechas['C-ANUL-0000'])
 
-# Create your tests here.
+        self.ot.refresh_from_db()
+        self.assertEqual(self.ot.fecha_recepcion_factura, date(2025, 4, 10))
+        self.assertEqual(self.ot.fecha_solicitud_facturacion, date(2025, 4, 10))
+        self.assertEqual(self.ot.estado_facturado, 'facturado')
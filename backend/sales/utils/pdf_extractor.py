@@ -149,6 +149,8 @@ class SalesInvoicePDFExtractor:
                     
                     if value is not None:  # Permitir 0.00, 0, '', pero no None
                         result[result_field_name] = value
+                        # Telemetría en buffer: solo el patrón aplicado, sin escribir en su fila
+                        pattern.incrementar_uso()
                         logger.debug(f"Campo '{field_name}' extraído: {value}")
                         break  # Ya encontramos el valor, no probar más patrones
                         
@@ -3,16 +3,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from django.db.models import Sum, Q, Count, Avg
+from django.db.models import Sum, Q, Count, Avg, F
 from django.utils import timezone
 from decimal import Decimal
 from datetime import datetime, timedelta
 import logging
-import os
 import tempfile
 
 from .models import SalesInvoice, Payment, InvoiceSalesMapping
 from .models_items import SalesInvoiceItem
+from .models_profitability import MonthlyProfitability
+from .services import cost_mapping
+from .services import provisionadas as provisionadas_service
+from .services.profitability import ot_metrics
 from .serializers import (
     SalesInvoiceListSerializer,
     SalesInvoiceDetailSerializer,
@@ -29,11 +32,17 @@ from .filters import SalesInvoiceFilter, PaymentFilter
 
 from invoices.models import Invoice, UploadedFile
 from ots.models import OT
+from common.file_delivery import FileDeliveryService
+from common.mixins import ReplicaReadMixin
 
 logger = logging.getLogger(__name__)
 
-class SalesInvoiceViewSet(viewsets.ModelViewSet):
+# Campos monetarios del dashboard (el resto son contadores)
+MONTOS_DASHBOARD = {'total_vendido', 'total_cobrado', 'por_cobrar', 'monto_provisionadas'}
+
+class SalesInvoiceViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, CanManageSalesInvoices]
+    replica_actions = {'list', 'retrieve', 'stats', 'provisionadas'}
     queryset = SalesInvoice.objects.filter(deleted_at__isnull=True)
     filterset_class = SalesInvoiceFilter
     
@@ -204,34 +213,12 @@ class SalesInvoiceViewSet(viewsets.ModelViewSet):
         que el monto de la venta (escenario de ganancia o pérdida).
 
         Además, actualiza las fechas de facturación de las facturas de costo asociadas.
+        Todo en un número fijo de consultas (ver sales/services/cost_mapping.py).
         """
-        from .serializers import actualizar_fechas_facturas_costo_asociadas
-
         sales_invoice = self.get_object()
         cost_invoice_ids = request.data.get('invoice_ids', [])
 
-        # Obtener todas las facturas de costo
-        cost_invoices = Invoice.objects.filter(id__in=cost_invoice_ids)
-
-        # Asociar cada factura de costo con su monto completo disponible
-        for cost_invoice in cost_invoices:
-            # Usar el monto aplicable completo de la factura de costo
-            monto_a_asignar = cost_invoice.get_monto_aplicable()
-
-            # Verificar si ya existe la asociación
-            mapping, created = InvoiceSalesMapping.objects.get_or_create(
-                sales_invoice=sales_invoice,
-                cost_invoice=cost_invoice,
-                defaults={'monto_asignado': monto_a_asignar}
-            )
-
-            # Si ya existía, actualizar el monto
-            if not created:
-                mapping.monto_asignado = monto_a_asignar
-                mapping.save()
-
-        # Actualizar fechas de las facturas de costo asociadas
-        actualizar_fechas_facturas_costo_asociadas(sales_invoice, cost_invoice_ids)
+        cost_mapping.asociar_costos(sales_invoice, cost_invoice_ids)
 
         serializer = self.get_serializer(sales_invoice)
         return Response(serializer.data)
@@ -242,39 +229,35 @@ class SalesInvoiceViewSet(viewsets.ModelViewSet):
         Estadísticas de facturas de venta para pestañas y dashboard.
 
         Retorna contadores por estado para implementar sistema de tabs.
+        Se lee de la tabla materializada de rentabilidad (una consulta).
         """
-        queryset = self.get_queryset()
-
-        # Contadores totales
-        total = queryset.count()
-        total_monto = queryset.aggregate(Sum('monto_total'))['monto_total__sum'] or Decimal('0.00')
-        total_cobrado = queryset.aggregate(Sum('monto_pagado'))['monto_pagado__sum'] or Decimal('0.00')
-        total_pendiente = queryset.aggregate(Sum('monto_pendiente'))['monto_pendiente__sum'] or Decimal('0.00')
-
-        # Contadores por nuevo estado de facturación
-        facturadas = queryset.filter(estado_facturacion='facturada').count()
-        pendientes_cobro = queryset.filter(estado_facturacion='pendiente_cobro').count()
-        pagadas = queryset.filter(estado_facturacion='pagada').count()
-        anuladas = queryset.filter(estado_facturacion__in=['anulada', 'anulada_parcial']).count()
+        totales = MonthlyProfitability.objects.aggregate(
+            total=Sum('ventas_count'),
+            total_monto=Sum('ventas_total'),
+            total_cobrado=Sum('ventas_cobrado'),
+            total_pendiente=Sum('ventas_pendiente'),
+            facturadas=Sum('facturadas_count'),
+            pendientes_cobro=Sum('pendientes_cobro_count'),
+            pagadas=Sum('pagadas_count'),
+            anuladas=Sum('anuladas_count'),
+        )
 
         stats = {
             # Totales generales
-            'total': total,
-            'total_monto': float(total_monto),
-            'total_cobrado': float(total_cobrado),
-            'total_pendiente': float(total_pendiente),
+            'total': totales['total'] or 0,
+            'total_monto': float(totales['total_monto'] or 0),
+            'total_cobrado': float(totales['total_cobrado'] or 0),
+            'total_pendiente': float(totales['total_pendiente'] or 0),
 
             # Por estado de facturación (nuevos estados)
-            'facturadas': facturadas,
-            'pendientes_cobro': pendientes_cobro,
-            'pagadas': pagadas,
-            'anuladas': anuladas,
+            'facturadas': totales['facturadas'] or 0,
+            'pendientes_cobro': totales['pendientes_cobro'] or 0,
+            'pagadas': totales['pagadas'] or 0,
+            'anuladas': totales['anuladas'] or 0,
         }
 
         return Response(stats)
 
-
-
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def ot_info(self, request):
         """
@@ -318,18 +301,36 @@ class SalesInvoiceViewSet(viewsets.ModelViewSet):
         """
         Lista facturas de costo provisionadas (para finanzas).
         Estas son las facturas listas para asociar a facturas de venta.
-        """
-        provisionadas = Invoice.objects.filter(
-            deleted_at__isnull=True
-        ).select_related('proveedor', 'ot').order_by('-fecha_provision')
 
-        # Filtros opcionales
-        ot_id = request.query_params.get('ot_id')
-        if ot_id:
-            provisionadas = provisionadas.filter(ot_id=ot_id)
+        Filtros: ot_id, proveedor_id, estado_provision, tipo_costo,
+        provision_desde, provision_hasta, search, solo_disponibles=true
+        (ver sales/services/provisionadas.py).
 
-        serializer = CostInvoiceBasicSerializer(provisionadas, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        - ?page=N / ?page_size=N: respuesta paginada con `totales` del feed
+          filtrado (un solo aggregate).
+        - ?vista=ligera: solo las columnas de la tabla, sin instanciar modelos.
+
+        Sin page/page_size retorna la lista completa (compatibilidad).
+        """
+        feed = provisionadas_service.feed_queryset(request.query_params)
+        ligera = request.query_params.get('vista') == 'ligera'
+        if ligera:
+            queryset = feed.values(*provisionadas_service.PROYECCION_LIGERA)
+        else:
+            queryset = feed.select_related('proveedor')
+
+        def serialize(rows):
+            if ligera:
+                return provisionadas_service.proyeccion_ligera(rows)
+            return CostInvoiceBasicSerializer(rows, many=True).data
+
+        if 'page' not in request.query_params and 'page_size' not in request.query_params:
+            return Response(serialize(queryset), status=status.HTTP_200_OK)
+
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response(serialize(page))
+        response.data['totales'] = provisionadas_service.resumen(feed)
+        return response
 
     @action(detail=True, methods=['get'])
     def cost_mappings(self, request, pk=None):
@@ -452,9 +453,10 @@ class SalesInvoiceViewSet(viewsets.ModelViewSet):
         associated_ids = sales_invoice.cost_mappings.values_list('cost_invoice_id', flat=True)
         available = Invoice.objects.filter(
             deleted_at__isnull=True
-        ).exclude(id__in=associated_ids)
+        ).exclude(id__in=associated_ids).select_related('proveedor')
         if sales_invoice.ot:
             available = available.filter(ot=sales_invoice.ot)
+        available = provisionadas_service.anotar_disponible(available)
         serializer = CostInvoiceBasicSerializer(available, many=True)
         return Response({'available_invoices': serializer.data})
 
@@ -462,11 +464,8 @@ class SalesInvoiceViewSet(viewsets.ModelViewSet):
     def retrieve_file(self, request, pk=None):
         """
         Permite descargar o previsualizar el archivo PDF de la factura de venta.
-        Actúa como proxy para servir archivos desde Cloudinary.
+        Ver common/file_delivery.py (redirect firmado o proxy con Range/ETag).
         """
-        from django.http import HttpResponse
-        from django.conf import settings
-
         sales_invoice = self.get_object()
 
         if not sales_invoice.archivo_pdf:
@@ -475,149 +474,13 @@ class SalesInvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Si usamos Cloudinary, servir archivo como proxy
-        if getattr(settings, 'USE_CLOUDINARY', False):
-            try:
-                import cloudinary.utils
-                import requests
-                import os
-
-                # Obtener el storage_path del archivo almacenado en Cloudinary
-                storage_path = sales_invoice.archivo_pdf.name
-                logger.info(f"Fetching sales invoice PDF from Cloudinary: {storage_path}")
-
-                # CRITICAL: Cloudinary stores raw files WITHOUT extension in the public_id
-                # But we may have saved it WITH extension in older uploads
-                # Try both approaches
-                base_name, ext = os.path.splitext(storage_path)
-                ext_clean = ext.lstrip('.')
-
-                # Try with and without extension
-                public_id_candidates = []
-                if ext:
-                    public_id_candidates.append(base_name)  # Without extension
-                public_id_candidates.append(storage_path)  # With extension
-
-                # Remove duplicates while preserving order
-                unique_candidates = []
-                for candidate in public_id_candidates:
-                    if candidate and candidate not in unique_candidates:
-                        unique_candidates.append(candidate)
-
-                cloudinary_response = None
-                last_status = None
-
-                for public_id in unique_candidates:
-                    logger.info(f"Trying public_id: {public_id}")
-                    # Try both 'authenticated' and 'upload' types
-                    for cloudinary_type in ('authenticated', 'upload'):
-                        try:
-                            format_arg = None
-                            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
-                                format_arg = ext_clean
-
-                            cloudinary_options = {
-                                'resource_type': 'raw',
-                                'type': cloudinary_type,
-                                'secure': True,
-                                'sign_url': True,
-                            }
-                            if format_arg:
-                                cloudinary_options['format'] = format_arg
-
-                            download_url, _ = cloudinary.utils.cloudinary_url(
-                                public_id,
-                                **cloudinary_options,
-                            )
-                            logger.info(f"Generated signed CDN URL ({cloudinary_type}): {download_url[:100]}...")
-                        except Exception as url_error:
-                            logger.error(f"Error generating signed URL ({cloudinary_type}): {url_error}")
-                            continue
-
-                        logger.info(f"Downloading from Cloudinary CDN...")
-                        response = requests.get(download_url, timeout=30)
-                        logger.info(f"Cloudinary response status: {response.status_code}")
-
-                        if response.status_code == 200:
-                            cloudinary_response = response
-                            logger.info(f"✅ SUCCESS: Downloaded {len(response.content)} bytes")
-                            break
-
-                        if response.status_code == 404:
-                            logger.warning(f"404: File not found with public_id={public_id}, type={cloudinary_type}")
-                            last_status = 404
-                        else:
-                            logger.warning(f"Unexpected status {response.status_code} for {public_id}")
-                            last_status = response.status_code
-
-                    if cloudinary_response:
-                        break
-
-                if not cloudinary_response:
-                    if last_status == 404:
-                        return Response(
-                            {'detail': 'Archivo no encontrado en Cloudinary. Por favor, suba la factura nuevamente.'},
-                            status=status.HTTP_404_NOT_FOUND
-                        )
-
-                    detail_status = last_status or 'desconocido'
-                    return Response(
-                        {'detail': f'Error al descargar archivo de Cloudinary: {detail_status}'},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
-
-                # Servir el archivo descargado
-                filename = f"factura_venta_{sales_invoice.numero_factura}.pdf"
-                content_type = 'application/pdf'
-
-                response_file = HttpResponse(cloudinary_response.content, content_type=content_type)
-                download_flag = str(request.query_params.get('download', '')).lower()
-                disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-                response_file['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-                response_file['Content-Length'] = len(cloudinary_response.content)
-                response_file['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-                return response_file
-
-            except requests.exceptions.Timeout:
-                logger.error('Timeout al descargar de Cloudinary')
-                return Response(
-                    {'detail': 'Timeout al descargar el archivo. Intente nuevamente.'},
-                    status=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            except requests.exceptions.RequestException as req_exc:
-                logger.error(f'Error de red al descargar de Cloudinary: {req_exc}', exc_info=True)
-                return Response(
-                    {'detail': f'Error de conexión con Cloudinary: {req_exc}'},
-                    status=status.HTTP_502_BAD_GATEWAY
-                )
-            except Exception as exc:
-                logger.error(f'Error inesperado al servir archivo de Cloudinary: {exc}', exc_info=True)
-                return Response(
-                    {'detail': f'Error al obtener archivo: {str(exc)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        # Para almacenamiento local, servir normalmente
-        try:
-            file_handle = sales_invoice.archivo_pdf.open('rb')
-            filename = f"factura_venta_{sales_invoice.numero_factura}.pdf"
-            content_type = 'application/pdf'
-
-            from django.http import FileResponse
-            response = FileResponse(file_handle, content_type=content_type)
-            download_flag = str(request.query_params.get('download', '')).lower()
-            disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-            response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-            return response
-        except Exception as e:
-            logger.error(f"Error al abrir archivo local: {e}", exc_info=True)
-            return Response(
-                {'detail': f'No se pudo abrir el archivo: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return FileDeliveryService().serve(
+            request,
+            storage_path=sales_invoice.archivo_pdf.name,
+            filename=f"factura_venta_{sales_invoice.numero_factura}.pdf",
+            content_type='application/pdf',
+            not_found_detail='Archivo no encontrado. Por favor, suba la factura nuevamente.',
+        )
 
 class PaymentViewSet(viewsets.ModelViewSet):
     """
@@ -657,11 +520,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def retrieve_file(self, request, pk=None):
         """
         Permite descargar o previsualizar el comprobante de pago.
-        Actúa como proxy para servir archivos desde Cloudinary.
+        Ver common/file_delivery.py (redirect firmado o proxy con Range/ETag).
         """
-        from django.http import HttpResponse
-        from django.conf import settings
-
         payment = self.get_object()
 
         if not payment.archivo_comprobante:
@@ -670,154 +530,25 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Si usamos Cloudinary, servir archivo como proxy
-        if getattr(settings, 'USE_CLOUDINARY', False):
-            try:
-                import cloudinary.utils
-                import requests
-                import os
-
-                # Obtener el storage_path del archivo almacenado en Cloudinary
-                storage_path = payment.archivo_comprobante.name
-                logger.info(f"Fetching payment receipt from Cloudinary: {storage_path}")
-
-                # CRITICAL: Cloudinary stores raw files WITHOUT extension in the public_id
-                # But we may have saved it WITH extension in older uploads
-                # Try both approaches
-                base_name, ext = os.path.splitext(storage_path)
-                ext_clean = ext.lstrip('.')
-
-                # Try with and without extension
-                public_id_candidates = []
-                if ext:
-                    public_id_candidates.append(base_name)  # Without extension
-                public_id_candidates.append(storage_path)  # With extension
-
-                # Remove duplicates while preserving order
-                unique_candidates = []
-                for candidate in public_id_candidates:
-                    if candidate and candidate not in unique_candidates:
-                        unique_candidates.append(candidate)
-
-                cloudinary_response = None
-                last_status = None
-
-                for public_id in unique_candidates:
-                    logger.info(f"Trying public_id: {public_id}")
-                    # Try both 'authenticated' and 'upload' types
-                    for cloudinary_type in ('authenticated', 'upload'):
-                        try:
-                            format_arg = None
-                            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
-                                format_arg = ext_clean
-
-                            cloudinary_options = {
-                                'resource_type': 'raw',
-                                'type': cloudinary_type,
-                                'secure': True,
-                                'sign_url': True,
-                            }
-                            if format_arg:
-                                cloudinary_options['format'] = format_arg
-
-                            download_url, _ = cloudinary.utils.cloudinary_url(
-                                public_id,
-                                **cloudinary_options,
-                            )
-                            logger.info(f"Generated signed CDN URL ({cloudinary_type}): {download_url[:100]}...")
-                        except Exception as url_error:
-                            logger.error(f"Error generating signed URL ({cloudinary_type}): {url_error}")
-                            continue
-
-                        logger.info(f"Downloading from Cloudinary CDN...")
-                        response = requests.get(download_url, timeout=30)
-                        logger.info(f"Cloudinary response status: {response.status_code}")
-
-                        if response.status_code == 200:
-                            cloudinary_response = response
-                            logger.info(f"✅ SUCCESS: Downloaded {len(response.content)} bytes")
-                            break
-
-                        if response.status_code == 404:
-                            logger.warning(f"404: File not found with public_id={public_id}, type={cloudinary_type}")
-                            last_status = 404
-                        else:
-                            logger.warning(f"Unexpected status {response.status_code} for {public_id}")
-                            last_status = response.status_code
-
-                    if cloudinary_response:
-                        break
-
-                if not cloudinary_response:
-                    if last_status == 404:
-                        return Response(
-                            {'detail': 'Archivo no encontrado en Cloudinary. Por favor, suba el comprobante nuevamente.'},
-                            status=status.HTTP_404_NOT_FOUND
-                        )
-
-                    detail_status = last_status or 'desconocido'
-                    return Response(
-                        {'detail': f'Error al descargar archivo de Cloudinary: {detail_status}'},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
-
-                # Servir el archivo descargado
-                filename = f"comprobante_pago_{payment.referencia}.pdf"
-                content_type = 'application/pdf'
-
-                response_file = HttpResponse(cloudinary_response.content, content_type=content_type)
-                download_flag = str(request.query_params.get('download', '')).lower()
-                disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-                response_file['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-                response_file['Content-Length'] = len(cloudinary_response.content)
-                response_file['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-                return response_file
-
-            except requests.exceptions.Timeout:
-                logger.error('Timeout al descargar de Cloudinary')
-                return Response(
-                    {'detail': 'Timeout al descargar el archivo. Intente nuevamente.'},
-                    status=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            except requests.exceptions.RequestException as req_exc:
-                logger.error(f'Error de red al descargar de Cloudinary: {req_exc}', exc_info=True)
-                return Response(
-                    {'detail': f'Error de conexión con Cloudinary: {req_exc}'},
-                    status=status.HTTP_502_BAD_GATEWAY
-                )
-            except Exception as exc:
-                logger.error(f'Error inesperado al servir archivo de Cloudinary: {exc}', exc_info=True)
-                return Response(
-                    {'detail': f'Error al obtener archivo: {str(exc)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        # Para almacenamiento local, servir normalmente
-        try:
-            file_handle = payment.archivo_comprobante.open('rb')
-            filename = f"comprobante_pago_{payment.referencia}.pdf"
-            content_type = 'application/pdf'
-
-            from django.http import FileResponse
-            response = FileResponse(file_handle, content_type=content_type)
-            download_flag = str(request.query_params.get('download', '')).lower()
-            disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-            response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-            return response
-        except Exception as e:
-            logger.error(f"Error al abrir archivo local: {e}", exc_info=True)
-            return Response(
-                {'detail': f'No se pudo abrir el archivo: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return FileDeliveryService().serve(
+            request,
+            storage_path=payment.archivo_comprobante.name,
+            filename=f"comprobante_pago_{payment.referencia}.pdf",
+            content_type='application/pdf',
+        )
 
 
-class FinanceDashboardView(APIView):
-    """Dashboard principal para finanzas con métricas clave."""
+class FinanceDashboardView(ReplicaReadMixin, APIView):
+    """
+    Dashboard principal para finanzas con métricas clave.
+
+    Ventas, costos provisionados y top de OTs se leen de la tabla materializada
+    MonthlyProfitability cuando no hay filtro de fechas o el filtro cubre meses
+    completos; con fechas a mitad de mes se calculan sobre las facturas.
+    Vencimientos y pagos siempre se consultan en vivo (dependen de "hoy").
+    """
     permission_classes = [IsAuthenticated, IsFinanzasOrAdmin]
+    replica_actions = {'get'}
 
     def get(self, request):
         hoy = timezone.now().date()
@@ -838,27 +569,15 @@ class FinanceDashboardView(APIView):
             sales_invoices = sales_invoices.filter(fecha_emision__lte=fecha_fin)
             cost_invoices = cost_invoices.filter(fecha_emision__lte=fecha_fin)
 
-        # === MÉTRICAS DE VENTAS ===
-        total_vendido = sales_invoices.aggregate(Sum('monto_total'))['monto_total__sum'] or Decimal('0.00')
-        total_cobrado = sales_invoices.aggregate(Sum('monto_pagado'))['monto_pagado__sum'] or Decimal('0.00')
-        por_cobrar = sales_invoices.aggregate(Sum('monto_pendiente'))['monto_pendiente__sum'] or Decimal('0.00')
+        # === MÉTRICAS DE VENTAS Y COSTOS PROVISIONADOS ===
+        periodo = self._periodo_mensual(fecha_inicio, fecha_fin)
+        if periodo is not None:
+            metricas = self._metricas_materializadas(*periodo)
+        else:
+            metricas = self._metricas_en_vivo(sales_invoices, cost_invoices)
 
-        # Facturas de venta por estado
-        total_facturas = sales_invoices.count()
-        facturas_cobradas = sales_invoices.filter(estado_pago='pagado_total').count()
-        facturas_pendientes = sales_invoices.filter(estado_pago__in=['pendiente', 'pagado_parcial']).count()
         facturas_vencidas = sales_invoices.filter(estado_pago__in=['pendiente', 'pagado_parcial'], fecha_vencimiento__lt=hoy).count()
 
-        # === MÉTRICAS DE COSTOS PROVISIONADOS ===
-        facturas_provisionadas = cost_invoices.filter(estado_provision='provisionada')
-        total_provisionadas = facturas_provisionadas.count()
-        monto_provisionadas = facturas_provisionadas.aggregate(Sum('monto'))['monto__sum'] or Decimal('0.00')
-
-        # Facturas provisionadas sin asociar a venta
-        provisionadas_sin_asociar = facturas_provisionadas.exclude(
-            id__in=InvoiceSalesMapping.objects.values_list('cost_invoice_id', flat=True)
-        ).count()
-
         # === MÉTRICAS DE PAGOS ===
         payments = Payment.objects.filter(deleted_at__isnull=True)
 
@@ -874,30 +593,9 @@ class FinanceDashboardView(APIView):
 
         # === CÁLCULO DE MÁRGENES ===
         # Calcular margen bruto total
-        margen_bruto_total = total_vendido - monto_provisionadas
-
-        # === TOP OTs POR MARGEN ===
-        from ots.models import OT
-        top_ots = OT.objects.filter(
-            deleted_at__isnull=True,
-            estado_facturacion_venta__in=['facturada', 'pendiente_cobro', 'pagada']
-        ).order_by('-margen_bruto')[:10]
-
-        top_ots_data = []
-        for ot in top_ots:
-            top_ots_data.append({
-                'id': ot.id,
-                'numero_ot': ot.numero_ot,
-                'cliente_nombre': ot.cliente_nombre,
-                'monto_total_vendido': str(ot.monto_total_vendido or Decimal('0.00')),
-                'monto_total_costos': str(ot.monto_total_costos or Decimal('0.00')),
-                'margen_bruto': str(ot.margen_bruto or Decimal('0.00')),
-                'porcentaje_margen': str(ot.porcentaje_margen or Decimal('0.00')),
-            })
+        margen_bruto_total = metricas['total_vendido'] - metricas['monto_provisionadas']
 
         # === FACTURAS PRÓXIMAS A VENCER ===
-        from datetime import timedelta
-        hoy = timezone.now().date()
         proximos_7_dias = hoy + timedelta(days=7)
 
         facturas_proximas_vencer = sales_invoices.filter(
@@ -905,7 +603,7 @@ class FinanceDashboardView(APIView):
             fecha_vencimiento__gte=hoy,
             fecha_vencimiento__lte=proximos_7_dias,
             estado_pago__in=['pendiente', 'pagado_parcial']
-        ).order_by('fecha_vencimiento')[:10]
+        ).select_related('cliente').order_by('fecha_vencimiento')[:10]
 
         facturas_vencer_data = []
         for factura in facturas_proximas_vencer:
@@ -918,29 +616,158 @@ class FinanceDashboardView(APIView):
             })
 
         return Response({
-            'total_vendido': str(total_vendido),
-            'total_cobrado': str(total_cobrado),
-            'por_cobrar': str(por_cobrar),
+            'total_vendido': str(metricas['total_vendido']),
+            'total_cobrado': str(metricas['total_cobrado']),
+            'por_cobrar': str(metricas['por_cobrar']),
             'margen_bruto_total': str(margen_bruto_total),
 
-            'total_facturas': total_facturas,
-            'facturas_cobradas': facturas_cobradas,
-            'facturas_pendientes': facturas_pendientes,
+            'total_facturas': metricas['total_facturas'],
+            'facturas_cobradas': metricas['facturas_cobradas'],
+            'facturas_pendientes': metricas['facturas_pendientes'],
             'facturas_vencidas': facturas_vencidas,
 
-            'total_provisionadas': total_provisionadas,
-            'monto_provisionadas': str(monto_provisionadas),
-            'provisionadas_sin_asociar': provisionadas_sin_asociar,
+            'total_provisionadas': metricas['total_provisionadas'],
+            'monto_provisionadas': str(metricas['monto_provisionadas']),
+            'provisionadas_sin_asociar': metricas['provisionadas_sin_asociar'],
 
             'total_pagos': total_pagos,
             'pagos_validados': pagos_validados,
             'pagos_pendientes': pagos_pendientes,
             'monto_pendiente_validacion': str(monto_pendiente_validacion),
 
-            'top_ots_margen': top_ots_data,
+            'top_ots_margen': metricas['top_ots_margen'],
             'facturas_proximas_vencer': facturas_vencer_data,
         })
 
+    @staticmethod
+    def _periodo_mensual(fecha_inicio, fecha_fin):
+        """
+        (inicio, fin) si el filtro se puede responder con la tabla mensual:
+        sin fechas, o inicio en día 1 y fin en el último día del mes.
+        None si hay que calcular en vivo.
+        """
+        try:
+            inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date() if fecha_inicio else None
+            fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date() if fecha_fin else None
+        except ValueError:
+            return None
+
+        if inicio and inicio.day != 1:
+            return None
+        if fin and (fin + timedelta(days=1)).day != 1:
+            return None
+        return inicio, fin
+
+    @staticmethod
+    def _fila_top_ot(ot_id, numero_ot, cliente_nombre, vendido, costos):
+        metricas = ot_metrics(vendido, costos)
+        return {
+            'id': ot_id,
+            'numero_ot': numero_ot,
+            'cliente_nombre': cliente_nombre or 'N/A',
+            'monto_total_vendido': str(metricas['monto_total_vendido']),
+            'monto_total_costos': str(metricas['monto_total_costos']),
+            'margen_bruto': str(metricas['margen_bruto']),
+            'porcentaje_margen': str(metricas['porcentaje_margen']),
+        }
+
+    def _metricas_materializadas(self, inicio, fin):
+        """Métricas desde MonthlyProfitability (dos consultas)."""
+        filas = MonthlyProfitability.objects.all()
+        if inicio:
+            filas = filas.filter(periodo__gte=inicio)
+        if fin:
+            filas = filas.filter(periodo__lte=fin)
+
+        totales = filas.aggregate(
+            total_vendido=Sum('ventas_total'),
+            total_cobrado=Sum('ventas_cobrado'),
+            por_cobrar=Sum('ventas_pendiente'),
+            total_facturas=Sum('ventas_count'),
+            facturas_cobradas=Sum('cobradas_count'),
+            facturas_pendientes=Sum('pendientes_pago_count'),
+            total_provisionadas=Sum('provisionadas_count'),
+            monto_provisionadas=Sum('costos_provisionados'),
+            provisionadas_sin_asociar=Sum('provisionadas_sin_asociar_count'),
+        )
+        metricas = {
+            name: value if value is not None else (Decimal('0.00') if name in MONTOS_DASHBOARD else 0)
+            for name, value in totales.items()
+        }
+
+        # === TOP OTs POR MARGEN ===
+        if inicio is None and fin is None:
+            # Sin filtro: las métricas acumuladas de la OT las mantiene el mismo store
+            metricas['top_ots_margen'] = self._top_ots_acumulado()
+            return metricas
+
+        # Agrupar solo por ot_id (sin joins) y traer los datos de las 10 OTs aparte
+        top_ots = list(
+            filas.filter(ot__isnull=False)
+            .values('ot_id')
+            .annotate(vendido=Sum('ventas_total'), costos=Sum('costos_total'))
+            .filter(vendido__gt=0)
+            .annotate(margen=F('vendido') - F('costos'))
+            .order_by('-margen', 'ot_id')[:20]
+        )
+        datos_ots = {
+            pk: (numero_ot, cliente)
+            for pk, numero_ot, cliente in OT.objects.filter(
+                deleted_at__isnull=True,
+                pk__in=[fila['ot_id'] for fila in top_ots]
+            ).values_list('pk', 'numero_ot', 'cliente__short_name')
+        } if top_ots else {}
+        metricas['top_ots_margen'] = [
+            self._fila_top_ot(fila['ot_id'], *datos_ots[fila['ot_id']], fila['vendido'], fila['costos'])
+            for fila in top_ots
+            if fila['ot_id'] in datos_ots
+        ][:10]
+        return metricas
+
+    def _top_ots_acumulado(self):
+        """Top 10 OTs por margen acumulado (campos de la OT mantenidos por el store)."""
+        top_ots = OT.objects.filter(
+            deleted_at__isnull=True,
+            monto_total_vendido__gt=0
+        ).order_by('-margen_bruto', 'id').values_list(
+            'id', 'numero_ot', 'cliente__short_name', 'monto_total_vendido', 'monto_total_costos'
+        )[:10]
+
+        return [self._fila_top_ot(*ot) for ot in top_ots]
+
+    def _metricas_en_vivo(self, sales_invoices, cost_invoices):
+        """Métricas calculadas sobre las facturas (filtros de fecha a mitad de mes)."""
+        ventas = sales_invoices.aggregate(
+            total_vendido=Sum('monto_total'),
+            total_cobrado=Sum('monto_pagado'),
+            por_cobrar=Sum('monto_pendiente'),
+        )
+
+        facturas_provisionadas = cost_invoices.filter(estado_provision='provisionada')
+
+        metricas = {
+            'total_vendido': ventas['total_vendido'] or Decimal('0.00'),
+            'total_cobrado': ventas['total_cobrado'] or Decimal('0.00'),
+            'por_cobrar': ventas['por_cobrar'] or Decimal('0.00'),
+
+            # Facturas de venta por estado
+            'total_facturas': sales_invoices.count(),
+            'facturas_cobradas': sales_invoices.filter(estado_pago='pagado_total').count(),
+            'facturas_pendientes': sales_invoices.filter(estado_pago__in=['pendiente', 'pagado_parcial']).count(),
+
+            'total_provisionadas': facturas_provisionadas.count(),
+            'monto_provisionadas': facturas_provisionadas.aggregate(Sum('monto'))['monto__sum'] or Decimal('0.00'),
+            # Facturas provisionadas sin asociar a venta
+            'provisionadas_sin_asociar': facturas_provisionadas.exclude(
+                id__in=InvoiceSalesMapping.objects.values_list('cost_invoice_id', flat=True)
+            ).count(),
+        }
+
+        # === TOP OTs POR MARGEN ===
+        # Métricas acumuladas de la OT (no dependen del filtro de fechas)
+        metricas['top_ots_margen'] = self._top_ots_acumulado()
+        return metricas
+
 
 class SalesInvoiceItemViewSet(viewsets.ModelViewSet):
     """
@@ -1084,11 +911,8 @@ class CreditNoteViewSet(viewsets.ModelViewSet):
     def retrieve_file(self, request, pk=None):
         """
         Permite descargar o previsualizar el archivo PDF de la nota de crédito.
-        Actúa como proxy para servir archivos desde Cloudinary.
+        Ver common/file_delivery.py (redirect firmado o proxy con Range/ETag).
         """
-        from django.shortcuts import redirect
-        from django.conf import settings
-
         credit_note = self.get_object()
 
         if not credit_note.archivo_pdf:
@@ -1097,121 +921,10 @@ class CreditNoteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Si usamos Cloudinary, servir archivo como proxy
-        if getattr(settings, 'USE_CLOUDINARY', False):
-            try:
-                import cloudinary.utils
-                import requests
-
-                # Obtener el nombre del archivo almacenado en Cloudinary
-                storage_path = credit_note.archivo_pdf.name
-                logger.info(f"Fetching credit note PDF from Cloudinary: {storage_path}")
-
-                # Eliminar la extensión del public_id si existe (Cloudinary raw files)
-                import os
-                base_name, ext = os.path.splitext(storage_path)
-                ext_clean = ext.lstrip('.')
-
-                # Intentar con y sin extensión
-                public_id_candidates = []
-                if ext:
-                    public_id_candidates.append(base_name)
-                public_id_candidates.append(storage_path)
-
-                # Eliminar duplicados manteniendo orden
-                unique_candidates = []
-                for candidate in public_id_candidates:
-                    if candidate and candidate not in unique_candidates:
-                        unique_candidates.append(candidate)
-
-                cloudinary_response = None
-
-                for public_id in unique_candidates:
-                    logger.info(f"Trying public_id: {public_id}")
-                    for cloudinary_type in ('authenticated', 'upload'):
-                        try:
-                            format_arg = None
-                            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
-                                format_arg = ext_clean
-
-                            cloudinary_options = {
-                                'resource_type': 'raw',
-                                'type': cloudinary_type,
-                                'secure': True,
-                                'sign_url': True,
-                            }
-                            if format_arg:
-                                cloudinary_options['format'] = format_arg
-
-                            download_url, _ = cloudinary.utils.cloudinary_url(
-                                public_id,
-                                **cloudinary_options,
-                            )
-                            logger.info(f"Generated signed CDN URL ({cloudinary_type}): {download_url[:100]}...")
-                        except Exception as url_error:
-                            logger.error(f"Error generating signed URL ({cloudinary_type}): {url_error}")
-                            continue
-
-                        logger.info(f"Downloading from Cloudinary CDN...")
-                        response = requests.get(download_url, timeout=30)
-                        logger.info(f"Cloudinary response status: {response.status_code}")
-
-                        if response.status_code == 200:
-                            cloudinary_response = response
-                            logger.info(f"✅ SUCCESS: Downloaded {len(response.content)} bytes")
-                            break
-                        elif response.status_code == 404:
-                            logger.warning(f"404: File not found with public_id={public_id}, type={cloudinary_type}")
-                        else:
-                            logger.warning(f"Unexpected status {response.status_code} for {public_id}")
-
-                    if cloudinary_response:
-                        break
-
-                if cloudinary_response is None:
-                    logger.error(f"All download attempts failed for credit note {credit_note.id}")
-                    return Response(
-                        {'detail': 'No se pudo descargar el archivo desde Cloudinary después de múltiples intentos.'},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-
-                # Servir el archivo descargado
-                filename = f"nota_credito_{credit_note.numero_nota_credito}.pdf"
-                content_type = 'application/pdf'
-
-                response_file = HttpResponse(cloudinary_response.content, content_type=content_type)
-                download_flag = str(request.query_params.get('download', '')).lower()
-                disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-                response_file['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-                response_file['Content-Length'] = len(cloudinary_response.content)
-                response_file['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-                return response_file
-
-            except Exception as e:
-                logger.error(f"Error al obtener archivo de Cloudinary: {e}", exc_info=True)
-                return Response(
-                    {'detail': f'Error al obtener el archivo: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+        return FileDeliveryService().serve(
+            request,
+            storage_path=credit_note.archivo_pdf.name,
+            filename=f"nota_credito_{credit_note.numero_nota_credito}.pdf",
+            content_type='application/pdf',
+        )
 
-        # Para almacenamiento local, servir normalmente
-        try:
-            file_handle = credit_note.archivo_pdf.open('rb')
-            filename = f"nota_credito_{credit_note.numero_nota_credito}.pdf"
-            content_type = 'application/pdf'
-
-            from django.http import FileResponse
-            response = FileResponse(file_handle, content_type=content_type)
-            download_flag = str(request.query_params.get('download', '')).lower()
-            disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-            response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-            return response
-        except Exception as e:
-            logger.error(f"Error al abrir archivo local: {e}", exc_info=True)
-            return Response(
-                {'detail': f'No se pudo abrir el archivo: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
@@ -6,7 +6,7 @@ from rest_framework import serializers
 from decimal import Decimal
 from .models import SupplierPayment, SupplierPaymentLink
 from invoices.models import Invoice
-from catalogs.models import Provider
+from catalogs.models import CostType, Provider
 
 
 class SupplierPaymentLinkSerializer(serializers.ModelSerializer):
@@ -264,6 +264,10 @@ class FacturaPendientePagoSerializer(serializers.ModelSerializer):
     esta_vencida = serializers.SerializerMethodField()
     ot_data = serializers.SerializerMethodField()
 
+    # Anotados por services.payables.facturas_por_pagar (calculados con los links de pago)
+    monto_pagado = serializers.DecimalField(source='pagado_links', max_digits=15, decimal_places=2, read_only=True)
+    monto_pendiente = serializers.DecimalField(source='saldo_pendiente', max_digits=15, decimal_places=2, read_only=True)
+
     class Meta:
         model = Invoice
         fields = [
@@ -288,7 +292,10 @@ class FacturaPendientePagoSerializer(serializers.ModelSerializer):
         ]
 
     def get_tipo_costo_display(self, obj):
-        return obj.get_tipo_costo_display()
+        # Nombres de CostType cargados una vez por listado (no una consulta por fila)
+        if not hasattr(self, '_cost_type_names'):
+            self._cost_type_names = CostType.names_by_code()
+        return obj.get_tipo_costo_display(self._cost_type_names)
 
     def get_dias_hasta_vencimiento(self, obj):
         return obj.calcular_dias_hasta_vencimiento()
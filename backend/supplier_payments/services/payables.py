@@ -0,0 +1,217 @@
+"""
+Consultas de cuentas por pagar (facturas de costo provisionadas con saldo).
+
+El saldo de cada factura se calcula en la misma consulta con una subconsulta
+correlacionada sobre SupplierPaymentLink (índice por cost_invoice):
+
+    saldo_pendiente = max(monto_aplicable - SUM(links.monto_pagado_factura), 0)
+
+en lugar de confiar en Invoice.monto_pendiente, que solo se recalcula cuando
+se guarda la factura. Los totales por proveedor y por tramo de vencimiento
+salen de UNA consulta agrupada cada uno, y el listado se puede recorrer por
+páginas keyset (common.pagination.KeysetPagination) o exportar a CSV en
+streaming sin materializar los modelos.
+
+Uso:
+    queryset = facturas_por_pagar(proveedor_id=22)
+    totales_por_proveedor(queryset)   # [{'proveedor_id', 'total_pendiente', ...}]
+    totales_por_vencimiento(queryset) # [{'tramo': 'vencida', ...}, ...]
+    StreamingHttpResponse(iter_csv(queryset), content_type='text/csv')
+"""
+
+import csv
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+
+from django.db.models import (
+    Case, CharField, Count, DateField, DecimalField, Min, OuterRef, Q, QuerySet,
+    Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from invoices.models import Invoice
+from supplier_payments.models import SupplierPaymentLink
+
+
+ESTADOS_CON_SALDO = ('pendiente', 'pagado_parcial')
+
+# Las facturas sin fecha de vencimiento van al final del listado
+SIN_VENCIMIENTO = date(9999, 12, 31)
+
+# Orden keyset del listado de pendientes (vence_orden es Coalesce de la fecha)
+ORDEN_PENDIENTES = ('vence_orden', 'id')
+
+TRAMOS_VENCIMIENTO = [
+    ('vencida', 'Vencidas'),
+    ('0_7', 'Vencen en 0-7 días'),
+    ('8_30', 'Vencen en 8-30 días'),
+    ('mas_30', 'Vencen en más de 30 días'),
+    ('sin_fecha', 'Sin fecha de vencimiento'),
+]
+
+CSV_COLUMNAS = [
+    ('id', 'ID'),
+    ('numero_factura', 'Factura'),
+    ('proveedor__nombre', 'Proveedor'),
+    ('ot_number', 'OT'),
+    ('ot__cliente__original_name', 'Cliente'),
+    ('tipo_costo', 'Tipo de costo'),
+    ('fecha_emision', 'Fecha emisión'),
+    ('fecha_vencimiento', 'Fecha vencimiento'),
+    ('monto_aplicable', 'Monto aplicable'),
+    ('pagado_links', 'Pagado'),
+    ('saldo_pendiente', 'Saldo pendiente'),
+    ('estado_pago', 'Estado de pago'),
+]
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+
+def pagado_subquery() -> Subquery:
+    """SUM(monto_pagado_factura) de los links de la factura externa (o NULL)."""
+    links = SupplierPaymentLink.objects.filter(
+        cost_invoice=OuterRef('pk')
+    ).order_by().values('cost_invoice').annotate(
+        total=Sum('monto_pagado_factura')
+    ).values('total')
+    return Subquery(links, output_field=MONEY)
+
+
+def anotar_saldo(queryset: QuerySet) -> QuerySet:
+    """Agrega pagado_links, saldo_pendiente y vence_orden a un queryset de Invoice."""
+    pagado = Coalesce(pagado_subquery(), ZERO, output_field=MONEY)
+    return queryset.annotate(
+        pagado_links=pagado,
+        saldo_pendiente=Greatest(
+            Coalesce('monto_aplicable', 'monto', output_field=MONEY) - pagado,
+            ZERO,
+            output_field=MONEY,
+        ),
+        vence_orden=Coalesce('fecha_vencimiento', Value(SIN_VENCIMIENTO), output_field=DateField()),
+    )
+
+
+def facturas_por_pagar(proveedor_id=None, incluir_parciales: bool = True,
+                       vence_desde=None, vence_hasta=None) -> QuerySet:
+    """
+    Facturas provisionadas con saldo pendiente, anotadas con el saldo.
+
+    Args:
+        proveedor_id: Limitar a un proveedor.
+        incluir_parciales: Incluir las pagadas parcialmente (si no, solo
+            estado_pago='pendiente').
+        vence_desde / vence_hasta: Rango de fecha de vencimiento (inclusive).
+    """
+    estados = ESTADOS_CON_SALDO if incluir_parciales else ('pendiente',)
+    queryset = Invoice.objects.filter(
+        is_deleted=False,
+        estado_provision='provisionada',
+        estado_pago__in=estados,
+    )
+    if proveedor_id:
+        queryset = queryset.filter(proveedor_id=proveedor_id)
+    if vence_desde:
+        queryset = queryset.filter(fecha_vencimiento__gte=vence_desde)
+    if vence_hasta:
+        queryset = queryset.filter(fecha_vencimiento__lte=vence_hasta)
+
+    # Excluir facturas sin saldo (ej: cubiertas por notas de crédito)
+    return anotar_saldo(queryset).filter(saldo_pendiente__gt=0)
+
+
+def resumen(queryset: QuerySet, hoy: Optional[date] = None) -> Dict:
+    """Totales del listado completo (una consulta)."""
+    hoy = hoy or timezone.localdate()
+    data = queryset.order_by().aggregate(
+        total_facturas=Count('id'),
+        total_pendiente=Sum('saldo_pendiente'),
+        total_vencido=Sum('saldo_pendiente', filter=Q(fecha_vencimiento__lt=hoy)),
+    )
+    return {
+        'total_facturas': data['total_facturas'],
+        'total_pendiente': float(data['total_pendiente'] or 0),
+        'total_vencido': float(data['total_vencido'] or 0),
+    }
+
+
+def totales_por_proveedor(queryset: QuerySet, hoy: Optional[date] = None) -> List[Dict]:
+    """Saldo, monto, vencido y próximo vencimiento por proveedor (una consulta)."""
+    hoy = hoy or timezone.localdate()
+    filas = queryset.filter(proveedor__isnull=False).order_by().values(
+        'proveedor_id', 'proveedor__nombre'
+    ).annotate(
+        total_facturas=Count('id'),
+        total_pendiente=Sum('saldo_pendiente'),
+        total_monto=Sum('monto_aplicable'),
+        total_vencido=Sum('saldo_pendiente', filter=Q(fecha_vencimiento__lt=hoy)),
+        proximo_vencimiento=Min('fecha_vencimiento'),
+    ).order_by('proveedor__nombre')
+
+    return [
+        {
+            'proveedor_id': fila['proveedor_id'],
+            'proveedor_nombre': fila['proveedor__nombre'],
+            'total_facturas': fila['total_facturas'],
+            'total_pendiente': float(fila['total_pendiente'] or 0),
+            'total_monto': float(fila['total_monto'] or 0),
+            'total_vencido': float(fila['total_vencido'] or 0),
+            'proximo_vencimiento': fila['proximo_vencimiento'],
+        }
+        for fila in filas
+    ]
+
+
+def totales_por_vencimiento(queryset: QuerySet, hoy: Optional[date] = None) -> List[Dict]:
+    """Saldo agrupado por tramo de vencimiento (una consulta), en orden fijo."""
+    hoy = hoy or timezone.localdate()
+    tramo = Case(
+        When(fecha_vencimiento__isnull=True, then=Value('sin_fecha')),
+        When(fecha_vencimiento__lt=hoy, then=Value('vencida')),
+        When(fecha_vencimiento__lte=hoy + timedelta(days=7), then=Value('0_7')),
+        When(fecha_vencimiento__lte=hoy + timedelta(days=30), then=Value('8_30')),
+        default=Value('mas_30'),
+        output_field=CharField(),
+    )
+    filas = {
+        fila['tramo']: fila
+        for fila in queryset.order_by().annotate(tramo=tramo).values('tramo').annotate(
+            total_facturas=Count('id'),
+            total_pendiente=Sum('saldo_pendiente'),
+            proveedores=Count('proveedor_id', distinct=True),
+        )
+    }
+    return [
+        {
+            'tramo': codigo,
+            'label': label,
+            'total_facturas': filas.get(codigo, {}).get('total_facturas', 0),
+            'total_pendiente': float(filas.get(codigo, {}).get('total_pendiente') or 0),
+            'proveedores': filas.get(codigo, {}).get('proveedores', 0),
+        }
+        for codigo, label in TRAMOS_VENCIMIENTO
+    ]
+
+
+class _Echo:
+    """Buffer de escritura que devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset: QuerySet, chunk_size: int = 2000) -> Iterator[str]:
+    """
+    Líneas CSV del listado, para StreamingHttpResponse.
+
+    Lee tuplas con values_list() e iterator() (cursor del servidor en
+    PostgreSQL), así la memoria no crece con el tamaño del proveedor.
+    """
+    writer = csv.writer(_Echo())
+    # BOM para que Excel detecte UTF-8
+    yield '\ufeff' + writer.writerow([titulo for _, titulo in CSV_COLUMNAS])
+    filas = queryset.order_by(*ORDEN_PENDIENTES).values_list(*[campo for campo, _ in CSV_COLUMNAS])
+    for fila in filas.iterator(chunk_size=chunk_size):
+        yield writer.writerow(['' if valor is None else valor for valor in fila])
@@ -1,3 +1,215 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from catalogs.models import Provider
+from client_aliases.models import ClientAlias
+from invoices.models import Invoice, UploadedFile
+from ots.models import OT
+from supplier_payments.models import SupplierPayment, SupplierPaymentLink
+from supplier_payments.services import payables
+
+
+class PayablesAPITestCase(TestCase):
+    """Cuentas por pagar: saldo por subconsulta, páginas keyset, totales agrupados y CSV"""
+
+    URL = '/api/supplier-payments/facturas_pendientes/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='finanzas_cxp', email='cxp@example.com', password='password123', role='finanzas'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.hoy = timezone.localdate()
+        self.naviera = Provider.objects.create(nombre='Naviera CxP')
+        self.agente = Provider.objects.create(nombre='Agente CxP')
+        cliente = ClientAlias.objects.create(original_name='Cliente CxP', normalized_name='CLIENTE CXP')
+        self.ot = OT.objects.create(numero_ot='OT-CXP-001', cliente=cliente)
+
+        self.vencida = self._factura('CXP-1', self.naviera, '100.00')
+        self.parcial = self._factura('CXP-2', self.naviera, '250.00')
+        self.futura = self._factura('CXP-3', self.agente, '80.00')
+        self.sin_fecha = self._factura('CXP-4', self.agente, '40.00')
+        self.misma_fecha = self._factura('CXP-5', self.agente, '60.00')
+        self.pagada = self._factura('CXP-6', self.naviera, '30.00')
+
+        self._pagar(self.parcial, '100.00')
+        self._pagar(self.pagada, '30.00')
+
+        vencimientos = {
+            self.vencida: self.hoy - timedelta(days=3),
+            self.parcial: self.hoy + timedelta(days=5),
+            self.futura: self.hoy + timedelta(days=45),
+            self.misma_fecha: self.hoy + timedelta(days=5),
+            self.pagada: self.hoy,
+        }
+        for invoice, vencimiento in vencimientos.items():
+            Invoice.objects.filter(pk=invoice.pk).update(fecha_vencimiento=vencimiento)
+
+    def _factura(self, numero, proveedor, monto):
+        content = numero.encode()
+        uploaded_file = UploadedFile.objects.create(
+            filename=f"{numero}.pdf",
+            path=f"invoices/test/{numero}.pdf",
+            sha256=UploadedFile.calculate_hash(content),
+            size=len(content),
+            content_type="application/pdf"
+        )
+        return Invoice.objects.create(
+            numero_factura=numero,
+            fecha_emision=self.hoy - timedelta(days=30),
+            fecha_provision=self.hoy - timedelta(days=1),
+            monto=Decimal(monto),
+            tipo_costo='OTRO',
+            proveedor=proveedor,
+            proveedor_nombre=proveedor.nombre,
+            ot=self.ot,
+            uploaded_file=uploaded_file,
+        )
+
+    def _pagar(self, invoice, monto):
+        pago = SupplierPayment.objects.create(
+            proveedor=invoice.proveedor, fecha_pago=self.hoy, monto_total=Decimal(monto), referencia=invoice.numero_factura
+        )
+        SupplierPaymentLink.objects.create(
+            supplier_payment=pago, cost_invoice=invoice, monto_pagado_factura=Decimal(monto)
+        )
+
+    def test_keyset_pages_cover_all_rows_in_due_date_order(self):
+        ids, cursor = [], None
+        while True:
+            params = {'page_size': 2, 'incluir_parciales': 'true'}
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(3):  # totales + página + nombres de tipo de costo
+                response = self.client.get(self.URL, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        # Vencimiento ascendente, empates por id y sin fecha al final; la pagada no aparece
+        self.assertEqual(ids, [self.vencida.pk, self.parcial.pk, self.misma_fecha.pk, self.futura.pk, self.sin_fecha.pk])
+        self.assertEqual(response.data['totales'], {
+            'total_facturas': 5, 'total_pendiente': 430.0, 'total_vencido': 100.0,
+        })
+
+    def test_balance_comes_from_payment_links(self):
+        # monto_pendiente almacenado desactualizado: el saldo se calcula con los links
+        Invoice.objects.filter(pk=self.parcial.pk).update(monto_pendiente=Decimal('999.00'))
+
+        response = self.client.get(self.URL, {'proveedor_id': self.naviera.pk, 'incluir_parciales': 'true'})
+        self.assertEqual(response.status_code, 200)
+        rows = {row['id']: row for row in response.data}
+        self.assertEqual(set(rows), {self.vencida.pk, self.parcial.pk})
+        self.assertEqual(rows[self.parcial.pk]['monto_pagado'], '100.00')
+        self.assertEqual(rows[self.parcial.pk]['monto_pendiente'], '150.00')
+
+    def test_grouped_totals_use_one_query(self):
+        queryset = payables.facturas_por_pagar()
+        with self.assertNumQueries(1):
+            por_proveedor = payables.totales_por_proveedor(queryset, hoy=self.hoy)
+        with self.assertNumQueries(1):
+            por_tramo = payables.totales_por_vencimiento(queryset, hoy=self.hoy)
+
+        self.assertEqual(
+            [(p['proveedor_nombre'], p['total_facturas'], p['total_pendiente'], p['total_vencido']) for p in por_proveedor],
+            [('Agente CxP', 3, 180.0, 0.0), ('Naviera CxP', 2, 250.0, 100.0)]
+        )
+        tramos = {t['tramo']: (t['total_facturas'], t['total_pendiente']) for t in por_tramo}
+        self.assertEqual(tramos, {
+            'vencida': (1, 100.0), '0_7': (2, 210.0), '8_30': (0, 0.0), 'mas_30': (1, 80.0), 'sin_fecha': (1, 40.0),
+        })
+
+        response = self.client.get(self.URL, {'page_size': 10, 'agrupar': 'vencimiento', 'incluir_parciales': 'true'})
+        self.assertEqual(response.data['grupos'], por_tramo)
+
+    def test_stats_por_proveedor_keeps_shape(self):
+        response = self.client.get('/api/supplier-payments/stats_por_proveedor/')
+        self.assertEqual(response.status_code, 200)
+        naviera = next(p for p in response.data if p['proveedor_id'] == self.naviera.pk)
+        self.assertEqual(naviera['total_facturas'], 2)
+        self.assertEqual(naviera['total_pendiente'], 250.0)
+        self.assertEqual(naviera['total_monto'], 350.0)
+
+    def test_csv_export_streams_rows(self):
+        response = self.client.get('/api/supplier-payments/facturas_pendientes/csv/', {'proveedor_id': self.agente.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertTrue(lines[0].startswith('ID,Factura,Proveedor'))
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['CXP-5', 'CXP-3', 'CXP-4'])
+
+    def test_historial_keyset_with_totals(self):
+        response = self.client.get('/api/supplier-payments/historial/', {'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totales'], {'cantidad': 2, 'monto_total': 130.0})
+        self.assertEqual(len(response.data['results']), 1)
+
+        siguiente = self.client.get('/api/supplier-payments/historial/', {
+            'page_size': 1, 'cursor': response.data['next_cursor']
+        })
+        self.assertIsNone(siguiente.data['next_cursor'])
+        ids = {response.data['results'][0]['id'], siguiente.data['results'][0]['id']}
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(siguiente.data['results'][0]['invoice_links'][0]['invoice_cliente'], 'Cliente CxP')
+
+
+class SupplierPaymentFileTestCase(TestCase):
+    """El comprobante se sirve con FileDeliveryService (streaming, Range y ETag)"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_media = override_settings(MEDIA_ROOT=media, USE_CLOUDINARY=False)
+        settings_media.enable()
+        self.addCleanup(settings_media.disable)
+
+        user = User.objects.create_user(
+            username='finanzas_comprobante', email='comprobante@example.com', password='password123', role='finanzas'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+        self.contenido = b'%PDF-1.4 comprobante ' * 50
+        self.pago = SupplierPayment.objects.create(
+            proveedor=Provider.objects.create(nombre='Naviera Comprobante'),
+            fecha_pago=timezone.localdate(),
+            monto_total=Decimal('100.00'),
+            referencia='TRF-001',
+        )
+        self.pago.archivo_comprobante.save('comprobante.pdf', ContentFile(self.contenido))
+        self.url = f'/api/supplier-payments/{self.pago.pk}/file/'
+
+    def test_file_is_streamed_with_range_and_etag(self):
+        response = self.client.get(self.url, {'download': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="comprobante_pago_proveedor_TRF-001.pdf"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.contenido)
+
+        partial = self.client.get(self.url, HTTP_RANGE='bytes=0-7')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), self.contenido[:8])
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_payment_without_file_returns_404(self):
+        SupplierPayment.objects.filter(pk=self.pago.pk).update(archivo_comprobante='')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['detail'], 'El pago no tiene comprobante asociado.')
@@ -9,7 +9,9 @@ Permisos:
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Sum, Count
+from django.db.models import Q, Sum, Count, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from decimal import Decimal
 
 from .models import SupplierPayment, SupplierPaymentLink
@@ -17,12 +19,15 @@ from .serializers import (
     SupplierPaymentSerializer,
     FacturaPendientePagoSerializer
 )
-from invoices.models import Invoice
+from .services import payables
 from catalogs.models import Provider
+from common.pagination import KeysetPagination
 from common.permissions import IsAdminOrFinanzas
+from common.file_delivery import FileDeliveryService
+from common.mixins import ReplicaReadMixin
 
 
-class SupplierPaymentViewSet(viewsets.ModelViewSet):
+class SupplierPaymentViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     API para gestionar pagos a proveedores (Cuentas por Pagar).
 
@@ -35,6 +40,9 @@ class SupplierPaymentViewSet(viewsets.ModelViewSet):
     queryset = SupplierPayment.objects.filter(is_deleted=False)
     serializer_class = SupplierPaymentSerializer
     permission_classes = [IsAdminOrFinanzas]
+    replica_actions = {
+        'list', 'retrieve', 'facturas_pendientes', 'exportar_pendientes', 'stats_por_proveedor', 'historial'
+    }
 
     def get_queryset(self):
         """Filtros opcionales"""
@@ -62,7 +70,11 @@ class SupplierPaymentViewSet(viewsets.ModelViewSet):
                 Q(notas__icontains=search)
             )
 
-        return queryset.select_related('proveedor', 'registrado_por').prefetch_related('invoice_links')
+        # Los links se serializan con factura, OT y cliente: traerlos en el mismo prefetch
+        links = SupplierPaymentLink.objects.select_related('cost_invoice__ot__cliente')
+        return queryset.select_related('proveedor', 'registrado_por').prefetch_related(
+            Prefetch('invoice_links', queryset=links)
+        )
 
     def create(self, request, *args, **kwargs):
         """
@@ -121,104 +133,106 @@ class SupplierPaymentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
+    def _facturas_por_pagar(self, request, incluir_parciales_default='false'):
+        """Queryset de services.payables según los query params."""
+        params = request.query_params
+        return payables.facturas_por_pagar(
+            proveedor_id=params.get('proveedor_id'),
+            incluir_parciales=params.get('incluir_parciales', incluir_parciales_default).lower() == 'true',
+            vence_desde=params.get('vence_desde'),
+            vence_hasta=params.get('vence_hasta'),
+        )
+
     @action(detail=False, methods=['get'])
     def facturas_pendientes(self, request):
         """
-        Retorna facturas PROVISIONADAS pendientes de pago,
-        agrupadas por proveedor.
+        Retorna facturas PROVISIONADAS con saldo pendiente de pago,
+        ordenadas por fecha de vencimiento.
 
         Opciones:
         - ?proveedor_id=X - Filtrar por proveedor específico
         - ?incluir_parciales=true - Incluir facturas con pago parcial
-        """
-        proveedor_id = request.query_params.get('proveedor_id')
-        incluir_parciales = request.query_params.get('incluir_parciales', 'false').lower() == 'true'
-
-        # Filtrar facturas provisionadas y pendientes de pago
-        # Excluir facturas anuladas o con monto pendiente = 0 (ej: cubiertas por notas de crédito)
-        queryset = Invoice.objects.filter(
-            is_deleted=False,
-            estado_provision='provisionada',
-            monto_pendiente__gt=0,  # Solo facturas con monto pendiente mayor a 0
-        )
+        - ?vence_desde=YYYY-MM-DD / ?vence_hasta=YYYY-MM-DD
+        - ?page_size=N y/o ?cursor=... - Paginación keyset; la respuesta pasa a
+          ser {next, next_cursor, page_size, totales, results}
+        - ?agrupar=proveedor|vencimiento - Agrega `grupos` (una consulta agrupada)
 
-        # Estado de pago
-        if incluir_parciales:
-            queryset = queryset.filter(estado_pago__in=['pendiente', 'pagado_parcial'])
-        else:
-            queryset = queryset.filter(estado_pago='pendiente')
+        Sin parámetros de paginación retorna la lista completa (compatibilidad).
+        """
+        queryset = self._facturas_por_pagar(request).select_related('proveedor', 'ot', 'ot__cliente')
+
+        paginar = 'cursor' in request.query_params or 'page_size' in request.query_params
+        if not paginar:
+            serializer = FacturaPendientePagoSerializer(queryset.order_by(*payables.ORDEN_PENDIENTES), many=True)
+            return Response(serializer.data)
+
+        hoy = timezone.localdate()
+        extra = {'totales': payables.resumen(queryset, hoy=hoy)}
+        agrupar = request.query_params.get('agrupar')
+        if agrupar == 'proveedor':
+            extra['grupos'] = payables.totales_por_proveedor(queryset, hoy=hoy)
+        elif agrupar == 'vencimiento':
+            extra['grupos'] = payables.totales_por_vencimiento(queryset, hoy=hoy)
+        elif agrupar:
+            return Response(
+                {'error': "agrupar debe ser 'proveedor' o 'vencimiento'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Filtro por proveedor
-        if proveedor_id:
-            queryset = queryset.filter(proveedor_id=proveedor_id)
+        paginator = KeysetPagination(payables.ORDEN_PENDIENTES)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = FacturaPendientePagoSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data, **extra)
 
-        queryset = queryset.select_related('proveedor', 'ot', 'ot__cliente').order_by('fecha_vencimiento', 'proveedor__nombre')
+    @action(detail=False, methods=['get'], url_path='facturas_pendientes/csv')
+    def exportar_pendientes(self, request):
+        """
+        Exporta las facturas pendientes a CSV en streaming (mismos filtros que
+        facturas_pendientes, incluye pagos parciales por defecto).
+        """
+        queryset = self._facturas_por_pagar(request, incluir_parciales_default='true')
+        filename = f"cuentas_por_pagar_{timezone.localdate():%Y%m%d}.csv"
 
-        serializer = FacturaPendientePagoSerializer(queryset, many=True)
-        return Response(serializer.data)
+        response = StreamingHttpResponse(payables.iter_csv(queryset), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+        return response
 
     @action(detail=False, methods=['get'])
     def stats_por_proveedor(self, request):
         """
-        Retorna estadísticas de facturas pendientes agrupadas por proveedor.
+        Retorna estadísticas de facturas pendientes agrupadas por proveedor
+        (una sola consulta agrupada).
         Útil para mostrar la lista de proveedores con deuda.
         """
-        # Facturas provisionadas pendientes de pago
-        # Excluir facturas con monto pendiente = 0 (ej: cubiertas por notas de crédito)
-        facturas = Invoice.objects.filter(
-            is_deleted=False,
-            estado_provision='provisionada',
-            estado_pago__in=['pendiente', 'pagado_parcial'],
-            monto_pendiente__gt=0  # Solo facturas con monto pendiente mayor a 0
-        ).values('proveedor_id', 'proveedor__nombre').annotate(
-            total_facturas=Count('id'),
-            total_pendiente=Sum('monto_pendiente'),
-            total_monto=Sum('monto_aplicable')
-        ).order_by('proveedor__nombre')
-
-        # Convertir Decimal a float para JSON
-        stats = []
-        for item in facturas:
-            if item['proveedor_id']:  # Asegurar que tenga proveedor
-                stats.append({
-                    'proveedor_id': item['proveedor_id'],
-                    'proveedor_nombre': item['proveedor__nombre'],
-                    'total_facturas': item['total_facturas'],
-                    'total_pendiente': float(item['total_pendiente'] or 0),
-                    'total_monto': float(item['total_monto'] or 0)
-                })
-
-        return Response(stats)
+        queryset = payables.facturas_por_pagar(incluir_parciales=True)
+        return Response(payables.totales_por_proveedor(queryset))
 
     @action(detail=False, methods=['get'])
     def historial(self, request):
         """
-        Retorna historial de pagos realizados.
+        Retorna historial de pagos realizados (paginación keyset por fecha).
         Opcionalmente filtrar por proveedor o rango de fechas.
-        """
-        queryset = self.get_queryset().order_by('-fecha_pago')
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        Respuesta: {next, next_cursor, page_size, totales, results}
+        """
+        queryset = self.get_queryset()
+        totales = queryset.order_by().aggregate(cantidad=Count('id'), monto_total=Sum('monto_total'))
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination(('-fecha_pago', '-id'))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data, totales={
+            'cantidad': totales['cantidad'],
+            'monto_total': float(totales['monto_total'] or 0),
+        })
 
     @action(detail=True, methods=['get'], url_path='file')
     def retrieve_file(self, request, pk=None):
         """
         Permite descargar o previsualizar el comprobante de pago a proveedor.
-        Actúa como proxy para servir archivos desde Cloudinary.
+        Ver common/file_delivery.py (redirect firmado o proxy con Range/ETag).
         """
-        from django.shortcuts import redirect
-        from django.conf import settings
-        from django.http import FileResponse, HttpResponse
-        import logging
-
-        logger = logging.getLogger(__name__)
-
         supplier_payment = self.get_object()
 
         if not supplier_payment.archivo_comprobante:
@@ -227,120 +241,9 @@ class SupplierPaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Si usamos Cloudinary, servir archivo como proxy
-        if getattr(settings, 'USE_CLOUDINARY', False):
-            try:
-                import cloudinary.utils
-                import requests
-
-                # Obtener el nombre del archivo almacenado en Cloudinary
-                storage_path = supplier_payment.archivo_comprobante.name
-                logger.info(f"Fetching supplier payment receipt from Cloudinary: {storage_path}")
-
-                # Eliminar la extensión del public_id si existe (Cloudinary raw files)
-                import os
-                base_name, ext = os.path.splitext(storage_path)
-                ext_clean = ext.lstrip('.')
-
-                # Intentar con y sin extensión
-                public_id_candidates = []
-                if ext:
-                    public_id_candidates.append(base_name)
-                public_id_candidates.append(storage_path)
-
-                # Eliminar duplicados manteniendo orden
-                unique_candidates = []
-                for candidate in public_id_candidates:
-                    if candidate and candidate not in unique_candidates:
-                        unique_candidates.append(candidate)
-
-                cloudinary_response = None
-
-                for public_id in unique_candidates:
-                    logger.info(f"Trying public_id: {public_id}")
-                    for cloudinary_type in ('authenticated', 'upload'):
-                        try:
-                            format_arg = None
-                            if ext_clean and not public_id.lower().endswith(f".{ext_clean.lower()}"):
-                                format_arg = ext_clean
-
-                            cloudinary_options = {
-                                'resource_type': 'raw',
-                                'type': cloudinary_type,
-                                'secure': True,
-                                'sign_url': True,
-                            }
-                            if format_arg:
-                                cloudinary_options['format'] = format_arg
-
-                            download_url, _ = cloudinary.utils.cloudinary_url(
-                                public_id,
-                                **cloudinary_options,
-                            )
-                            logger.info(f"Generated signed CDN URL ({cloudinary_type}): {download_url[:100]}...")
-                        except Exception as url_error:
-                            logger.error(f"Error generating signed URL ({cloudinary_type}): {url_error}")
-                            continue
-
-                        logger.info(f"Downloading from Cloudinary CDN...")
-                        response = requests.get(download_url, timeout=30)
-                        logger.info(f"Cloudinary response status: {response.status_code}")
-
-                        if response.status_code == 200:
-                            cloudinary_response = response
-                            logger.info(f"✅ SUCCESS: Downloaded {len(response.content)} bytes")
-                            break
-                        elif response.status_code == 404:
-                            logger.warning(f"404: File not found with public_id={public_id}, type={cloudinary_type}")
-                        else:
-                            logger.warning(f"Unexpected status {response.status_code} for {public_id}")
-
-                    if cloudinary_response:
-                        break
-
-                if cloudinary_response is None:
-                    logger.error(f"All download attempts failed for supplier payment {supplier_payment.id}")
-                    return Response(
-                        {'detail': 'No se pudo descargar el archivo desde Cloudinary después de múltiples intentos.'},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-
-                # Servir el archivo descargado
-                filename = f"comprobante_pago_proveedor_{supplier_payment.referencia}.pdf"
-                content_type = 'application/pdf'
-
-                response_file = HttpResponse(cloudinary_response.content, content_type=content_type)
-                download_flag = str(request.query_params.get('download', '')).lower()
-                disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-                response_file['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-                response_file['Content-Length'] = len(cloudinary_response.content)
-                response_file['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-                return response_file
-
-            except Exception as e:
-                logger.error(f"Error al obtener archivo de Cloudinary: {e}", exc_info=True)
-                return Response(
-                    {'detail': f'Error al obtener el archivo: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        # Para almacenamiento local, servir normalmente
-        try:
-            file_handle = supplier_payment.archivo_comprobante.open('rb')
-            filename = f"comprobante_pago_proveedor_{supplier_payment.referencia}.pdf"
-            content_type = 'application/pdf'
-
-            response = FileResponse(file_handle, content_type=content_type)
-            download_flag = str(request.query_params.get('download', '')).lower()
-            disposition = 'attachment' if download_flag in ('1', 'true', 'yes') else 'inline'
-            response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-
-            return response
-        except Exception as e:
-            logger.error(f"Error al abrir archivo local: {e}", exc_info=True)
-            return Response(
-                {'detail': f'No se pudo abrir el archivo: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return FileDeliveryService().serve(
+            request,
+            storage_path=supplier_payment.archivo_comprobante.name,
+            filename=f"comprobante_pago_proveedor_{supplier_payment.referencia}.pdf",
+            content_type='application/pdf',
+        )